@@ -0,0 +1,4 @@
+"""
+ACEest Fitness & Gym - shared application support package
+Storage engines and helpers used by the Flask applications
+"""
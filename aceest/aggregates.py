@@ -0,0 +1,91 @@
+"""
+Running aggregates for workout summaries
+Keeps per-category and global totals up to date in O(1) per write
+"""
+
+
+def to_tenths(calories):
+    """Convert a calorie value logged with one decimal to integer tenths"""
+    return int(round(calories * 10))
+
+
+class RunningTotals:
+    """Per-category session count, time and calorie totals
+
+    Calories are accumulated as integer tenths, so totals are exact and
+    match a full re-scan of entries that were rounded to one decimal.
+    """
+
+    def __init__(self, categories=()):
+        self._counts = {}
+        self._time = {}
+        self._tenths = {}
+        for category in categories:
+            self._ensure(category)
+
+    def _ensure(self, category):
+        if category not in self._counts:
+            self._counts[category] = 0
+            self._time[category] = 0
+            self._tenths[category] = 0
+
+    def add(self, category, duration, calories):
+        """Account for one new entry"""
+        self._ensure(category)
+        self._counts[category] += 1
+        self._time[category] += duration
+        self._tenths[category] += to_tenths(calories)
+
+    def load(self, category, sessions, time_total, calories_tenths):
+        """Set a category's totals from persisted values"""
+        self._ensure(category)
+        self._counts[category] = sessions
+        self._time[category] = time_total
+        self._tenths[category] = calories_tenths
+
+    def count(self, category):
+        """Number of entries accounted for in a category"""
+        return self._counts.get(category, 0)
+
+    def category_totals(self):
+        """Return {category: {'time': minutes, 'calories': kcal}}"""
+        return {
+            category: {'time': self._time[category], 'calories': self._tenths[category] / 10}
+            for category in self._counts
+        }
+
+    @property
+    def total_time(self):
+        return sum(self._time.values())
+
+    @property
+    def total_calories(self):
+        return sum(self._tenths.values()) / 10
+
+    def reset(self, categories=()):
+        """Drop all totals"""
+        self._counts.clear()
+        self._time.clear()
+        self._tenths.clear()
+        for category in categories:
+            self._ensure(category)
+
+    def rebuild(self, workouts):
+        """Recompute totals from a category -> entries mapping"""
+        self.reset(workouts.keys())
+        for category, sessions in workouts.items():
+            for entry in sessions:
+                self.add(category, entry['duration'], entry.get('calories', 0))
+
+    def verify(self, workouts):
+        """Compare totals against a full scan; returns a list of mismatches"""
+        expected = RunningTotals()
+        expected.rebuild(workouts)
+        mismatches = []
+        for category in set(self._counts) | set(expected._counts):
+            actual = (self.count(category), self._time.get(category, 0), self._tenths.get(category, 0))
+            scanned = (expected.count(category), expected._time.get(category, 0),
+                       expected._tenths.get(category, 0))
+            if actual != scanned:
+                mismatches.append({'category': category, 'running': actual, 'scanned': scanned})
+        return mismatches
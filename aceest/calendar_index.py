@@ -0,0 +1,232 @@
+"""
+Calendar index over daily workout totals
+Fenwick (binary indexed) trees per category answer date-range totals in O(log n)
+"""
+import bisect
+import threading
+from array import array
+from datetime import date, timedelta
+
+from aceest.aggregates import to_tenths
+
+BUCKETS = ('day', 'week', 'month')
+
+
+class FenwickTree:
+    """Prefix sums over an integer array with O(log n) updates and appends"""
+
+    def __init__(self, values=()):
+        self._tree = array('q', [0]) * (len(values) + 1)
+        # Linear-time construction: push each node's sum to its parent
+        for i, value in enumerate(values, start=1):
+            self._tree[i] += value
+            parent = i + (i & -i)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    def __len__(self):
+        return len(self._tree) - 1
+
+    def append(self, value):
+        """Add a position at the end holding value, in O(log n)"""
+        i = len(self._tree)
+        # Node i covers positions i - lowbit(i) + 1 .. i (1-based); all but the new one exist
+        self._tree.append(value + self.prefix(i - 2) - self.prefix(i - (i & -i) - 1))
+
+    def add(self, index, delta):
+        """Add delta at a 0-based position"""
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index):
+        """Sum of positions 0..index inclusive"""
+        total = 0
+        i = min(index + 1, len(self._tree) - 1)
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def range_sum(self, start, end):
+        """Sum of positions start..end inclusive (clamped to the tree)"""
+        if end < start or end < 0:
+            return 0
+        return self.prefix(end) - (self.prefix(start - 1) if start > 0 else 0)
+
+
+def to_ordinal(day):
+    """Accept a date or ISO string and return its proleptic ordinal"""
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    return day.toordinal()
+
+
+class DayIndex:
+    """Per-category minutes and calories per day with logarithmic range totals
+
+    Only days with entries are indexed: a sorted array of their ordinals,
+    per-category values aligned with it, and Fenwick trees over those
+    positions (ranks). Memory follows the number of active days, not the
+    span between the first and last one, so an outlier date costs one
+    slot. Days after the last indexed one are appended in O(log n); other
+    new days are buffered and merged in one linear rebuild by the next
+    query, so backfills stay linear overall.
+    """
+
+    def __init__(self, categories=()):
+        self._categories = list(categories)
+        self._days = array('q')
+        self._positions = {}
+        self._minutes = {}
+        self._tenths = {}
+        self._minute_trees = {}
+        self._tenth_trees = {}
+        # ordinal -> {category: [minutes, tenths]} of days not merged yet
+        self._pending = {}
+        self._lock = threading.Lock()
+        for category in self._categories:
+            self._add_category(category)
+
+    def _add_category(self, category):
+        if category not in self._minutes:
+            if category not in self._categories:
+                self._categories.append(category)
+            self._minutes[category] = array('q', [0]) * len(self._days)
+            self._tenths[category] = array('q', [0]) * len(self._days)
+            self._minute_trees[category] = FenwickTree(self._minutes[category])
+            self._tenth_trees[category] = FenwickTree(self._tenths[category])
+
+    def add(self, day, category, duration, calories):
+        """Account for one entry logged on ``day``"""
+        ordinal = to_ordinal(day)
+        tenths = to_tenths(calories)
+        with self._lock:
+            self._add_category(category)
+            position = self._positions.get(ordinal)
+            if position is None and not self._pending and (not self._days or ordinal > self._days[-1]):
+                position = self._positions[ordinal] = len(self._days)
+                self._days.append(ordinal)
+                for name in self._categories:
+                    for raw, trees in ((self._minutes, self._minute_trees), (self._tenths, self._tenth_trees)):
+                        raw[name].append(0)
+                        trees[name].append(0)
+            if position is None:
+                values = self._pending.setdefault(ordinal, {}).setdefault(category, [0, 0])
+                values[0] += duration
+                values[1] += tenths
+                return
+            self._minutes[category][position] += duration
+            self._tenths[category][position] += tenths
+            self._minute_trees[category].add(position, duration)
+            self._tenth_trees[category].add(position, tenths)
+
+    def _merge_pending(self):
+        # Caller holds the lock
+        if not self._pending:
+            return
+        days = sorted(set(self._days).union(self._pending))
+        positions = {ordinal: position for position, ordinal in enumerate(days)}
+        for category in self._categories:
+            for raw, field in ((self._minutes, 0), (self._tenths, 1)):
+                values = array('q', [0]) * len(days)
+                for ordinal, value in zip(self._days, raw[category]):
+                    values[positions[ordinal]] = value
+                for ordinal, categories in self._pending.items():
+                    if category in categories:
+                        values[positions[ordinal]] += categories[category][field]
+                raw[category] = values
+            self._minute_trees[category] = FenwickTree(self._minutes[category])
+            self._tenth_trees[category] = FenwickTree(self._tenths[category])
+        self._days = array('q', days)
+        self._positions = positions
+        self._pending = {}
+
+    def __len__(self):
+        """Number of days with entries"""
+        with self._lock:
+            self._merge_pending()
+            return len(self._days)
+
+    def clear(self):
+        """Drop every indexed day"""
+        with self._lock:
+            self._days = array('q')
+            self._positions = {}
+            self._pending = {}
+            for category in self._categories:
+                self._minutes[category] = array('q')
+                self._tenths[category] = array('q')
+                self._minute_trees[category] = FenwickTree()
+                self._tenth_trees[category] = FenwickTree()
+
+    def _bounds(self, start, end):
+        # Positions of the first and last indexed day within start..end
+        lo = bisect.bisect_left(self._days, to_ordinal(start)) if start is not None else 0
+        hi = bisect.bisect_right(self._days, to_ordinal(end)) - 1 if end is not None else len(self._days) - 1
+        return lo, hi
+
+    def range_totals(self, start, end):
+        """Return {category: {'time', 'calories'}} for days start..end inclusive"""
+        with self._lock:
+            self._merge_pending()
+            lo, hi = self._bounds(start, end)
+            totals = {}
+            for category in self._categories:
+                if hi < lo:
+                    totals[category] = {'time': 0, 'calories': 0}
+                    continue
+                totals[category] = {
+                    'time': self._minute_trees[category].range_sum(lo, hi),
+                    'calories': self._tenth_trees[category].range_sum(lo, hi) / 10
+                }
+            return totals
+
+    def daily_totals(self, start=None, end=None, categories=None):
+        """Return [(ordinal, minutes, tenths)] for active days start..end inclusive
+
+        Read straight from the per-day arrays, summed over ``categories``
+        (default all), in day order.
+        """
+        with self._lock:
+            self._merge_pending()
+            lo, hi = self._bounds(start, end)
+            selected = [category for category in self._categories if categories is None or category in categories]
+            days = []
+            for position in range(lo, hi + 1):
+                minutes = sum(self._minutes[category][position] for category in selected)
+                tenths = sum(self._tenths[category][position] for category in selected)
+                if minutes or tenths:
+                    days.append((self._days[position], minutes, tenths))
+            return days
+
+    def last_days(self, days, today=None):
+        """Totals for the ``days`` days ending today (inclusive)"""
+        end = today or date.today()
+        return self.range_totals(end - timedelta(days=days - 1), end)
+
+
+def bucket_bounds(start, end, bucket):
+    """Split start..end (dates, inclusive) into day, ISO-week or month buckets"""
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    if start > end:
+        return
+    current = start
+    while True:
+        if bucket == 'day':
+            bucket_end = current
+        elif bucket == 'week':
+            # Clamped before adding, so weeks ending past date.max never overflow
+            bucket_end = current + timedelta(days=min(6 - current.weekday(), (end - current).days))
+        elif current.month == 12:
+            bucket_end = date(current.year, 12, 31)
+        else:
+            bucket_end = date(current.year, current.month + 1, 1) - timedelta(days=1)
+        bucket_end = min(bucket_end, end)
+        yield current, bucket_end
+        # Stop at the last bucket instead of stepping past it (end may be date.max)
+        if bucket_end >= end:
+            return
+        current = bucket_end + timedelta(days=1)
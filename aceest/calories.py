@@ -0,0 +1,239 @@
+"""
+Derived workout calories
+Versioned MET table, per-member weight history and memoized recomputation
+"""
+import bisect
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from aceest.aggregates import RunningTotals
+from aceest.vectorized import calories_batch
+
+DEFAULT_WEIGHT = 70
+DEFAULT_MET = 5.0
+# Weight history records kept per member; the oldest are dropped beyond this
+MAX_WEIGHT_HISTORY = 50
+# Effective time of a record that applies to everything logged before the others
+SINCE_START = ''
+
+
+def met_version(values):
+    """Content version of a MET table: equal tables have equal versions"""
+    payload = json.dumps(values, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.blake2b(payload, digest_size=6).hexdigest()
+
+
+class MetTable:
+    """The MET values in force, versioned by content
+
+    ``baseline`` is the table stored calories were computed with. While
+    the current table equals it, stored values are already right; after a
+    correction (at runtime with ``update`` or by shipping different
+    values) every entry is re-derived with the current table.
+
+    Runtime corrections are saved to ``path`` (a JSON object of the
+    corrected values) when one is given: processes sharing the file load
+    them at startup and pick up each other's corrections on ``refresh``.
+    Without a path they only apply to this process.
+    """
+
+    def __init__(self, values, baseline=None, path=None):
+        self.shipped = dict(values)
+        self.baseline_version = met_version(baseline if baseline is not None else values)
+        self.path = path
+        self._corrections = {}
+        self._seen = None
+        self._lock = threading.Lock()
+        self._apply({})
+        self.refresh()
+
+    @property
+    def corrected(self):
+        return self.version != self.baseline_version
+
+    def get(self, category):
+        return self.values.get(category, DEFAULT_MET)
+
+    def _apply(self, corrections):
+        values = dict(self.shipped)
+        values.update(corrections)
+        self._corrections = corrections
+        # Swap in a new dict so readers never see a half-applied change
+        self.values = values
+        self.version = met_version(values)
+
+    def refresh(self):
+        """Load the corrections saved to ``path`` if they changed (one stat otherwise)"""
+        if self.path is None:
+            return
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        seen = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if seen != self._seen:
+            with self._lock:
+                self._seen = seen
+                self._apply(_read_corrections(self.path))
+
+    def update(self, changes):
+        """Apply MET corrections, saving them to ``path``; returns the new version"""
+        with self._lock:
+            if self.path is None:
+                self._apply(dict(self._corrections, **changes))
+                return self.version
+            with open(self.path + '.lock', 'a') as lock:
+                # Read, change and replace the file as one step across processes
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                corrections = _read_corrections(self.path)
+                corrections.update(changes)
+                temporary = self.path + '.tmp'
+                with open(temporary, 'w') as handle:
+                    json.dump(corrections, handle, sort_keys=True)
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                os.replace(temporary, self.path)
+                stat = os.stat(self.path)
+                self._seen = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                self._apply(corrections)
+            return self.version
+
+
+def _read_corrections(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def weight_at(history, timestamp, default=DEFAULT_WEIGHT):
+    """Weight in effect at a 'YYYY-MM-DD HH:MM:SS' timestamp"""
+    index = bisect.bisect_right(history, [timestamp, float('inf')]) - 1
+    return history[index][1] if index >= 0 else default
+
+
+def record_weight(user_info, weight, effective, now):
+    """Profile fields after a weight change effective at a timestamp
+
+    Returns ``weight_history`` (``[effective, weight]`` pairs in order),
+    ``weight_version`` (bumped on every change), ``weight_corrected``
+    (set once a change is backdated, which alters logged entries) and the
+    ``weight`` in effect now. A profile saved before histories were kept
+    seeds the history with its weight for everything logged until then.
+    """
+    history = [list(record) for record in user_info.get('weight_history') or []]
+    if not history and user_info.get('weight'):
+        history.append([SINCE_START, user_info['weight']])
+    history = [record for record in history if record[0] != effective]
+    bisect.insort(history, [effective, weight])
+    # Past the cap the oldest changes are dropped; entries before the new
+    # first record then use the default weight
+    del history[:-MAX_WEIGHT_HISTORY]
+    return {
+        'weight_history': history,
+        'weight_version': user_info.get('weight_version', 0) + 1,
+        'weight_corrected': bool(user_info.get('weight_corrected')) or effective < now,
+        'weight': weight_at(history, now, user_info.get('weight', DEFAULT_WEIGHT))
+    }
+
+
+class CalorieModel:
+    """Derives entry calories from weight history and the MET table
+
+    Derived values are memoized per member under a basis of (weight
+    version, MET version): changing either drops that member's memo in
+    one step. Members without a backdated weight correction, while the
+    MET table is uncorrected, keep their stored values and cost nothing.
+    """
+
+    def __init__(self, met_table, max_members=1024):
+        self.met_table = met_table
+        self.max_members = max_members
+        self._memos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def applies(self, user_info):
+        """Whether a member's stored calories may differ from the derived ones"""
+        return bool(user_info.get('weight_corrected')) or self.met_table.corrected
+
+    def basis(self, user_info):
+        """Versions the derived calories of a member depend on"""
+        return user_info.get('weight_version', 0), self.met_table.version
+
+    def _memo(self, member_key, basis):
+        with self._lock:
+            memo = self._memos.get(member_key)
+            if memo is None or memo['basis'] != basis:
+                if memo is not None:
+                    self.invalidations += 1
+                memo = self._memos[member_key] = {'basis': basis, 'entries': {}, 'totals': None}
+                while len(self._memos) > self.max_members:
+                    self._memos.popitem(last=False)
+            self._memos.move_to_end(member_key)
+            return memo
+
+    def apply(self, member_key, user_info, records):
+        """Replace the calories of (category, entry) pairs in place
+
+        Misses are computed together in one calories_batch pass.
+        """
+        memo = self._memo(member_key, self.basis(user_info))
+        entries = memo['entries']
+        missing = []
+        for category, entry in records:
+            key = (category, entry['timestamp'], entry['duration'])
+            calories = entries.get(key)
+            if calories is None:
+                missing.append((key, entry))
+            else:
+                entry['calories'] = calories
+        with self._lock:
+            self.hits += len(records) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            history = user_info.get('weight_history') or []
+            default = DEFAULT_WEIGHT if history else user_info.get('weight', DEFAULT_WEIGHT)
+            values = calories_batch([weight_at(history, key[1], default) for key, _entry in missing],
+                                    [self.met_table.get(key[0]) for key, _entry in missing],
+                                    [key[2] for key, _entry in missing], ndigits=1)
+            for (key, entry), calories in zip(missing, values):
+                entries[key] = entry['calories'] = calories
+        return records
+
+    def category_totals(self, member_key, user_info, store):
+        """Per-category totals with derived calories, memoized per data version"""
+        memo = self._memo(member_key, self.basis(user_info))
+        version = store.data_version()
+        cached = memo['totals']
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        records = [(category, entry) for category, _day, entry in store.iter_records()]
+        self.apply(member_key, user_info, records)
+        totals = RunningTotals(store.get_category_totals())
+        for category, entry in records:
+            totals.add(category, entry['duration'], entry['calories'])
+        memo['totals'] = (version, totals.category_totals())
+        return memo['totals'][1]
+
+    def discard(self, member_key):
+        """Drop a member's memo (e.g. when its store is evicted)"""
+        with self._lock:
+            self._memos.pop(member_key, None)
+
+    def stats(self):
+        """Return memo counters as a dict"""
+        with self._lock:
+            return {
+                'members': len(self._memos),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations
+            }
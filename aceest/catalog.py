@@ -0,0 +1,72 @@
+"""
+Plan catalogs served from pre-serialized, pre-compressed bytes
+Each catalog is encoded once; requests only pick a body by Accept-Encoding
+"""
+import gzip
+import hashlib
+import json
+import zlib
+
+# Offered content codings, in order of preference on equal quality
+ENCODINGS = ('gzip', 'deflate')
+CATALOG_KEYS = ('workout_plans', 'diet_plans')
+
+
+class PrecompressedJSON:
+    """A JSON document serialized once and kept in every supported encoding
+
+    The identity body is byte-for-byte what ``jsonify`` produces for the
+    same data, so switching an endpoint over changes no response body.
+    """
+
+    def __init__(self, data, level=9):
+        body = (json.dumps(data, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+        self.bodies = {
+            'identity': body,
+            # mtime=0 keeps the gzip bytes (and so the ETag) stable across restarts
+            'gzip': gzip.compress(body, level, mtime=0),
+            'deflate': zlib.compress(body, level)
+        }
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    def negotiate(self, accept_encodings):
+        """Return the best coding for a parsed Accept-Encoding header"""
+        return accept_encodings.best_match(ENCODINGS) or 'identity'
+
+    def serve(self, request, response_class, cache_control=None):
+        """Build the response for a request, honouring If-None-Match"""
+        encoding = self.negotiate(request.accept_encodings)
+        # Each coding is a different representation and needs its own strong ETag
+        etag = self.etag if encoding == 'identity' else f'{self.etag}-{encoding}'
+        if request.if_none_match.contains(etag):
+            response = response_class(status=304)
+        else:
+            response = response_class(self.bodies[encoding], mimetype='application/json')
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        if cache_control:
+            response.headers['Cache-Control'] = cache_control
+        return response
+
+
+def load_catalogs(path):
+    """Read workout and diet plans from a JSON data file
+
+    The file holds ``{"workout_plans": {name: [steps]}, "diet_plans":
+    {name: [items]}}``; returns the two mappings.
+    """
+    with open(path, encoding='utf-8') as catalog_file:
+        data = json.load(catalog_file)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected an object with {' and '.join(CATALOG_KEYS)}")
+    catalogs = []
+    for key in CATALOG_KEYS:
+        plans = data.get(key)
+        if not isinstance(plans, dict) or not all(
+                isinstance(name, str) and isinstance(items, list) and all(isinstance(item, str) for item in items)
+                for name, items in plans.items()):
+            raise ValueError(f"{path}: {key} must map plan names to lists of strings")
+        catalogs.append(plans)
+    return tuple(catalogs)
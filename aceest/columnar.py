@@ -0,0 +1,218 @@
+"""
+Columnar, array-backed storage for workout entries
+One typed array per field instead of one dict per logged session
+"""
+from array import array
+from collections.abc import Mapping, MutableMapping
+from datetime import date, datetime, timedelta
+from itertools import count
+
+from aceest.aggregates import to_tenths
+
+ENTRY_FIELDS = ('exercise', 'duration', 'calories', 'timestamp')
+
+_EPOCH = datetime(1970, 1, 1)
+# Distinguishes EntryColumns instances, e.g. after a category is replaced
+_serials = count()
+
+
+def timestamp_to_epoch(timestamp):
+    """Convert a 'YYYY-MM-DD HH:MM:SS' timestamp to naive epoch seconds"""
+    return int((datetime.fromisoformat(timestamp) - _EPOCH).total_seconds())
+
+
+def epoch_to_timestamp(seconds):
+    """Convert naive epoch seconds back to the 'YYYY-MM-DD HH:MM:SS' form"""
+    return (_EPOCH + timedelta(seconds=seconds)).isoformat(sep=' ')
+
+
+def day_to_date(ordinal):
+    """Convert a stored day ordinal back to a date"""
+    return date.fromordinal(ordinal)
+
+
+class StringInterner:
+    """Maps exercise names to small integer ids and back"""
+
+    def __init__(self):
+        self.names = []
+        self._ids = {}
+
+    def intern(self, name):
+        """Return the id for a name, assigning a new one if needed"""
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self._ids[name] = name_id
+            self.names.append(name)
+        return name_id
+
+    def lookup(self, name):
+        """Return the id for a known name, or None"""
+        return self._ids.get(name)
+
+    def __len__(self):
+        return len(self.names)
+
+
+class EntryView(Mapping):
+    """Lightweight read-only view of one row in an EntryColumns
+
+    Behaves like the entry dict it replaces (``entry['duration']``,
+    ``entry.get('calories', 0)``, ``dict(entry)``) and also exposes the
+    fields as attributes for templates.
+    """
+
+    __slots__ = ('_columns', '_index')
+
+    def __init__(self, columns, index):
+        self._columns = columns
+        self._index = index
+
+    @property
+    def exercise(self):
+        return self._columns.interner.names[self._columns.exercise_ids[self._index]]
+
+    @property
+    def duration(self):
+        return self._columns.durations[self._index]
+
+    @property
+    def calories(self):
+        return self._columns.calorie_tenths[self._index] / 10
+
+    @property
+    def timestamp(self):
+        return epoch_to_timestamp(self._columns.timestamps[self._index])
+
+    @property
+    def day(self):
+        """ISO date of the daily bucket the entry was logged in"""
+        return day_to_date(self._columns.days[self._index]).isoformat()
+
+    def __getitem__(self, key):
+        if key not in ENTRY_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(ENTRY_FIELDS)
+
+    def __len__(self):
+        return len(ENTRY_FIELDS)
+
+    def to_dict(self):
+        """Return the entry in the JSON shape used by the API"""
+        return {
+            'exercise': self.exercise,
+            'duration': self.duration,
+            'calories': self.calories,
+            'timestamp': self.timestamp
+        }
+
+    def __repr__(self):
+        return f"EntryView({self.to_dict()!r})"
+
+
+class EntryColumns:
+    """Append-only list of entries for one category, stored column by column"""
+
+    def __init__(self, interner=None, entries=()):
+        self.interner = interner if interner is not None else StringInterner()
+        self.serial = next(_serials)
+        self.durations = array('I')
+        # Integer tenths: exact for any value logged with one decimal
+        self.calorie_tenths = array('i')
+        self.timestamps = array('q')
+        self.exercise_ids = array('I')
+        self.days = array('I')
+        for entry in entries:
+            self.append(entry)
+
+    def append(self, entry, day_iso=None):
+        """Append an entry dict (or view); returns its row index"""
+        timestamp = entry['timestamp']
+        seconds = timestamp_to_epoch(timestamp)
+        day = date.fromisoformat(day_iso or timestamp[:10]).toordinal()
+        self.durations.append(entry['duration'])
+        self.calorie_tenths.append(to_tenths(entry.get('calories', 0)))
+        self.timestamps.append(seconds)
+        self.exercise_ids.append(self.interner.intern(entry['exercise']))
+        self.days.append(day)
+        return len(self.durations) - 1
+
+    def __len__(self):
+        return len(self.durations)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [EntryView(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("entry index out of range")
+        return EntryView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield EntryView(self, index)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __eq__(self, other):
+        if isinstance(other, (EntryColumns, list)):
+            return self.to_dicts() == [dict(entry) for entry in other]
+        return NotImplemented
+
+    def total_duration(self):
+        """Sum of all durations (single pass over a typed array)"""
+        return sum(self.durations)
+
+    def total_calories(self):
+        """Sum of all calories rounded to the logged precision"""
+        return sum(self.calorie_tenths) / 10
+
+    def to_dicts(self):
+        """Return all entries in the JSON shape used by the API"""
+        return [EntryView(self, i).to_dict() for i in range(len(self))]
+
+    def nbytes(self):
+        """Bytes used by the column buffers"""
+        return sum(column.itemsize * len(column) for column in
+                   (self.durations, self.calorie_tenths, self.timestamps, self.exercise_ids, self.days))
+
+
+class ColumnarWorkouts(MutableMapping):
+    """Category -> EntryColumns mapping sharing one exercise-name interner
+
+    Assigning an iterable of entries (e.g. ``workouts['Workout'] = []``)
+    replaces that category's entries.
+    """
+
+    def __init__(self, categories):
+        self.interner = StringInterner()
+        self._categories = {category: EntryColumns(self.interner) for category in categories}
+
+    def __getitem__(self, category):
+        return self._categories[category]
+
+    def __setitem__(self, category, entries):
+        self._categories[category] = EntryColumns(self.interner, entries)
+
+    def __delitem__(self, category):
+        del self._categories[category]
+
+    def __iter__(self):
+        return iter(self._categories)
+
+    def __len__(self):
+        return len(self._categories)
+
+    def to_dicts(self):
+        """Return the whole mapping in the JSON shape used by the API"""
+        return {category: columns.to_dicts() for category, columns in self._categories.items()}
+
+    def nbytes(self):
+        """Bytes used by all column buffers"""
+        return sum(columns.nbytes() for columns in self._categories.values())
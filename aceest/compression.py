@@ -0,0 +1,269 @@
+"""
+Response compression middleware for the ACEest Flask apps
+Gzips eligible responses, including streamed ones, and counts the savings
+"""
+import os
+import threading
+import time
+import zlib
+
+DEFAULT_MIMETYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/xml',
+    'application/json', 'application/javascript', 'application/x-ndjson',
+    'application/xml', 'image/svg+xml'
+)
+DEFAULT_MINIMUM_SIZE = 500
+DEFAULT_LEVEL = 6
+ETAG_SUFFIX = '-gzip'
+
+
+def accepts_gzip(header):
+    """Check whether an Accept-Encoding header allows gzip"""
+    star = False
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding == 'gzip':
+            return quality > 0
+        if coding == '*':
+            star = quality > 0
+    return star
+
+
+def _split_etags(header):
+    return [tag.strip() for tag in header.split(',') if tag.strip()]
+
+
+class CompressionStats:
+    """Thread-safe counters describing what the middleware did"""
+
+    FIELDS = ('compressed', 'skipped', 'bytes_in', 'bytes_out', 'cpu_seconds')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    def record(self, bytes_in, bytes_out, cpu_seconds):
+        with self._lock:
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.cpu_seconds += cpu_seconds
+
+    def count(self, compressed):
+        with self._lock:
+            if compressed:
+                self.compressed += 1
+            else:
+                self.skipped += 1
+
+    @property
+    def bytes_saved(self):
+        return self.bytes_in - self.bytes_out
+
+    def snapshot(self):
+        """Return the counters as a dict"""
+        with self._lock:
+            values = {field: getattr(self, field) for field in self.FIELDS}
+        values['bytes_saved'] = values['bytes_in'] - values['bytes_out']
+        return values
+
+
+class GzipMiddleware:
+    """WSGI middleware applying gzip to eligible responses
+
+    A response is compressed when the client accepts gzip, the status is a
+    full 2xx, the content type is in the allowlist, it has no
+    Content-Encoding yet (pre-compressed bodies pass through untouched),
+    Cache-Control does not forbid transforms, and a declared Content-Length
+    is at least ``minimum_size``. Responses without a Content-Length are
+    streamed: each chunk is compressed and flushed as it arrives.
+
+    Compressed responses get ``-gzip`` appended to a strong ETag, and the
+    same suffix is stripped from If-None-Match on the way in, so the app's
+    conditional GETs keep producing 304s.
+    """
+
+    def __init__(self, app, minimum_size=DEFAULT_MINIMUM_SIZE, level=DEFAULT_LEVEL,
+                 mimetypes=DEFAULT_MIMETYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.mimetypes = frozenset(mimetypes)
+        self.stats = CompressionStats()
+
+    @classmethod
+    def from_env(cls, app):
+        """Configure from COMPRESS_MIN_SIZE, COMPRESS_LEVEL and COMPRESS_MIMETYPES"""
+        mimetypes = os.environ.get('COMPRESS_MIMETYPES')
+        return cls(app,
+                   minimum_size=int(os.environ.get('COMPRESS_MIN_SIZE', DEFAULT_MINIMUM_SIZE)),
+                   level=int(os.environ.get('COMPRESS_LEVEL', DEFAULT_LEVEL)),
+                   mimetypes=[m.strip() for m in mimetypes.split(',')] if mimetypes else DEFAULT_MIMETYPES)
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') == 'HEAD' or not accepts_gzip(environ.get('HTTP_ACCEPT_ENCODING', '')):
+            return self.app(environ, start_response)
+
+        client_etags = _split_etags(environ.get('HTTP_IF_NONE_MATCH', ''))
+        if any(tag.endswith(ETAG_SUFFIX + '"') for tag in client_etags):
+            # Offer the app the uncompressed form of our ETags as well
+            stripped = [tag[:-len(ETAG_SUFFIX) - 1] + '"' for tag in client_etags
+                        if tag.endswith(ETAG_SUFFIX + '"')]
+            environ['HTTP_IF_NONE_MATCH'] = ', '.join(client_etags + stripped)
+
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return self._write_unsupported
+
+        body = self.app(environ, capture)
+        iterator = iter(body)
+        # Apps may call start_response lazily from inside their iterable
+        first = []
+        if not captured:
+            for chunk in iterator:
+                first.append(chunk)
+                if captured:
+                    break
+        status, headers, exc_info = captured
+        headers = list(headers)
+
+        if not self._should_compress(status, headers):
+            self.stats.count(False)
+            if status.startswith('304'):
+                headers = self._restore_etag(headers, client_etags)
+            start_response(status, headers, exc_info)
+            return self._chain(first, iterator, body)
+
+        if self._header(headers, 'content-length') is not None:
+            # Known size: compress in one go and keep a Content-Length
+            try:
+                data = b''.join(first) + b''.join(iterator)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+            compressed = self._compress_all(data)
+            if len(compressed) >= len(data):
+                self.stats.count(False)
+                start_response(status, headers, exc_info)
+                return [data]
+            self.stats.count(True)
+            headers = self._mark_compressed(headers)
+            headers.append(('Content-Length', str(len(compressed))))
+            start_response(status, headers, exc_info)
+            return [compressed]
+        self.stats.count(True)
+        start_response(status, self._mark_compressed(headers), exc_info)
+        return self._compress_stream(self._chain(first, iterator, body))
+
+    def wrap(self, app):
+        """Apply this middleware's settings and counters to another WSGI app"""
+        middleware = GzipMiddleware(app, self.minimum_size, self.level, self.mimetypes)
+        middleware.stats = self.stats
+        return middleware
+
+    @staticmethod
+    def _write_unsupported(data):
+        raise RuntimeError('GzipMiddleware does not support the WSGI write() callable')
+
+    @staticmethod
+    def _header(headers, name):
+        for key, value in headers:
+            if key.lower() == name:
+                return value
+        return None
+
+    def _should_compress(self, status, headers):
+        code = int(status.split(' ', 1)[0])
+        if not 200 <= code < 300 or code in (204, 206):
+            return False
+        if self._header(headers, 'content-encoding'):
+            return False
+        if 'no-transform' in (self._header(headers, 'cache-control') or ''):
+            return False
+        mimetype = (self._header(headers, 'content-type') or '').split(';', 1)[0].strip().lower()
+        if mimetype not in self.mimetypes:
+            return False
+        length = self._header(headers, 'content-length')
+        return length is None or int(length) >= self.minimum_size
+
+    @staticmethod
+    def _mark_compressed(headers):
+        """Headers for the gzipped form of a response"""
+        result = []
+        vary = None
+        for name, value in headers:
+            lower = name.lower()
+            if lower == 'content-length':
+                continue
+            if lower == 'etag' and not value.startswith('W/') and value.endswith('"'):
+                value = value[:-1] + ETAG_SUFFIX + '"'
+            elif lower == 'vary':
+                vary = value
+                continue
+            result.append((name, value))
+        result.append(('Content-Encoding', 'gzip'))
+        if vary and 'accept-encoding' not in vary.lower():
+            result.append(('Vary', vary + ', Accept-Encoding'))
+        else:
+            result.append(('Vary', vary or 'Accept-Encoding'))
+        return result
+
+    @staticmethod
+    def _restore_etag(headers, client_etags):
+        """On a 304, give back the ETag form the client sent"""
+        result = []
+        for name, value in headers:
+            if name.lower() == 'etag' and value not in client_etags and value.endswith('"'):
+                suffixed = value[:-1] + ETAG_SUFFIX + '"'
+                if suffixed in client_etags:
+                    value = suffixed
+            result.append((name, value))
+        return result
+
+    @staticmethod
+    def _chain(first, iterator, body):
+        try:
+            yield from first
+            yield from iterator
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+    def _compressor(self):
+        # wbits 31: zlib's deflate with a gzip header and trailer
+        return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+    def _compress_all(self, data):
+        started = time.thread_time()
+        compressor = self._compressor()
+        compressed = compressor.compress(data) + compressor.flush()
+        self.stats.record(len(data), len(compressed), time.thread_time() - started)
+        return compressed
+
+    def _compress_stream(self, chunks):
+        compressor = self._compressor()
+        for chunk in chunks:
+            if not chunk:
+                continue
+            started = time.thread_time()
+            # A sync flush per chunk keeps streamed output timely for the client
+            compressed = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.stats.record(len(chunk), len(compressed), time.thread_time() - started)
+            yield compressed
+        started = time.thread_time()
+        tail = compressor.flush()
+        self.stats.record(0, len(tail), time.thread_time() - started)
+        yield tail
@@ -0,0 +1,76 @@
+"""
+Downsampling of chart series
+Largest-Triangle-Three-Buckets and min/max bucketing; both keep original points
+"""
+
+METHODS = ('lttb', 'minmax')
+
+
+def lttb(xs, ys, threshold):
+    """Indices of ``threshold`` points chosen by Largest-Triangle-Three-Buckets
+
+    The first and last points are always kept. In between, the series is
+    split into ``threshold - 2`` buckets and each contributes the point
+    forming the largest triangle with the previously kept point and the
+    average of the next bucket, which preserves the visual shape (peaks
+    and troughs) far better than striding.
+    """
+    length = len(xs)
+    if threshold >= length:
+        return list(range(length))
+    if threshold < 3:
+        raise ValueError('lttb needs at least 3 points')
+    every = (length - 2) / (threshold - 2)
+    selected = [0]
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_start = end
+        next_end = min(int((bucket + 2) * every) + 1, length)
+        span = next_end - next_start
+        average_x = sum(xs[next_start:next_end]) / span
+        average_y = sum(ys[next_start:next_end]) / span
+        previous_x, previous_y = xs[previous], ys[previous]
+        best, best_area = start, -1.0
+        for index in range(start, end):
+            # Twice the triangle's area; the factor does not change the choice
+            area = abs((previous_x - average_x) * (ys[index] - previous_y)
+                       - (previous_x - xs[index]) * (average_y - previous_y))
+            if area > best_area:
+                best, best_area = index, area
+        selected.append(best)
+        previous = best
+    selected.append(length - 1)
+    return selected
+
+
+def minmax(xs, ys, threshold):
+    """Indices of the lowest and highest point of each of ``threshold // 2`` buckets
+
+    Keeps every extreme of the series, e.g. for spotting outlier days.
+    """
+    length = len(xs)
+    if threshold >= length:
+        return list(range(length))
+    if threshold < 2:
+        raise ValueError('minmax needs at least 2 points')
+    buckets = threshold // 2
+    every = length / buckets
+    selected = []
+    for bucket in range(buckets):
+        start = int(bucket * every)
+        end = int((bucket + 1) * every) if bucket < buckets - 1 else length
+        low = min(range(start, end), key=ys.__getitem__)
+        high = max(range(start, end), key=ys.__getitem__)
+        selected.extend(sorted({low, high}))
+    return selected
+
+
+def downsample(xs, ys, threshold, method='lttb'):
+    """Indices of the points to keep, in order, using one of METHODS"""
+    if method == 'lttb':
+        return lttb(xs, ys, threshold)
+    if method == 'minmax':
+        return minmax(xs, ys, threshold)
+    raise ValueError(f"method must be one of {', '.join(METHODS)}")
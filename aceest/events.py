@@ -0,0 +1,157 @@
+"""
+In-process fan-out of live update events
+Server-Sent Events formatting and a broker with bounded per-subscriber queues
+"""
+import itertools
+import json
+import threading
+from collections import deque
+
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_MAX_SUBSCRIBERS = 1000
+# Sent in place of a subscriber's backlog when it falls too far behind
+RESYNC_EVENT = 'resync'
+
+
+class BrokerFull(RuntimeError):
+    """Raised when the broker already has its maximum number of subscribers"""
+
+
+def format_event(event, data, event_id=None):
+    """Encode one Server-Sent Events message with a JSON data line"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, separators=(',', ':'), sort_keys=True))
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """One subscriber's bounded queue of encoded messages
+
+    Publishers never block on a subscriber. When a subscriber lets its
+    queue fill up, the backlog is dropped and replaced by a single
+    ``resync`` event telling the client to refetch its state, so memory
+    per connection stays bounded however slow the client is.
+
+    Blocking readers use ``get``; asynchronous readers set ``on_push`` to
+    a callable that is invoked (from the publishing thread) after every
+    push and on close, and then drain with ``get(0)``.
+    """
+
+    def __init__(self, topic, maxsize):
+        self.topic = topic
+        self.maxsize = maxsize
+        self.overflows = 0
+        self.closed = False
+        self.on_push = None
+        self._messages = deque()
+        self._ready = threading.Condition()
+
+    def push(self, message, event_id):
+        """Queue a message; returns False if the backlog had to be dropped"""
+        with self._ready:
+            delivered = len(self._messages) < self.maxsize
+            if not delivered:
+                self._messages.clear()
+                self._messages.append(format_event(RESYNC_EVENT, {'reason': 'overflow'}, event_id))
+                self.overflows += 1
+            else:
+                self._messages.append(message)
+            self._ready.notify()
+        if self.on_push is not None:
+            self.on_push()
+        return delivered
+
+    def get(self, timeout=None):
+        """Return the next message, or None after timeout or once closed"""
+        with self._ready:
+            if not self._messages and not self.closed:
+                self._ready.wait(timeout)
+            return self._messages.popleft() if self._messages else None
+
+    def close(self):
+        """Wake any waiting reader; later gets return what is left, then None"""
+        with self._ready:
+            self.closed = True
+            self._ready.notify_all()
+        if self.on_push is not None:
+            self.on_push()
+
+    def __len__(self):
+        return len(self._messages)
+
+
+class EventBroker:
+    """Fans events out to the subscribers of a topic
+
+    Each message is encoded once and shared by every subscriber's queue.
+    Topics are arbitrary hashable values (e.g. a member's dataset).
+    """
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, max_subscribers=DEFAULT_MAX_SUBSCRIBERS):
+        if queue_size <= 0 or max_subscribers <= 0:
+            raise ValueError('queue_size and max_subscribers must be positive')
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._topics = {}
+        self._count = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+
+    def subscribe(self, topic):
+        """Register a new subscriber to a topic"""
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise BrokerFull(f'at most {self.max_subscribers} subscribers are allowed')
+            subscription = Subscription(topic, self.queue_size)
+            # Copy on write, so publishers can iterate without the lock
+            self._topics[topic] = self._topics.get(topic, ()) + (subscription,)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscriber and wake it up"""
+        with self._lock:
+            current = self._topics.get(subscription.topic, ())
+            remaining = tuple(s for s in current if s is not subscription)
+            if len(remaining) != len(current):
+                self._count -= 1
+                if remaining:
+                    self._topics[subscription.topic] = remaining
+                else:
+                    del self._topics[subscription.topic]
+        subscription.close()
+
+    def has_subscribers(self, topic):
+        """Check whether publishing to a topic would reach anyone"""
+        return topic in self._topics
+
+    def publish(self, topic, event, data):
+        """Send an event to every subscriber of a topic; returns how many got it"""
+        subscribers = self._topics.get(topic, ())
+        if not subscribers:
+            return 0
+        event_id = next(self._ids)
+        message = format_event(event, data, event_id)
+        delivered = sum(1 for subscription in subscribers if subscription.push(message, event_id))
+        with self._lock:
+            self.published += 1
+            self.delivered += delivered
+            self.overflows += len(subscribers) - delivered
+        return delivered
+
+    def stats(self):
+        """Return subscriber and delivery counters as a dict"""
+        with self._lock:
+            return {
+                'subscribers': self._count,
+                'topics': len(self._topics),
+                'published': self.published,
+                'delivered': self.delivered,
+                'overflows': self.overflows
+            }
@@ -0,0 +1,65 @@
+"""
+Streaming export of workout history
+NDJSON and CSV encoders that yield chunks, so exports run in constant memory
+"""
+import csv
+import io
+import json
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+CSV_COLUMNS = ('category', 'day', 'exercise', 'duration', 'calories', 'timestamp')
+# Records per yielded chunk: large enough to keep per-chunk overhead low,
+# small enough that a chunk stays in the tens of kilobytes
+CHUNK_RECORDS = 256
+
+
+def _chunks(lines):
+    """Join encoded lines into chunks of CHUNK_RECORDS"""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= CHUNK_RECORDS:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def export_ndjson(records):
+    """Yield NDJSON chunks, one object per (category, day_iso, entry) record"""
+    def lines():
+        for category, day_iso, entry in records:
+            yield json.dumps({'category': category, 'day': day_iso, **entry}) + '\n'
+    return _chunks(lines())
+
+
+def export_csv(records):
+    """Yield CSV chunks with a header row, one row per record"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    def encode(row):
+        writer.writerow(row)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    def lines():
+        yield encode(CSV_COLUMNS)
+        for category, day_iso, entry in records:
+            yield encode((category, day_iso, entry['exercise'], entry['duration'],
+                          entry['calories'], entry['timestamp']))
+    return _chunks(lines())
+
+
+def export_records(records, export_format):
+    """Return the chunk generator for a format in EXPORT_FORMATS"""
+    if export_format == 'ndjson':
+        return export_ndjson(records)
+    if export_format == 'csv':
+        return export_csv(records)
+    raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
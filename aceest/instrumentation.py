@@ -0,0 +1,30 @@
+"""
+Serving setup shared by the Flask applications
+Response compression, on-demand profiling and Prometheus metrics in one call
+"""
+import os
+
+from aceest.compression import GzipMiddleware
+from aceest.metrics import Metrics, instrument
+from aceest.profiling import enable_profiling
+
+GZIP_COUNTERS = ('compressed', 'skipped', 'bytes_in', 'bytes_out', 'cpu_seconds')
+
+
+def instrument_app(app):
+    """Add the shared middleware to a Flask app and return its Metrics
+
+    - Eligible responses are gzipped (COMPRESS_MIN_SIZE, COMPRESS_LEVEL,
+      COMPRESS_MIMETYPES); counters are kept on app.wsgi_app.stats.
+    - /debug/profile and ?profile=1 answer requests bearing ADMIN_TOKEN
+      (disabled when unset).
+    - /metrics serves request counts and latency histograms per endpoint
+      and the gzip counters; METRICS_DIR sums them across workers.
+
+    Apps add their own series to the returned Metrics.
+    """
+    app.wsgi_app = GzipMiddleware.from_env(app.wsgi_app)
+    enable_profiling(app, os.environ.get('ADMIN_TOKEN'))
+    metrics = instrument(app, Metrics.from_env())
+    metrics.export_stats('gzip', app.wsgi_app.stats.snapshot, counters=GZIP_COUNTERS)
+    return metrics
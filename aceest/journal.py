@@ -0,0 +1,421 @@
+"""
+Append-only workout journal with compacted snapshots
+Gives the in-memory storage engine durability and fast warm restarts
+"""
+import fcntl
+import glob
+import json
+import os
+import threading
+
+from aceest.storage import WorkoutStore
+
+_JOURNAL_PATTERN = 'journal-*.ndjson'
+_SNAPSHOT_PATTERN = 'snapshot-*.json'
+
+
+def _seq_from_name(path):
+    """Extract the sequence number encoded in a journal or snapshot name"""
+    name = os.path.basename(path)
+    return int(name.split('-', 1)[1].split('.', 1)[0])
+
+
+def _fsync_directory(directory):
+    """Make renames and new files in a directory durable"""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WorkoutJournal:
+    """NDJSON write-ahead journal with group-commit fsync batching
+
+    Writers append records under a short lock and, in durable mode, wait for
+    a background flusher that fsyncs everything written so far in one call.
+    Concurrent writers therefore share a single fsync. Each record carries a
+    monotonically increasing ``seq``; snapshots record the last ``seq`` they
+    contain so recovery only replays the journal tail.
+    """
+
+    def __init__(self, directory, durable=True, commit_interval=0.0):
+        self.directory = directory
+        self.durable = durable
+        self.commit_interval = commit_interval
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(os.path.join(directory, 'LOCK'), 'a')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(f"Journal directory {directory} is in use by another process")
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._seq = 0
+        self._written_seq = 0
+        self._durable_seq = 0
+        self._file = None
+        self._closed = False
+        self._flusher = None
+
+    @property
+    def seq(self):
+        """Sequence number of the last appended record"""
+        return self._seq
+
+    def recover(self, apply):
+        """Replay the newest snapshot and the journal tail through ``apply``
+
+        ``apply`` is called with each record dict in order; records carry the
+        ``member`` they belong to and the ``seq`` they were written with.
+        Returns the number of journal records replayed after the snapshot.
+        """
+        base_seq = 0
+        member_seqs = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, _SNAPSHOT_PATTERN)),
+                           key=_seq_from_name, reverse=True):
+            try:
+                with open(path, encoding='utf-8') as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError):
+                continue  # Fall back to the previous snapshot
+            base_seq = snapshot['seq']
+            members = snapshot.get('members')
+            if members is None:
+                # Snapshots written before member scoping hold one profile
+                members = {'': {'seq': base_seq, 'user_info': snapshot.get('user_info'),
+                                'entries': snapshot.get('entries', [])}}
+            for member, state in members.items():
+                member_seqs[member] = state['seq']
+                if state.get('user_info'):
+                    apply({'type': 'user', 'member': member, 'seq': state['seq'],
+                           'data': state['user_info']})
+                for category, day, entry in state.get('entries', []):
+                    apply({'type': 'workout', 'member': member, 'seq': state['seq'],
+                           'category': category, 'day': day, 'entry': entry})
+            break
+
+        replayed = 0
+        last_seq = base_seq
+        for path in sorted(glob.glob(os.path.join(self.directory, _JOURNAL_PATTERN)),
+                           key=_seq_from_name):
+            with open(path, encoding='utf-8') as handle:
+                for line in handle:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # Torn write at the tail of a crashed journal
+                    record.setdefault('member', '')
+                    # A member's snapshot may already include writes made
+                    # after the rotation that started the snapshot
+                    if record['seq'] <= member_seqs.get(record['member'], base_seq):
+                        continue
+                    apply(record)
+                    last_seq = max(last_seq, record['seq'])
+                    replayed += 1
+
+        self._seq = self._written_seq = self._durable_seq = last_seq
+        self._open_segment()
+        return replayed
+
+    def _open_segment(self):
+        # A new segment is started on every open so a torn tail is never appended
+        # to; a leftover file with this name cannot hold a valid record past seq
+        path = os.path.join(self.directory, 'journal-%020d.ndjson' % (self._seq + 1))
+        self._file = open(path, 'w', encoding='utf-8')
+        _fsync_directory(self.directory)
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='journal-flusher', daemon=True)
+            self._flusher.start()
+
+    def write(self, record):
+        """Append a record without waiting for it to be durable; returns its seq"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Journal is closed")
+            self._seq += 1
+            record['seq'] = self._seq
+            self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self._written_seq = self._seq
+            self._cond.notify_all()
+            return self._seq
+
+    def wait_durable(self, seq):
+        """Block until the record with ``seq`` has been fsynced (durable mode only)"""
+        if not self.durable:
+            return
+        with self._cond:
+            while self._durable_seq < seq and not self._closed:
+                self._cond.wait()
+
+    def append(self, record):
+        """Append a record and, in durable mode, wait for its group commit"""
+        seq = self.write(record)
+        self.wait_durable(seq)
+        return seq
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and self._written_seq == self._durable_seq:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                target = self._written_seq
+            # fsync outside the writer lock so appends keep flowing into the next batch
+            with self._io_lock:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            with self._cond:
+                self._durable_seq = max(self._durable_seq, target)
+                self._cond.notify_all()
+            if self.commit_interval:
+                # Optional window to gather a larger batch under heavy load
+                threading.Event().wait(self.commit_interval)
+
+    def rotate(self):
+        """Start a new journal segment; returns the last seq of the old one
+
+        Must be called while the caller prevents concurrent writes so that the
+        returned seq matches the state captured for a snapshot.
+        """
+        with self._cond, self._io_lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._durable_seq = self._written_seq
+            self._open_segment()
+            self._cond.notify_all()
+            return self._seq
+
+    def write_snapshot(self, seq, members):
+        """Atomically write a compacted snapshot and drop what it supersedes
+
+        ``seq`` is the last record of the rotated-out segments; ``members``
+        maps each member to its ``seq``, ``user_info`` and ``entries``.
+        """
+        final_path = os.path.join(self.directory, 'snapshot-%020d.json' % seq)
+        tmp_path = final_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump({'seq': seq, 'members': members}, handle, separators=(',', ':'))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, final_path)
+        _fsync_directory(self.directory)
+
+        for path in glob.glob(os.path.join(self.directory, _SNAPSHOT_PATTERN)):
+            if _seq_from_name(path) < seq:
+                os.remove(path)
+        for path in glob.glob(os.path.join(self.directory, _JOURNAL_PATTERN)):
+            if _seq_from_name(path) <= seq:
+                os.remove(path)
+
+    def close(self):
+        """Flush outstanding records and release the directory lock"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._lock_file.close()
+
+
+class _JournalState:
+    """Journal, member stores and snapshot bookkeeping shared by JournaledStores"""
+
+    def __init__(self, journal, snapshot_every):
+        self.journal = journal
+        self.snapshot_every = snapshot_every
+        self.stores = {}
+        self.lock = threading.Lock()
+        self.since_snapshot = 0
+        self.snapshot_thread = None
+
+
+class JournaledStore(WorkoutStore):
+    """Store wrapper that journals every write and snapshots periodically
+
+    On construction the wrapped store is rebuilt from the newest snapshot and
+    the journal tail. Stores for other members come from for_member() and
+    share the journal; every ``snapshot_every`` writes the state of all
+    members is captured and written as a new snapshot from a background
+    thread.
+    """
+
+    def __init__(self, inner, journal, snapshot_every=10000, member='', state=None):
+        self.inner = inner
+        self.journal = journal
+        self.member = member
+        self.last_seq = 0
+        self._lock = threading.Lock()
+        self.replayed = 0
+        self._owns_state = state is None
+        if state is None:
+            state = _JournalState(journal, snapshot_every)
+            state.stores[member] = self
+            self._state = state
+            self.replayed = journal.recover(self._apply)
+        else:
+            self._state = state
+
+    @property
+    def snapshot_every(self):
+        return self._state.snapshot_every
+
+    def for_member(self, member):
+        """Return the journaled store of another member, creating it if needed"""
+        with self._state.lock:
+            store = self._state.stores.get(member)
+            if store is None:
+                store = JournaledStore(self.inner.for_member(member), self.journal,
+                                       member=member, state=self._state)
+                self._state.stores[member] = store
+        return store
+
+    # Member stores stay in the shared state once created
+    durable = True
+
+    def has_member(self, member):
+        return member in self._state.stores or self.inner.has_member(member)
+
+    def settings_path(self, name):
+        return os.path.join(self.journal.directory, name)
+
+    def _apply(self, record):
+        store = self if record['member'] == self.member else self.for_member(record['member'])
+        if record['type'] == 'workout':
+            store.inner.add_workout(record['category'], record['entry'], record['day'])
+        elif record['type'] == 'batch':
+            store.inner.add_workouts((category, entry, day) for category, day, entry in record['items'])
+        elif record['type'] == 'user':
+            store.inner.save_user_info(record['data'])
+        store.last_seq = max(store.last_seq, record['seq'])
+
+    def _write(self, record, apply):
+        record['member'] = self.member
+        with self._lock:
+            seq = self.journal.write(record)
+            result = apply()
+            self.last_seq = seq
+        state = self._state
+        with state.lock:
+            state.since_snapshot += 1
+            take_snapshot = state.snapshot_every and state.since_snapshot >= state.snapshot_every
+        self.journal.wait_durable(seq)
+        if take_snapshot:
+            self.snapshot(background=True)
+        return result
+
+    def add_workout(self, category, entry, day_iso):
+        record = {'type': 'workout', 'category': category, 'day': day_iso, 'entry': entry}
+        return self._write(record, lambda: self.inner.add_workout(category, entry, day_iso))
+
+    def add_workouts(self, items):
+        items = list(items)
+        # One journal line per batch, so a torn tail drops the batch as a whole
+        record = {'type': 'batch', 'items': [[category, day_iso, entry] for category, entry, day_iso in items]}
+        return self._write(record, lambda: self.inner.add_workouts(items))
+
+    def save_user_info(self, info):
+        return self._write({'type': 'user', 'data': info}, lambda: self.inner.save_user_info(info))
+
+    def snapshot(self, background=False):
+        """Capture every member's state and write it as a compacted snapshot"""
+        state = self._state
+        with state.lock:
+            running = state.snapshot_thread is not None and state.snapshot_thread.is_alive()
+            if running and background:
+                return None  # One snapshot at a time; the next trigger will catch up
+        if running:
+            state.snapshot_thread.join()
+        with state.lock:
+            seq = self.journal.rotate()
+            stores = list(state.stores.items())
+            state.since_snapshot = 0
+        members = {}
+        for member, store in stores:
+            # Each member is captured under its own lock; writes it made after
+            # the rotation are covered by recording its last applied seq
+            with store._lock:
+                members[member] = {
+                    'seq': store.last_seq,
+                    'user_info': dict(store.inner.get_user_info()),
+                    'entries': list(store.inner.iter_records())
+                }
+        # Entries are never mutated after being stored, so serialization can
+        # run outside the locks while new writes go to the fresh segment
+        if background:
+            state.snapshot_thread = threading.Thread(
+                target=self.journal.write_snapshot, args=(seq, members),
+                name='journal-snapshot', daemon=True)
+            state.snapshot_thread.start()
+        else:
+            self.journal.write_snapshot(seq, members)
+        return seq
+
+    def get_workouts(self):
+        return self.inner.get_workouts()
+
+    def get_daily_workouts(self):
+        return self.inner.get_daily_workouts()
+
+    def get_user_info(self):
+        return self.inner.get_user_info()
+
+    def data_version(self):
+        return self.inner.data_version()
+
+    def category_versions(self):
+        return self.inner.category_versions()
+
+    def category_counts(self):
+        return self.inner.category_counts()
+
+    @property
+    def store_id(self):
+        return self.inner.store_id
+
+    def page_workouts(self, category, limit, before=None):
+        return self.inner.page_workouts(category, limit, before)
+
+    def get_category_totals(self):
+        return self.inner.get_category_totals()
+
+    def get_range_totals(self, start, end):
+        return self.inner.get_range_totals(start, end)
+
+    def get_daily_totals(self, start=None, end=None, categories=None):
+        return self.inner.get_daily_totals(start, end, categories)
+
+    def exercise_counts(self):
+        return self.inner.exercise_counts()
+
+    def rebuild_totals(self):
+        return self.inner.rebuild_totals()
+
+    def verify_totals(self):
+        return self.inner.verify_totals()
+
+    def iter_records(self, start=None, end=None, categories=None):
+        return self.inner.iter_records(start, end, categories)
+
+    def has_category(self, category):
+        return self.inner.has_category(category)
+
+    def close(self):
+        if not self._owns_state:
+            return  # Member stores share the journal owned by the root store
+        state = self._state
+        if state.snapshot_thread is not None:
+            state.snapshot_thread.join()
+        self.journal.close()
+        for store in state.stores.values():
+            store.inner.close()
@@ -0,0 +1,62 @@
+"""
+Fast JSON provider for the ACEest Flask apps
+Encodes responses with orjson when it is installed, otherwise with the stdlib
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised where orjson is absent
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider that encodes with orjson when available
+
+    Output matches the default provider: keys are sorted, dates use the
+    HTTP date format, floats print in their shortest round-trip form (so
+    ``round(x, 1)`` values are unchanged), and compact output has no
+    spaces. Non-ASCII text is emitted as UTF-8 rather than ``\\u`` escapes,
+    on both paths. Pretty-printed output, custom encoder arguments and
+    anything orjson rejects (e.g. integers beyond 64 bits) go through the
+    stdlib encoder.
+    """
+
+    ensure_ascii = False
+
+    @property
+    def available(self):
+        """Whether the fast encoder is in use"""
+        return orjson is not None
+
+    def dumps_bytes(self, obj):
+        """Serialize to compact UTF-8 JSON bytes, using orjson when possible"""
+        if orjson is not None:
+            # Dates are left to the default hook so they keep the HTTP date format
+            option = orjson.OPT_PASSTHROUGH_DATETIME
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            try:
+                return orjson.dumps(obj, default=self.default, option=option)
+            except TypeError:
+                pass  # orjson.JSONEncodeError; the stdlib encoder decides
+        return super().dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs == {'separators': (',', ':')}:
+            return self.dumps_bytes(obj).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.loads(s)
+            except ValueError:
+                pass  # e.g. NaN literals or huge integers, which the stdlib accepts
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(obj)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
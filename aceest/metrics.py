@@ -0,0 +1,405 @@
+"""
+Request and cache metrics for ACEest Fitness
+Prometheus text exposition, aggregated across worker processes via mmap files
+"""
+import fcntl
+import glob
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+from contextlib import contextmanager
+
+from flask import g, request
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Latency buckets (seconds) of the request duration histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds between two publications of a worker's collected values
+PUBLISH_INTERVAL = 5.0
+# Distinct from the shm store's and rate limiter's magics
+MAGIC = b'ACEESTP1'
+# Samples of exited processes, folded together by merge_exited()
+EXITED_FILE = 'metrics_exited.db'
+# magic, bytes used (header included)
+_HEADER = struct.Struct('<8sQ')
+_KEY_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+INITIAL_FILE_SIZE = 64 * 1024
+KINDS = ('counter', 'gauge', 'histogram')
+
+
+def format_labels(labels):
+    """Prometheus label set text, e.g. '{endpoint="health",method="GET"}'"""
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def format_value(value):
+    """Sample value text: integers without a fraction, infinities as +Inf/-Inf"""
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _series(name, labels, suffix=''):
+    # Keys are "family series": the family groups the lines of one metric
+    return f'{name} {name}{suffix}{format_labels(labels)}'
+
+
+class LocalValues:
+    """Sample values of this process only"""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = float(value)
+
+    def collect(self):
+        """[(process alive, {key: value})] for every process sharing the values"""
+        with self._lock:
+            return [(True, dict(self._values))]
+
+
+class SharedValues:
+    """Sample values in one mmap file per process, summed over all files
+
+    Each process appends its samples (key, then an 8-byte value updated in
+    place) to ``metrics_<pid>.db`` in ``directory`` and is the only writer
+    of that file, so writes only take a thread lock. Any process collects
+    by reading every file: counters of exited processes keep counting
+    (totals never go backwards), their gauges are dropped. A process that
+    was forked after opening its file (e.g. gunicorn --preload) switches
+    to a file of its own on its next write. merge_exited() folds the files
+    of exited processes into one, so the directory stays as large as the
+    set of live processes.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._open()
+
+    def _open(self):
+        self._pid = os.getpid()
+        self.path = os.path.join(self.directory, f'metrics_{self._pid}.db')
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < _HEADER.size:
+            os.ftruncate(self._fd, INITIAL_FILE_SIZE)
+        self._mm = mmap.mmap(self._fd, 0)
+        # A restarted process with a reused pid continues its counts
+        if _HEADER.unpack_from(self._mm, 0)[0] != MAGIC:
+            _HEADER.pack_into(self._mm, 0, MAGIC, _HEADER.size)
+        self._offsets = {key: offset for key, offset, _value in self._entries(self._mm)}
+
+    @staticmethod
+    def _entries(data):
+        """(key, value offset, value) of every sample in a file's bytes"""
+        if len(data) < _HEADER.size:
+            return
+        magic, used = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            return
+        position = _HEADER.size
+        used = min(used, len(data))
+        while position + _KEY_LENGTH.size <= used:
+            length = _KEY_LENGTH.unpack_from(data, position)[0]
+            offset = _value_offset(position, length)
+            if offset + _VALUE.size > used:
+                return
+            key = bytes(data[position + _KEY_LENGTH.size:position + _KEY_LENGTH.size + length]).decode('utf-8')
+            yield key, offset, _VALUE.unpack_from(data, offset)[0]
+            position = offset + _VALUE.size
+
+    def _offset(self, key):
+        if self._pid != os.getpid():
+            self._mm.close()
+            os.close(self._fd)
+            self._open()
+        offset = self._offsets.get(key)
+        if offset is None:
+            encoded = key.encode('utf-8')
+            used = _HEADER.unpack_from(self._mm, 0)[1]
+            offset = _value_offset(used, len(encoded))
+            end = offset + _VALUE.size
+            if end > len(self._mm):
+                self._mm.close()
+                os.ftruncate(self._fd, max(2 * os.fstat(self._fd).st_size, end))
+                self._mm = mmap.mmap(self._fd, 0)
+            _KEY_LENGTH.pack_into(self._mm, used, len(encoded))
+            self._mm[used + _KEY_LENGTH.size:used + _KEY_LENGTH.size + len(encoded)] = encoded
+            _VALUE.pack_into(self._mm, offset, 0.0)
+            # Readers only parse up to the bytes used: publish the entry last
+            _HEADER.pack_into(self._mm, 0, MAGIC, end)
+            self._offsets[key] = offset
+        return offset
+
+    def inc(self, key, amount):
+        with self._lock:
+            offset = self._offset(key)
+            _VALUE.pack_into(self._mm, offset, _VALUE.unpack_from(self._mm, offset)[0] + amount)
+
+    def set(self, key, value):
+        with self._lock:
+            _VALUE.pack_into(self._mm, self._offset(key), float(value))
+
+    def collect(self):
+        """[(process alive, {key: value})] for every process sharing the directory"""
+        processes = []
+        # merge_exited() moves samples between files under the exclusive lock
+        with _directory_lock(self.directory, fcntl.LOCK_SH):
+            for path in sorted(glob.glob(os.path.join(self.directory, 'metrics_*.db'))):
+                match = re.search(r'metrics_(\d+)\.db$', path)
+                values = _read_values(path)
+                if values is not None:
+                    processes.append((match is not None and _alive(int(match.group(1))), values))
+        return processes
+
+    def close(self):
+        """Unmap this process's file (it is kept for the totals)"""
+        with self._lock:
+            if self._fd is not None:
+                self._mm.close()
+                os.close(self._fd)
+                self._fd = None
+
+
+def merge_exited(directory):
+    """Fold the files of exited processes in a metrics directory into one
+
+    Their samples are added to EXITED_FILE (read like any exited process:
+    counters are kept, gauges dropped) and their files removed. Run it
+    from the process manager when a worker exits, e.g. gunicorn's
+    child_exit hook. Returns the number of files folded.
+    """
+    if not os.path.isdir(directory):
+        return 0
+    with _directory_lock(directory, fcntl.LOCK_EX):
+        exited_path = os.path.join(directory, EXITED_FILE)
+        totals = _read_values(exited_path) or {}
+        folded = []
+        for path in glob.glob(os.path.join(directory, 'metrics_*.db')):
+            match = re.search(r'metrics_(\d+)\.db$', path)
+            if match is None or _alive(int(match.group(1))):
+                continue
+            for key, value in (_read_values(path) or {}).items():
+                totals[key] = totals.get(key, 0.0) + value
+            folded.append(path)
+        if not folded:
+            return 0
+        data = bytearray(_HEADER.size)
+        for key, value in totals.items():
+            encoded = key.encode('utf-8')
+            offset = _value_offset(len(data), len(encoded))
+            data += _KEY_LENGTH.pack(len(encoded)) + encoded
+            data += bytes(offset - len(data)) + _VALUE.pack(value)
+        _HEADER.pack_into(data, 0, MAGIC, len(data))
+        temporary = exited_path + '.tmp'
+        with open(temporary, 'wb') as handle:
+            handle.write(data)
+        os.replace(temporary, exited_path)
+        for path in folded:
+            os.unlink(path)
+        return len(folded)
+
+
+@contextmanager
+def _directory_lock(directory, operation):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, operation)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _read_values(path):
+    """{key: value} of a samples file, None if it is gone"""
+    try:
+        with open(path, 'rb') as handle:
+            data = handle.read()
+    except OSError:
+        return None
+    return {key: value for key, _offset, value in SharedValues._entries(data)}
+
+
+def _value_offset(position, key_length):
+    # Values are 8-byte aligned so each one is written in a single store
+    return (position + _KEY_LENGTH.size + key_length + 7) // 8 * 8
+
+
+def _alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Metrics:
+    """Counters, gauges and histograms rendered in the Prometheus text format
+
+    Request metrics are recorded as they happen. Everything else comes
+    from collectors: callables returning (name, labels, value) samples.
+    Published collectors (per-process counters such as cache hits) are
+    written to the shared values at most every ``publish_interval``
+    seconds and summed across processes; local collectors (e.g. the size
+    of a store every worker sees) are read by the scraping process only.
+    """
+
+    def __init__(self, values=None, publish_interval=PUBLISH_INTERVAL):
+        self.values = values if values is not None else LocalValues()
+        self.publish_interval = publish_interval
+        self._families = {}
+        self._buckets = {}
+        self._published = []
+        self._local = []
+        self._publish_lock = threading.Lock()
+        self._next_publish = 0.0
+
+    @classmethod
+    def from_env(cls):
+        """Share the values across workers through METRICS_DIR when it is set"""
+        directory = os.environ.get('METRICS_DIR')
+        return cls(SharedValues(directory) if directory else None,
+                   float(os.environ.get('METRICS_PUBLISH_INTERVAL', PUBLISH_INTERVAL)))
+
+    def describe(self, name, kind, help_text, buckets=DEFAULT_BUCKETS):
+        """Declare a metric family (kind is one of KINDS)"""
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+        self._families[name] = (kind, help_text)
+        if kind == 'histogram':
+            self._buckets[name] = tuple(sorted(buckets))
+
+    def inc(self, name, labels=None, amount=1):
+        """Add to a counter"""
+        self.values.inc(_series(name, labels), amount)
+
+    def observe(self, name, labels, value):
+        """Count a value in a histogram"""
+        labels = labels or {}
+        values = self.values
+        for bound in self._buckets[name]:
+            key = _series(name, dict(labels, le=format_value(bound)), '_bucket')
+            values.inc(key, 1 if value <= bound else 0)
+        values.inc(_series(name, dict(labels, le='+Inf'), '_bucket'), 1)
+        values.inc(_series(name, labels, '_sum'), value)
+        values.inc(_series(name, labels, '_count'), 1)
+
+    def collector(self, collect, local=False):
+        """Add a callable returning (name, labels, value) samples"""
+        (self._local if local else self._published).append(collect)
+        return collect
+
+    def export_stats(self, subsystem, stats, counters=(), gauges=()):
+        """Export fields of a stats() dict as aceest_<subsystem>_<field>[_total]"""
+        def help_text(field):
+            return f'{subsystem} {field}'.replace('_', ' ').capitalize()
+
+        for field in counters:
+            self.describe(f'aceest_{subsystem}_{field}_total', 'counter', help_text(field))
+        for field in gauges:
+            self.describe(f'aceest_{subsystem}_{field}', 'gauge', help_text(field))
+
+        def collect():
+            values = stats()
+            return ([(f'aceest_{subsystem}_{field}_total', None, values[field]) for field in counters]
+                    + [(f'aceest_{subsystem}_{field}', None, values[field]) for field in gauges])
+        return self.collector(collect)
+
+    def publish(self, force=False):
+        """Write the published collectors' samples, unless done within the interval"""
+        now = time.monotonic()
+        if not force and now < self._next_publish:
+            return
+        with self._publish_lock:
+            self._next_publish = now + self.publish_interval
+            for collect in self._published:
+                for name, labels, value in collect():
+                    self.values.set(_series(name, labels), value)
+
+    def render(self):
+        """All metrics of all processes in the Prometheus text format"""
+        self.publish(force=True)
+        totals = {}
+        for alive, values in self.values.collect():
+            for key, value in values.items():
+                family = key.partition(' ')[0]
+                if not alive and self._families.get(family, ('gauge',))[0] == 'gauge':
+                    continue
+                totals[key] = totals.get(key, 0.0) + value
+        for collect in self._local:
+            for name, labels, value in collect():
+                totals[_series(name, labels)] = value
+        lines = {}
+        for key, value in totals.items():
+            family, _, series = key.partition(' ')
+            lines.setdefault(family, []).append(f'{series} {format_value(value)}')
+        output = []
+        for family, (kind, help_text) in self._families.items():
+            if family in lines:
+                output.append(f'# HELP {family} {help_text}')
+                output.append(f'# TYPE {family} {kind}')
+                output.extend(lines[family])
+        return '\n'.join(output) + '\n'
+
+
+def instrument(app, metrics):
+    """Record request counts, statuses and latencies of a Flask app and serve /metrics
+
+    Latency is measured from the start of the request to the response
+    leaving the view, so streamed bodies count their time to first byte.
+    Requests no route matched are counted under the endpoint "unmatched".
+    """
+    metrics.describe('aceest_http_requests_total', 'counter', 'HTTP requests by endpoint, method and status')
+    metrics.describe('aceest_http_request_duration_seconds', 'histogram',
+                     'HTTP request latency by endpoint and method')
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            record(metrics, request.endpoint or 'unmatched', request.method, response.status_code,
+                   time.perf_counter() - started)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Prometheus scrape endpoint"""
+        return app.response_class(metrics.render(), content_type=CONTENT_TYPE)
+
+    return metrics
+
+
+def record(metrics, endpoint, method, status, seconds):
+    """Account for one served request (also used by entry points that bypass Flask)"""
+    metrics.inc('aceest_http_requests_total', {'endpoint': endpoint, 'method': method, 'status': str(status)})
+    metrics.observe('aceest_http_request_duration_seconds', {'endpoint': endpoint, 'method': method}, seconds)
+    metrics.publish()
@@ -0,0 +1,63 @@
+"""
+Cursor pagination helpers for the workout API
+Opaque page cursors and response field selection
+"""
+import base64
+import binascii
+import json
+
+from aceest.columnar import ENTRY_FIELDS
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+PAGE_PARAMS = ('limit', 'cursor', 'category', 'fields')
+
+
+def encode_cursor(category, position):
+    """Encode a page position as an opaque, URL-safe token"""
+    payload = json.dumps({'c': category, 'p': position}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return (category, position) from a token made by encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, binascii.Error, UnicodeError):
+        raise ValueError('cursor is invalid') from None
+    if (not isinstance(payload, dict) or not isinstance(payload.get('c'), str)
+            or type(payload.get('p')) is not int or payload['p'] < 0):
+        raise ValueError('cursor is invalid')
+    return payload['c'], payload['p']
+
+
+def parse_limit(value):
+    """Validate a ?limit= value (defaults to DEFAULT_PAGE_SIZE)"""
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer') from None
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return limit
+
+
+def parse_fields(value):
+    """Validate a comma-separated ?fields= list; None selects every field"""
+    if value is None:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in ENTRY_FIELDS]
+    if not fields or unknown:
+        raise ValueError(f"fields must be a comma-separated subset of {', '.join(ENTRY_FIELDS)}")
+    return fields
+
+
+def select_fields(entries, fields):
+    """Project entry dicts onto the requested fields"""
+    if fields is None:
+        return entries
+    return [{field: entry[field] for field in fields} for entry in entries]
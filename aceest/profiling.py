@@ -0,0 +1,177 @@
+"""
+On-demand profiling of a serving worker
+Thread-based stack sampling in collapsed-stack format, and cProfile per request
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, jsonify, request
+
+DEFAULT_SECONDS = 5.0
+# Longest sample; keep well below the worker timeout (gunicorn --timeout 120)
+MAX_SECONDS = 60.0
+DEFAULT_HZ = 100
+MAX_HZ = 1000
+# Functions listed in a ?profile=1 report
+PROFILE_LINES = 40
+COLLAPSED_CONTENT_TYPE = 'text/plain; charset=utf-8'
+
+
+class StackSampler:
+    """Samples the stacks of every other thread of the process
+
+    Each sample reads all threads' current frames (sys._current_frames)
+    from the calling thread, so nothing is installed in the sampled code
+    and the overhead is one stack walk per thread per tick. Stacks are
+    counted as 'thread;outer;...;inner' in the collapsed format that
+    flamegraph.pl, speedscope and inferno read. Signals are not used:
+    they only interrupt the main thread and would collide with gunicorn's
+    own handlers.
+    """
+
+    def __init__(self, hz=DEFAULT_HZ):
+        self.interval = 1.0 / hz
+        self._labels = {}
+        self._prefixes = sorted((os.path.join(os.path.abspath(path), '') for path in sys.path if path),
+                                key=len, reverse=True)
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            for prefix in self._prefixes:
+                if filename.startswith(prefix):
+                    filename = filename[len(prefix):]
+                    break
+            # Semicolons separate frames in the collapsed format
+            label = f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ':')
+            self._labels[code] = label
+        return label
+
+    def sample_once(self, counts, skip=()):
+        """Add one sample of every thread not in ``skip`` (thread idents) to ``counts``"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident in skip:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f'thread-{ident}').replace(';', ':').replace(' ', '_'))
+            counts[';'.join(reversed(stack))] += 1
+
+    def sample(self, seconds):
+        """Sample for ``seconds``; returns (Counter of collapsed stacks, ticks taken)"""
+        counts = Counter()
+        skip = {threading.get_ident()}
+        ticks = 0
+        deadline = time.monotonic() + seconds
+        next_tick = time.monotonic()
+        while next_tick < deadline:
+            self.sample_once(counts, skip)
+            ticks += 1
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind (e.g. a busy GIL): skip the missed ticks
+                next_tick = time.monotonic()
+        return counts, ticks
+
+
+def collapsed(counts):
+    """Collapsed-stack text: one 'frame;frame;... count' line per stack, most sampled first"""
+    return ''.join(f'{stack} {count}\n' for stack, count in counts.most_common())
+
+
+def is_admin(req, token):
+    """Check a request carries ``Authorization: Bearer <token>``"""
+    if not token:
+        return False
+    scheme, _, supplied = req.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(supplied.strip().encode('utf-8'),
+                                                              token.encode('utf-8'))
+
+
+def parse_number(args, name, default, low, high):
+    """A numeric query argument within (low, high]; raises ValueError"""
+    try:
+        value = float(args.get(name, default))
+        if not low < value <= high:
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValueError(f'{name} must be a number above {low:g} and at most {high:g}') from None
+    return value
+
+
+def enable_profiling(app, admin_token):
+    """Add /debug/profile and ?profile=1 to a Flask app, for requests bearing the admin token
+
+    Without a token both stay disabled: /debug/profile answers 404 and
+    ?profile=1 is ignored like any unknown query argument.
+    """
+    sampling = threading.Lock()
+
+    @app.route('/debug/profile')
+    def debug_profile():
+        """Sample this worker's threads for ?seconds= (default 5) at ?hz= (default 100)
+
+        Returns collapsed stacks, e.g. for flamegraph.pl. Only requests
+        served by other threads of the worker show up, so run gunicorn
+        with --threads (or the ASGI entry point) when profiling.
+        """
+        if not is_admin(request, admin_token):
+            return jsonify({'error': 'Not found'}), 404
+        try:
+            seconds = parse_number(request.args, 'seconds', DEFAULT_SECONDS, 0, MAX_SECONDS)
+            hz = parse_number(request.args, 'hz', DEFAULT_HZ, 0, MAX_HZ)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid input: {str(e)}'}), 400
+        if not sampling.acquire(blocking=False):
+            return jsonify({'error': 'A profile is already running in this worker'}), 409
+        try:
+            counts, ticks = StackSampler(hz).sample(seconds)
+        finally:
+            sampling.release()
+        response = app.response_class(collapsed(counts), content_type=COLLAPSED_CONTENT_TYPE)
+        response.headers['X-Profile-Samples'] = str(ticks)
+        response.headers['X-Profile-Pid'] = str(os.getpid())
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    @app.before_request
+    def start_request_profile():
+        if request.args.get('profile') == '1' and is_admin(request, admin_token):
+            g.request_profile = cProfile.Profile()
+            g.request_profile.enable()
+
+    @app.after_request
+    def finish_request_profile(response):
+        profile = g.pop('request_profile', None)
+        if profile is None:
+            return response
+        profile.disable()
+        report = io.StringIO()
+        pstats.Stats(profile, stream=report).strip_dirs().sort_stats('cumulative').print_stats(PROFILE_LINES)
+        # The report replaces the body; streamed bodies are not generated yet and so not profiled
+        profiled = app.response_class(report.getvalue(), content_type=COLLAPSED_CONTENT_TYPE)
+        profiled.headers['X-Profiled-Status'] = str(response.status_code)
+        profiled.headers['Cache-Control'] = 'no-store'
+        response.close()
+        return profiled
+
+    @app.teardown_request
+    def stop_request_profile(exc):
+        # Left running only when the view raised past the error handlers
+        profile = g.pop('request_profile', None)
+        if profile is not None:
+            profile.disable()
@@ -0,0 +1,223 @@
+"""
+Per-client rate limiting for ACEest Fitness
+Token buckets kept in a process-local table or an mmap table shared by all workers
+"""
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+PERIODS = {'s': 1, 'sec': 1, 'min': 60, 'h': 3600, 'hour': 3600}
+MAGIC = b'ACEESTR1'
+# magic, slot count
+_HEADER = struct.Struct('<8sQ')
+# key hash (0 = free), tokens, last refill (epoch seconds)
+_SLOT = struct.Struct('<Qdd')
+DEFAULT_SLOTS = 65536
+# Slots probed for a key; when all are taken the least recently used is reused
+PROBE_LIMIT = 16
+DEFAULT_MAX_CLIENTS = 100000
+
+
+class Budget(namedtuple('Budget', 'rate burst')):
+    """Tokens refilled per second and the most a client can hold (its burst)"""
+
+    @classmethod
+    def parse(cls, spec):
+        """Parse 'count/period:burst', e.g. '120/min:30' (burst defaults to count)"""
+        try:
+            allowance, _, burst = spec.strip().partition(':')
+            count, _, period = allowance.partition('/')
+            count = float(count)
+            seconds = PERIODS[period.strip() or 's']
+            burst = float(burst) if burst else count
+        except (KeyError, ValueError):
+            raise ValueError(f"invalid rate limit {spec!r}; expected e.g. '120/min:30'") from None
+        if count <= 0 or burst < 1:
+            raise ValueError(f"invalid rate limit {spec!r}; count must be positive and burst at least 1")
+        return cls(count / seconds, burst)
+
+
+def parse_budgets(spec):
+    """Parse 'route=count/period:burst;...' into {route: Budget}; 'route=off' maps to None"""
+    budgets = {}
+    for item in spec.split(';'):
+        if item.strip():
+            route, _, budget = item.partition('=')
+            budgets[route.strip()] = None if budget.strip() == 'off' else Budget.parse(budget)
+    return budgets
+
+
+def refill(tokens, updated, budget, now):
+    """Take one token from a bucket; returns (allowed, tokens, retry_after)"""
+    tokens = min(budget.burst, tokens + max(0.0, now - updated) * budget.rate)
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / budget.rate
+
+
+class LocalTable:
+    """Buckets of one process, for the least recently seen ``max_clients``"""
+
+    def __init__(self, max_clients=DEFAULT_MAX_CLIENTS):
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, budget, now):
+        """Take a token from a key's bucket; returns (allowed, retry_after)"""
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (budget.burst, now))
+            allowed, tokens, retry_after = refill(tokens, updated, budget, now)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def close(self):
+        """Nothing to release"""
+
+
+class SharedTable:
+    """Buckets in an mmap-backed file that every worker on the host maps
+
+    A fixed open-addressing table of ``slots`` buckets keyed by a 64-bit
+    hash of (route, client). Updates hold a thread lock plus ``flock`` on
+    the file, so workers share one budget per client. A full probe window
+    reuses its least recently refilled slot: the bucket of a client that
+    has been idle longest, which has refilled anyway.
+    """
+
+    def __init__(self, path, slots=DEFAULT_SLOTS):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < _HEADER.size:
+                os.ftruncate(self._fd, _HEADER.size + slots * _SLOT.size)
+                self._mm = mmap.mmap(self._fd, 0)
+                _HEADER.pack_into(self._mm, 0, MAGIC, slots)
+            else:
+                self._mm = mmap.mmap(self._fd, 0)
+                magic, slots = _HEADER.unpack_from(self._mm, 0)
+                if magic != MAGIC:
+                    self._mm.close()
+                    os.close(self._fd)
+                    self._fd = None
+                    raise ValueError(f"{path} is not an ACEest rate limit table")
+        finally:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self.slots = slots
+
+    @staticmethod
+    def _hash(key):
+        digest = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=8).digest()
+        # Zero marks a free slot
+        return struct.unpack('<Q', digest)[0] | 1
+
+    def take(self, key, budget, now):
+        """Take a token from a key's bucket; returns (allowed, retry_after)"""
+        key_hash = self._hash(key)
+        start = key_hash % self.slots
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                mm = self._mm
+                chosen = None
+                oldest = None
+                for probe in range(min(PROBE_LIMIT, self.slots)):
+                    offset = _HEADER.size + ((start + probe) % self.slots) * _SLOT.size
+                    slot_hash, tokens, updated = _SLOT.unpack_from(mm, offset)
+                    if slot_hash == key_hash:
+                        chosen = (offset, tokens, updated)
+                        break
+                    if slot_hash == 0:
+                        chosen = (offset, budget.burst, now)
+                        break
+                    if oldest is None or updated < oldest[2]:
+                        oldest = (offset, budget.burst, updated)
+                if chosen is None:
+                    chosen = (oldest[0], budget.burst, now)
+                offset, tokens, updated = chosen
+                allowed, tokens, retry_after = refill(tokens, updated, budget, now)
+                _SLOT.pack_into(mm, offset, key_hash, tokens, now)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return allowed, retry_after
+
+    def __len__(self):
+        return sum(1 for index in range(self.slots)
+                   if _SLOT.unpack_from(self._mm, _HEADER.size + index * _SLOT.size)[0])
+
+    def close(self):
+        """Unmap the table"""
+        if self._fd is not None:
+            self._mm.close()
+            os.close(self._fd)
+            self._fd = None
+
+
+class RateLimiter:
+    """Token-bucket admission per (route, client) with per-route budgets
+
+    Each client gets ``burst`` requests at once and then ``rate`` per
+    second on each limited route, so one misbehaving client is refused
+    with a retry delay while every other client keeps its full budget.
+    Routes without a budget (or with None) are not limited.
+    """
+
+    def __init__(self, budgets, table=None, clock=time.time):
+        self.budgets = dict(budgets)
+        self.table = table if table is not None else LocalTable()
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def acquire(self, route, *clients):
+        """Admit one request charged to each client's bucket; returns None, or the seconds to wait
+
+        Buckets are charged in order and the first refusal stops the
+        request, so a client refused by its first bucket spends nothing
+        from the others.
+        """
+        budget = self.budgets.get(route)
+        if budget is None:
+            return None
+        now = self.clock()
+        retry_after = None
+        for client in clients:
+            allowed, wait = self.table.take((route, client), budget, now)
+            if not allowed:
+                retry_after = wait
+                break
+        with self._lock:
+            if retry_after is None:
+                self.allowed += 1
+            else:
+                self.limited += 1
+        return retry_after
+
+    @staticmethod
+    def retry_after_header(retry_after):
+        """Retry-After value: whole seconds, at least one"""
+        return str(max(1, math.ceil(retry_after)))
+
+    def stats(self):
+        """Return admission counters as a dict"""
+        with self._lock:
+            return {'allowed': self.allowed, 'limited': self.limited}
+
+    def close(self):
+        """Release the bucket table"""
+        self.table.close()
@@ -0,0 +1,90 @@
+"""
+LRU cache for rendered page fragments
+Keeps rendered HTML keyed by template and data version, with hit/miss counters
+"""
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class RenderCache:
+    """Thread-safe LRU mapping of cache keys to rendered strings
+
+    Keys should name everything the fragment depends on (template, dataset
+    and a version of the data it shows), so entries never need to be
+    invalidated: a write changes the version and the stale fragment simply
+    ages out. Both the number of fragments and their total size (in
+    characters) are bounded.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        if max_entries <= 0 or max_bytes <= 0:
+            raise ValueError('max_entries and max_bytes must be positive')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached fragment for a key, or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a fragment, evicting the least recently used ones if needed"""
+        if len(value) > self.max_bytes:
+            return value
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += len(value)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _key, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+        return value
+
+    def get_or_render(self, key, render):
+        """Return the cached fragment, calling render() to fill a miss"""
+        value = self.get(key)
+        if value is None:
+            # Rendering runs outside the lock; two concurrent misses for the
+            # same key both render and the second put wins, which is harmless
+            value = self.put(key, render())
+        return value
+
+    def clear(self):
+        """Drop every fragment (the counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Return the counters, current size and hit ratio as a dict"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size': self._size,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
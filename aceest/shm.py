@@ -0,0 +1,371 @@
+"""
+Shared-memory storage engine for ACEest Fitness
+All gunicorn workers map the same files, so they read and write one dataset
+without an external service
+"""
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+import weakref
+from datetime import date
+
+from aceest.aggregates import RunningTotals, to_tenths
+from aceest.calendar_index import to_ordinal
+from aceest.columnar import epoch_to_timestamp, timestamp_to_epoch
+from aceest.storage import CATEGORIES, WorkoutStore, empty_workouts
+
+# Version 2 widened the exercise name field
+MAGIC = b'ACEESTM2'
+HEADER_SIZE = 4096
+# magic, seqlock sequence, record count, record capacity
+_HEADER = struct.Struct('<8sQQQ')
+# sessions, minutes, calorie tenths for each category
+_TOTALS = struct.Struct('<' + 'QQq' * len(CATEGORIES))
+_TOTALS_OFFSET = _HEADER.size
+_USER_LEN = struct.Struct('<I')
+_USER_OFFSET = _TOTALS_OFFSET + _TOTALS.size
+_USER_DATA_OFFSET = _USER_OFFSET + _USER_LEN.size
+MAX_USER_INFO_BYTES = HEADER_SIZE - _USER_DATA_OFFSET
+# Room for the longest exercise name the app accepts (MAX_EXERCISE_NAME,
+# 100 characters) at 4 UTF-8 bytes each
+MAX_EXERCISE_BYTES = 400
+# category, name length, duration, calorie tenths, epoch seconds, day ordinal, name
+_RECORD = struct.Struct('<BxHIqqI4x%ds' % MAX_EXERCISE_BYTES)
+INITIAL_CAPACITY = 1024
+# Optimistic read attempts before a reader falls back to the writer lock
+SPIN_LIMIT = 10000
+
+_SEQ_OFFSET = 8
+_COUNT_OFFSET = 16
+_CAPACITY_OFFSET = 24
+
+
+def _encode_name(name):
+    """UTF-8 encode an exercise name; names longer than the record holds are rejected"""
+    data = name.encode('utf-8')
+    if len(data) > MAX_EXERCISE_BYTES:
+        raise ValueError(f'Exercise names are at most {MAX_EXERCISE_BYTES} bytes of UTF-8')
+    return data
+
+
+def _member_path(directory, member):
+    name = 'default.shm' if not member else 'member-%s.shm' % member.encode('utf-8').hex()
+    return os.path.join(directory, name)
+
+
+def _to_entry(fields):
+    """Build the API entry dict from an unpacked record"""
+    _category, name_len, duration, tenths, seconds, _day, name = fields
+    return {
+        'exercise': name[:name_len].decode('utf-8'),
+        'duration': duration,
+        'calories': tenths / 10,
+        'timestamp': epoch_to_timestamp(seconds)
+    }
+
+
+class SharedMemoryStore(WorkoutStore):
+    """Store kept in an mmap-backed file shared by every worker process
+
+    Records are fixed-size and append-only. Writers serialize through a
+    thread lock plus ``flock`` on the file and publish each change with a
+    seqlock: the sequence is made odd, the header is updated, and it is made
+    even again. Readers never lock: they retry header reads (count, totals,
+    profile) until they see the same even sequence before and after, and
+    then read records below the published count straight from the mapping,
+    since published records never change. This relies on the platform
+    keeping stores to shared memory in order (x86-64 does).
+    """
+
+    def __init__(self, directory, member='', initial_capacity=INITIAL_CAPACITY):
+        self.directory = directory
+        self.member = member
+        os.makedirs(directory, exist_ok=True)
+        self.path = _member_path(directory, member)
+        self.store_id = 'mmap:' + os.path.abspath(self.path)
+        self._lock = threading.Lock()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        # Mappings close themselves when collected; the descriptor goes with
+        # the store, so stores dropped without close() hold no files open
+        self._release = weakref.finalize(self, os.close, self._fd)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < HEADER_SIZE:
+                os.ftruncate(self._fd, HEADER_SIZE + initial_capacity * _RECORD.size)
+                self._mm = mmap.mmap(self._fd, 0)
+                _HEADER.pack_into(self._mm, 0, MAGIC, 0, 0, initial_capacity)
+            else:
+                self._mm = mmap.mmap(self._fd, 0)
+                if self._mm[:len(MAGIC)] != MAGIC:
+                    self._mm.close()
+                    self._release()
+                    self._fd = None
+                    raise ValueError(f"{self.path} is not an ACEest shared-memory store")
+                self._repair_sequence()
+        finally:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    durable = True
+
+    def for_member(self, member):
+        return SharedMemoryStore(self.directory, member)
+
+    def has_member(self, member):
+        return os.path.exists(_member_path(self.directory, member))
+
+    def settings_path(self, name):
+        return os.path.join(self.directory, name)
+
+    # -- seqlock helpers -------------------------------------------------
+
+    def _repair_sequence(self):
+        """Make an odd sequence even again; only called under the file lock
+
+        An odd sequence seen while holding the lock means the last writer
+        died mid-update. Updates publish the record count last, so the
+        header is still consistent and only the sequence needs fixing.
+        """
+        seq = struct.unpack_from('<Q', self._mm, _SEQ_OFFSET)[0]
+        if seq & 1:
+            struct.pack_into('<Q', self._mm, _SEQ_OFFSET, seq + 1)
+
+    def _read_consistent(self, read):
+        """Run ``read(mm)`` until it observes one stable, even sequence"""
+        for _ in range(SPIN_LIMIT):
+            mm = self._mm
+            before = struct.unpack_from('<Q', mm, _SEQ_OFFSET)[0]
+            if before & 1:
+                continue  # A writer is mid-update
+            result = read(mm)
+            if struct.unpack_from('<Q', mm, _SEQ_OFFSET)[0] == before:
+                return result
+        # Heavy write traffic or a crashed writer: read under the writer lock
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self._remap_if_grown()
+                self._repair_sequence()
+                return read(self._mm)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _write(self, update):
+        """Run ``update(mm)`` as one seqlock-protected write"""
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self._remap_if_grown()
+                self._repair_sequence()
+                mm = self._mm
+                seq = struct.unpack_from('<Q', mm, _SEQ_OFFSET)[0]
+                struct.pack_into('<Q', mm, _SEQ_OFFSET, seq + 1)
+                try:
+                    return update(mm)
+                finally:
+                    struct.pack_into('<Q', self._mm, _SEQ_OFFSET, seq + 2)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _remap_if_grown(self):
+        size = os.fstat(self._fd).st_size
+        if size > len(self._mm):
+            self._mm = mmap.mmap(self._fd, 0)
+
+    def data_version(self):
+        # Every write moves the seqlock sequence on by two; an odd value
+        # means a write is in flight and has not been published yet
+        return struct.unpack_from('<Q', self._mm, _SEQ_OFFSET)[0] >> 1
+
+    def category_versions(self):
+        values = self._read_consistent(lambda mm: _TOTALS.unpack_from(mm, _TOTALS_OFFSET))
+        return {category: values[index * 3] for index, category in enumerate(CATEGORIES)}
+
+    def category_counts(self):
+        # The per-category entry counts are the versions
+        return self.category_versions()
+
+    def _count(self):
+        return self._read_consistent(lambda mm: struct.unpack_from('<Q', mm, _COUNT_OFFSET)[0])
+
+    # -- writes ----------------------------------------------------------
+
+    def add_workout(self, category, entry, day_iso):
+        self.add_workouts([(category, entry, day_iso)])
+        return entry
+
+    def add_workouts(self, items):
+        items = list(items)
+        records = []
+        deltas = [0] * (3 * len(CATEGORIES))
+        for category, entry, day_iso in items:
+            category_index = CATEGORIES.index(category)
+            name = _encode_name(entry['exercise'])
+            tenths = to_tenths(entry.get('calories', 0))
+            records.append(_RECORD.pack(category_index, len(name), entry['duration'], tenths,
+                                        timestamp_to_epoch(entry['timestamp']),
+                                        date.fromisoformat(day_iso).toordinal(), name))
+            base = category_index * 3
+            deltas[base] += 1
+            deltas[base + 1] += entry['duration']
+            deltas[base + 2] += tenths
+        data = b''.join(records)
+
+        def update(mm):
+            count, capacity = struct.unpack_from('<QQ', mm, _COUNT_OFFSET)
+            if count + len(records) > capacity:
+                while count + len(records) > capacity:
+                    capacity *= 2
+                os.ftruncate(self._fd, HEADER_SIZE + capacity * _RECORD.size)
+                self._mm = mm = mmap.mmap(self._fd, 0)
+                struct.pack_into('<Q', mm, _CAPACITY_OFFSET, capacity)
+            offset = HEADER_SIZE + count * _RECORD.size
+            mm[offset:offset + len(data)] = data
+            totals = _TOTALS.unpack_from(mm, _TOTALS_OFFSET)
+            _TOTALS.pack_into(mm, _TOTALS_OFFSET, *(a + b for a, b in zip(totals, deltas)))
+            # Publishing the count last makes the whole batch visible at once
+            struct.pack_into('<Q', mm, _COUNT_OFFSET, count + len(records))
+
+        self._write(update)
+        return [entry for _category, entry, _day_iso in items]
+
+    def save_user_info(self, info):
+        def update(mm):
+            length = _USER_LEN.unpack_from(mm, _USER_OFFSET)[0]
+            stored = json.loads(bytes(mm[_USER_DATA_OFFSET:_USER_DATA_OFFSET + length])) if length else {}
+            stored.update(info)
+            data = json.dumps(stored, separators=(',', ':')).encode('utf-8')
+            if len(data) > MAX_USER_INFO_BYTES:
+                raise ValueError('user info is too large for the shared-memory header')
+            mm[_USER_DATA_OFFSET:_USER_DATA_OFFSET + len(data)] = data
+            _USER_LEN.pack_into(mm, _USER_OFFSET, len(data))
+            return stored
+
+        return self._write(update)
+
+    # -- reads -----------------------------------------------------------
+
+    def _raw_rows(self):
+        """Yield unpacked record tuples read in place from the mapping"""
+        count = self._count()
+        if HEADER_SIZE + count * _RECORD.size > len(self._mm):
+            with self._lock:
+                self._remap_if_grown()
+        with memoryview(self._mm) as view:
+            yield from _RECORD.iter_unpack(view[HEADER_SIZE:HEADER_SIZE + count * _RECORD.size])
+
+    def _iter_rows(self):
+        """Yield (category, day ordinal, entry) for every published record"""
+        for fields in self._raw_rows():
+            yield CATEGORIES[fields[0]], fields[5], _to_entry(fields)
+
+    def page_workouts(self, category, limit, before=None):
+        category_index = CATEGORIES.index(category)
+        count = self._count()
+        if HEADER_SIZE + count * _RECORD.size > len(self._mm):
+            with self._lock:
+                self._remap_if_grown()
+        mm = self._mm
+        position = count if before is None else min(before, count)
+        entries = []
+        # Walk back one record past a full page to learn whether more remain
+        while position > 0 and len(entries) <= limit:
+            position -= 1
+            fields = _RECORD.unpack_from(mm, HEADER_SIZE + position * _RECORD.size)
+            if fields[0] == category_index:
+                entries.append((position, fields))
+        next_before = entries[limit - 1][0] if len(entries) > limit else None
+        return [_to_entry(fields) for _position, fields in entries[:limit]], next_before
+
+    def __len__(self):
+        return self._count()
+
+    def get_workouts(self):
+        result = empty_workouts()
+        for category, _day, entry in self._iter_rows():
+            result[category].append(entry)
+        return result
+
+    def get_daily_workouts(self):
+        result = {}
+        for category, day, entry in self._iter_rows():
+            day_iso = date.fromordinal(day).isoformat()
+            if day_iso not in result:
+                result[day_iso] = empty_workouts()
+            result[day_iso][category].append(entry)
+        return result
+
+    def iter_records(self, start=None, end=None, categories=None):
+        first = to_ordinal(start) if start is not None else 0
+        last = to_ordinal(end) if end is not None else date.max.toordinal()
+        wanted = None if categories is None else {
+            CATEGORIES.index(category) for category in categories if category in CATEGORIES
+        }
+        # Filters are checked on the raw record before any strings are decoded
+        for fields in self._raw_rows():
+            if first <= fields[5] <= last and (wanted is None or fields[0] in wanted):
+                yield CATEGORIES[fields[0]], date.fromordinal(fields[5]).isoformat(), _to_entry(fields)
+
+    def get_user_info(self):
+        def read(mm):
+            length = _USER_LEN.unpack_from(mm, _USER_OFFSET)[0]
+            return bytes(mm[_USER_DATA_OFFSET:_USER_DATA_OFFSET + length])
+
+        data = self._read_consistent(read)
+        return json.loads(data) if data else {}
+
+    def get_category_totals(self):
+        values = self._read_consistent(lambda mm: _TOTALS.unpack_from(mm, _TOTALS_OFFSET))
+        totals = RunningTotals()
+        for index, category in enumerate(CATEGORIES):
+            totals.load(category, *values[index * 3:index * 3 + 3])
+        return totals.category_totals()
+
+    def get_range_totals(self, start, end):
+        first, last = to_ordinal(start), to_ordinal(end)
+        values = [0] * (2 * len(CATEGORIES))
+        for category_index, _len, duration, tenths, _seconds, day, _name in self._raw_rows():
+            if first <= day <= last:
+                values[category_index * 2] += duration
+                values[category_index * 2 + 1] += tenths
+        return {
+            category: {'time': values[index * 2], 'calories': values[index * 2 + 1] / 10}
+            for index, category in enumerate(CATEGORIES)
+        }
+
+    def get_daily_totals(self, start=None, end=None, categories=None):
+        first = to_ordinal(start) if start is not None else 0
+        last = to_ordinal(end) if end is not None else date.max.toordinal()
+        wanted = None if categories is None else {
+            CATEGORIES.index(category) for category in categories if category in CATEGORIES
+        }
+        days = {}
+        for category_index, _len, duration, tenths, _seconds, day, _name in self._raw_rows():
+            if first <= day <= last and (wanted is None or category_index in wanted):
+                totals = days.setdefault(day, [0, 0])
+                totals[0] += duration
+                totals[1] += tenths
+        return [(date.fromordinal(day).isoformat(), time_total, total_tenths / 10)
+                for day, (time_total, total_tenths) in sorted(days.items())]
+
+    def rebuild_totals(self):
+        def update(mm):
+            count = struct.unpack_from('<Q', mm, _COUNT_OFFSET)[0]
+            totals = [0] * (3 * len(CATEGORIES))
+            with memoryview(mm) as view:
+                for fields in _RECORD.iter_unpack(view[HEADER_SIZE:HEADER_SIZE + count * _RECORD.size]):
+                    base = fields[0] * 3
+                    totals[base] += 1
+                    totals[base + 1] += fields[2]
+                    totals[base + 2] += fields[3]
+            _TOTALS.pack_into(mm, _TOTALS_OFFSET, *totals)
+
+        self._write(update)
+
+    def close(self):
+        with self._lock:
+            self._mm.close()
+            self._release()
@@ -0,0 +1,274 @@
+"""
+Mergeable quantile sketches for workout statistics
+DDSketch-style log-bucketed histograms with a relative-error guarantee
+"""
+import math
+import threading
+from collections import OrderedDict
+
+DEFAULT_ACCURACY = 0.01
+DEFAULT_MAX_BINS = 2048
+QUANTILES = (0.5, 0.9, 0.99)
+# Exercises tracked per dataset; further names only count towards their category
+MAX_EXERCISES = 1000
+# Values at or below this are counted as zero (the log mapping needs v > 0)
+MIN_VALUE = 1e-9
+
+
+class DDSketch:
+    """Quantile sketch with relative accuracy ``relative_accuracy``
+
+    Values are counted in buckets whose bounds grow geometrically by
+    gamma = (1 + a) / (1 - a), so any quantile is answered within a
+    relative error of ``a`` of a true value of that rank. Adding is O(1),
+    and two sketches of the same accuracy merge exactly by adding bucket
+    counts, so sketches built by different workers or pods combine into
+    the sketch of all their values.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_ACCURACY, max_bins=DEFAULT_MAX_BINS):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy must be between 0 and 1')
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        """Account for one non-negative value"""
+        if value < 0:
+            raise ValueError('sketched values must not be negative')
+        if value <= MIN_VALUE:
+            self.zeros += 1
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + 1
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def _collapse(self):
+        # Fold the lowest buckets together: only the smallest quantiles lose accuracy
+        lowest = sorted(self.bins)[:len(self.bins) - self.max_bins + 1]
+        self.bins[lowest[-1]] += sum(self.bins.pop(index) for index in lowest[:-1])
+
+    def merge(self, other):
+        """Add another sketch's values to this one"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('only sketches with the same relative accuracy can be merged')
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        while len(self.bins) > self.max_bins:
+            self._collapse()
+        self.zeros += other.zeros
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Estimate the q-quantile (0 <= q <= 1); None when empty"""
+        if not 0 <= q <= 1:
+            raise ValueError('q must be between 0 and 1')
+        if not self.count:
+            return None
+        # The extremes are tracked exactly
+        if q == 0:
+            return self.min
+        if q == 1:
+            return self.max
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for index, count in sorted(list(self.bins.items())):
+            seen += count
+            if seen > rank:
+                # The bucket's midpoint in relative terms: within a of every value in it
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        """JSON-serializable form (see from_dict)"""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'bins': sorted(list(self.bins.items())),
+            'zeros': self.zeros,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None
+        }
+
+    @classmethod
+    def from_dict(cls, data, max_bins=DEFAULT_MAX_BINS):
+        """Rebuild a sketch from to_dict output"""
+        sketch = cls(data['relative_accuracy'], max_bins)
+        sketch.bins = {int(index): int(count) for index, count in data['bins']}
+        sketch.zeros = data['zeros']
+        sketch.count = data['count']
+        sketch.sum = data['sum']
+        if sketch.count:
+            sketch.min = data['min']
+            sketch.max = data['max']
+        return sketch
+
+
+def _round(value, ndigits=1):
+    return None if value is None else round(value, ndigits)
+
+
+class WorkoutStats:
+    """Duration and calorie sketches per category and per exercise"""
+
+    METRICS = ('duration', 'calories')
+
+    def __init__(self, relative_accuracy=DEFAULT_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.categories = {}
+        self.exercises = {}
+
+    def _sketches(self, group, name):
+        sketches = group.get(name)
+        if sketches is None:
+            sketches = group[name] = {metric: DDSketch(self.relative_accuracy) for metric in self.METRICS}
+        return sketches
+
+    def add(self, category, entry):
+        """Account for one entry of a category"""
+        targets = [self._sketches(self.categories, category)]
+        if entry['exercise'] in self.exercises or len(self.exercises) < MAX_EXERCISES:
+            targets.append(self._sketches(self.exercises, entry['exercise']))
+        for sketches in targets:
+            sketches['duration'].add(entry['duration'])
+            sketches['calories'].add(entry.get('calories', 0))
+
+    def merge(self, other):
+        """Add another WorkoutStats (e.g. from another worker) to this one"""
+        for group, other_group in ((self.categories, other.categories), (self.exercises, other.exercises)):
+            for name, sketches in other_group.items():
+                if group is self.exercises and name not in group and len(group) >= MAX_EXERCISES:
+                    continue
+                mine = self._sketches(group, name)
+                for metric in self.METRICS:
+                    mine[metric].merge(sketches[metric])
+        return self
+
+    def summary(self, quantiles=QUANTILES):
+        """Counts and pNN durations and calories per category and exercise"""
+        def describe(sketches):
+            result = {'count': sketches['duration'].count}
+            for metric in self.METRICS:
+                result[metric] = {f'p{round(q * 100):d}': _round(sketches[metric].quantile(q))
+                                  for q in quantiles}
+            return result
+
+        # Snapshots of the mappings: a write may add a name while this runs
+        return {
+            'categories': {name: describe(sketches) for name, sketches in list(self.categories.items())},
+            'exercises': {name: describe(sketches) for name, sketches in sorted(list(self.exercises.items()))}
+        }
+
+    def to_dict(self):
+        """JSON-serializable form (see from_dict)"""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'categories': {name: {metric: sketch.to_dict() for metric, sketch in sketches.items()}
+                           for name, sketches in list(self.categories.items())},
+            'exercises': {name: {metric: sketch.to_dict() for metric, sketch in sketches.items()}
+                          for name, sketches in list(self.exercises.items())}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild stats from to_dict output"""
+        stats = cls(data['relative_accuracy'])
+        for group, serialized in ((stats.categories, data['categories']), (stats.exercises, data['exercises'])):
+            for name, sketches in serialized.items():
+                group[name] = {metric: DDSketch.from_dict(sketch) for metric, sketch in sketches.items()}
+        return stats
+
+
+def merge_stats(serialized):
+    """Merge to_dict outputs (e.g. one per worker or pod) into one WorkoutStats"""
+    merged = None
+    for data in serialized:
+        stats = WorkoutStats.from_dict(data)
+        merged = stats if merged is None else merged.merge(stats)
+    return merged if merged is not None else WorkoutStats()
+
+
+class StatsCache:
+    """WorkoutStats per dataset, kept current by writes and rebuilt when stale
+
+    Each dataset's stats are tagged with the state (e.g. data version) they
+    describe. Writes fold their entries in with ``record`` when they were
+    the only change since that state; otherwise (e.g. another worker wrote
+    to a shared store) the next ``get`` rebuilds the stats from the data.
+    With ``max_datasets=None`` nothing is evicted here; the owner bounds the
+    cache by discarding datasets it drops (e.g. evicted member stores).
+    """
+
+    def __init__(self, max_datasets=1024):
+        self.max_datasets = max_datasets
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+        self.updates = 0
+
+    def get(self, key, state, build):
+        """Current stats of a dataset; ``build()`` is only called when stale
+
+        ``state()`` returns the dataset's current state. A rebuild that
+        raced with a write is returned but not kept, so stats are never
+        tagged with a state they do not describe.
+        """
+        current = state()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == current:
+                self._entries.move_to_end(key)
+                return cached[1]
+        stats = build()
+        with self._lock:
+            self.rebuilds += 1
+            if state() != current:
+                return stats
+            self._entries[key] = (current, stats)
+            self._entries.move_to_end(key)
+            while self.max_datasets is not None and len(self._entries) > self.max_datasets:
+                self._entries.popitem(last=False)
+        return stats
+
+    def discard(self, key):
+        """Forget a dataset's stats"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def record(self, key, before, after, records):
+        """Fold (category, entry) records written between two states; returns whether it could"""
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached[0] != before:
+                return False
+            for category, entry in records:
+                cached[1].add(category, entry)
+            self._entries[key] = (after, cached[1])
+            self.updates += 1
+            return True
+
+    def stats(self):
+        """Return cache counters as a dict"""
+        with self._lock:
+            return {'datasets': len(self._entries), 'rebuilds': self.rebuilds, 'updates': self.updates}
@@ -0,0 +1,718 @@
+"""
+Storage engines for ACEest Fitness workout data
+Provides an in-memory backend and a shared SQLite (WAL mode) backend
+"""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from array import array
+from contextlib import contextmanager
+
+from aceest.aggregates import RunningTotals, to_tenths
+from aceest.calendar_index import DayIndex, to_ordinal
+from aceest.columnar import ColumnarWorkouts, day_to_date
+
+CATEGORIES = ("Warm-up", "Workout", "Cool-down")
+
+
+def empty_workouts():
+    """Return a fresh category -> entries mapping"""
+    return {category: [] for category in CATEGORIES}
+
+
+class WorkoutStore:
+    """Interface shared by all storage engines"""
+
+    # Whether a member's data outlives its store object, i.e. for_member()
+    # returns it again after the store is dropped (e.g. evicted from a cache)
+    durable = False
+
+    def add_workout(self, category, entry, day_iso):
+        """Persist a workout entry for the given category and day"""
+        raise NotImplementedError
+
+    def add_workouts(self, items):
+        """Persist many (category, entry, day_iso) items as one atomic write
+
+        Engines override this to apply the whole batch in one transaction;
+        this fallback simply adds the items one by one.
+        """
+        return [self.add_workout(category, entry, day_iso) for category, entry, day_iso in items]
+
+    def get_workouts(self):
+        """Return all entries as a category -> list of entries mapping"""
+        raise NotImplementedError
+
+    def get_daily_workouts(self):
+        """Return entries grouped as day_iso -> category -> entries"""
+        raise NotImplementedError
+
+    def get_user_info(self):
+        """Return the saved user profile (empty dict when not set)"""
+        raise NotImplementedError
+
+    def save_user_info(self, info):
+        """Save the user profile and return the stored copy"""
+        raise NotImplementedError
+
+    def iter_records(self, start=None, end=None, categories=None):
+        """Yield (category, day_iso, entry) tuples in per-category insertion order
+
+        ``start``/``end`` (dates or ISO strings, inclusive) and ``categories``
+        restrict the records yielded; engines apply them before building
+        any entry.
+        """
+        first = to_ordinal(start) if start is not None else None
+        last = to_ordinal(end) if end is not None else None
+        for day_iso, day_categories in self.get_daily_workouts().items():
+            ordinal = to_ordinal(day_iso)
+            if (first is not None and ordinal < first) or (last is not None and ordinal > last):
+                continue
+            for category, sessions in day_categories.items():
+                if categories is None or category in categories:
+                    for entry in sessions:
+                        yield category, day_iso, entry
+
+    def page_workouts(self, category, limit, before=None):
+        """Return up to ``limit`` entries of a category, newest first
+
+        Every entry has a stable position that increases in insertion order.
+        Only entries positioned before ``before`` are returned. The second
+        item is the position to pass as ``before`` for the next page, or
+        None when no older entries remain.
+        """
+        sessions = self.get_workouts().get(category, [])
+        end = len(sessions) if before is None else min(before, len(sessions))
+        start = max(0, end - limit)
+        return [dict(entry) for entry in reversed(sessions[start:end])], (start or None)
+
+    def get_category_totals(self):
+        """Return per-category time and calorie totals"""
+        totals = RunningTotals()
+        totals.rebuild(self.get_workouts())
+        return totals.category_totals()
+
+    def get_range_totals(self, start, end):
+        """Return per-category totals for entries logged between two days (inclusive)"""
+        first, last = to_ordinal(start), to_ordinal(end)
+        totals = RunningTotals(CATEGORIES)
+        for day_iso, categories in self.get_daily_workouts().items():
+            if first <= to_ordinal(day_iso) <= last:
+                for category, sessions in categories.items():
+                    for entry in sessions:
+                        totals.add(category, entry['duration'], entry.get('calories', 0))
+        return totals.category_totals()
+
+    def get_daily_totals(self, start=None, end=None, categories=None):
+        """Return [(day_iso, time, calories)] for days with entries, in day order
+
+        Totals are summed over ``categories`` (default all) for the days
+        start..end (dates or ISO strings, inclusive). Engines answer this
+        from their per-day rollups rather than the entries.
+        """
+        days = {}
+        for _category, day_iso, entry in self.iter_records(start, end, categories):
+            totals = days.setdefault(day_iso, [0, 0])
+            totals[0] += entry['duration']
+            totals[1] += to_tenths(entry.get('calories', 0))
+        return [(day_iso, time_total, tenths / 10) for day_iso, (time_total, tenths) in sorted(days.items())]
+
+    def exercise_counts(self):
+        """Return {exercise name: number of entries logged with it}"""
+        counts = {}
+        for _category, _day, entry in self.iter_records():
+            counts[entry['exercise']] = counts.get(entry['exercise'], 0) + 1
+        return counts
+
+    def rebuild_totals(self):
+        """Recompute any maintained totals from the stored entries"""
+
+    def verify_totals(self):
+        """Compare the served totals against a full scan; returns mismatches"""
+        scanned = RunningTotals()
+        scanned.rebuild(self.get_workouts())
+        served = self.get_category_totals()
+        return [
+            {'category': category, 'running': served.get(category), 'scanned': totals}
+            for category, totals in scanned.category_totals().items()
+            if served.get(category) != totals
+        ]
+
+    def data_version(self):
+        """Return a counter that increases with every write to this store
+
+        Together with ``store_id`` (which names the dataset the counter
+        belongs to) it identifies the state of the data, e.g. for ETags.
+        """
+        raise NotImplementedError
+
+    def category_versions(self):
+        """Return a token per category that changes whenever its entries do
+
+        Entries are append-only, so stores that know their per-category
+        counts use them; the fallback changes every category on any write.
+        """
+        return dict.fromkeys(CATEGORIES, self.data_version())
+
+    def category_counts(self):
+        """Return {category: number of entries} (e.g. for metrics)"""
+        return {category: len(sessions) for category, sessions in self.get_workouts().items()}
+
+    def for_member(self, member):
+        """Return a store of the same kind scoped to another member"""
+        raise NotImplementedError
+
+    def has_member(self, member):
+        """Check whether another member has data for_member() would load"""
+        return False
+
+    def settings_path(self, name):
+        """Path of a settings file kept with the data, None when the data is not kept in files"""
+        return None
+
+    def has_category(self, category):
+        """Check whether the category is accepted by this store"""
+        return category in CATEGORIES
+
+    def close(self):
+        """Release any resources held by the store"""
+
+
+class MemoryStore(WorkoutStore):
+    """Process-local store keeping entries in typed, per-field columns"""
+
+    def __init__(self, workouts=None, daily_workouts=None, user_info=None):
+        # Shared by reference so an application can expose them as module state
+        self.workouts = workouts if workouts is not None else ColumnarWorkouts(CATEGORIES)
+        # day_iso -> category -> row indices into self.workouts[category]
+        self.daily_workouts = daily_workouts if daily_workouts is not None else {}
+        self.user_info = user_info if user_info is not None else {}
+        self.totals = RunningTotals(self.workouts.keys())
+        self.day_index = DayIndex(self.workouts.keys())
+        self._lock = threading.Lock()
+        # Process-local data: a fresh id per instance keeps versions from
+        # different workers or restarts from ever being confused
+        self.store_id = uuid.uuid4().hex
+        self._version = 0
+        self.rebuild_totals()
+
+    def for_member(self, member):
+        store = MemoryStore()
+        store.member = member
+        # Stable within the process, so an empty member store dropped and
+        # created again keeps its ETags and event topic
+        store.store_id = '%s:%s' % (self.store_id, member.encode('utf-8').hex())
+        return store
+
+    def _append(self, category, entry, day_iso):
+        row = self.workouts[category].append(entry, day_iso)
+        self.totals.add(category, entry['duration'], entry.get('calories', 0))
+        self.day_index.add(day_iso, category, entry['duration'], entry.get('calories', 0))
+        day = self.daily_workouts.get(day_iso)
+        if day is None:
+            day = self.daily_workouts[day_iso] = {}
+        day.setdefault(category, array('I')).append(row)
+
+    def add_workout(self, category, entry, day_iso):
+        with self._lock:
+            self._append(category, entry, day_iso)
+            self._version += 1
+        return entry
+
+    def add_workouts(self, items):
+        items = list(items)
+        with self._lock:
+            for category, entry, day_iso in items:
+                self._append(category, entry, day_iso)
+            self._version += 1
+        return [entry for _category, entry, _day_iso in items]
+
+    def data_version(self):
+        return self._version
+
+    def category_versions(self):
+        # The serial catches a category replaced wholesale with as many entries
+        return {category: (columns.serial, len(columns)) for category, columns in self.workouts.items()}
+
+    def category_counts(self):
+        return {category: len(columns) for category, columns in self.workouts.items()}
+
+    def get_workouts(self):
+        return self.workouts.to_dicts()
+
+    def get_daily_workouts(self):
+        result = {}
+        for day_iso, categories in self.daily_workouts.items():
+            result[day_iso] = empty_workouts()
+            for category, rows in categories.items():
+                columns = self.workouts[category]
+                result[day_iso][category] = [columns[row].to_dict() for row in rows]
+        return result
+
+    def get_user_info(self):
+        return self.user_info
+
+    def save_user_info(self, info):
+        with self._lock:
+            self.user_info.update(info)
+            self._version += 1
+        return self.user_info
+
+    def page_workouts(self, category, limit, before=None):
+        columns = self.workouts[category]
+        end = len(columns) if before is None else min(before, len(columns))
+        start = max(0, end - limit)
+        return [columns[row].to_dict() for row in range(end - 1, start - 1, -1)], (start or None)
+
+    def iter_records(self, start=None, end=None, categories=None):
+        if start is None and end is None:
+            for category, columns in self.workouts.items():
+                if categories is None or category in categories:
+                    for entry in columns:
+                        yield category, entry.day, entry.to_dict()
+            return
+        # Date filters go through the daily index, so only matching days are visited
+        first = to_ordinal(start) if start is not None else None
+        last = to_ordinal(end) if end is not None else None
+        for day_iso, day_categories in list(self.daily_workouts.items()):
+            ordinal = to_ordinal(day_iso)
+            if (first is not None and ordinal < first) or (last is not None and ordinal > last):
+                continue
+            for category, rows in list(day_categories.items()):
+                if categories is None or category in categories:
+                    columns = self.workouts[category]
+                    for row in rows:
+                        yield category, day_iso, columns[row].to_dict()
+
+    def _check_totals(self):
+        # Categories replaced wholesale (e.g. workouts['Workout'] = []) bypass
+        # add_workout; a count check per category catches that cheaply
+        if any(self.totals.count(category) != len(columns)
+               for category, columns in self.workouts.items()):
+            self.rebuild_totals()
+
+    def get_category_totals(self):
+        self._check_totals()
+        return self.totals.category_totals()
+
+    def get_range_totals(self, start, end):
+        self._check_totals()
+        return self.day_index.range_totals(start, end)
+
+    def get_daily_totals(self, start=None, end=None, categories=None):
+        self._check_totals()
+        return [(day_to_date(ordinal).isoformat(), minutes, tenths / 10)
+                for ordinal, minutes, tenths in self.day_index.daily_totals(start, end, categories)]
+
+    def rebuild_totals(self):
+        with self._lock:
+            # Reached when entries were replaced outside add_workout
+            self._version += 1
+            self.totals.rebuild(self.workouts)
+            self.day_index.clear()
+            for category, columns in self.workouts.items():
+                for day, duration, tenths in zip(columns.days, columns.durations, columns.calorie_tenths):
+                    self.day_index.add(day_to_date(day), category, duration, tenths / 10)
+
+    def has_category(self, category):
+        return category in self.workouts
+
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS workouts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        member TEXT NOT NULL DEFAULT '',
+        category TEXT NOT NULL,
+        exercise TEXT NOT NULL,
+        duration INTEGER NOT NULL,
+        calories REAL NOT NULL,
+        timestamp TEXT NOT NULL,
+        day TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_workouts_member_day ON workouts (member, day)",
+    # rowid is implicitly the last index column, so pages walk id order
+    "CREATE INDEX IF NOT EXISTS idx_workouts_member_category ON workouts (member, category)",
+    """CREATE TABLE IF NOT EXISTS category_totals (
+        member TEXT NOT NULL,
+        category TEXT NOT NULL,
+        sessions INTEGER NOT NULL,
+        time INTEGER NOT NULL,
+        calories_tenths INTEGER NOT NULL,
+        PRIMARY KEY (member, category)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS daily_totals (
+        member TEXT NOT NULL,
+        day TEXT NOT NULL,
+        category TEXT NOT NULL,
+        time INTEGER NOT NULL,
+        calories_tenths INTEGER NOT NULL,
+        PRIMARY KEY (member, day, category)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS members (
+        member TEXT PRIMARY KEY,
+        data TEXT NOT NULL
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS member_versions (
+        member TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    ) WITHOUT ROWID""",
+)
+
+# Statements are kept as constants so sqlite3's per-connection statement
+# cache reuses the compiled (prepared) form on every call
+_INSERT_WORKOUT = ("INSERT INTO workouts (member, category, exercise, duration, calories, timestamp, day) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?)")
+_SELECT_WORKOUTS_FROM = ("SELECT category, exercise, duration, calories, timestamp, day FROM workouts "
+                         "WHERE member = ?")
+_SELECT_WORKOUTS = _SELECT_WORKOUTS_FROM + " ORDER BY id"
+_SELECT_PAGE = ("SELECT id, exercise, duration, calories, timestamp FROM workouts "
+                "WHERE member = ? AND category = ? AND id < ? ORDER BY id DESC LIMIT ?")
+_UPDATE_TOTALS = ("INSERT INTO category_totals (member, category, sessions, time, calories_tenths) "
+                  "VALUES (?, ?, ?, ?, ?) ON CONFLICT (member, category) DO UPDATE SET "
+                  "sessions = sessions + excluded.sessions, time = time + excluded.time, "
+                  "calories_tenths = calories_tenths + excluded.calories_tenths")
+_SELECT_TOTALS = "SELECT category, sessions, time, calories_tenths FROM category_totals WHERE member = ?"
+_SELECT_SESSIONS = "SELECT category, sessions FROM category_totals WHERE member = ?"
+_UPDATE_DAILY_TOTALS = ("INSERT INTO daily_totals (member, day, category, time, calories_tenths) "
+                        "VALUES (?, ?, ?, ?, ?) ON CONFLICT (member, day, category) DO UPDATE SET "
+                        "time = time + excluded.time, "
+                        "calories_tenths = calories_tenths + excluded.calories_tenths")
+_SELECT_RANGE_TOTALS = ("SELECT category, SUM(time), SUM(calories_tenths) FROM daily_totals "
+                        "WHERE member = ? AND day BETWEEN ? AND ? GROUP BY category")
+_SELECT_EXERCISE_COUNTS = "SELECT exercise, COUNT(*) FROM workouts WHERE member = ? GROUP BY exercise"
+_SELECT_DAILY_TOTALS = ("SELECT day, category, time, calories_tenths FROM daily_totals "
+                        "WHERE member = ? AND day BETWEEN ? AND ? ORDER BY day")
+_REBUILD_TOTALS = ("INSERT INTO category_totals (member, category, sessions, time, calories_tenths) "
+                   "SELECT member, category, COUNT(*), SUM(duration), "
+                   "SUM(CAST(ROUND(calories * 10) AS INTEGER)) "
+                   "FROM workouts WHERE member = ? GROUP BY category")
+_REBUILD_DAILY_TOTALS = ("INSERT INTO daily_totals (member, day, category, time, calories_tenths) "
+                         "SELECT member, day, category, SUM(duration), "
+                         "SUM(CAST(ROUND(calories * 10) AS INTEGER)) "
+                         "FROM workouts WHERE member = ? GROUP BY day, category")
+_BUMP_VERSION = ("INSERT INTO member_versions (member, version) VALUES (?, 1) "
+                 "ON CONFLICT (member) DO UPDATE SET version = version + 1")
+_SELECT_VERSION = "SELECT version FROM member_versions WHERE member = ?"
+_SELECT_USER = "SELECT data FROM members WHERE member = ?"
+_UPSERT_USER = ("INSERT INTO members (member, data) VALUES (?, ?) "
+                "ON CONFLICT (member) DO UPDATE SET data = excluded.data")
+
+
+def _migrate(conn):
+    """Bring databases written by older releases up to the current schema"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(workouts)")]
+    if columns and 'member' not in columns:
+        # Single-user databases: every existing row belongs to the default member
+        conn.execute("ALTER TABLE workouts ADD COLUMN member TEXT NOT NULL DEFAULT ''")
+        conn.execute("DROP INDEX IF EXISTS idx_workouts_day")
+        # Rollups are derived data and are rebuilt with the new key
+        conn.execute("DROP TABLE IF EXISTS category_totals")
+        conn.execute("DROP TABLE IF EXISTS daily_totals")
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    legacy_user = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'user_info'").fetchone()
+    if legacy_user:
+        conn.execute("INSERT OR IGNORE INTO members (member, data) SELECT '', data FROM user_info")
+        conn.execute("DROP TABLE user_info")
+    # Fill rollups that are missing or out of step with the entries
+    stale = conn.execute(
+        "SELECT w.member FROM workouts w GROUP BY w.member "
+        "HAVING COUNT(*) != COALESCE((SELECT SUM(sessions) FROM category_totals t "
+        "WHERE t.member = w.member), 0) "
+        "OR NOT EXISTS (SELECT 1 FROM daily_totals d WHERE d.member = w.member)").fetchall()
+    for (member,) in stale:
+        _rebuild_member_totals(conn, member)
+
+
+def _rebuild_member_totals(conn, member):
+    conn.execute("DELETE FROM category_totals WHERE member = ?", (member,))
+    conn.execute(_REBUILD_TOTALS, (member,))
+    conn.execute("DELETE FROM daily_totals WHERE member = ?", (member,))
+    conn.execute(_REBUILD_DAILY_TOTALS, (member,))
+
+
+class ConnectionPool:
+    """Per-worker pool handing each thread its own SQLite connection
+
+    Connections are never shared across a fork: a pool used from a new
+    process id drops the inherited handles and opens fresh ones.
+    """
+
+    def __init__(self, path, timeout=5.0, cached_statements=64):
+        self.path = path
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout,
+                               cached_statements=self.cached_statements,
+                               check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is durable across application crashes in WAL mode and keeps
+        # commits off the fsync path, which is what holds writes under 1 ms
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return conn
+
+    def connection(self):
+        """Return the connection owned by the calling thread"""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _reset_after_fork(self):
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Close every connection opened by this process"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+class SQLiteStore(WorkoutStore):
+    """Store shared by all workers through one SQLite database in WAL mode
+
+    Each instance is scoped to one member; instances created with
+    for_member() share the connection pool of the store they came from.
+    """
+
+    def __init__(self, path, member='', pool=None):
+        self.path = path
+        self.member = member
+        self.store_id = 'sqlite:' + os.path.abspath(path)
+        self._owns_pool = pool is None
+        self.pool = pool if pool is not None else ConnectionPool(path)
+        if self._owns_pool:
+            with self._transaction() as conn:
+                _migrate(conn)
+
+    durable = True
+
+    def for_member(self, member):
+        """Return a store for another member sharing this store's pool"""
+        return SQLiteStore(self.path, member=member, pool=self.pool)
+
+    def has_member(self, member):
+        # Every write bumps the member's version
+        return self.pool.connection().execute(_SELECT_VERSION, (member,)).fetchone() is not None
+
+    def settings_path(self, name):
+        return '%s.%s' % (self.path, name)
+
+    @contextmanager
+    def _transaction(self):
+        conn = self.pool.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def add_workout(self, category, entry, day_iso):
+        with self._transaction() as conn:
+            conn.execute(_INSERT_WORKOUT, (
+                self.member, category, entry['exercise'], entry['duration'],
+                entry['calories'], entry['timestamp'], day_iso
+            ))
+            tenths = to_tenths(entry['calories'])
+            conn.execute(_UPDATE_TOTALS, (self.member, category, 1, entry['duration'], tenths))
+            conn.execute(_UPDATE_DAILY_TOTALS, (self.member, day_iso, category, entry['duration'], tenths))
+            conn.execute(_BUMP_VERSION, (self.member,))
+        return entry
+
+    def add_workouts(self, items):
+        items = list(items)
+        # Roll the batch up first so each total row is updated once
+        totals = {}
+        daily = {}
+        for category, entry, day_iso in items:
+            tenths = to_tenths(entry['calories'])
+            sessions, time_total, tenths_total = totals.get(category, (0, 0, 0))
+            totals[category] = (sessions + 1, time_total + entry['duration'], tenths_total + tenths)
+            time_total, tenths_total = daily.get((day_iso, category), (0, 0))
+            daily[day_iso, category] = (time_total + entry['duration'], tenths_total + tenths)
+        with self._transaction() as conn:
+            conn.executemany(_INSERT_WORKOUT, [
+                (self.member, category, entry['exercise'], entry['duration'],
+                 entry['calories'], entry['timestamp'], day_iso)
+                for category, entry, day_iso in items
+            ])
+            conn.executemany(_UPDATE_TOTALS, [
+                (self.member, category) + values for category, values in totals.items()
+            ])
+            conn.executemany(_UPDATE_DAILY_TOTALS, [
+                (self.member, day_iso, category) + values for (day_iso, category), values in daily.items()
+            ])
+            conn.execute(_BUMP_VERSION, (self.member,))
+        return [entry for _category, entry, _day_iso in items]
+
+    def _rows(self):
+        return self.pool.connection().execute(_SELECT_WORKOUTS, (self.member,))
+
+    def get_workouts(self):
+        result = empty_workouts()
+        for category, exercise, duration, calories, timestamp, _day in self._rows():
+            result.setdefault(category, []).append({
+                'exercise': exercise,
+                'duration': duration,
+                'calories': calories,
+                'timestamp': timestamp
+            })
+        return result
+
+    def get_daily_workouts(self):
+        result = {}
+        for category, exercise, duration, calories, timestamp, day in self._rows():
+            if day not in result:
+                result[day] = empty_workouts()
+            result[day].setdefault(category, []).append({
+                'exercise': exercise,
+                'duration': duration,
+                'calories': calories,
+                'timestamp': timestamp
+            })
+        return result
+
+    def iter_records(self, start=None, end=None, categories=None):
+        if start is None and end is None and categories is None:
+            rows = self._rows()
+        else:
+            # Filters become WHERE clauses answered from the (member, day) index
+            sql = _SELECT_WORKOUTS_FROM
+            params = [self.member]
+            if start is not None:
+                sql += " AND day >= ?"
+                params.append(str(start))
+            if end is not None:
+                sql += " AND day <= ?"
+                params.append(str(end))
+            if categories is not None:
+                sql += " AND category IN (%s)" % ', '.join('?' * len(categories))
+                params.extend(categories)
+            rows = self.pool.connection().execute(sql + " ORDER BY id", params)
+        for category, exercise, duration, calories, timestamp, day in rows:
+            yield category, day, {
+                'exercise': exercise,
+                'duration': duration,
+                'calories': calories,
+                'timestamp': timestamp
+            }
+
+    def page_workouts(self, category, limit, before=None):
+        rows = self.pool.connection().execute(
+            _SELECT_PAGE, (self.member, category, (1 << 63) - 1 if before is None else before, limit + 1)
+        ).fetchall()
+        entries = [
+            {'exercise': exercise, 'duration': duration, 'calories': calories, 'timestamp': timestamp}
+            for _id, exercise, duration, calories, timestamp in rows[:limit]
+        ]
+        return entries, (rows[limit - 1][0] if len(rows) > limit else None)
+
+    def get_category_totals(self):
+        totals = RunningTotals(CATEGORIES)
+        for category, sessions, time_total, tenths in self.pool.connection().execute(
+                _SELECT_TOTALS, (self.member,)):
+            totals.load(category, sessions, time_total, tenths)
+        return totals.category_totals()
+
+    def get_range_totals(self, start, end):
+        totals = RunningTotals(CATEGORIES)
+        rows = self.pool.connection().execute(_SELECT_RANGE_TOTALS, (self.member, str(start), str(end)))
+        for category, time_total, tenths in rows:
+            totals.load(category, 0, time_total, tenths)
+        return totals.category_totals()
+
+    def get_daily_totals(self, start=None, end=None, categories=None):
+        rows = self.pool.connection().execute(_SELECT_DAILY_TOTALS, (
+            self.member, str(start) if start is not None else '', str(end) if end is not None else '9999-12-31'))
+        days = {}
+        for day_iso, category, time_total, tenths in rows:
+            if categories is None or category in categories:
+                totals = days.setdefault(day_iso, [0, 0])
+                totals[0] += time_total
+                totals[1] += tenths
+        return [(day_iso, time_total, tenths / 10) for day_iso, (time_total, tenths) in days.items()]
+
+    def exercise_counts(self):
+        return dict(self.pool.connection().execute(_SELECT_EXERCISE_COUNTS, (self.member,)))
+
+    def rebuild_totals(self):
+        with self._transaction() as conn:
+            _rebuild_member_totals(conn, self.member)
+
+    def data_version(self):
+        row = self.pool.connection().execute(_SELECT_VERSION, (self.member,)).fetchone()
+        return row[0] if row else 0
+
+    def category_versions(self):
+        versions = dict.fromkeys(CATEGORIES, 0)
+        versions.update(self.pool.connection().execute(_SELECT_SESSIONS, (self.member,)))
+        return versions
+
+    def category_counts(self):
+        # The per-category session counts are the versions
+        return self.category_versions()
+
+    def get_user_info(self):
+        row = self.pool.connection().execute(_SELECT_USER, (self.member,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def save_user_info(self, info):
+        with self._transaction() as conn:
+            row = conn.execute(_SELECT_USER, (self.member,)).fetchone()
+            stored = json.loads(row[0]) if row else {}
+            stored.update(info)
+            conn.execute(_UPSERT_USER, (self.member, json.dumps(stored)))
+            conn.execute(_BUMP_VERSION, (self.member,))
+        return stored
+
+    def close(self):
+        if self._owns_pool:
+            self.pool.close()
+
+
+def create_store(url=None, **memory_kwargs):
+    """Create a store from a URL such as ``memory://`` or ``sqlite:///data/aceest.db``
+
+    SQLite URLs follow the usual convention: ``sqlite:///relative.db`` and
+    ``sqlite:////absolute/path.db``; ``mmap:///dir`` works the same way and
+    names the directory of shared-memory files (``/dev/shm/...`` keeps them
+    off disk). Keyword arguments are passed to
+    MemoryStore so an application can keep its module-level state as the
+    in-memory backing state.
+    """
+    if not url or url == 'memory://':
+        return MemoryStore(**memory_kwargs)
+    if url.startswith('sqlite:///'):
+        path = url[len('sqlite:///'):]
+        if not path:
+            raise ValueError("SQLite storage URL needs a database path")
+        return SQLiteStore(path)
+    if url.startswith('mmap:///'):
+        path = url[len('mmap:///'):]
+        if not path:
+            raise ValueError("Shared-memory storage URL needs a directory")
+        from aceest.shm import SharedMemoryStore
+        return SharedMemoryStore(path)
+    raise ValueError(f"Unsupported storage URL: {url}")
@@ -0,0 +1,136 @@
+"""
+Exercise name autocomplete
+Sorted-array prefix index with frequency ranking, updated on every insert
+"""
+import bisect
+import heapq
+import threading
+
+DEFAULT_LIMIT = 10
+# Largest limit a suggestion request may ask for (the size of the top lists)
+MAX_LIMIT = 20
+# Prefixes up to this length keep a ready top list; they match too many
+# names to rank at request time
+TOP_PREFIX_LENGTH = 3
+# Longer prefixes get a top list once they match more names than this;
+# smaller ranges are ranked at request time
+SCAN_LIMIT = 256
+
+
+def normalize_name(name):
+    """Matching key of an exercise name: case-folded, single-spaced"""
+    return ' '.join(name.split()).casefold()
+
+
+def plan_exercise_names(plans):
+    """Exercise names in a plan catalog, e.g. 'Push-ups' from 'Push-ups (3 sets of 10-15) - ...'"""
+    names = []
+    for items in plans.values():
+        for item in items:
+            name = item.split(' (', 1)[0].split(' - ', 1)[0].strip().rstrip('.')
+            if name:
+                names.append(name)
+    return names
+
+
+class ExerciseIndex:
+    """Ranks exercise names matching a typed prefix, most logged first
+
+    Keys are kept in one sorted list, so the names under any prefix are a
+    contiguous slice found by bisection. Prefixes matching too many names
+    to rank on every keystroke (all short ones, and longer ones once a new
+    name takes them past SCAN_LIMIT matches) get an exact top list that is
+    maintained as counts change. Counts only ever grow, so a name can only
+    enter a top list when its own count changes, and an insert only
+    touches the top lists of its own prefixes. Readers never take the
+    lock: the lists they read are replaced, not modified.
+    """
+
+    def __init__(self, names=()):
+        self._keys = []
+        self._counts = {}
+        self._display = {}
+        self._canonical = set()
+        self._top = {}
+        self._lock = threading.Lock()
+        for name in names:
+            self.add(name, count=0, canonical=True)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _rank(self, key):
+        return -self._counts[key], key
+
+    def add(self, name, count=1, canonical=False):
+        """Count ``count`` more uses of a name; canonical names (e.g. plans) keep their spelling"""
+        key = normalize_name(name)
+        if not key:
+            return
+        with self._lock:
+            if key not in self._counts:
+                # Count and spelling first: readers may find the key as soon as it is listed
+                self._counts[key] = 0
+                self._display[key] = ' '.join(name.split())
+                bisect.insort(self._keys, key)
+                self._promote(key)
+            if canonical and key not in self._canonical:
+                self._canonical.add(key)
+                self._display[key] = ' '.join(name.split())
+            self._counts[key] += count
+            rank = self._rank(key)
+            for length in range(len(key) + 1):
+                prefix = key[:length]
+                if length > TOP_PREFIX_LENGTH and prefix not in self._top:
+                    # Longer prefixes only get a top list after this one (see _promote)
+                    break
+                top = self._top.get(prefix, ())
+                if key in top:
+                    top = sorted(top, key=self._rank)
+                elif len(top) < MAX_LIMIT:
+                    top = sorted(top + (key,), key=self._rank)
+                elif rank < self._rank(top[-1]):
+                    top = sorted(top[:-1] + (key,), key=self._rank)
+                else:
+                    continue
+                self._top[prefix] = tuple(top)
+
+    def add_counts(self, counts):
+        """Fold in a name -> count mapping (e.g. a store's logged exercises)"""
+        for name, count in counts.items():
+            self.add(name, count)
+
+    def _range(self, key):
+        keys = self._keys
+        low = bisect.bisect_left(keys, key)
+        return low, bisect.bisect_left(keys, key[:-1] + chr(ord(key[-1]) + 1), low)
+
+    def _promote(self, key):
+        # A new key only grows the ranges of its own prefixes; those past
+        # SCAN_LIMIT get a top list. Longer prefixes match subsets, so the
+        # first small range ends the walk.
+        for length in range(TOP_PREFIX_LENGTH + 1, len(key) + 1):
+            prefix = key[:length]
+            if prefix in self._top:
+                continue
+            low, high = self._range(prefix)
+            if high - low <= SCAN_LIMIT:
+                break
+            self._top[prefix] = tuple(heapq.nsmallest(MAX_LIMIT, self._keys[low:high], key=self._rank))
+
+    def suggest(self, prefix, limit=DEFAULT_LIMIT):
+        """Up to ``limit`` {'name', 'count'} matches of a prefix, most logged first"""
+        key = normalize_name(prefix)
+        # A trailing space is part of what was typed ("push " should not match "pushdown")
+        if prefix[-1:].isspace() and key:
+            key += ' '
+        limit = min(limit, MAX_LIMIT)
+        matches = self._top.get(key)
+        if matches is None:
+            if len(key) <= TOP_PREFIX_LENGTH:
+                return []
+            low, high = self._range(key)
+            matches = self._keys[low:high]
+        counts = self._counts
+        ranked = heapq.nsmallest(limit, matches, key=lambda match: (-counts[match], match))
+        return [{'name': self._display[match], 'count': counts[match]} for match in ranked]
@@ -0,0 +1,118 @@
+"""
+Multi-member tenancy for ACEest Fitness
+Per-member stores keyed by regn_id, sharded across lock-striped partitions
+"""
+import itertools
+import threading
+import zlib
+
+DEFAULT_MEMBER = ''
+MAX_MEMBER_ID_LENGTH = 64
+
+
+class InvalidMemberId(ValueError):
+    """Raised when a regn_id cannot be used as a member key"""
+
+
+def normalize_member_id(member_id):
+    """Validate and normalize a regn_id used as a member key"""
+    if member_id is None:
+        return DEFAULT_MEMBER
+    if not isinstance(member_id, str):
+        raise InvalidMemberId('regn_id must be a string')
+    member_id = member_id.strip()
+    if len(member_id) > MAX_MEMBER_ID_LENGTH:
+        raise InvalidMemberId(f'regn_id must be at most {MAX_MEMBER_ID_LENGTH} characters')
+    return member_id
+
+
+class MemberRegistry:
+    """Maps member ids to their stores across N independently locked shards
+
+    Lookups of existing members are a lock-free dict read. Only the first
+    request for a member takes its shard's lock to create the store, so
+    writers for different members never contend on the registry; each
+    member store has its own lock for its data.
+
+    With ``max_members`` each shard holds about max_members / shards
+    stores: loading one more evicts the shard's least recently used store
+    that ``evictable(store)`` allows (all by default). Evicted stores are
+    not closed, since requests may still be using them; they release their
+    resources once collected. Stores registered with add() are never
+    evicted. ``on_evict(member_id, store)``, when set, is called for each
+    eviction so per-member caches can be bounded together with the registry.
+    """
+
+    def __init__(self, factory, shards=64, max_members=None, evictable=None, on_evict=None):
+        if shards <= 0:
+            raise ValueError('shards must be positive')
+        if max_members is not None and max_members <= 0:
+            raise ValueError('max_members must be positive')
+        self.factory = factory
+        self.evictable = evictable or (lambda store: True)
+        self.on_evict = on_evict
+        self._shard_capacity = None if max_members is None else -(-max_members // shards)
+        # member_id -> [store, last use]; the use ticks order evictions
+        self._shards = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._pinned = set()
+        self._clock = itertools.count()
+        self.evictions = 0
+
+    def _shard_index(self, member_id):
+        # crc32 rather than hash() so shard placement is stable across workers
+        return zlib.crc32(member_id.encode('utf-8')) % len(self._shards)
+
+    def get(self, member_id, create=True):
+        """Return the store for a member, creating it on first use
+
+        With ``create=False`` a member without a store gets None instead.
+        """
+        index = self._shard_index(member_id)
+        shard = self._shards[index]
+        slot = shard.get(member_id)
+        if slot is None:
+            if not create:
+                return None
+            with self._locks[index]:
+                slot = shard.get(member_id)
+                if slot is None:
+                    slot = [self.factory(member_id), 0]
+                    self._evict(shard)
+                    shard[member_id] = slot
+        slot[1] = next(self._clock)
+        return slot[0]
+
+    def _evict(self, shard):
+        # Called under the shard's lock before adding one store to it
+        if self._shard_capacity is None or len(shard) < self._shard_capacity:
+            return
+        candidates = [(used, member_id) for member_id, (store, used) in list(shard.items())
+                      if member_id not in self._pinned and self.evictable(store)]
+        if candidates:
+            member_id = min(candidates)[1]
+            store = shard.pop(member_id)[0]
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(member_id, store)
+
+    def add(self, member_id, store):
+        """Register an existing store for a member; it is never evicted"""
+        index = self._shard_index(member_id)
+        with self._locks[index]:
+            self._pinned.add(member_id)
+            self._shards[index][member_id] = [store, next(self._clock)]
+
+    def __contains__(self, member_id):
+        return member_id in self._shards[self._shard_index(member_id)]
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+    def members(self):
+        """Return the ids of all members with a store in this process"""
+        return [member_id for shard in self._shards for member_id in list(shard)]
+
+    def shard_sizes(self):
+        """Number of members per shard (for balance checks)"""
+        return [len(shard) for shard in self._shards]
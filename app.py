@@ -7,9 +7,14 @@ from datetime import datetime
 import json
 import os
 
+from aceest.instrumentation import instrument_app
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
+# Gzip, ADMIN_TOKEN profiling and /metrics (see aceest.instrumentation)
+metrics = instrument_app(app)
+
 # In-memory storage (in production, use a database)
 workouts = {
     "Warm-up": [],
@@ -17,6 +22,15 @@ workouts = {
     "Cool-down": []
 }
 
+# Entries per category at /metrics, next to the request and gzip series
+metrics.describe('aceest_workout_entries', 'gauge', 'Logged entries per category')
+
+@metrics.collector
+def workout_entries():
+    """Entries per category held by this worker"""
+    return [('aceest_workout_entries', {'category': category}, len(sessions))
+            for category, sessions in workouts.items()]
+
 @app.route('/')
 def index():
     """Home page - Display workout logging interface"""
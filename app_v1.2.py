@@ -7,15 +7,30 @@ from datetime import datetime
 import json
 import os
 
+from aceest.catalog import PrecompressedJSON, load_catalogs
+from aceest.instrumentation import instrument_app
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
+# Gzip, ADMIN_TOKEN profiling and /metrics (see aceest.instrumentation)
+metrics = instrument_app(app)
+
 workouts = {
     "Warm-up": [],
     "Workout": [],
     "Cool-down": []
 }
 
+# Entries per category at /metrics, next to the request and gzip series
+metrics.describe('aceest_workout_entries', 'gauge', 'Logged entries per category')
+
+@metrics.collector
+def workout_entries():
+    """Entries per category held by this worker"""
+    return [('aceest_workout_entries', {'category': category}, len(sessions))
+            for category, sessions in workouts.items()]
+
 # Workout plan data
 WORKOUT_PLANS = {
     "Warm-up (5-10 min)": [
@@ -65,6 +80,21 @@ DIET_PLANS = {
     ]
 }
 
+def reload_catalogs():
+    """Load the plan catalogs and encode them once for serving
+    
+    PLANS_FILE may point to a JSON data file with workout_plans and
+    diet_plans that replaces the built-in plans. Call again after changing
+    the file to pick up new plans.
+    """
+    global WORKOUT_PLANS, DIET_PLANS, WORKOUT_PLANS_PAYLOAD, DIET_PLANS_PAYLOAD
+    if os.environ.get('PLANS_FILE'):
+        WORKOUT_PLANS, DIET_PLANS = load_catalogs(os.environ['PLANS_FILE'])
+    WORKOUT_PLANS_PAYLOAD = PrecompressedJSON(WORKOUT_PLANS)
+    DIET_PLANS_PAYLOAD = PrecompressedJSON(DIET_PLANS)
+
+reload_catalogs()
+
 @app.route('/')
 def index():
     """Home page with multiple tabs"""
@@ -129,12 +159,12 @@ def get_summary():
 @app.route('/api/workout-plans', methods=['GET'])
 def get_workout_plans():
     """API endpoint to get workout plans"""
-    return jsonify(WORKOUT_PLANS)
+    return WORKOUT_PLANS_PAYLOAD.serve(request, app.response_class)
 
 @app.route('/api/diet-plans', methods=['GET'])
 def get_diet_plans():
     """API endpoint to get diet plans"""
-    return jsonify(DIET_PLANS)
+    return DIET_PLANS_PAYLOAD.serve(request, app.response_class)
 
 @app.route('/summary')
 def summary():
@@ -2,25 +2,146 @@
 ACEest Fitness & Gym - Flask Web Application
 Version 1.3 - Advanced features with Progress Tracking, User Info, and Calorie Calculation
 """
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
-from datetime import datetime, date
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash
+from datetime import datetime, date, timedelta
+from functools import wraps
+import hashlib
+import itertools
 import json
 import os
 
+from markupsafe import Markup
+
+from aceest.aggregates import RunningTotals, to_tenths
+from aceest.calendar_index import bucket_bounds
+from aceest.calories import CalorieModel, MetTable, record_weight
+from aceest.catalog import PrecompressedJSON, load_catalogs
+from aceest.columnar import ColumnarWorkouts, timestamp_to_epoch
+from aceest.downsample import METHODS as DOWNSAMPLE_METHODS, downsample
+from aceest.events import BrokerFull, EventBroker, format_event
+from aceest.export import EXPORT_FORMATS, export_records
+from aceest.journal import JournaledStore, WorkoutJournal
+from aceest.json_provider import FastJSONProvider
+from aceest.instrumentation import instrument_app
+from aceest.pagination import (PAGE_PARAMS, decode_cursor, encode_cursor, parse_fields,
+                               parse_limit, select_fields)
+from aceest.ratelimit import LocalTable, RateLimiter, SharedTable, parse_budgets
+from aceest.render_cache import RenderCache
+from aceest.sketches import StatsCache, WorkoutStats
+from aceest.storage import CATEGORIES, MemoryStore, create_store
+from aceest.suggest import DEFAULT_LIMIT as DEFAULT_SUGGESTIONS, MAX_LIMIT as MAX_SUGGESTIONS, \
+    ExerciseIndex, plan_exercise_names
+from aceest.tenancy import DEFAULT_MEMBER, InvalidMemberId, MemberRegistry, normalize_member_id
+from aceest.vectorized import bmi_batch, bmr_batch, calories_batch
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
-workouts = {
-    "Warm-up": [],
-    "Workout": [],
-    "Cool-down": []
-}
+# orjson-backed JSON encoding when installed, stdlib otherwise
+app.json = FastJSONProvider(app)
 
-daily_workouts = {}  # key=date_iso, value={category:[entries]}
+# Gzip, ADMIN_TOKEN profiling and /metrics (see aceest.instrumentation)
+metrics = instrument_app(app)
+
+# Entries are kept column by column (typed arrays) rather than as dicts
+workouts = ColumnarWorkouts(["Warm-up", "Workout", "Cool-down"])
+
+daily_workouts = {}  # key=date_iso, value={category: row indices into workouts}
 
 # User information storage
 user_info = {}
 
+# Storage engine; the default in-memory backend keeps using the state above,
+# while e.g. STORAGE_URL=sqlite:////data/aceest.db shares one dataset
+# between all gunicorn workers and survives restarts
+store = create_store(os.environ.get('STORAGE_URL', 'memory://'),
+                     workouts=workouts, daily_workouts=daily_workouts,
+                     user_info=user_info)
+
+# Optional durability mode: JOURNAL_DIR journals every accepted write and
+# keeps compacted snapshots, so a restart replays only the journal tail.
+# Durable engines keep their data already; journaling them would replay
+# the tail on top of it at every restart
+if os.environ.get('JOURNAL_DIR'):
+    if store.durable:
+        raise ValueError(f"JOURNAL_DIR only applies to the memory:// store; "
+                         f"{os.environ['STORAGE_URL']} is durable on its own, unset JOURNAL_DIR")
+    store = JournaledStore(
+        store,
+        WorkoutJournal(os.environ['JOURNAL_DIR'],
+                       durable=os.environ.get('JOURNAL_FSYNC', 'group') != 'async'),
+        snapshot_every=int(os.environ.get('JOURNAL_SNAPSHOT_EVERY', 10000)))
+
+# Exercise names for /api/exercises/suggest: the plan names plus the names
+# logged in every member store this process loads, counted as they are written
+exercise_index = ExerciseIndex()
+
+# Members whose logged exercises are in the index (stores may be evicted and loaded again)
+indexed_members = set()
+
+def load_member(member):
+    """Open a member's store and index the exercises it has logged"""
+    member_store = store.for_member(member)
+    if member not in indexed_members:
+        indexed_members.add(member)
+        exercise_index.add_counts(member_store.exercise_counts())
+    return member_store
+
+def member_evictable(member_store):
+    """Whether dropping a member's store loses nothing: its data is durable, or it has none"""
+    return member_store.durable or not (member_store.get_user_info() or any(member_store.category_counts().values()))
+
+# Per-member stores keyed by regn_id. Requests scoped with ?regn_id= or an
+# X-Regn-Id header get their own store; unscoped requests use the default
+# member backed by the state above. At most about MEMBER_CACHE_SIZE stores
+# are kept open; the least recently used evictable one makes room. Only
+# durable engines (sqlite, mmap) free a member's data that way: with
+# memory://, journaled or not, the data is held in process memory, so the
+# cap only applies to members without data and memory grows with the rest
+members = MemberRegistry(load_member, shards=int(os.environ.get('MEMBER_SHARDS', 64)),
+                         max_members=int(os.environ.get('MEMBER_CACHE_SIZE', 256)),
+                         evictable=member_evictable)
+members.add(DEFAULT_MEMBER, store)
+
+# What reads of a member without any data see; never written to
+EMPTY_STORE = MemoryStore()
+EMPTY_STORE.store_id = 'empty'
+exercise_index.add_counts(store.exercise_counts())
+
+# Rendered pages and summary cards, keyed by template and data version
+# (RENDER_CACHE_SIZE fragments at most); counters via render_cache.stats()
+render_cache = RenderCache(int(os.environ.get('RENDER_CACHE_SIZE', 256)))
+
+# Live updates for /api/stream: writes are fanned out to this process's
+# subscribers, each with a bounded queue of SSE_QUEUE_SIZE events
+broker = EventBroker(int(os.environ.get('SSE_QUEUE_SIZE', 64)),
+                     int(os.environ.get('SSE_MAX_SUBSCRIBERS', 1000)))
+SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT', 15))
+# Whether the home page subscribes to /api/stream. Each open stream holds a
+# sync worker until the worker timeout kills it, so this is off unless
+# LIVE_UPDATES=1; the ASGI entry point, where a stream is a coroutine,
+# turns it on
+LIVE_UPDATES = os.environ.get('LIVE_UPDATES', '0') == '1'
+
+# Duration and calorie sketches per member for /api/stats: writes fold into
+# them, any other change rebuilds them on the next read. Entries are tagged
+# with the member's data version and live as long as the member's store:
+# evictions from the registry drop them, so /api/stats/gym never thrashes
+workout_stats = StatsCache(max_datasets=None)
+
+# Per-client token buckets for the write endpoints (count/period:burst per
+# view); RATE_LIMITS overrides them, e.g. "add_workout=120/min:30;save_user_info=off"
+DEFAULT_RATE_LIMITS = 'add_workout=600/min:120;add_workouts_batch=60/min:20;' \
+                      'save_user_info=60/min:20;record_user_weight=60/min:20'
+# RATE_LIMIT_FILE (e.g. /dev/shm/aceest-ratelimit) shares the buckets between
+# all workers on the host; otherwise each process limits on its own
+rate_limiter = RateLimiter(
+    dict(parse_budgets(DEFAULT_RATE_LIMITS), **parse_budgets(os.environ.get('RATE_LIMITS', ''))),
+    SharedTable(os.environ['RATE_LIMIT_FILE'], int(os.environ.get('RATE_LIMIT_SLOTS', 65536)))
+    if os.environ.get('RATE_LIMIT_FILE') else LocalTable())
+# Proxies in front of the app that append to X-Forwarded-For (e.g. 1 behind an ingress)
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', 0))
+
 # MET Values for calorie calculation
 MET_VALUES = {
     "Warm-up": 3.0,
@@ -28,6 +149,58 @@ MET_VALUES = {
     "Cool-down": 2.5
 }
 
+# The MET values stored calories were computed with. Leave these as they
+# are when correcting MET_VALUES: entries are then re-derived on read with
+# the corrected values instead of being rewritten
+BASELINE_MET_VALUES = {
+    "Warm-up": 3.0,
+    "Workout": 6.0,
+    "Cool-down": 2.5
+}
+
+# Calories served for entries are derived from the member's weight history
+# and the MET table, memoized per (weight version, MET version); counters
+# via calorie_model.stats(). Runtime corrections are saved with the data
+# (next to the database, shared-memory files or journal), so every worker
+# and restart serves the same table; with plain memory:// they are per process
+met_table = MetTable(MET_VALUES, baseline=BASELINE_MET_VALUES, path=store.settings_path('met-values.json'))
+calorie_model = CalorieModel(met_table)
+
+def forget_member(member_id, member_store):
+    """Drop the per-member caches of a store evicted from the registry"""
+    workout_stats.discard(dataset_key(member_store))
+    calorie_model.discard(dataset_key(member_store))
+
+members.on_evict = forget_member
+
+@app.before_request
+def refresh_met_values():
+    """See MET corrections saved by other workers"""
+    met_table.refresh()
+
+# Cache and limiter counters and entries per category at /metrics, next to
+# the request and gzip series
+metrics.export_stats('render_cache', render_cache.stats,
+                     counters=('hits', 'misses', 'evictions'), gauges=('entries', 'size'))
+metrics.export_stats('calorie_memo', calorie_model.stats,
+                     counters=('hits', 'misses', 'invalidations'), gauges=('members',))
+metrics.export_stats('stats_cache', workout_stats.stats, counters=('rebuilds', 'updates'), gauges=('datasets',))
+metrics.export_stats('sse', broker.stats,
+                     counters=('published', 'delivered', 'overflows'), gauges=('subscribers', 'topics'))
+metrics.export_stats('rate_limit', rate_limiter.stats, counters=('allowed', 'limited'))
+metrics.describe('aceest_members_loaded', 'gauge', 'Member stores open in the worker')
+metrics.describe('aceest_workout_entries', 'gauge', 'Logged entries per category of the unscoped dataset')
+metrics.collector(lambda: [('aceest_members_loaded', None, len(members))])
+
+def workout_entries():
+    """Entries per category of the unscoped dataset"""
+    return [('aceest_workout_entries', {'category': category}, count)
+            for category, count in store.category_counts().items()]
+
+# Every worker sees the same shared dataset, so only the scraping worker
+# counts it; in-memory datasets are per worker and summed
+metrics.collector(workout_entries, local=not os.environ.get('STORAGE_URL', 'memory://').startswith('memory:'))
+
 WORKOUT_PLANS = {
     "Warm-up (5-10 min)": [
         "5 min light cardio (Jog/Cycle) to raise heart rate.",
@@ -65,6 +238,25 @@ DIET_PLANS = {
     ]
 }
 
+def reload_catalogs():
+    """Load the plan catalogs and encode them once for serving
+    
+    PLANS_FILE may point to a JSON data file with workout_plans and
+    diet_plans that replaces the built-in plans. Call again after changing
+    the file to pick up new plans.
+    """
+    global WORKOUT_PLANS, DIET_PLANS, WORKOUT_PLANS_PAYLOAD, DIET_PLANS_PAYLOAD
+    if os.environ.get('PLANS_FILE'):
+        WORKOUT_PLANS, DIET_PLANS = load_catalogs(os.environ['PLANS_FILE'])
+    WORKOUT_PLANS_PAYLOAD = PrecompressedJSON(WORKOUT_PLANS)
+    DIET_PLANS_PAYLOAD = PrecompressedJSON(DIET_PLANS)
+    for name in plan_exercise_names(WORKOUT_PLANS):
+        exercise_index.add(name, count=0, canonical=True)
+    # Cached pages may show the old plans
+    render_cache.clear()
+
+reload_catalogs()
+
 def calculate_calories(weight_kg, met, duration_min):
     """Calculate calories burned using MET formula"""
     return (met * 3.5 * weight_kg / 200) * duration_min
@@ -80,17 +272,188 @@ def calculate_bmr(weight_kg, height_cm, age, gender):
     else:
         return 10 * weight_kg + 6.25 * height_cm - 5 * age - 161
 
+def request_member_id(req=None):
+    """Return the member (regn_id) a request (default: the current one) is scoped to"""
+    req = request if req is None else req
+    return normalize_member_id(req.args.get('regn_id', req.headers.get('X-Regn-Id')))
+
+def current_store(req=None, create=False):
+    """Return the store of the member a request (default: the current one) is scoped to
+    
+    Reads of a member without a store in this process load it only when
+    the backend holds data for it, and see EMPTY_STORE otherwise, so stray
+    regn_ids never register a store. Writes pass ``create=True``.
+    """
+    member_id = request_member_id(req)
+    member_store = members.get(member_id, create=create)
+    if member_store is None:
+        if not store.has_member(member_id):
+            return EMPTY_STORE
+        member_store = members.get(member_id)
+    return member_store
+
+def data_etag(member_store, full_path):
+    """ETag of a member read endpoint's response (see versioned)"""
+    # Members of a shared backend share its store_id, so the member is part of the tag
+    return make_etag(*dataset_key(member_store), member_store.data_version(), met_table.version,
+                     full_path, date.today().isoformat())
+
+def update_met_values(changes):
+    """Correct MET values; logged entries are re-derived on their next read
+    
+    The corrections are saved with the data for the other workers and
+    later restarts. Returns the new MET table version.
+    """
+    version = met_table.update(changes)
+    MET_VALUES.update(changes)
+    return version
+
+def calorie_basis(member_store):
+    """Versions a member's served calories depend on, None when stored values are served"""
+    user_info = member_store.get_user_info()
+    return calorie_model.basis(user_info) if calorie_model.applies(user_info) else None
+
+def derive_calories(member_store, records):
+    """Set the derived calories on (category, entry) pairs where they differ from stored ones"""
+    user_info = member_store.get_user_info()
+    if calorie_model.applies(user_info):
+        calorie_model.apply(dataset_key(member_store), user_info, records)
+    return records
+
+def member_category_totals(member_store):
+    """Per-category totals of the calories served for a member"""
+    user_info = member_store.get_user_info()
+    if calorie_model.applies(user_info):
+        return calorie_model.category_totals(dataset_key(member_store), user_info, member_store)
+    return member_store.get_category_totals()
+
+# Records re-derived together when streaming an export
+EXPORT_CHUNK = 500
+
+def derived_records(member_store, records):
+    """Export records (category, day, entry) with derived calories, a chunk at a time"""
+    if calorie_basis(member_store) is None:
+        yield from records
+        return
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, EXPORT_CHUNK))
+        if not chunk:
+            return
+        derive_calories(member_store, [(category, entry) for category, _day, entry in chunk])
+        yield from chunk
+
+def make_etag(*parts):
+    """Strong ETag value for a representation identified by parts"""
+    return hashlib.blake2b('\0'.join(str(part) for part in parts).encode('utf-8'),
+                           digest_size=16).hexdigest()
+
+# Member data may change at any time: clients cache it but revalidate
+DATA_CACHE_CONTROL = 'private, no-cache'
+# Requests name their member in the query string or this header
+DATA_VARY = 'X-Regn-Id'
+
+def set_validators(response, etag):
+    """Mark a member data response (200 or 304) with its ETag and caching headers"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = DATA_CACHE_CONTROL
+    response.vary.add(DATA_VARY)
+    return response
+# The plan catalogs only change with a deployment
+CATALOG_CACHE_CONTROL = 'public, max-age=86400'
+
+def versioned(view):
+    """Serve a read endpoint with a strong ETag tied to the data version
+    
+    The ETag covers the member, its store and data version, the full request
+    path (query parameters select different representations) and today's
+    date (relative ranges move at midnight). A matching If-None-Match is
+    answered with 304 before the view touches any data.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        member_store = current_store()
+        # Read the version before the data: a write racing with the view can
+        # only make the body newer than its ETag, never older
+        etag = data_etag(member_store, request.full_path)
+        if request.if_none_match.contains(etag):
+            return set_validators(app.response_class(status=304), etag)
+        response = app.make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            set_validators(response, etag)
+        return response
+    return wrapper
+
+@app.errorhandler(InvalidMemberId)
+def invalid_member(e):
+    """Reject requests scoped to an invalid regn_id"""
+    return jsonify({'error': f'Invalid input: {str(e)}'}), 400
+
+def rate_limit_clients(req=None):
+    """Buckets a request is charged to: its client address, and also its member (regn_id) if scoped
+    
+    The address is always charged, so a client cannot escape its budget
+    by naming members, nor spend more than its own budget from theirs.
+    """
+    req = request if req is None else req
+    member_id = request_member_id(req)
+    address = req.remote_addr
+    if RATE_LIMIT_PROXY_HOPS:
+        # The address our outermost proxy saw is the N-th entry from the end
+        forwarded = [hop.strip() for hop in req.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+        if len(forwarded) >= RATE_LIMIT_PROXY_HOPS:
+            address = forwarded[-RATE_LIMIT_PROXY_HOPS]
+    clients = ['ip:' + str(address)]
+    if member_id:
+        clients.append('member:' + member_id)
+    return clients
+
+def admit(route, req=None):
+    """Take a token from the client's bucket for a route; returns None, or the Retry-After value"""
+    retry_after = rate_limiter.acquire(route, *rate_limit_clients(req))
+    return None if retry_after is None else RateLimiter.retry_after_header(retry_after)
+
+RATE_LIMIT_ERROR = 'Too many requests, retry later'
+
+def rate_limited(view):
+    """Answer 429 with Retry-After once the client has spent its budget for the view"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        retry_after = admit(view.__name__)
+        if retry_after is not None:
+            return jsonify({'error': RATE_LIMIT_ERROR}), 429, {'Retry-After': retry_after}
+        return view(*args, **kwargs)
+    return wrapper
+
+def dataset_key(member_store):
+    """Identify a member's dataset (render cache keys, event topics)"""
+    return member_store.store_id, getattr(member_store, 'member', DEFAULT_MEMBER)
+
+def render_cached(key, template, context):
+    """Render a template through the fragment cache; context() is only called on a miss"""
+    return Markup(render_cache.get_or_render(key, lambda: render_template(template, **context())))
+
 @app.route('/')
 def index():
     """Home page with all features"""
-    return render_template('index_v1.3.html', workouts=workouts,
-                         workout_plans=WORKOUT_PLANS, diet_plans=DIET_PLANS,
-                         user_info=user_info)
+    member_id = request_member_id()
+    member_store = current_store()
+    # Entries are loaded by the page's script, so the page itself only
+    # depends on the data version. The script scopes its API calls to the
+    # page's member, which members without data (EMPTY_STORE) do not share
+    key = ('index_v1.3.html', LIVE_UPDATES, member_id) + dataset_key(member_store) + (member_store.data_version(),)
+    return render_cached(key, 'index_v1.3.html', lambda: {
+        'workout_plans': WORKOUT_PLANS, 'diet_plans': DIET_PLANS,
+        'user_info': member_store.get_user_info(), 'live_updates': LIVE_UPDATES,
+        'regn_id': member_id
+    })
 
 @app.route('/api/user', methods=['POST'])
+@rate_limited
 def save_user_info():
     """API endpoint to save user information"""
     data = request.get_json()
+    member_id = request_member_id()
     
     try:
         name = data.get('name', '').strip()
@@ -106,10 +469,14 @@ def save_user_info():
         if gender not in ['M', 'F']:
             return jsonify({'error': 'Gender must be M or F'}), 400
         
+        if member_id and member_id != regn_id:
+            return jsonify({'error': 'regn_id does not match the member the request is scoped to'}), 400
+        
         bmi = calculate_bmi(height_cm, weight_kg)
         bmr = calculate_bmr(weight_kg, height_cm, age, gender)
         
-        user_info.update({
+        member_store = members.get(member_id)
+        info = {
             'name': name,
             'regn_id': regn_id,
             'age': age,
@@ -119,48 +486,150 @@ def save_user_info():
             'bmi': round(bmi, 1),
             'bmr': round(bmr, 0),
             'weekly_cal_goal': 2000
-        })
+        }
+        # A new weight applies from now on; earlier entries keep the old one
+        existing = member_store.get_user_info()
+        if existing.get('weight') != weight_kg or not existing.get('weight_history'):
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            info.update(record_weight(existing, weight_kg, now, now))
+        saved = member_store.save_user_info(info)
         
-        return jsonify({'message': 'User info saved successfully', 'user_info': user_info}), 201
+        return jsonify({'message': 'User info saved successfully', 'user_info': saved}), 201
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid input: {str(e)}'}), 400
+
+@app.route('/api/user/weight', methods=['POST'])
+@rate_limited
+def record_user_weight():
+    """API endpoint to record a weight change, optionally backdated
+    
+    Accepts {"weight": kg, "effective_from": "YYYY-MM-DD[ HH:MM:SS]"}
+    (default now). Entries logged from effective_from on are served with
+    calories for the new weight; nothing stored is rewritten.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Weight is required'}), 400
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        weight_kg = float(data.get('weight', 0))
+        if weight_kg <= 0:
+            raise ValueError('weight must be a positive number')
+        effective = data.get('effective_from') or now
+        if not isinstance(effective, str):
+            raise ValueError('effective_from must be a date')
+        if len(effective) == 10:
+            effective = date.fromisoformat(effective).isoformat() + ' 00:00:00'
+        else:
+            effective = datetime.strptime(effective, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
+        if effective > now:
+            raise ValueError('effective_from must not be in the future')
     except (ValueError, TypeError) as e:
         return jsonify({'error': f'Invalid input: {str(e)}'}), 400
+    
+    member_store = current_store(create=True)
+    existing = member_store.get_user_info()
+    info = record_weight(existing, weight_kg, effective, now)
+    # Keep the derived profile figures in step with the current weight
+    if all(existing.get(field) for field in ('height', 'age', 'gender')):
+        info['bmi'] = round(calculate_bmi(existing['height'], info['weight']), 1)
+        info['bmr'] = round(calculate_bmr(info['weight'], existing['height'], existing['age'], existing['gender']), 0)
+    saved = member_store.save_user_info(info)
+    return jsonify({'message': 'Weight recorded successfully', 'user_info': saved}), 201
 
 @app.route('/api/user', methods=['GET'])
+@versioned
 def get_user_info():
     """API endpoint to get user information"""
-    return jsonify(user_info if user_info else {})
+    return jsonify(current_store().get_user_info())
 
 @app.route('/api/workouts', methods=['GET'])
+@versioned
 def get_workouts():
-    """API endpoint to get all workouts"""
+    """API endpoint to get all workouts
+    
+    Without parameters returns every entry per category. With
+    ?limit=&cursor=&category=&fields= returns pages of entries, newest
+    first, each with an opaque next_cursor for the older entries.
+    """
+    if any(key in request.args for key in PAGE_PARAMS):
+        return get_workouts_page()
+    member_store = current_store()
+    workouts = member_store.get_workouts()
+    derive_calories(member_store, [(category, entry) for category, entries in workouts.items() for entry in entries])
     return jsonify(workouts)
 
-@app.route('/api/workouts', methods=['POST'])
-def add_workout():
-    """API endpoint to add a new workout with calorie calculation"""
-    data = request.get_json()
+def get_workouts_page():
+    """One page of entries for a category, or the first page of each"""
+    member_store = current_store()
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        fields = parse_fields(request.args.get('fields'))
+        category = request.args.get('category')
+        before = None
+        if 'cursor' in request.args:
+            cursor_category, before = decode_cursor(request.args['cursor'])
+            if category is not None and category != cursor_category:
+                raise ValueError('cursor belongs to another category')
+            category = cursor_category
+        if category is not None and not member_store.has_category(category):
+            raise ValueError('Invalid category')
+    except ValueError as e:
+        return jsonify({'error': f'Invalid input: {str(e)}'}), 400
     
+    def page(page_category, before=None):
+        entries, next_before = member_store.page_workouts(page_category, limit, before)
+        derive_calories(member_store, [(page_category, entry) for entry in entries])
+        return {
+            'entries': select_fields(entries, fields),
+            'next_cursor': encode_cursor(page_category, next_before) if next_before is not None else None
+        }
+    
+    if category is None:
+        return jsonify({page_category: page(page_category) for page_category in CATEGORIES})
+    return jsonify(dict(category=category, **page(category, before)))
+
+# Longest accepted exercise name; names are indexed for suggestions by prefix
+MAX_EXERCISE_NAME = 100
+# Bounds of one logged entry, within what the store's typed columns hold
+MAX_DURATION = 24 * 60
+MAX_CALORIES = 100000
+CALORIES_ERROR = f'Calories must be at most {MAX_CALORIES}; check the profile weight'
+
+def record_workout(member_store, data):
+    """Validate, price and store one workout; returns the stored entry
+    
+    Raises ValueError with the client-facing message for invalid input.
+    Shared by the WSGI view and the ASGI entry point.
+    """
     category = data.get('category', 'Workout')
     exercise = data.get('exercise', '').strip()
     duration = data.get('duration', 0)
     
     if not exercise or not duration:
-        return jsonify({'error': 'Exercise and duration are required'}), 400
+        raise ValueError('Exercise and duration are required')
+    if len(exercise) > MAX_EXERCISE_NAME:
+        raise ValueError(f'Exercise names are at most {MAX_EXERCISE_NAME} characters')
     
     try:
         duration = int(duration)
         if duration <= 0:
             raise ValueError
     except (ValueError, TypeError):
-        return jsonify({'error': 'Duration must be a positive integer'}), 400
+        raise ValueError('Duration must be a positive integer') from None
+    if duration > MAX_DURATION:
+        raise ValueError(f'Duration must be at most {MAX_DURATION} minutes')
     
-    if category not in workouts:
-        return jsonify({'error': 'Invalid category'}), 400
+    if not member_store.has_category(category):
+        raise ValueError('Invalid category')
     
     # Calculate calories
+    user_info = member_store.get_user_info()
     weight = user_info.get('weight', 70)  # Default weight if not set
-    met = MET_VALUES.get(category, 5.0)
+    met = met_table.get(category)
     calories = calculate_calories(weight, met, duration)
+    if not 0 <= calories <= MAX_CALORIES:
+        raise ValueError(CALORIES_ERROR)
     
     entry = {
         'exercise': exercise,
@@ -169,77 +638,575 @@ def add_workout():
         'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     }
     
-    workouts[category].append(entry)
-    
-    # Store in daily workouts
-    today_iso = date.today().isoformat()
-    if today_iso not in daily_workouts:
-        daily_workouts[today_iso] = {"Warm-up": [], "Workout": [], "Cool-down": []}
-    daily_workouts[today_iso][category].append(entry)
+    # Store the entry and its daily bucket
+    before = member_store.data_version()
+    member_store.add_workout(category, entry, date.today().isoformat())
+    record_stats(member_store, user_info, before, [(category, entry)])
+    exercise_index.add(exercise)
+    publish_update(member_store, 'workout', {'category': category, 'entry': entry}, [category])
+    return entry
+
+@app.route('/api/workouts', methods=['POST'])
+@rate_limited
+def add_workout():
+    """API endpoint to add a new workout with calorie calculation"""
+    data = request.get_json()
+    try:
+        entry = record_workout(current_store(create=True), data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({'message': 'Workout added successfully', 'workout': entry}), 201
 
+# Longest prefix /api/exercises/suggest accepts
+MAX_SUGGEST_QUERY = 100
+
+@app.route('/api/exercises/suggest', methods=['GET'])
+def suggest_exercises():
+    """API endpoint to autocomplete exercise names
+    
+    ?q= is matched case-insensitively against the start of plan and logged
+    exercise names; up to ?limit= (default 10, at most 20) are returned,
+    most logged first.
+    """
+    try:
+        return jsonify(exercise_suggestions(request.args))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid input: {str(e)}'}), 400
+
+def exercise_suggestions(args):
+    """Suggestions for the query arguments of /api/exercises/suggest
+    
+    Raises ValueError for invalid arguments. Shared by the WSGI view and
+    the ASGI entry point.
+    """
+    prefix = args.get('q', '')
+    if len(prefix) > MAX_SUGGEST_QUERY:
+        raise ValueError(f'q must be at most {MAX_SUGGEST_QUERY} characters')
+    try:
+        limit = int(args.get('limit', DEFAULT_SUGGESTIONS))
+        if not 1 <= limit <= MAX_SUGGESTIONS:
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValueError(f'limit must be between 1 and {MAX_SUGGESTIONS}') from None
+    return {'q': prefix, 'suggestions': exercise_index.suggest(prefix, limit)}
+
+# Upper bounds for POST /api/workouts/batch
+MAX_BATCH_SIZE = 5000
+# Backfilled timestamps may go back this far, and run ahead of the server clock by this much
+MAX_BACKFILL_YEARS = 10
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+def parse_batch_item(item, member_store):
+    """Validate one batch item; returns (category, exercise, duration, timestamp or None)"""
+    if not isinstance(item, dict):
+        raise ValueError('Each workout must be an object')
+    category = item.get('category', 'Workout')
+    exercise = item.get('exercise', '')
+    if not isinstance(exercise, str) or not exercise.strip() or not item.get('duration'):
+        raise ValueError('Exercise and duration are required')
+    if len(exercise.strip()) > MAX_EXERCISE_NAME:
+        raise ValueError(f'Exercise names are at most {MAX_EXERCISE_NAME} characters')
+    try:
+        duration = int(item['duration'])
+        if not 0 < duration <= MAX_DURATION:
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValueError(f'Duration must be a positive integer of at most {MAX_DURATION} minutes')
+    if not isinstance(category, str) or not member_store.has_category(category):
+        raise ValueError('Invalid category')
+    timestamp = item.get('timestamp')
+    if timestamp is not None:
+        try:
+            logged = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+            timestamp = logged.strftime('%Y-%m-%d %H:%M:%S')
+            # The parser the stores use, so anything accepted here can be stored
+            timestamp_to_epoch(timestamp)
+        except (ValueError, TypeError):
+            raise ValueError('Timestamp must be formatted as YYYY-MM-DD HH:MM:SS')
+        now = datetime.now()
+        if logged > now + MAX_CLOCK_SKEW:
+            raise ValueError('Timestamp must not be in the future')
+        if logged < now - timedelta(days=365 * MAX_BACKFILL_YEARS):
+            raise ValueError(f'Timestamp must be within the last {MAX_BACKFILL_YEARS} years')
+    return category, exercise.strip(), duration, timestamp
+
+@app.route('/api/workouts/batch', methods=['POST'])
+@rate_limited
+def add_workouts_batch():
+    """API endpoint to add many workouts in one atomic request
+    
+    Accepts {"workouts": [{category, exercise, duration, timestamp?}, ...]}.
+    Items without a timestamp are logged now. All items are validated
+    first; if any is invalid nothing is stored and the errors are listed
+    by index.
+    """
+    data = request.get_json(silent=True)
+    items = data.get('workouts') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'workouts must be a non-empty list'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'A batch holds at most {MAX_BATCH_SIZE} workouts'}), 400
+    
+    member_store = current_store(create=True)
+    parsed = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            parsed.append(parse_batch_item(item, member_store))
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+    if errors:
+        return jsonify({'error': 'No workouts were added', 'errors': errors}), 400
+    
+    # The profile lookup and clock read are done once per batch, and the
+    # calories of every item in one vectorized pass (same values as
+    # calculate_calories per item)
+    user_info = member_store.get_user_info()
+    weight = user_info.get('weight', 70)
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    calories = calories_batch(weight,
+                              [met_table.get(category) for category, _exercise, _duration, _timestamp in parsed],
+                              [duration for _category, _exercise, duration, _timestamp in parsed],
+                              ndigits=1)
+    errors = [{'index': index, 'error': CALORIES_ERROR}
+              for index, entry_calories in enumerate(calories) if not 0 <= entry_calories <= MAX_CALORIES]
+    if errors:
+        return jsonify({'error': 'No workouts were added', 'errors': errors}), 400
+    batch = []
+    totals = {}
+    for (category, exercise, duration, timestamp), entry_calories in zip(parsed, calories):
+        entry = {
+            'exercise': exercise,
+            'duration': duration,
+            'calories': entry_calories,
+            'timestamp': timestamp or now
+        }
+        batch.append((category, entry, entry['timestamp'][:10]))
+        category_totals = totals.setdefault(category, {'count': 0, 'time': 0, 'calories': 0})
+        category_totals['count'] += 1
+        category_totals['time'] += duration
+        category_totals['calories'] = round(category_totals['calories'] + entry['calories'], 1)
+    
+    before = member_store.data_version()
+    member_store.add_workouts(batch)
+    record_stats(member_store, user_info, before, [(category, entry) for category, entry, _day in batch])
+    for _category, entry, _day in batch:
+        exercise_index.add(entry['exercise'])
+    publish_update(member_store, 'batch', {'added': len(batch)}, totals)
+    
+    return jsonify({
+        'message': f'{len(batch)} workouts added successfully',
+        'added': len(batch),
+        'category_totals': totals
+    }), 201
+
+def publish_update(member_store, event, data, categories):
+    """Push a write to the member's stream subscribers with the updated totals"""
+    topic = dataset_key(member_store)
+    if broker.has_subscribers(topic):
+        category_totals = member_category_totals(member_store)
+        data['category_totals'] = {category: category_totals[category] for category in categories}
+        broker.publish(topic, event, data)
+
+def stats_state(version, user_info):
+    """What a member's stats describe: the data version and calorie basis"""
+    return version, calorie_model.basis(user_info) if calorie_model.applies(user_info) else None
+
+def record_stats(member_store, user_info, before, records):
+    """Fold a write into the member's stats if it was the only change since ``before``"""
+    after = member_store.data_version()
+    if after == before + 1:
+        workout_stats.record(dataset_key(member_store), stats_state(before, user_info),
+                             stats_state(after, user_info), records)
+
+def member_stats(member_store):
+    """WorkoutStats of a member, rebuilt from the entries only when stale"""
+    def state():
+        return stats_state(member_store.data_version(), member_store.get_user_info())
+    
+    def build():
+        stats = WorkoutStats()
+        records = [(category, entry) for category, _day, entry in member_store.iter_records()]
+        for category, entry in derive_calories(member_store, records):
+            stats.add(category, entry)
+        return stats
+    
+    return workout_stats.get(dataset_key(member_store), state, build)
+
+def stats_response(stats):
+    """Percentiles of stats, or with ?format=sketch their serialized sketches"""
+    stats_format = request.args.get('format', 'summary')
+    if stats_format == 'sketch':
+        return jsonify(stats.to_dict())
+    if stats_format != 'summary':
+        return jsonify({'error': 'Invalid input: format must be summary or sketch'}), 400
+    return jsonify(dict(stats.summary(), relative_accuracy=stats.relative_accuracy))
+
+@app.route('/api/stats', methods=['GET'])
+@versioned
+def get_stats():
+    """API endpoint to get session duration and calorie percentiles
+    
+    p50, p90 and p99 per category and per exercise, from mergeable
+    sketches that writes update in O(1). ?format=sketch returns the
+    serialized sketches, which aceest.sketches.merge_stats combines
+    across workers and pods.
+    """
+    return stats_response(member_stats(current_store()))
+
+@app.route('/api/stats/gym', methods=['GET'])
+def get_gym_stats():
+    """API endpoint to get percentiles over every member this process serves"""
+    stats = WorkoutStats()
+    for member_id in members.members():
+        member_store = members.get(member_id, create=False)
+        if member_store is not None:
+            stats.merge(member_stats(member_store))
+    return stats_response(stats)
+
+# Adult BMI bands: (upper bound, name)
+BMI_BANDS = ((18.5, 'underweight'), (25.0, 'normal'), (30.0, 'overweight'), (float('inf'), 'obese'))
+
+def cohort_report(profiles):
+    """BMI and BMR over the complete profiles, each computed in one vectorized pass"""
+    profiles = [profile for profile in profiles
+                if all(profile.get(field) for field in ('height', 'weight', 'age', 'gender'))]
+    if not profiles:
+        return {'members': 0, 'bmi': None, 'bmr': None}
+    heights = [profile['height'] for profile in profiles]
+    weights = [profile['weight'] for profile in profiles]
+    bmis = bmi_batch(heights, weights)
+    bmrs = bmr_batch(weights, heights, [profile['age'] for profile in profiles],
+                     [profile['gender'] for profile in profiles])
+    bands = dict.fromkeys((name for _limit, name in BMI_BANDS), 0)
+    for bmi in bmis:
+        bands[next(name for limit, name in BMI_BANDS if bmi < limit)] += 1
+    
+    def summary(values, ndigits):
+        # Rounded like the profile's own bmi and bmr
+        return {'mean': round(sum(values) / len(values), ndigits),
+                'min': round(min(values), ndigits), 'max': round(max(values), ndigits)}
+    
+    return {'members': len(profiles), 'bmi': dict(summary(bmis, 1), bands=bands), 'bmr': summary(bmrs, 0)}
+
+@app.route('/api/stats/cohort', methods=['GET'])
+def get_cohort_stats():
+    """API endpoint to get BMI and BMR figures over every member profile this process serves"""
+    profiles = []
+    for member_id in members.members():
+        member_store = members.get(member_id, create=False)
+        if member_store is not None:
+            profiles.append(member_store.get_user_info())
+    return jsonify(cohort_report(profiles))
+
+@app.route('/api/stream', methods=['GET'])
+def stream_updates():
+    """Push live updates to the client as Server-Sent Events
+    
+    Opens with a ``totals`` event carrying every category total, then sends
+    a ``workout`` event (new entry plus its category's totals) or a
+    ``batch`` event (count plus totals of the touched categories) for each
+    write, and a comment every SSE_HEARTBEAT seconds. A ``resync`` event
+    means the client fell behind and should refetch its data.
+    """
+    # Subscribing registers the member, so its first write reaches the stream
+    member_store = current_store(create=True)
+    try:
+        subscription = broker.subscribe(dataset_key(member_store))
+    except BrokerFull as e:
+        return jsonify({'error': str(e)}), 503
+    opening = format_event('totals', {'category_totals': member_category_totals(member_store)})
+    
+    def generate():
+        yield opening
+        while not subscription.closed:
+            yield subscription.get(SSE_HEARTBEAT) or ': keepalive\n\n'
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Runs when the client disconnects, even if the stream never started
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    return response
+
+def parse_categories(member_store, args):
+    """Categories selected by ?category= (repeatable or comma-separated), None for all"""
+    if 'category' not in args:
+        return None
+    categories = [category.strip() for value in args.getlist('category')
+                  for category in value.split(',') if category.strip()]
+    if not categories or not all(member_store.has_category(category) for category in categories):
+        raise ValueError('Invalid category')
+    return categories
+
+@app.route('/api/workouts/export', methods=['GET'])
+def export_workouts():
+    """Stream the workout history as NDJSON or CSV
+    
+    ?format=ndjson|csv (default ndjson), optional ?from=&to= (inclusive ISO
+    dates) and ?category= (repeatable or comma-separated). Filters are
+    applied by the store and entries are encoded as they are read.
+    """
+    member_store = current_store()
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+        start = date.fromisoformat(request.args['from']) if 'from' in request.args else None
+        end = date.fromisoformat(request.args['to']) if 'to' in request.args else None
+        if start and end and start > end:
+            raise ValueError('from must not be after to')
+        categories = parse_categories(member_store, request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid input: {str(e)}'}), 400
+    
+    records = derived_records(member_store, member_store.iter_records(start, end, categories))
+    return Response(export_records(records, export_format), mimetype=EXPORT_FORMATS[export_format],
+                    headers={'Content-Disposition': f'attachment; filename="workouts.{export_format}"'})
+
 @app.route('/api/workouts/summary', methods=['GET'])
+@versioned
 def get_summary():
     """API endpoint to get detailed workout summary"""
-    total_time = sum(
-        sum(entry['duration'] for entry in sessions)
-        for sessions in workouts.values()
-    )
-    
-    total_calories = sum(
-        sum(entry.get('calories', 0) for entry in sessions)
-        for sessions in workouts.values()
-    )
-    
-    category_totals = {
-        category: {
-            'time': sum(entry['duration'] for entry in sessions),
-            'calories': sum(entry.get('calories', 0) for entry in sessions)
-        }
-        for category, sessions in workouts.items()
-    }
+    return jsonify(workout_summary(current_store()))
+
+def workout_summary(member_store):
+    """Totals and full history of a member, as served by /api/workouts/summary"""
+    category_totals = member_category_totals(member_store)
+    total_time = sum(totals['time'] for totals in category_totals.values())
+    total_calories = sum(totals['calories'] for totals in category_totals.values())
+    workouts = member_store.get_workouts()
+    derive_calories(member_store, [(category, entry) for category, entries in workouts.items() for entry in entries])
     
-    return jsonify({
+    return {
         'total_time': total_time,
         'total_calories': round(total_calories, 1),
         'category_totals': category_totals,
         'workouts': workouts
-    })
+    }
+
+# Upper bound on buckets per /api/progress range query
+MAX_PROGRESS_BUCKETS = 1000
+# Longest range of the range endpoints, by ?days= or ?from=&to= (about a century)
+MAX_RANGE_DAYS = 36600
 
 @app.route('/api/progress', methods=['GET'])
+@versioned
 def get_progress():
-    """API endpoint to get progress data for charts"""
-    totals = {
-        category: sum(entry['duration'] for entry in sessions)
-        for category, sessions in workouts.items()
+    """API endpoint to get progress data for charts
+    
+    Without parameters returns lifetime minutes per category. With
+    ?from=&to=&bucket=day|week|month (or ?days=N ending today) returns
+    per-bucket totals answered from the calendar index.
+    """
+    try:
+        return jsonify(progress_report(current_store(), request.args))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid input: {str(e)}'}), 400
+
+def progress_report(member_store, args):
+    """Progress data for the query arguments of /api/progress
+    
+    Raises ValueError for an invalid range. Shared by the WSGI view and the
+    ASGI entry point.
+    """
+    if any(key in args for key in ('from', 'to', 'days', 'bucket')):
+        return progress_range(member_store, args)
+    return {
+        category: category_totals['time']
+        for category, category_totals in member_store.get_category_totals().items()
+    }
+
+def parse_date_range(args, default_days=None):
+    """Dates (start, end) of ?from=&to=, or of ?days=N ending at ?to= (default today)
+    
+    Without ?from= and ?days= the range spans default_days, or has no start
+    (None) when that is None. Raises ValueError for invalid or
+    unrepresentable ranges.
+    """
+    end = date.fromisoformat(args['to']) if 'to' in args else date.today()
+    start = None
+    if 'from' in args:
+        start = date.fromisoformat(args['from'])
+    elif 'days' in args or default_days is not None:
+        days = int(args.get('days', default_days))
+        if not 0 < days <= MAX_RANGE_DAYS:
+            raise ValueError(f'days must be a positive integer of at most {MAX_RANGE_DAYS}')
+        try:
+            start = end - timedelta(days=days - 1)
+        except OverflowError:
+            raise ValueError('days reaches before the earliest date') from None
+    if start is not None:
+        if start > end:
+            raise ValueError('from must not be after to')
+        # Bounds the work of every bucket size, e.g. ?from=0001-01-01&bucket=month
+        if (end - start).days >= MAX_RANGE_DAYS:
+            raise ValueError(f'range spans more than {MAX_RANGE_DAYS} days')
+    return start, end
+
+def progress_range(member_store, args):
+    """Bucketed minutes and calories for a date range"""
+    start, end = parse_date_range(args, default_days=30)
+    bucket = args.get('bucket', 'day')
+    bounds = []
+    for bound in bucket_bounds(start, end, bucket):
+        bounds.append(bound)
+        if len(bounds) > MAX_PROGRESS_BUCKETS:
+            raise ValueError(f'range spans more than {MAX_PROGRESS_BUCKETS} buckets')
+    
+    buckets = []
+    derived = calorie_basis(member_store) is not None
+    for bucket_start, bucket_end in bounds:
+        if derived:
+            category_totals = derived_range_totals(member_store, bucket_start, bucket_end)
+        else:
+            category_totals = member_store.get_range_totals(bucket_start, bucket_end)
+        buckets.append({
+            'start': bucket_start.isoformat(),
+            'end': bucket_end.isoformat(),
+            'time': sum(totals['time'] for totals in category_totals.values()),
+            'calories': round(sum(totals['calories'] for totals in category_totals.values()), 1),
+            'categories': category_totals
+        })
+    
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'bucket': bucket,
+        'buckets': buckets
     }
-    return jsonify(totals)
 
+def derived_range_totals(member_store, start, end):
+    """get_range_totals with derived calories, from the entries in the range"""
+    records = [(category, entry) for category, _day, entry in member_store.iter_records(start, end)]
+    derive_calories(member_store, records)
+    totals = RunningTotals(CATEGORIES)
+    for category, entry in records:
+        totals.add(category, entry['duration'], entry['calories'])
+    return totals.category_totals()
+
+# Bounds for /api/progress/series: buckets before and points after downsampling
+MAX_SERIES_BUCKETS = 40000
+DEFAULT_SERIES_POINTS = 500
+MAX_SERIES_POINTS = 5000
+
+@app.route('/api/progress/series', methods=['GET'])
+@versioned
+def get_progress_series():
+    """API endpoint to get a chart series of minutes and calories
+    
+    ?bucket=day|week|month over ?from=&to= (or ?days=N ending today; by
+    default the whole history), optionally for some ?category= values.
+    Series longer than ?points= (default 500) are downsampled with
+    ?method=lttb|minmax on ?metric=time|calories.
+    """
+    try:
+        return jsonify(progress_series(current_store(), request.args))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid input: {str(e)}'}), 400
+
+def progress_series(member_store, args):
+    """Bucketed, downsampled series for the query arguments of /api/progress/series
+    
+    Read from the store's per-day rollup, so the cost depends on the number
+    of days in the range rather than the number of entries.
+    """
+    start, end = parse_date_range(args)
+    bucket = args.get('bucket', 'day')
+    points = int(args.get('points', DEFAULT_SERIES_POINTS))
+    if not 3 <= points <= MAX_SERIES_POINTS:
+        raise ValueError(f'points must be between 3 and {MAX_SERIES_POINTS}')
+    method = args.get('method', 'lttb')
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"method must be one of {', '.join(DOWNSAMPLE_METHODS)}")
+    metric = args.get('metric', 'time')
+    if metric not in ('time', 'calories'):
+        raise ValueError('metric must be time or calories')
+    categories = parse_categories(member_store, args)
+    
+    if calorie_basis(member_store) is not None:
+        daily = derived_daily_totals(member_store, start, end, categories)
+    else:
+        daily = member_store.get_daily_totals(start, end, categories)
+    if start is None:
+        start = date.fromisoformat(daily[0][0]) if daily else end
+    
+    # Walk the buckets and the active days together; empty buckets are zeros
+    series = []
+    position = 0
+    for bucket_start, bucket_end in bucket_bounds(start, end, bucket):
+        if len(series) >= MAX_SERIES_BUCKETS:
+            raise ValueError(f'range spans more than {MAX_SERIES_BUCKETS} buckets')
+        last_day = bucket_end.isoformat()
+        time_total = calories = 0
+        while position < len(daily) and daily[position][0] <= last_day:
+            time_total += daily[position][1]
+            calories += daily[position][2]
+            position += 1
+        series.append({
+            'start': bucket_start.isoformat(),
+            'end': last_day,
+            'time': time_total,
+            'calories': round(calories, 1)
+        })
+    
+    keep = downsample(list(range(len(series))), [point[metric] for point in series], points, method)
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'bucket': bucket,
+        'metric': metric,
+        'method': method,
+        'buckets': len(series),
+        'series': [series[index] for index in keep]
+    }
+
+def derived_daily_totals(member_store, start, end, categories):
+    """get_daily_totals with derived calories, from the entries in the range"""
+    records = list(member_store.iter_records(start, end, categories))
+    derive_calories(member_store, [(category, entry) for category, _day, entry in records])
+    days = {}
+    for _category, day_iso, entry in records:
+        totals = days.setdefault(day_iso, [0, 0])
+        totals[0] += entry['duration']
+        totals[1] += to_tenths(entry['calories'])
+    return [(day_iso, time_total, tenths / 10) for day_iso, (time_total, tenths) in sorted(days.items())]
+
+# Catalog ETags are content hashes, so they change exactly when a plan does
 @app.route('/api/workout-plans', methods=['GET'])
 def get_workout_plans():
     """API endpoint to get workout plans"""
-    return jsonify(WORKOUT_PLANS)
+    return WORKOUT_PLANS_PAYLOAD.serve(request, app.response_class, CATALOG_CACHE_CONTROL)
 
 @app.route('/api/diet-plans', methods=['GET'])
 def get_diet_plans():
     """API endpoint to get diet plans"""
-    return jsonify(DIET_PLANS)
+    return DIET_PLANS_PAYLOAD.serve(request, app.response_class, CATALOG_CACHE_CONTROL)
 
 @app.route('/summary')
 def summary():
     """Summary page"""
-    total_time = sum(
-        sum(entry['duration'] for entry in sessions)
-        for sessions in workouts.values()
-    )
-    total_calories = sum(
-        sum(entry.get('calories', 0) for entry in sessions)
-        for sessions in workouts.values()
-    )
-    return render_template('summary_v1.3.html', workouts=workouts, 
+    member_store = current_store()
+    category_totals = member_category_totals(member_store)
+    basis = calorie_basis(member_store)
+    total_time = sum(totals['time'] for totals in category_totals.values())
+    total_calories = sum(totals['calories'] for totals in category_totals.values())
+    # One cached card per category: a new workout re-renders only its own
+    # category, and unchanged categories never load their entries
+    category_cards = []
+    for category, version in member_store.category_versions().items():
+        key = ('summary_card_v1.3.html',) + dataset_key(member_store) + (category, version, basis)
+        category_cards.append(render_cached(key, 'summary_card_v1.3.html', lambda category=category: {
+            'category': category,
+            'sessions': [entry for _category, entry in derive_calories(member_store, [
+                (category, entry) for _category, _day, entry in member_store.iter_records(categories=(category,))
+            ])]
+        }))
+    return render_template('summary_v1.3.html', category_cards=category_cards,
                          total_time=total_time, total_calories=round(total_calories, 1),
-                         user_info=user_info)
+                         user_info=member_store.get_user_info(), regn_id=request_member_id())
 
 @app.route('/health')
 def health():
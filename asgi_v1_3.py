@@ -0,0 +1,337 @@
+"""
+ASGI entry point for app_v1.3.py
+Serves the v1.3 routes on an asyncio event loop: uvicorn asgi_v1_3:app
+"""
+import asyncio
+import functools
+import importlib.util
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Request
+
+from aceest.events import BrokerFull, format_event
+from aceest.metrics import record as record_request
+from aceest.tenancy import InvalidMemberId
+
+# Load the app module dynamically (the same module the WSGI entry point serves)
+file_path = os.path.join(os.path.dirname(__file__), 'app_v1.3.py')
+spec = importlib.util.spec_from_file_location("app_v1_3", file_path)
+if spec is None or spec.loader is None:
+    raise ImportError(f"Cannot load module from {file_path}")
+
+app_module = importlib.util.module_from_spec(spec)
+sys.modules["app_v1_3"] = app_module
+spec.loader.exec_module(app_module)
+
+flask_app = app_module.app
+compression = flask_app.wsgi_app
+
+# Open streams are cheap here, so pages subscribe to live updates by default
+app_module.LIVE_UPDATES = os.environ.get('LIVE_UPDATES', '1') == '1'
+
+# Store calls and Flask views run on these threads, never on the event loop,
+# so a slow store or client cannot stall the other connections
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get('ASGI_THREADS', 32)),
+                              thread_name_prefix='aceest-asgi')
+
+
+def json_response(data, status=200):
+    """Response with the same JSON encoding as jsonify"""
+    return flask_app.response_class(flask_app.json.dumps_bytes(data) + b'\n', status=status,
+                                    mimetype='application/json')
+
+
+def versioned_response(req, member_store, build):
+    """Conditional GET handling of the WSGI app's versioned decorator"""
+    etag = app_module.data_etag(member_store, req.full_path)
+    if req.if_none_match.contains(etag):
+        response = flask_app.response_class(status=304)
+    else:
+        response = json_response(build())
+    return app_module.set_validators(response, etag)
+
+
+def health(req):
+    """Health check endpoint"""
+    return json_response({'status': 'healthy', 'version': '1.3'})
+
+
+def workout_plans(req):
+    """Workout plans, pre-compressed"""
+    return app_module.WORKOUT_PLANS_PAYLOAD.serve(req, flask_app.response_class,
+                                                  app_module.CATALOG_CACHE_CONTROL)
+
+
+def diet_plans(req):
+    """Diet plans, pre-compressed"""
+    return app_module.DIET_PLANS_PAYLOAD.serve(req, flask_app.response_class,
+                                               app_module.CATALOG_CACHE_CONTROL)
+
+
+def add_workout(req):
+    """Add a workout (see app_v1.3.add_workout)"""
+    retry_after = app_module.admit('add_workout', req)
+    if retry_after is not None:
+        response = json_response({'error': app_module.RATE_LIMIT_ERROR}, 429)
+        response.headers['Retry-After'] = retry_after
+        return response
+    data = req.get_json()
+    try:
+        entry = app_module.record_workout(app_module.current_store(req, create=True), data)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    return json_response({'message': 'Workout added successfully', 'workout': entry}, 201)
+
+
+def suggest_exercises(req):
+    """Exercise name suggestions; answered on the event loop, they never touch the store"""
+    try:
+        return json_response(app_module.exercise_suggestions(req.args))
+    except ValueError as e:
+        return json_response({'error': f'Invalid input: {str(e)}'}, 400)
+
+
+def get_summary(req):
+    """Detailed workout summary with conditional GET support"""
+    member_store = app_module.current_store(req)
+    return versioned_response(req, member_store, lambda: app_module.workout_summary(member_store))
+
+
+def get_progress(req):
+    """Progress data with conditional GET support"""
+    member_store = app_module.current_store(req)
+    try:
+        return versioned_response(req, member_store,
+                                  lambda: app_module.progress_report(member_store, req.args))
+    except ValueError as e:
+        return json_response({'error': f'Invalid input: {str(e)}'}, 400)
+
+
+def native(handler, endpoint=None):
+    """Wrap a handler(request) -> response as a WSGI app with the app's gzip settings
+
+    Requests are counted in the app's metrics under ``endpoint`` (default
+    the handler's name), the name of the Flask view serving the same route.
+    """
+    endpoint = endpoint or handler.__name__
+
+    def wsgi_app(environ, start_response):
+        started = time.perf_counter()
+        # The Flask app's before_request hook, for routes that bypass it
+        app_module.refresh_met_values()
+        try:
+            response = handler(Request(environ))
+        except InvalidMemberId as e:
+            response = json_response({'error': f'Invalid input: {str(e)}'}, 400)
+        except HTTPException as e:
+            response = e.get_response(environ)
+        record_request(app_module.metrics, endpoint, environ['REQUEST_METHOD'], response.status_code,
+                       time.perf_counter() - started)
+        return response(environ, start_response)
+    return compression.wrap(wsgi_app)
+
+
+# Routes answered without Flask's request dispatch: (method, path) ->
+# (WSGI app, whether it touches the store and so runs on the executor).
+# Every other route is served by the Flask app on the executor.
+ROUTES = {
+    ('GET', '/health'): (native(health), False),
+    ('GET', '/api/workout-plans'): (native(workout_plans, 'get_workout_plans'), False),
+    ('GET', '/api/diet-plans'): (native(diet_plans, 'get_diet_plans'), False),
+    ('POST', '/api/workouts'): (native(add_workout), True),
+    ('GET', '/api/exercises/suggest'): (native(suggest_exercises), False),
+    ('GET', '/api/workouts/summary'): (native(get_summary), True),
+    ('GET', '/api/progress'): (native(get_progress), True),
+}
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope and its request body"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if client:
+        environ['REMOTE_ADDR'] = client[0]
+        environ['REMOTE_PORT'] = str(client[1])
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def read_body(receive):
+    """Collect the request body; returns None if the client went away"""
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def send_wsgi(send, wsgi_app, environ, in_thread):
+    """Run a WSGI app and send its response over ASGI
+
+    With ``in_thread`` the app and each step of its body iterator run on
+    the executor, so streamed bodies (e.g. exports) hold a thread only
+    while producing a chunk, not while the client is slow to read it.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def call(function, *args):
+        if in_thread:
+            return await loop.run_in_executor(executor, function, *args)
+        return function(*args)
+
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    body = await call(wsgi_app, environ, start_response)
+    try:
+        iterator = iter(body)
+        headers_sent = False
+        while True:
+            chunk = await call(next, iterator, None)
+            if not headers_sent and (chunk is not None or started):
+                status, headers = started
+                await send({
+                    'type': 'http.response.start',
+                    'status': int(status.split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in headers]
+                })
+                headers_sent = True
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(body, 'close'):
+            await call(body.close)
+
+
+async def wait_for_disconnect(receive):
+    """Return once the client has closed the connection"""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_updates(scope, receive, send):
+    """Native /api/stream: an idle subscriber costs a coroutine, not a thread"""
+    environ = build_environ(scope, b'')
+    loop = asyncio.get_running_loop()
+    try:
+        # Opening a new member's store may lock files and load its history
+        member_store = await loop.run_in_executor(
+            executor, functools.partial(app_module.current_store, Request(environ), create=True))
+    except InvalidMemberId as e:
+        await send_wsgi(send, json_response({'error': f'Invalid input: {str(e)}'}, 400), environ, False)
+        return
+    try:
+        subscription = app_module.broker.subscribe(app_module.dataset_key(member_store))
+    except BrokerFull as e:
+        await send_wsgi(send, json_response({'error': str(e)}, 503), environ, False)
+        return
+
+    wake = asyncio.Event()
+    # Publishers run on other threads; hand the wake-up to the event loop
+    subscription.on_push = lambda: loop.call_soon_threadsafe(wake.set)
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        totals = await loop.run_in_executor(executor, app_module.member_category_totals, member_store)
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'text/event-stream; charset=utf-8'),
+                        (b'cache-control', b'no-cache'),
+                        (b'x-accel-buffering', b'no')]
+        })
+        await send({'type': 'http.response.body', 'more_body': True,
+                    'body': format_event('totals', {'category_totals': totals}).encode('utf-8')})
+        while not disconnect.done() and not subscription.closed:
+            wake.clear()
+            message = subscription.get(0)
+            if message is None:
+                waiter = asyncio.ensure_future(wake.wait())
+                done, _pending = await asyncio.wait({waiter, disconnect}, timeout=app_module.SSE_HEARTBEAT,
+                                                    return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if done:
+                    continue
+                message = ': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+        if not disconnect.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnect.cancel()
+        subscription.on_push = None
+        app_module.broker.unsubscribe(subscription)
+
+
+async def lifespan(receive, send):
+    """Answer the server's startup and shutdown events"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application for the v1.3 routes"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        raise ValueError(f"unsupported ASGI scope type {scope['type']!r}")
+    if scope['method'] == 'GET' and scope['path'] == '/api/stream':
+        await stream_updates(scope, receive, send)
+        return
+    body = await read_body(receive)
+    if body is None:
+        return
+    environ = build_environ(scope, body)
+    wsgi_app, in_thread = ROUTES.get((scope['method'], scope['path']), (flask_app, True))
+    if b'profile=' in scope['query_string']:
+        # Per-request profiles (?profile=1) are taken by the Flask app's hooks
+        wsgi_app, in_thread = flask_app, True
+    await send_wsgi(send, wsgi_app, environ, in_thread)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
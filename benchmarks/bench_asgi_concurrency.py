@@ -0,0 +1,104 @@
+"""
+Idle-connection concurrency and latency: 4 gunicorn sync workers vs one ASGI process
+Usage: python benchmarks/bench_asgi_concurrency.py [idle_streams] [requests]
+Needs gunicorn and uvicorn installed; both servers are started on local ports
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVERS = {
+    'wsgi (gunicorn, 4 sync workers)': ['gunicorn', '--bind', '127.0.0.1:{port}', '--workers', '4',
+                                        '--timeout', '120', 'wsgi_v1_3:app'],
+    'asgi (uvicorn, 1 process)': ['uvicorn', '--host', '127.0.0.1', '--port', '{port}',
+                                  '--log-level', 'warning', 'asgi_v1_3:app'],
+}
+CONNECT_TIMEOUT = 2.0
+REQUEST_TIMEOUT = 5.0
+
+
+async def http_get(port, path, timeout=REQUEST_TIMEOUT):
+    """Plain HTTP/1.1 GET; returns the status code"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def open_stream(port):
+    """Open an /api/stream connection and wait for its first event; returns the writer or None"""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), CONNECT_TIMEOUT)
+        writer.write(b'GET /api/stream HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n')
+        await writer.drain()
+        await asyncio.wait_for(reader.readuntil(b'\n\n'), CONNECT_TIMEOUT)
+        return writer
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        return None
+
+
+async def measure(port, idle_streams, requests):
+    """Hold idle streams open, then time summary requests alongside them"""
+    writers = await asyncio.gather(*(open_stream(port) for _ in range(idle_streams)))
+    established = sum(1 for writer in writers if writer is not None)
+    latencies = []
+    failures = 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        try:
+            if await http_get(port, '/api/workouts/summary') != 200:
+                failures += 1
+        except (OSError, asyncio.TimeoutError):
+            failures += 1
+        latencies.append(time.perf_counter() - started)
+    for writer in writers:
+        if writer is not None:
+            writer.close()
+    return established, failures, latencies
+
+
+def wait_until_up(port, process):
+    """Poll /health until the server answers"""
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            if asyncio.run(http_get(port, '/health', timeout=1)) == 200:
+                return
+        except (OSError, asyncio.TimeoutError):
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def main():
+    """Run the same measurement against both servers"""
+    idle_streams = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(f"{idle_streams} idle /api/stream connections, {requests} summary requests")
+    for port, (name, command) in enumerate(SERVERS.items(), start=18031):
+        process = subprocess.Popen([part.format(port=port) for part in command], cwd=ROOT,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(port, process)
+            established, failures, latencies = asyncio.run(measure(port, idle_streams, requests))
+        finally:
+            process.terminate()
+            process.wait()
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{name:34} streams held {established:5d}  failed requests {failures:4d}  "
+              f"p50 {statistics.median(latencies) * 1000:8.1f} ms  p99 {p99 * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Memory and scan benchmark: list-of-dicts entries vs the columnar store
+Usage: python benchmarks/bench_columnar_memory.py [entries]
+"""
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aceest.columnar import ColumnarWorkouts  # noqa: E402
+
+CATEGORIES = ("Warm-up", "Workout", "Cool-down")
+EXERCISES = ["Jog", "Jumping Jacks", "Push-ups", "Squats", "Plank", "Lunges", "Slow Walking", "Stretching"]
+
+
+def generate(count):
+    """Yield (category, entry) pairs shaped like the add_workout output"""
+    start = datetime(2024, 1, 1, 6, 0, 0)
+    for i in range(count):
+        duration = 5 + i % 55
+        yield CATEGORIES[i % 3], {
+            'exercise': EXERCISES[i % len(EXERCISES)],
+            'duration': duration,
+            'calories': round(duration * 7.35, 1),
+            # Each entry gets its own timestamp string, as datetime.now() does
+            'timestamp': (start + timedelta(seconds=i * 37)).strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+
+def measure(build):
+    """Return (bytes allocated, result) for a builder"""
+    tracemalloc.start()
+    result = build()
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def build_dicts(count):
+    workouts = {category: [] for category in CATEGORIES}
+    for category, entry in generate(count):
+        workouts[category].append(entry)
+    return workouts
+
+
+def build_columns(count):
+    workouts = ColumnarWorkouts(CATEGORIES)
+    for category, entry in generate(count):
+        workouts[category].append(entry)
+    return workouts
+
+
+def scan_dicts(workouts):
+    return {
+        category: (sum(e['duration'] for e in sessions), sum(e.get('calories', 0) for e in sessions))
+        for category, sessions in workouts.items()
+    }
+
+
+def scan_columns(workouts):
+    return {
+        category: (columns.total_duration(), columns.total_calories())
+        for category, columns in workouts.items()
+    }
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    dict_bytes, dict_workouts = measure(lambda: build_dicts(count))
+    column_bytes, column_workouts = measure(lambda: build_columns(count))
+
+    print(f"entries:             {count:,}")
+    print(f"list-of-dicts:       {dict_bytes / 2**20:8.1f} MiB  ({dict_bytes / count:6.1f} B/entry)")
+    print(f"columnar:            {column_bytes / 2**20:8.1f} MiB  ({column_bytes / count:6.1f} B/entry)")
+    print(f"memory reduction:    {dict_bytes / column_bytes:8.1f}x")
+    print(f"summary scan dicts:  {timed(scan_dicts, dict_workouts) * 1000:8.1f} ms")
+    print(f"summary scan arrays: {timed(scan_columns, column_workouts) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Encode throughput benchmark: Flask's default JSON provider vs FastJSONProvider
+Usage: python benchmarks/bench_json_provider.py [entries] [repeats]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from aceest.json_provider import FastJSONProvider, orjson  # noqa: E402
+
+CATEGORIES = ("Warm-up", "Workout", "Cool-down")
+EXERCISES = ["Jog", "Jumping Jacks", "Push-ups", "Squats", "Plank", "Lunges", "Slow Walking", "Stretching"]
+
+
+def workouts_payload(count):
+    """A get_workouts-shaped payload with ``count`` entries"""
+    start = datetime(2024, 1, 1, 6, 0, 0)
+    payload = {category: [] for category in CATEGORIES}
+    for i in range(count):
+        duration = 5 + i % 55
+        payload[CATEGORIES[i % 3]].append({
+            'exercise': EXERCISES[i % len(EXERCISES)],
+            'duration': duration,
+            'calories': round(duration * 7.35, 1),
+            'timestamp': (start + timedelta(seconds=i * 37)).strftime('%Y-%m-%d %H:%M:%S')
+        })
+    return payload
+
+
+def summary_payload(workouts):
+    """A get_summary-shaped payload around the same entries"""
+    totals = {
+        category: {'time': sum(e['duration'] for e in entries),
+                   'calories': round(sum(e['calories'] for e in entries), 1)}
+        for category, entries in workouts.items()
+    }
+    return {
+        'total_time': sum(t['time'] for t in totals.values()),
+        'total_calories': round(sum(t['calories'] for t in totals.values()), 1),
+        'category_totals': totals,
+        'workouts': workouts
+    }
+
+
+def measure(app, payload, repeats):
+    """Return (seconds per response, body size) for app.json.response"""
+    with app.app_context():
+        body = app.json.response(payload).get_data()
+        started = time.perf_counter()
+        for _ in range(repeats):
+            app.json.response(payload)
+        return (time.perf_counter() - started) / repeats, len(body)
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    default_app = Flask(__name__)
+    default_app.json = DefaultJSONProvider(default_app)
+    fast_app = Flask(__name__)
+    fast_app.json = FastJSONProvider(fast_app)
+    workouts = workouts_payload(entries)
+    print(f"{entries} entries, orjson {'available' if orjson else 'not installed (stdlib fallback)'}")
+    print(f"{'payload':<10} {'provider':<10} {'ms/response':>12} {'MB/s':>8} {'speedup':>8}")
+    for name, payload in (('workouts', workouts), ('summary', summary_payload(workouts))):
+        baseline, size = measure(default_app, payload, repeats)
+        fast, _size = measure(fast_app, payload, repeats)
+        for provider, seconds in (('default', baseline), ('fast', fast)):
+            print(f"{name:<10} {provider:<10} {seconds * 1000:>12.1f} {size / seconds / 1e6:>8.1f} "
+                  f"{baseline / seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
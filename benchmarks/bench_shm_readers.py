@@ -0,0 +1,78 @@
+"""
+Read-throughput benchmark for the shared-memory store across worker processes
+Usage: python benchmarks/bench_shm_readers.py [entries] [seconds]
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aceest.shm import SharedMemoryStore  # noqa: E402
+
+CATEGORIES = ("Warm-up", "Workout", "Cool-down")
+WORKER_COUNTS = (1, 2, 4, 8)
+
+
+def populate(directory, count):
+    """Fill a store with ``count`` entries spread over a year"""
+    store = SharedMemoryStore(directory)
+    for i in range(count):
+        day = f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}"
+        store.add_workout(CATEGORIES[i % 3], {
+            'exercise': 'Jog', 'duration': 5 + i % 55, 'calories': 36.8,
+            'timestamp': f"{day} 06:00:00"
+        }, day)
+    store.close()
+
+
+def reader(directory, seconds, results):
+    """Serve summary-style reads (O(1) totals plus a range scan) until time runs out"""
+    store = SharedMemoryStore(directory)
+    totals_reads = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        store.get_category_totals()
+        totals_reads += 1
+    scans = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        store.get_range_totals('2025-03-01', '2025-03-31')
+        scans += 1
+    store.close()
+    results.put((totals_reads, scans))
+
+
+def run(directory, workers, seconds):
+    """Return aggregate (totals reads/s, range scans/s) for a worker count"""
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=reader, args=(directory, seconds, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    counts = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return (sum(c[0] for c in counts) / seconds, sum(c[1] for c in counts) / seconds)
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    directory = tempfile.mkdtemp(prefix='aceest-shm-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    populate(directory, entries)
+    print(f"{entries} entries, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'totals reads/s':>16} {'range scans/s':>15}")
+    try:
+        for workers in WORKER_COUNTS:
+            totals_rate, scan_rate = run(directory, workers, seconds)
+            print(f"{workers:>8} {totals_rate:>16,.0f} {scan_rate:>15,.1f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
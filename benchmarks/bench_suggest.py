@@ -0,0 +1,77 @@
+"""
+Exercise autocomplete latency: prefix index vs scanning every name
+Usage: python benchmarks/bench_suggest.py [distinct_names] [logged_entries]
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aceest.suggest import ExerciseIndex, normalize_name  # noqa: E402
+
+WORDS = ["push", "pull", "squat", "plank", "lunge", "row", "press", "curl", "jump", "walk", "run",
+         "stretch", "bench", "dead", "lift", "kettlebell", "swing", "cable", "fly", "dip", "sled", "bike"]
+
+
+def make_names(count, rng):
+    """Distinct exercise names built from gym vocabulary plus a variant number"""
+    names = set()
+    while len(names) < count:
+        names.add(f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {rng.randint(1, 10 ** 6)}")
+    return sorted(names)
+
+
+def scan_suggest(counts, prefix, limit=10):
+    """The naive approach: filter and sort every name per keystroke"""
+    key = normalize_name(prefix)
+    matches = [name for name in counts if normalize_name(name).startswith(key)]
+    return sorted(matches, key=lambda name: (-counts[name], name))[:limit]
+
+
+def timed(function, queries):
+    """Per-call latencies in milliseconds"""
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        function(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return latencies
+
+
+def main():
+    distinct = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    logged = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    rng = random.Random(42)
+    names = make_names(distinct, rng)
+    # Zipf-like popularity: a few names are logged far more often than the rest
+    weights = [1 / (rank + 1) for rank in range(len(names))]
+    counts = {}
+    for name in rng.choices(names, weights, k=logged):
+        counts[name] = counts.get(name, 0) + 1
+
+    started = time.perf_counter()
+    index = ExerciseIndex()
+    index.add_counts(counts)
+    print(f"{len(index)} distinct names, {logged} entries, index built in {time.perf_counter() - started:.1f} s")
+
+    started = time.perf_counter()
+    for name in rng.sample(names, 1000):
+        index.add(name)
+    print(f"incremental insert: {(time.perf_counter() - started) * 1000:.3f} ms per 1000")
+
+    # Every prefix a user would type on the way to a name
+    queries = [name[:length] for name in rng.sample(names, 200) for length in range(0, 12)]
+    for label, function, sample in (('prefix index', index.suggest, queries),
+                                    ('full scan', lambda q: scan_suggest(counts, q), queries[::60])):
+        latencies = timed(function, sample)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{label:13} {len(sample):5d} queries  p50 {statistics.median(latencies):8.3f} ms  "
+              f"p99 {p99:8.3f} ms  max {latencies[-1]:8.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+"""
+Gunicorn settings for the v1.3 image: gunicorn -c gunicorn.conf.py wsgi_v1_3:app
+"""
+import os
+
+bind = '0.0.0.0:' + os.environ.get('PORT', '5000')
+timeout = 120
+
+# The journal directory is locked by one process, so with JOURNAL_DIR all
+# requests are served by the threads of a single worker
+if os.environ.get('JOURNAL_DIR'):
+    workers = 1
+    threads = int(os.environ.get('GUNICORN_THREADS', 8))
+else:
+    workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+
+def child_exit(server, worker):
+    """Fold an exited worker's metrics file into METRICS_DIR's total of exited workers"""
+    if os.environ.get('METRICS_DIR'):
+        from aceest.metrics import merge_exited
+        merge_exited(os.environ['METRICS_DIR'])
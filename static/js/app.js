@@ -1,6 +1,30 @@
+// Entries shown per category
+const RECENT_LIMIT = 5;
+
+// Newest-first entries per category, as currently displayed
+let recentWorkouts = {};
+
+// Set while the live update stream is connected
+let streaming = false;
+
+// Delay after the last keystroke before asking for exercise suggestions
+const SUGGEST_DELAY_MS = 80;
+
+// Member (regn_id) the page is scoped to, set by v1.3 pages opened with ?regn_id=
+function memberId() {
+    return document.body.dataset.regnId || '';
+}
+
+// Request headers scoping an API call to the page's member
+function memberHeaders(headers = {}) {
+    return memberId() ? {...headers, 'X-Regn-Id': memberId()} : headers;
+}
+
 // Load workouts on page load
 document.addEventListener('DOMContentLoaded', function() {
     loadWorkouts();
+    subscribeToUpdates();
+    setupExerciseSuggestions();
     
     const form = document.getElementById('workoutForm');
     if (form) {
@@ -10,23 +34,82 @@ document.addEventListener('DOMContentLoaded', function() {
 
 async function loadWorkouts() {
     try {
-        const response = await fetch('/api/workouts');
+        // Only the newest five entries per category are shown
+        const response = await fetch(`/api/workouts?limit=${RECENT_LIMIT}&fields=exercise,duration`,
+                                     {headers: memberHeaders()});
         const workouts = await response.json();
-        displayWorkouts(workouts);
+        recentWorkouts = {};
+        for (const [category, page] of Object.entries(workouts)) {
+            // Paged responses list entries newest first; older apps return every entry
+            recentWorkouts[category] = Array.isArray(page)
+                ? page.slice(-RECENT_LIMIT).reverse()
+                : page.entries;
+        }
+        displayWorkouts();
     } catch (error) {
         console.error('Error loading workouts:', error);
     }
 }
 
-function displayWorkouts(workouts) {
+function subscribeToUpdates() {
+    // Only pages of a server that can hold many open streams ask for them
+    if (!window.EventSource || document.body.dataset.liveUpdates !== 'true') return;
+    // EventSource cannot send headers, so the member goes in the query
+    const member = memberId();
+    const source = new EventSource(member ? `/api/stream?regn_id=${encodeURIComponent(member)}` : '/api/stream');
+    source.addEventListener('open', () => { streaming = true; });
+    source.addEventListener('error', () => { streaming = false; });
+    source.addEventListener('workout', (event) => {
+        const update = JSON.parse(event.data);
+        const sessions = recentWorkouts[update.category] || [];
+        recentWorkouts[update.category] = [update.entry, ...sessions].slice(0, RECENT_LIMIT);
+        displayWorkouts();
+    });
+    // Batches and missed events are rare; refetch the recent entries
+    source.addEventListener('batch', loadWorkouts);
+    source.addEventListener('resync', loadWorkouts);
+}
+
+function setupExerciseSuggestions() {
+    // Only pages with a suggestion list (v1.3) have /api/exercises/suggest
+    const input = document.getElementById('exercise');
+    const list = document.getElementById('exerciseSuggestions');
+    if (!input || !list) return;
+    let timer = null;
+    let pending = null;
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(async () => {
+            // Only the answer for the latest keystroke matters
+            if (pending) pending.abort();
+            pending = new AbortController();
+            try {
+                const response = await fetch(`/api/exercises/suggest?q=${encodeURIComponent(input.value)}`,
+                                             {signal: pending.signal, headers: memberHeaders()});
+                if (!response.ok) return;
+                const data = await response.json();
+                list.replaceChildren(...data.suggestions.map((suggestion) => {
+                    const option = document.createElement('option');
+                    option.value = suggestion.name;
+                    return option;
+                }));
+            } catch (error) {
+                if (error.name !== 'AbortError') console.error('Error loading suggestions:', error);
+            }
+        }, SUGGEST_DELAY_MS);
+    });
+}
+
+function displayWorkouts() {
     const container = document.getElementById('workoutsList');
     if (!container) return;
     
     let html = '';
-    for (const [category, sessions] of Object.entries(workouts)) {
+    for (const [category, recent] of Object.entries(recentWorkouts)) {
+        const sessions = recent.slice().reverse();
         if (sessions.length > 0) {
             html += `<h3>${category}</h3><ul>`;
-            sessions.slice(-5).forEach(entry => {
+            sessions.forEach(entry => {
                 html += `<li>${entry.exercise} - ${entry.duration} min</li>`;
             });
             html += '</ul>';
@@ -47,16 +130,19 @@ async function addWorkout(e) {
     try {
         const response = await fetch('/api/workouts', {
             method: 'POST',
-            headers: {
+            headers: memberHeaders({
                 'Content-Type': 'application/json'
-            },
+            }),
             body: JSON.stringify(formData)
         });
         
         if (response.ok) {
             alert('Workout added successfully!');
             document.getElementById('workoutForm').reset();
-            loadWorkouts();
+            // With the stream connected the new entry arrives as an event
+            if (!streaming) {
+                loadWorkouts();
+            }
         } else {
             const error = await response.json();
             alert('Error: ' + error.error);
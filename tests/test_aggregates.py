@@ -0,0 +1,83 @@
+"""
+Unit tests for the running workout aggregates
+"""
+import pytest
+from aceest.aggregates import RunningTotals, to_tenths
+from aceest.storage import MemoryStore, SQLiteStore
+
+def make_entry(duration=30, calories=36.8):
+    """Build a workout entry in the API shape"""
+    return {'exercise': 'Running', 'duration': duration, 'calories': calories,
+            'timestamp': '2025-01-01 10:00:00'}
+
+class TestRunningTotals:
+    """Test the aggregate layer itself"""
+
+    def test_add_updates_category_and_global_totals(self):
+        """Test each add updates the category and the global totals"""
+        totals = RunningTotals(['Warm-up', 'Workout'])
+        totals.add('Workout', 30, 220.5)
+        totals.add('Workout', 10, 36.8)
+        totals.add('Warm-up', 5, 18.4)
+        assert totals.category_totals()['Workout'] == {'time': 40, 'calories': 257.3}
+        assert totals.total_time == 45
+        assert totals.total_calories == 275.7
+        assert totals.count('Workout') == 2
+
+    def test_calories_are_exact(self):
+        """Test many one-decimal values sum without float drift"""
+        totals = RunningTotals(['Workout'])
+        for _ in range(1000):
+            totals.add('Workout', 1, 0.1)
+        assert totals.category_totals()['Workout']['calories'] == 100.0
+
+    def test_rebuild_and_verify(self):
+        """Test rebuilding from entries and verifying against a scan"""
+        workouts = {'Workout': [make_entry(), make_entry(20, 10.1)], 'Cool-down': []}
+        totals = RunningTotals()
+        totals.rebuild(workouts)
+        assert totals.verify(workouts) == []
+        workouts['Workout'].append(make_entry())
+        mismatches = totals.verify(workouts)
+        assert mismatches[0]['category'] == 'Workout'
+
+    def test_to_tenths(self):
+        """Test calorie conversion to integer tenths"""
+        assert to_tenths(36.8) == 368
+        assert to_tenths(0) == 0
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    """Yield each storage engine in turn"""
+    engine = MemoryStore() if request.param == 'memory' else SQLiteStore(str(tmp_path / 'totals.db'))
+    yield engine
+    engine.close()
+
+class TestStoreTotals:
+    """Test totals maintained by the storage engines"""
+
+    def test_totals_follow_writes(self, store):
+        """Test served totals match a full scan after writes"""
+        store.add_workout('Workout', make_entry(30, 220.5), '2025-01-01')
+        store.add_workout('Cool-down', make_entry(10, 18.4), '2025-01-01')
+        assert store.get_category_totals()['Workout'] == {'time': 30, 'calories': 220.5}
+        assert store.verify_totals() == []
+
+    def test_memory_totals_heal_after_reset(self):
+        """Test replacing a category's entries is picked up by the totals"""
+        store = MemoryStore()
+        store.add_workout('Workout', make_entry(), '2025-01-01')
+        store.workouts['Workout'] = []
+        assert store.get_category_totals()['Workout'] == {'time': 0, 'calories': 0}
+
+    def test_sqlite_totals_rebuilt_for_existing_database(self, tmp_path):
+        """Test a database without stored totals gets them rebuilt on open"""
+        path = str(tmp_path / 'legacy.db')
+        store = SQLiteStore(path)
+        store.add_workout('Workout', make_entry(45, 99.9), '2025-01-01')
+        store.pool.connection().execute("DELETE FROM category_totals")
+        store.close()
+        reopened = SQLiteStore(path)
+        assert reopened.get_category_totals()['Workout'] == {'time': 45, 'calories': 99.9}
+        assert reopened.verify_totals() == []
+        reopened.close()
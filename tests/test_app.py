@@ -37,6 +37,22 @@ class TestHealthEndpoint:
         assert data['status'] == 'healthy'
         assert data['version'] == '1.0'
 
+    def test_metrics(self, client):
+        """Test /metrics exposes request counts and entries per category"""
+        client.post('/api/workouts', data=json.dumps({'category': 'Workout', 'exercise': 'Run', 'duration': 5}),
+                    content_type='application/json')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        text = response.get_data(as_text=True)
+        assert 'aceest_http_requests_total{endpoint="add_workout",method="POST",status="201"} 1' in text
+        assert 'aceest_workout_entries{category="Workout"} 1' in text
+        assert '# TYPE aceest_http_request_duration_seconds histogram' in text
+
+    def test_profile_endpoint_disabled_by_default(self, client):
+        """Test /debug/profile is hidden without ADMIN_TOKEN"""
+        assert client.get('/debug/profile?seconds=0.01').status_code == 404
+
 class TestWorkoutAPI:
     """Test workout API endpoints"""
     
@@ -125,3 +125,11 @@ def test_summary_page_v1_1(client_v1_1):
     response = client_v1_1.get('/summary')
     assert response.status_code == 200
 
+
+def test_metrics_v1_1(client_v1_1):
+    """Test /metrics exposes request counts and gzip counters"""
+    client_v1_1.get('/health')
+    text = client_v1_1.get('/metrics').get_data(as_text=True)
+    assert 'aceest_http_requests_total{endpoint="health",method="GET",status="200"}' in text
+    assert '# TYPE aceest_gzip_compressed_total counter' in text
+    assert 'aceest_workout_entries{category="Warm-up"}' in text
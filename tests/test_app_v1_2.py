@@ -7,6 +7,8 @@ import json
 import sys
 import os
 import importlib.util
+import gzip
+import zlib
 
 def load_app_v1_2():
     """Load app_v1.2 module dynamically"""
@@ -155,3 +157,33 @@ def test_invalid_workout_v1_2(client_v1_2):
                          content_type='application/json')
     assert response.status_code == 400
 
+
+def test_plans_served_compressed(client_v1_2):
+    """Test plan catalogs are served pre-compressed when the client accepts it"""
+    plain = client_v1_2.get('/api/workout-plans')
+    for encoding, decompress in (('gzip', gzip.decompress), ('deflate', zlib.decompress)):
+        response = client_v1_2.get('/api/workout-plans', headers={'Accept-Encoding': encoding})
+        assert response.headers['Content-Encoding'] == encoding
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert decompress(response.data) == plain.data
+        assert response.headers['ETag'] != plain.headers['ETag']
+
+def test_plans_loaded_from_data_file(tmp_path, monkeypatch):
+    """Test PLANS_FILE replaces the built-in catalogs"""
+    plans_file = tmp_path / 'plans.json'
+    plans_file.write_text(json.dumps({
+        'workout_plans': {f'Plan {i}': [f'Step {i}'] for i in range(300)},
+        'diet_plans': {'Keto': ['Eggs']}
+    }))
+    monkeypatch.setenv('PLANS_FILE', str(plans_file))
+    client = load_app_v1_2().app.test_client()
+    assert len(json.loads(client.get('/api/workout-plans').data)) == 300
+    assert json.loads(client.get('/api/diet-plans').data) == {'Keto': ['Eggs']}
+
+def test_metrics_v1_2(client_v1_2):
+    """Test /metrics exposes request counts and gzip counters"""
+    client_v1_2.get('/health')
+    text = client_v1_2.get('/metrics').get_data(as_text=True)
+    assert 'aceest_http_requests_total{endpoint="health",method="GET",status="200"}' in text
+    assert '# TYPE aceest_gzip_compressed_total counter' in text
+    assert 'aceest_workout_entries{category="Warm-up"}' in text
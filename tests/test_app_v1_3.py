@@ -7,6 +7,8 @@ import json
 import sys
 import os
 import importlib.util
+import gzip
+from datetime import date, datetime, timedelta
 
 def load_app_v1_3():
     """Load app_v1.3 module dynamically"""
@@ -261,6 +263,20 @@ class TestWorkoutAPI:
         data = json.loads(response.data)
         assert 'calories' in data['workout']
     
+    def test_add_workout_out_of_range(self, client_v1_3):
+        """Test durations and calories past what the store holds are rejected with 400"""
+        response = client_v1_3.post('/api/workouts', data=json.dumps({'exercise': 'Run', 'duration': 2 ** 32}),
+                                    content_type='application/json')
+        assert response.status_code == 400
+        client_v1_3.post('/api/user', data=json.dumps({'name': 'A', 'regn_id': 'R1', 'age': 30, 'gender': 'M',
+                                                       'height': 175, 'weight': 1e9}),
+                         content_type='application/json')
+        for path, body in (('/api/workouts', {'exercise': 'Run', 'duration': 60}),
+                           ('/api/workouts/batch', {'workouts': [{'exercise': 'Run', 'duration': 60}]})):
+            response = client_v1_3.post(path, data=json.dumps(body), content_type='application/json')
+            assert response.status_code == 400
+        assert json.loads(client_v1_3.get('/api/workouts').data)['Workout'] == []
+    
     def test_add_workout_all_categories(self, client_v1_3):
         """Test adding workouts to all categories"""
         categories = ['Warm-up', 'Workout', 'Cool-down']
@@ -353,8 +369,1050 @@ class TestPages:
         response = client_v1_3.get('/')
         assert response.status_code == 200
     
+    def test_index_page_subscribes_only_when_enabled(self, client_v1_3, monkeypatch):
+        """Test pages served by sync workers do not open a stream"""
+        assert b'data-live-updates' not in client_v1_3.get('/').data
+        monkeypatch.setenv('LIVE_UPDATES', '1')
+        enabled = load_app_v1_3().app.test_client()
+        assert b'data-live-updates="true"' in enabled.get('/').data
+    
+    def test_index_page_carries_the_member(self, client_v1_3):
+        """Test the page hands its regn_id to the script and links, even for members without data"""
+        assert b'data-regn-id' not in client_v1_3.get('/').data
+        for member_id in ('R1', 'R2'):
+            html = client_v1_3.get(f'/?regn_id={member_id}').data.decode()
+            assert f'data-regn-id="{member_id}"' in html
+            assert f'href="/summary?regn_id={member_id}"' in html
+        assert 'href="/?regn_id=R1"' in client_v1_3.get('/summary?regn_id=R1').data.decode()
+    
     def test_summary_page(self, client_v1_3):
         """Test summary page loads"""
         response = client_v1_3.get('/summary')
         assert response.status_code == 200
 
+
+class TestSQLiteStorage:
+    """Test the app running on the shared SQLite storage engine"""
+    
+    def test_workers_share_workouts(self, tmp_path, monkeypatch):
+        """Test a workout posted to one worker is visible to another"""
+        monkeypatch.setenv('STORAGE_URL', f"sqlite:///{tmp_path / 'aceest.db'}")
+        worker_a = load_app_v1_3()
+        worker_b = load_app_v1_3()
+        worker_a.app.test_client().post('/api/workouts',
+                   data=json.dumps({'category': 'Workout', 'exercise': 'Rowing', 'duration': 20}),
+                   content_type='application/json')
+        response = worker_b.app.test_client().get('/api/workouts/summary')
+        data = json.loads(response.data)
+        assert data['category_totals']['Workout']['time'] == 20
+        assert data['workouts']['Workout'][0]['exercise'] == 'Rowing'
+        worker_a.store.close()
+        worker_b.store.close()
+
+class TestSharedMemoryStorage:
+    """Test the app running on the shared-memory storage engine"""
+    
+    def test_workers_share_workouts(self, tmp_path, monkeypatch):
+        """Test a workout and profile posted to one worker are visible to another"""
+        monkeypatch.setenv('STORAGE_URL', f"mmap:///{tmp_path / 'shm'}")
+        worker_a = load_app_v1_3()
+        worker_b = load_app_v1_3()
+        client_a = worker_a.app.test_client()
+        client_a.post('/api/workouts',
+                   data=json.dumps({'category': 'Cool-down', 'exercise': 'Stretching', 'duration': 15}),
+                   content_type='application/json')
+        client_a.post('/api/user',
+                   data=json.dumps({'name': 'Asha', 'regn_id': 'R-7', 'age': 30, 'gender': 'F',
+                                    'height': 165, 'weight': 60}),
+                   content_type='application/json')
+        client_b = worker_b.app.test_client()
+        data = json.loads(client_b.get('/api/workouts/summary').data)
+        assert data['category_totals']['Cool-down']['time'] == 15
+        assert json.loads(client_b.get('/api/user').data)['name'] == 'Asha'
+        worker_a.store.close()
+        worker_b.store.close()
+
+class TestWorkoutPagination:
+    """Test cursor pagination on GET /api/workouts"""
+    
+    def add_workouts(self, client, count, category='Workout'):
+        """Post count workouts to a category"""
+        for index in range(count):
+            client.post('/api/workouts',
+                       data=json.dumps({'category': category, 'exercise': f'Ex{index}', 'duration': index + 1}),
+                       content_type='application/json')
+    
+    def test_unparameterized_shape_unchanged(self, client_v1_3):
+        """Test the plain endpoint still returns every entry per category"""
+        self.add_workouts(client_v1_3, 2)
+        data = json.loads(client_v1_3.get('/api/workouts').data)
+        assert [entry['exercise'] for entry in data['Workout']] == ['Ex0', 'Ex1']
+    
+    def test_newest_entries_per_category(self, client_v1_3):
+        """Test ?limit= returns the newest entries of each category with a cursor"""
+        self.add_workouts(client_v1_3, 4)
+        data = json.loads(client_v1_3.get('/api/workouts?limit=2&fields=exercise').data)
+        assert data['Workout']['entries'] == [{'exercise': 'Ex3'}, {'exercise': 'Ex2'}]
+        assert data['Warm-up'] == {'entries': [], 'next_cursor': None}
+        
+        cursor = data['Workout']['next_cursor']
+        older = json.loads(client_v1_3.get(f'/api/workouts?limit=2&cursor={cursor}').data)
+        assert older['category'] == 'Workout'
+        assert [entry['exercise'] for entry in older['entries']] == ['Ex1', 'Ex0']
+        assert older['next_cursor'] is None
+    
+    def test_invalid_parameters(self, client_v1_3):
+        """Test bad limits, cursors, fields and categories are rejected"""
+        for query in ('limit=0', 'cursor=bogus', 'fields=secret', 'category=Yoga'):
+            response = client_v1_3.get(f'/api/workouts?{query}')
+            assert response.status_code == 400
+
+class TestWorkoutExport:
+    """Test the streaming /api/workouts/export endpoint"""
+    
+    def test_ndjson_export(self, client_v1_3):
+        """Test every entry is streamed as one NDJSON line"""
+        for exercise in ('Jog', 'Rowing'):
+            client_v1_3.post('/api/workouts',
+                       data=json.dumps({'category': 'Workout', 'exercise': exercise, 'duration': 10}),
+                       content_type='application/json')
+        response = client_v1_3.get('/api/workouts/export')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        assert [line['exercise'] for line in lines] == ['Jog', 'Rowing']
+        assert lines[0]['category'] == 'Workout'
+    
+    def test_csv_export_with_filters(self, client_v1_3):
+        """Test CSV export applies category and date filters"""
+        client_v1_3.post('/api/workouts',
+                   data=json.dumps({'category': 'Warm-up', 'exercise': 'Jog', 'duration': 5}),
+                   content_type='application/json')
+        client_v1_3.post('/api/workouts',
+                   data=json.dumps({'category': 'Workout', 'exercise': 'Squats', 'duration': 5}),
+                   content_type='application/json')
+        today = date.today().isoformat()
+        response = client_v1_3.get(f'/api/workouts/export?format=csv&category=Warm-up&from={today}')
+        lines = response.data.decode().splitlines()
+        assert response.mimetype == 'text/csv'
+        assert lines[0] == 'category,day,exercise,duration,calories,timestamp'
+        assert len(lines) == 2 and lines[1].startswith(f'Warm-up,{today},Jog,5,')
+        
+        response = client_v1_3.get('/api/workouts/export?format=csv&to=2000-01-01')
+        assert response.data.decode().splitlines()[1:] == []
+    
+    def test_invalid_export_parameters(self, client_v1_3):
+        """Test unknown formats, bad dates and categories are rejected"""
+        for query in ('format=xml', 'from=yesterday', 'category=Yoga', 'from=2025-02-01&to=2025-01-01'):
+            assert client_v1_3.get(f'/api/workouts/export?{query}').status_code == 400
+
+class TestWorkoutBatch:
+    """Test the POST /api/workouts/batch bulk ingest endpoint"""
+    
+    def post_batch(self, client, workouts):
+        """Post a batch and return the response"""
+        return client.post('/api/workouts/batch', data=json.dumps({'workouts': workouts}),
+                           content_type='application/json')
+    
+    def test_batch_adds_all_entries(self, client_v1_3):
+        """Test every item is stored with the same calories as a single add"""
+        response = self.post_batch(client_v1_3, [
+            {'category': 'Warm-up', 'exercise': 'Jog', 'duration': 10},
+            {'category': 'Workout', 'exercise': 'Squats', 'duration': 25,
+             'timestamp': '2025-03-01 07:30:00'},
+        ])
+        assert response.status_code == 201
+        data = json.loads(response.data)
+        assert data['added'] == 2
+        assert data['category_totals']['Workout'] == {'count': 1, 'time': 25, 'calories': 183.8}
+        
+        single = client_v1_3.post('/api/workouts',
+                   data=json.dumps({'category': 'Workout', 'exercise': 'Squats', 'duration': 25}),
+                   content_type='application/json')
+        workouts = json.loads(client_v1_3.get('/api/workouts').data)
+        assert workouts['Workout'][0]['calories'] == json.loads(single.data)['workout']['calories']
+        assert workouts['Workout'][0]['timestamp'] == '2025-03-01 07:30:00'
+        assert workouts['Warm-up'][0]['exercise'] == 'Jog'
+    
+    def test_invalid_item_rejects_whole_batch(self, client_v1_3):
+        """Test one bad item stores nothing and is reported by index"""
+        response = self.post_batch(client_v1_3, [
+            {'category': 'Workout', 'exercise': 'Squats', 'duration': 25},
+            {'category': 'Yoga', 'exercise': 'Flow', 'duration': 20},
+            {'category': 'Workout', 'exercise': 'Lunges', 'duration': -5},
+            {'category': 'Workout', 'exercise': 'Plank', 'duration': 5, 'timestamp': 'today'},
+        ])
+        assert response.status_code == 400
+        errors = json.loads(response.data)['errors']
+        assert [error['index'] for error in errors] == [1, 2, 3]
+        assert json.loads(client_v1_3.get('/api/workouts').data)['Workout'] == []
+    
+    def test_timestamps_out_of_range(self, client_v1_3):
+        """Test far-past, pre-1000 and future timestamps are rejected before reaching the store"""
+        future = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+        for timestamp in ('1000-01-01 00:00:00', '0001-01-01 00:00:00', '9999-12-31 23:59:59', future):
+            response = self.post_batch(client_v1_3, [
+                {'category': 'Workout', 'exercise': 'Row', 'duration': 10, 'timestamp': timestamp}])
+            assert response.status_code == 400, timestamp
+        assert json.loads(client_v1_3.get('/api/workouts').data)['Workout'] == []
+    
+    def test_batch_shape_and_size(self, client_v1_3):
+        """Test empty, malformed and oversized batches are rejected"""
+        assert self.post_batch(client_v1_3, []).status_code == 400
+        response = client_v1_3.post('/api/workouts/batch', data=json.dumps([1, 2]),
+                                    content_type='application/json')
+        assert response.status_code == 400
+        oversized = [{'exercise': 'Jog', 'duration': 1}] * (sys.modules['app_v1_3'].MAX_BATCH_SIZE + 1)
+        assert self.post_batch(client_v1_3, oversized).status_code == 400
+
+class TestConditionalRequests:
+    """Test ETags and If-None-Match on the read endpoints"""
+    
+    def test_unchanged_data_is_not_modified(self, client_v1_3):
+        """Test polling with the last ETag gets an empty 304"""
+        for path in ('/api/workouts', '/api/workouts/summary', '/api/progress', '/api/user'):
+            first = client_v1_3.get(path)
+            assert first.headers['Cache-Control'] == 'private, no-cache'
+            etag = first.headers['ETag']
+            second = client_v1_3.get(path, headers={'If-None-Match': etag})
+            assert second.status_code == 304
+            assert second.data == b''
+            assert second.headers['ETag'] == etag
+    
+    def test_writes_change_the_etag(self, client_v1_3):
+        """Test a workout or profile write invalidates earlier ETags"""
+        etag = client_v1_3.get('/api/workouts').headers['ETag']
+        client_v1_3.post('/api/workouts',
+                   data=json.dumps({'category': 'Workout', 'exercise': 'Squats', 'duration': 20}),
+                   content_type='application/json')
+        response = client_v1_3.get('/api/workouts', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        
+        etag = response.headers['ETag']
+        client_v1_3.post('/api/user',
+                   data=json.dumps({'name': 'A', 'regn_id': 'R1', 'age': 30, 'gender': 'M',
+                                    'height': 180, 'weight': 80}),
+                   content_type='application/json')
+        assert client_v1_3.get('/api/workouts', headers={'If-None-Match': etag}).status_code == 200
+    
+    def test_etag_depends_on_query_and_member(self, client_v1_3):
+        """Test different representations never share an ETag"""
+        etags = {client_v1_3.get(path).headers['ETag'] for path in (
+            '/api/workouts', '/api/workouts?limit=5', '/api/workouts?regn_id=R1')}
+        assert len(etags) == 3
+    
+    def test_plan_catalogs_are_cacheable(self, client_v1_3):
+        """Test the static catalogs carry long-lived caching and revalidate"""
+        for path in ('/api/workout-plans', '/api/diet-plans'):
+            response = client_v1_3.get(path)
+            assert 'max-age=86400' in response.headers['Cache-Control']
+            revalidated = client_v1_3.get(path, headers={'If-None-Match': response.headers['ETag']})
+            assert revalidated.status_code == 304
+    
+    def test_plan_catalogs_compressed(self, client_v1_3):
+        """Test the catalogs are served from their pre-compressed bodies"""
+        plain = client_v1_3.get('/api/diet-plans')
+        response = client_v1_3.get('/api/diet-plans', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data) == plain.data
+    
+    def test_compressed_responses_revalidate(self, client_v1_3):
+        """Test gzipped bodies carry a suffixed ETag that still yields 304"""
+        for index in range(20):
+            client_v1_3.post('/api/workouts',
+                       data=json.dumps({'category': 'Workout', 'exercise': f'Ex{index}', 'duration': 10}),
+                       content_type='application/json')
+        response = client_v1_3.get('/api/workouts', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert len(json.loads(gzip.decompress(response.data))['Workout']) == 20
+        etag = response.headers['ETag']
+        assert etag.endswith('-gzip"')
+        revalidated = client_v1_3.get('/api/workouts',
+                                      headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert revalidated.status_code == 304
+        assert revalidated.headers['ETag'] == etag
+    
+    def test_shared_store_versions_across_workers(self, tmp_path, monkeypatch):
+        """Test a write on one worker invalidates ETags served by another"""
+        monkeypatch.setenv('STORAGE_URL', f"sqlite:///{tmp_path / 'aceest.db'}")
+        worker_a = load_app_v1_3()
+        worker_b = load_app_v1_3()
+        client_a = worker_a.app.test_client()
+        etag = client_a.get('/api/workouts/summary').headers['ETag']
+        assert worker_b.app.test_client().get('/api/workouts/summary').headers['ETag'] == etag
+        worker_b.app.test_client().post('/api/workouts',
+                   data=json.dumps({'category': 'Workout', 'exercise': 'Rowing', 'duration': 20}),
+                   content_type='application/json')
+        assert client_a.get('/api/workouts/summary', headers={'If-None-Match': etag}).status_code == 200
+        worker_a.store.close()
+        worker_b.store.close()
+    
+    def test_header_scoped_members_on_shared_store(self, tmp_path, monkeypatch):
+        """Test members of one SQLite database never share ETags, and responses vary on X-Regn-Id"""
+        monkeypatch.setenv('STORAGE_URL', f"sqlite:///{tmp_path / 'aceest.db'}")
+        module = load_app_v1_3()
+        client = module.app.test_client()
+        for member_id, exercise in (('A1', 'Rowing'), ('B2', 'Cycling')):
+            client.post('/api/workouts', headers={'X-Regn-Id': member_id},
+                        data=json.dumps({'category': 'Workout', 'exercise': exercise, 'duration': 20}),
+                        content_type='application/json')
+        first = client.get('/api/workouts', headers={'X-Regn-Id': 'A1'})
+        assert 'X-Regn-Id' in first.headers['Vary']
+        response = client.get('/api/workouts', headers={'X-Regn-Id': 'B2', 'If-None-Match': first.headers['ETag']})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != first.headers['ETag']
+        assert [entry['exercise'] for entry in json.loads(response.data)['Workout']] == ['Cycling']
+        revalidated = client.get('/api/workouts', headers={'X-Regn-Id': 'A1', 'If-None-Match': first.headers['ETag']})
+        assert revalidated.status_code == 304
+        assert 'X-Regn-Id' in revalidated.headers['Vary']
+        module.store.close()
+
+class TestRenderCache:
+    """Test fragment-cached rendering of the HTML pages"""
+
+    def post_workout(self, client, category='Workout', exercise='Running', query=''):
+        client.post('/api/workouts' + query,
+                    data=json.dumps({'category': category, 'exercise': exercise, 'duration': 30}),
+                    content_type='application/json')
+
+    def test_summary_lists_entries(self, client_v1_3):
+        """Test the cached cards show every logged entry"""
+        self.post_workout(client_v1_3, exercise='Rowing')
+        self.post_workout(client_v1_3, category='Warm-up', exercise='Skipping')
+        html = client_v1_3.get('/summary').data.decode()
+        assert 'Rowing - 30 min' in html
+        assert 'Skipping - 30 min' in html
+        assert html.count('No workouts logged yet.') == 1
+
+    def test_repeat_summary_is_served_from_cache(self, client_v1_3):
+        """Test an unchanged summary renders no card again"""
+        cache = sys.modules['app_v1_3'].render_cache
+        first = client_v1_3.get('/summary').data
+        misses = cache.stats()['misses']
+        assert client_v1_3.get('/summary').data == first
+        assert cache.stats()['misses'] == misses
+
+    def test_new_workout_rerenders_only_its_category(self, client_v1_3):
+        """Test one write invalidates only its own category's card"""
+        cache = sys.modules['app_v1_3'].render_cache
+        client_v1_3.get('/summary')
+        misses = cache.stats()['misses']
+        self.post_workout(client_v1_3, exercise='Cycling')
+        html = client_v1_3.get('/summary').data.decode()
+        assert 'Cycling - 30 min' in html
+        assert cache.stats()['misses'] == misses + 1
+
+    def test_members_get_their_own_cards(self, client_v1_3):
+        """Test cached cards are never shared between members"""
+        self.post_workout(client_v1_3, exercise='Rowing', query='?regn_id=R-1')
+        client_v1_3.get('/summary?regn_id=R-1')
+        html = client_v1_3.get('/summary?regn_id=R-2').data.decode()
+        assert 'Rowing' not in html
+
+    def test_index_is_cached_by_data_version(self, client_v1_3):
+        """Test the home page is rendered once per data version"""
+        cache = sys.modules['app_v1_3'].render_cache
+        first = client_v1_3.get('/').data
+        hits = cache.stats()['hits']
+        assert client_v1_3.get('/').data == first
+        assert cache.stats()['hits'] == hits + 1
+
+    def test_cards_follow_writes_from_other_workers(self, tmp_path, monkeypatch):
+        """Test a worker's cached card is replaced after another worker writes"""
+        monkeypatch.setenv('STORAGE_URL', f"sqlite:///{tmp_path / 'aceest.db'}")
+        worker_a = load_app_v1_3()
+        worker_b = load_app_v1_3()
+        client_a = worker_a.app.test_client()
+        client_a.get('/summary')
+        self.post_workout(worker_b.app.test_client(), exercise='Rowing')
+        assert 'Rowing - 30 min' in client_a.get('/summary').data.decode()
+        worker_a.store.close()
+        worker_b.store.close()
+
+class TestLiveUpdates:
+    """Test the /api/stream Server-Sent Events endpoint"""
+
+    def open_stream(self, client, query=''):
+        response = client.get('/api/stream' + query, buffered=False)
+        return response, iter(response.response)
+
+    def read_event(self, stream):
+        fields = dict(line.split(': ', 1) for line in next(stream).decode().strip().split('\n'))
+        return fields['event'], json.loads(fields['data'])
+
+    def test_stream_opens_with_totals(self, client_v1_3):
+        """Test the stream is event-stream and starts with all category totals"""
+        response, stream = self.open_stream(client_v1_3)
+        assert response.mimetype == 'text/event-stream'
+        assert response.headers['Cache-Control'] == 'no-cache'
+        event, data = self.read_event(stream)
+        assert event == 'totals'
+        assert set(data['category_totals']) == {'Warm-up', 'Workout', 'Cool-down'}
+        response.close()
+
+    def test_new_workout_is_pushed(self, client_v1_3):
+        """Test adding a workout pushes the entry and its category totals"""
+        response, stream = self.open_stream(client_v1_3)
+        self.read_event(stream)
+        client_v1_3.post('/api/workouts',
+                   data=json.dumps({'category': 'Workout', 'exercise': 'Rowing', 'duration': 30}),
+                   content_type='application/json')
+        event, data = self.read_event(stream)
+        assert event == 'workout'
+        assert data['entry']['exercise'] == 'Rowing'
+        assert data['category_totals'] == {'Workout': {'time': 30, 'calories': data['entry']['calories']}}
+        response.close()
+
+    def test_batch_is_pushed(self, client_v1_3):
+        """Test a batch pushes one event with the touched categories' totals"""
+        response, stream = self.open_stream(client_v1_3)
+        self.read_event(stream)
+        client_v1_3.post('/api/workouts/batch', data=json.dumps({'workouts': [
+            {'category': 'Warm-up', 'exercise': 'Jog', 'duration': 10},
+            {'category': 'Warm-up', 'exercise': 'Skip', 'duration': 5}
+        ]}), content_type='application/json')
+        event, data = self.read_event(stream)
+        assert event == 'batch'
+        assert data['added'] == 2
+        assert data['category_totals']['Warm-up']['time'] == 15
+        response.close()
+
+    def test_events_are_scoped_to_the_member(self, client_v1_3):
+        """Test a member's stream does not see other members' writes"""
+        response, stream = self.open_stream(client_v1_3, '?regn_id=R-1')
+        self.read_event(stream)
+        client_v1_3.post('/api/workouts?regn_id=R-2',
+                   data=json.dumps({'category': 'Workout', 'exercise': 'Rowing', 'duration': 30}),
+                   content_type='application/json')
+        assert sys.modules['app_v1_3'].broker.stats()['published'] == 0
+        response.close()
+
+    def test_heartbeat_and_disconnect(self, client_v1_3):
+        """Test idle streams send keep-alives and closing unsubscribes"""
+        module = sys.modules['app_v1_3']
+        module.SSE_HEARTBEAT = 0.01
+        response, stream = self.open_stream(client_v1_3)
+        self.read_event(stream)
+        assert next(stream) == b': keepalive\n\n'
+        assert module.broker.stats()['subscribers'] == 1
+        response.close()
+        assert module.broker.stats()['subscribers'] == 0
+
+    def test_subscriber_limit(self, client_v1_3):
+        """Test a full broker answers 503"""
+        module = sys.modules['app_v1_3']
+        module.broker.max_subscribers = 1
+        response, _stream = self.open_stream(client_v1_3)
+        assert client_v1_3.get('/api/stream').status_code == 503
+        response.close()
+
+class TestDerivedCalories:
+    """Test calories derived from weight history and the MET table"""
+
+    def save_profile(self, client, weight):
+        return client.post('/api/user', data=json.dumps({
+            'name': 'Alex', 'regn_id': 'R-1', 'age': 30, 'gender': 'M', 'height': 180, 'weight': weight
+        }), content_type='application/json')
+
+    def log(self, client, duration=30):
+        response = client.post('/api/workouts',
+                   data=json.dumps({'category': 'Workout', 'exercise': 'Rowing', 'duration': duration}),
+                   content_type='application/json')
+        return json.loads(response.data)['workout']
+
+    def record_weight(self, client, weight, effective_from=None):
+        return client.post('/api/user/weight', data=json.dumps({'weight': weight, 'effective_from': effective_from}),
+                   content_type='application/json')
+
+    def test_weight_change_keeps_earlier_entries(self, client_v1_3):
+        """Test a new profile weight applies from now on only"""
+        self.save_profile(client_v1_3, 80)
+        entry = self.log(client_v1_3)
+        response = self.save_profile(client_v1_3, 60)
+        info = json.loads(response.data)['user_info']
+        assert info['weight_history'][-1][1] == 60
+        assert info['weight_version'] == 2
+        assert not info['weight_corrected']
+        workouts = json.loads(client_v1_3.get('/api/workouts').data)
+        assert workouts['Workout'][0]['calories'] == entry['calories'] == 252.0
+        assert self.log(client_v1_3)['calories'] == 189.0
+
+    def test_backdated_weight_rederives_history(self, client_v1_3):
+        """Test a backdated correction changes every read of the affected entries"""
+        self.log(client_v1_3)
+        response = self.record_weight(client_v1_3, 60, date.today().isoformat())
+        assert response.status_code == 201
+        info = json.loads(response.data)['user_info']
+        assert info['weight'] == 60
+        assert info['weight_corrected']
+
+        assert json.loads(client_v1_3.get('/api/workouts').data)['Workout'][0]['calories'] == 189.0
+        page = json.loads(client_v1_3.get('/api/workouts?category=Workout&limit=5').data)
+        assert page['entries'][0]['calories'] == 189.0
+        summary = json.loads(client_v1_3.get('/api/workouts/summary').data)
+        assert summary['total_calories'] == 189.0
+        assert summary['workouts']['Workout'][0]['calories'] == 189.0
+        progress = json.loads(client_v1_3.get('/api/progress?days=1').data)
+        assert progress['buckets'][0]['calories'] == 189.0
+        export = client_v1_3.get('/api/workouts/export').data.decode()
+        assert json.loads(export.splitlines()[0])['calories'] == 189.0
+        assert b'189.0' in client_v1_3.get('/summary').data
+
+    def test_met_correction_rederives_history(self, client_v1_3):
+        """Test correcting a MET value re-derives logged entries and changes ETags"""
+        module = sys.modules['app_v1_3']
+        self.log(client_v1_3)
+        etag = client_v1_3.get('/api/workouts/summary').headers['ETag']
+        module.update_met_values({'Workout': 8.0})
+        response = client_v1_3.get('/api/workouts/summary', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert json.loads(response.data)['total_calories'] == round(8.0 * 3.5 * 70 / 200 * 30, 1)
+        assert module.MET_VALUES['Workout'] == 8.0
+
+    def test_met_correction_reaches_other_workers(self, tmp_path, monkeypatch):
+        """Test a correction made in one worker is served by the others and after a restart"""
+        monkeypatch.setenv('STORAGE_URL', f"sqlite:///{tmp_path / 'aceest.db'}")
+        worker_a = load_app_v1_3()
+        worker_b = load_app_v1_3()
+        self.log(worker_a.app.test_client())
+        worker_a.update_met_values({'Workout': 8.0})
+        expected = round(8.0 * 3.5 * 70 / 200 * 30, 1)
+        restarted = load_app_v1_3()
+        for worker in (worker_a, worker_b, restarted):
+            response = worker.app.test_client().get('/api/workouts/summary')
+            assert json.loads(response.data)['total_calories'] == expected
+            assert worker.met_table.version == worker_a.met_table.version
+            worker.store.close()
+
+    def test_weight_records(self, client_v1_3):
+        """Test weight records are validated and update the profile figures"""
+        assert self.record_weight(client_v1_3, 0).status_code == 400
+        assert self.record_weight(client_v1_3, 70, '2999-01-01').status_code == 400
+        assert self.record_weight(client_v1_3, 70, 'yesterday').status_code == 400
+        self.save_profile(client_v1_3, 80)
+        response = self.record_weight(client_v1_3, 72.9)
+        assert response.status_code == 201
+        info = json.loads(response.data)['user_info']
+        assert info['weight'] == 72.9
+        assert info['bmi'] == 22.5
+
+class TestJournalDurability:
+    """Test the optional journal durability mode"""
+    
+    def test_restart_keeps_workouts(self, tmp_path, monkeypatch):
+        """Test workouts posted before a restart are served after it"""
+        monkeypatch.setenv('JOURNAL_DIR', str(tmp_path / 'journal'))
+        module = load_app_v1_3()
+        module.app.test_client().post('/api/workouts',
+                   data=json.dumps({'category': 'Warm-up', 'exercise': 'Jog', 'duration': 10}),
+                   content_type='application/json')
+        module.store.close()
+        
+        restarted = load_app_v1_3()
+        response = restarted.app.test_client().get('/api/workouts')
+        data = json.loads(response.data)
+        assert data['Warm-up'][0]['exercise'] == 'Jog'
+        restarted.store.close()
+    
+    def test_durable_engines_refuse_the_journal(self, tmp_path, monkeypatch):
+        """Test JOURNAL_DIR fails fast on engines that keep their data already"""
+        monkeypatch.setenv('JOURNAL_DIR', str(tmp_path / 'journal'))
+        monkeypatch.setenv('STORAGE_URL', f"sqlite:///{tmp_path / 'aceest.db'}")
+        with pytest.raises(ValueError, match='JOURNAL_DIR'):
+            load_app_v1_3()
+
+class TestProgressRange:
+    """Test bucketed /api/progress range queries"""
+    
+    def test_progress_days_buckets(self, client_v1_3):
+        """Test the last N days are returned as daily buckets"""
+        client_v1_3.post('/api/workouts',
+                   data=json.dumps({'category': 'Workout', 'exercise': 'Row', 'duration': 25}),
+                   content_type='application/json')
+        response = client_v1_3.get('/api/progress?days=7&bucket=day')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert len(data['buckets']) == 7
+        today = data['buckets'][-1]
+        assert today['categories']['Workout']['time'] == 25
+        assert today['time'] == 25
+    
+    def test_progress_month_range(self, client_v1_3):
+        """Test explicit from/to ranges with monthly buckets"""
+        response = client_v1_3.get('/api/progress?from=2025-01-15&to=2025-03-02&bucket=month')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert [b['start'] for b in data['buckets']] == ['2025-01-15', '2025-02-01', '2025-03-01']
+    
+    def test_progress_invalid_range(self, client_v1_3):
+        """Test invalid ranges and buckets are rejected"""
+        assert client_v1_3.get('/api/progress?from=2025-02-01&to=2025-01-01').status_code == 400
+        assert client_v1_3.get('/api/progress?bucket=year').status_code == 400
+        assert client_v1_3.get('/api/progress?from=yesterday').status_code == 400
+        assert client_v1_3.get('/api/progress?from=2000-01-01&to=2025-01-01&bucket=day').status_code == 400
+    
+    def test_progress_range_limits(self, client_v1_3):
+        """Test ranges at the edges of the calendar answer 400 or buckets, never 500"""
+        for query in ('days=99999999999', 'days=36601', 'to=0001-01-05&days=30'):
+            response = client_v1_3.get('/api/progress?' + query)
+            assert response.status_code == 400, query
+            assert json.loads(response.data)['error'].startswith('Invalid input')
+        for bucket in ('day', 'week', 'month'):
+            response = client_v1_3.get(f'/api/progress?from=9999-12-25&to=9999-12-31&bucket={bucket}')
+            assert response.status_code == 200, bucket
+            assert json.loads(response.data)['buckets'][-1]['end'] == '9999-12-31'
+
+class TestProgressSeries:
+    """Test downsampled /api/progress/series chart data"""
+    
+    def add_history(self, client, days):
+        """Log one workout a day, ending 2025-12-31"""
+        end = date(2025, 12, 31).toordinal()
+        workouts = [{'category': 'Workout' if day % 2 else 'Warm-up', 'exercise': 'Row', 'duration': 10 + day % 50,
+                     'timestamp': date.fromordinal(end - day).isoformat() + ' 08:00:00'} for day in range(days)]
+        for start in range(0, days, 5000):
+            client.post('/api/workouts/batch', data=json.dumps({'workouts': workouts[start:start + 5000]}),
+                        content_type='application/json')
+    
+    def test_whole_history_is_downsampled(self, client_v1_3):
+        """Test a multi-year daily series is reduced to the requested points"""
+        self.add_history(client_v1_3, 3 * 365)
+        response = client_v1_3.get('/api/progress/series?to=2025-12-31&points=200')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['from'] == '2023-01-02'
+        assert data['buckets'] == 3 * 365
+        assert len(data['series']) == 200
+        assert data['series'][0]['start'] == '2023-01-02'
+        assert data['series'][-1]['end'] == '2025-12-31'
+        assert response.headers['ETag']
+    
+    def test_buckets_sum_the_days(self, client_v1_3):
+        """Test short series are returned whole, with empty buckets as zeros"""
+        self.add_history(client_v1_3, 60)
+        data = json.loads(client_v1_3.get('/api/progress/series?from=2025-10-01&to=2026-01-31&bucket=month').data)
+        assert [point['start'] for point in data['series']] == ['2025-10-01', '2025-11-01', '2025-12-01', '2026-01-01']
+        november = sum(10 + day % 50 for day in range(31, 60))
+        assert data['series'][1]['time'] == november
+        assert data['series'][3]['time'] == 0
+        by_category = json.loads(client_v1_3.get(
+            '/api/progress/series?from=2025-12-31&to=2025-12-31&category=Warm-up').data)
+        assert by_category['series'][0]['time'] == 10
+    
+    def test_minmax_keeps_extremes(self, client_v1_3):
+        """Test min/max bucketing keeps the longest day"""
+        self.add_history(client_v1_3, 400)
+        data = json.loads(client_v1_3.get('/api/progress/series?to=2025-12-31&points=20&method=minmax').data)
+        assert len(data['series']) <= 20
+        assert max(point['time'] for point in data['series']) == 59
+    
+    def test_invalid_series_queries(self, client_v1_3):
+        """Test invalid parameters are rejected"""
+        for query in ('points=2', 'points=100000', 'method=stride', 'metric=reps', 'bucket=year',
+                      'category=Yoga', 'from=2025-02-01&to=2025-01-01', 'from=1900-01-01&to=2025-01-01'):
+            assert client_v1_3.get('/api/progress/series?' + query).status_code == 400
+    
+    def test_series_range_limits(self, client_v1_3):
+        """Test unrepresentable or century-spanning ranges answer 400, never 500"""
+        for query in ('days=99999999999', 'to=0001-01-05&days=30', 'from=0001-01-01&bucket=month',
+                      'from=2025-01-01&to=9999-12-31&bucket=month'):
+            response = client_v1_3.get('/api/progress/series?' + query)
+            assert response.status_code == 400, query
+            assert json.loads(response.data)['error'].startswith('Invalid input')
+        response = client_v1_3.get('/api/progress/series?from=9999-12-31&to=9999-12-31&bucket=week')
+        assert response.status_code == 200
+        assert json.loads(response.data)['series'][0]['end'] == '9999-12-31'
+
+class TestStats:
+    """Test /api/stats duration and calorie percentiles"""
+    
+    def add(self, client, exercise, duration, category='Workout', query=''):
+        client.post('/api/workouts' + query,
+                    data=json.dumps({'category': category, 'exercise': exercise, 'duration': duration}),
+                    content_type='application/json')
+    
+    def test_percentiles_follow_writes(self, client_v1_3):
+        """Test stats are built once and then updated by each write"""
+        module = sys.modules['app_v1_3']
+        for duration in range(1, 51):
+            self.add(client_v1_3, 'Rowing', duration)
+        data = json.loads(client_v1_3.get('/api/stats').data)
+        assert data['categories']['Workout']['count'] == 50
+        assert data['categories']['Workout']['duration']['p50'] == pytest.approx(25, rel=0.01)
+        assert data['exercises']['Rowing']['duration']['p99'] == pytest.approx(49, rel=0.01)
+        
+        self.add(client_v1_3, 'Jog', 10, 'Warm-up')
+        client_v1_3.post('/api/workouts/batch', data=json.dumps({'workouts': [
+            {'category': 'Warm-up', 'exercise': 'Jog', 'duration': 12}
+        ]}), content_type='application/json')
+        data = json.loads(client_v1_3.get('/api/stats').data)
+        assert data['exercises']['Jog']['count'] == 2
+        assert module.workout_stats.stats() == {'datasets': 1, 'rebuilds': 1, 'updates': 2}
+    
+    def test_sketches_merge_across_workers(self, client_v1_3):
+        """Test serialized sketches merge into the stats of all their entries"""
+        from aceest.sketches import merge_stats
+        for duration in (10, 20, 30):
+            self.add(client_v1_3, 'Rowing', duration)
+        sketches = json.loads(client_v1_3.get('/api/stats?format=sketch').data)
+        merged = merge_stats([sketches, sketches])
+        assert merged.summary()['categories']['Workout']['count'] == 6
+        assert client_v1_3.get('/api/stats?format=xml').status_code == 400
+    
+    def test_gym_stats_merge_members(self, client_v1_3):
+        """Test gym-wide stats cover every member"""
+        self.add(client_v1_3, 'Rowing', 30, query='?regn_id=R-1')
+        self.add(client_v1_3, 'Rowing', 40, query='?regn_id=R-2')
+        data = json.loads(client_v1_3.get('/api/stats/gym').data)
+        assert data['exercises']['Rowing']['count'] == 2
+    
+    def test_stats_cache_follows_the_registry(self, tmp_path, monkeypatch):
+        """Test member stats are kept while the store is and dropped with it, never thrashed"""
+        monkeypatch.setenv('STORAGE_URL', f"sqlite:///{tmp_path / 'aceest.db'}")
+        monkeypatch.setenv('MEMBER_SHARDS', '1')
+        monkeypatch.setenv('MEMBER_CACHE_SIZE', '4')
+        module = load_app_v1_3()
+        client = module.app.test_client()
+        for i in range(6):
+            self.add(client, 'Rowing', 30, query=f'?regn_id=R-{i}')
+        assert module.members.evictions == 3
+        first = json.loads(client.get('/api/stats/gym').data)
+        rebuilds = module.workout_stats.stats()['rebuilds']
+        assert json.loads(client.get('/api/stats/gym').data) == first
+        assert module.workout_stats.stats()['rebuilds'] == rebuilds
+        assert module.workout_stats.stats()['datasets'] == len(module.members)
+        module.store.close()
+    
+    def test_evictions_drop_calorie_memos(self, tmp_path, monkeypatch):
+        """Test derived-calorie memos of evicted members are dropped with their stores"""
+        monkeypatch.setenv('STORAGE_URL', f"sqlite:///{tmp_path / 'aceest.db'}")
+        monkeypatch.setenv('MEMBER_SHARDS', '1')
+        monkeypatch.setenv('MEMBER_CACHE_SIZE', '4')
+        module = load_app_v1_3()
+        module.update_met_values({'Workout': 8.0})
+        client = module.app.test_client()
+        for i in range(6):
+            self.add(client, 'Rowing', 30, query=f'?regn_id=R-{i}')
+            client.get(f'/api/workouts/summary?regn_id=R-{i}')
+        assert module.members.evictions == 3
+        assert module.calorie_model.stats()['members'] <= len(module.members)
+        module.store.close()
+    
+    def test_memory_members_with_data_are_kept(self, monkeypatch):
+        """Test the in-memory engine only evicts members without data, which it cannot lose"""
+        monkeypatch.setenv('MEMBER_SHARDS', '1')
+        monkeypatch.setenv('MEMBER_CACHE_SIZE', '2')
+        module = load_app_v1_3()
+        client = module.app.test_client()
+        for i in range(4):
+            self.add(client, 'Rowing', 30, query=f'?regn_id=R-{i}')
+        assert module.members.evictions == 0
+        assert len(module.members) == 5
+        for i in range(4):
+            assert json.loads(client.get(f'/api/stats?regn_id=R-{i}').data)['categories']['Workout']['count'] == 1
+    
+    def test_cohort_stats(self, client_v1_3):
+        """Test BMI and BMR figures over every complete member profile"""
+        assert json.loads(client_v1_3.get('/api/stats/cohort').data) == {'members': 0, 'bmi': None, 'bmr': None}
+        for regn_id, gender, weight in (('R-1', 'M', 70), ('R-2', 'F', 95)):
+            client_v1_3.post(f'/api/user?regn_id={regn_id}', data=json.dumps({
+                'name': regn_id, 'regn_id': regn_id, 'age': 30, 'gender': gender, 'height': 175, 'weight': weight
+            }), content_type='application/json')
+        self.add(client_v1_3, 'Rowing', 30, query='?regn_id=R-3')
+        data = json.loads(client_v1_3.get('/api/stats/cohort').data)
+        assert data['members'] == 2
+        assert data['bmi'] == {'mean': 26.9, 'min': 22.9, 'max': 31.0,
+                               'bands': {'underweight': 0, 'normal': 1, 'overweight': 0, 'obese': 1}}
+        assert data['bmr'] == {'mean': 1691.0, 'min': 1649.0, 'max': 1733.0}
+    
+    def test_stats_use_derived_calories(self, client_v1_3):
+        """Test a MET correction is reflected in the calorie percentiles"""
+        self.add(client_v1_3, 'Rowing', 30)
+        sys.modules['app_v1_3'].update_met_values({'Workout': 8.0})
+        data = json.loads(client_v1_3.get('/api/stats').data)
+        assert data['categories']['Workout']['calories']['p50'] == pytest.approx(294.0, rel=0.01)
+
+class TestExerciseSuggestions:
+    """Test /api/exercises/suggest autocomplete"""
+    
+    def test_plan_names_are_suggested(self, client_v1_3):
+        """Test the plan exercises are known before anything is logged"""
+        data = json.loads(client_v1_3.get('/api/exercises/suggest?q=pu').data)
+        assert data['suggestions'] == [{'name': 'Push-ups', 'count': 0}]
+    
+    def test_logged_names_rank_by_frequency(self, client_v1_3):
+        """Test every insert updates the index"""
+        for exercise in ('Plank walk', 'Plank walk'):
+            client_v1_3.post('/api/workouts', data=json.dumps({'exercise': exercise, 'duration': 10}),
+                             content_type='application/json')
+        client_v1_3.post('/api/workouts/batch', data=json.dumps({'workouts': [
+            {'exercise': 'Pilates', 'duration': 30}, {'exercise': 'plank walk', 'duration': 5}
+        ]}), content_type='application/json')
+        data = json.loads(client_v1_3.get('/api/exercises/suggest?q=P&limit=3').data)
+        assert data['suggestions'] == [{'name': 'Plank walk', 'count': 3}, {'name': 'Pilates', 'count': 1},
+                                       {'name': 'Plank', 'count': 0}]
+    
+    def test_member_history_is_indexed_on_load(self, tmp_path, monkeypatch):
+        """Test names logged before a restart are suggested after it"""
+        monkeypatch.setenv('STORAGE_URL', f"sqlite:///{tmp_path / 'aceest.db'}")
+        module = load_app_v1_3()
+        module.app.test_client().post('/api/workouts?regn_id=R-1', data=json.dumps({'exercise': 'Kettlebell swing', 'duration': 10}),
+                                      content_type='application/json')
+        module.store.close()
+        restarted = load_app_v1_3()
+        client = restarted.app.test_client()
+        assert json.loads(client.get('/api/exercises/suggest?q=kettle').data)['suggestions'] == []
+        client.get('/api/workouts?regn_id=R-1')
+        assert json.loads(client.get('/api/exercises/suggest?q=kettle').data)['suggestions'] == [
+            {'name': 'Kettlebell swing', 'count': 1}]
+        restarted.store.close()
+    
+    def test_invalid_suggest_queries(self, client_v1_3):
+        """Test limits and overlong prefixes are rejected"""
+        assert client_v1_3.get('/api/exercises/suggest?q=a&limit=0').status_code == 400
+        assert client_v1_3.get('/api/exercises/suggest?q=a&limit=many').status_code == 400
+        assert client_v1_3.get('/api/exercises/suggest?q=' + 'a' * 101).status_code == 400
+    
+    def test_overlong_names_are_rejected(self, client_v1_3):
+        """Test exercise names past MAX_EXERCISE_NAME are refused before reaching the index"""
+        name = 'a' * 101
+        response = client_v1_3.post('/api/workouts', data=json.dumps({'exercise': name, 'duration': 10}),
+                                    content_type='application/json')
+        assert response.status_code == 400
+        response = client_v1_3.post('/api/workouts/batch', data=json.dumps({'workouts': [
+            {'exercise': name, 'duration': 10}]}), content_type='application/json')
+        assert response.status_code == 400
+        assert json.loads(client_v1_3.get('/api/exercises/suggest?q=aaa').data)['suggestions'] == []
+
+class TestRateLimiting:
+    """Test per-client token buckets on the write endpoints"""
+
+    WORKOUT = json.dumps({'category': 'Workout', 'exercise': 'Run', 'duration': 30})
+
+    def post_workout(self, client, path='/api/workouts', address='10.0.0.1', headers=None):
+        """Log a workout from a client address"""
+        return client.post(path, data=self.WORKOUT, content_type='application/json',
+                           environ_base={'REMOTE_ADDR': address}, headers=headers)
+
+    @pytest.fixture
+    def limited(self, monkeypatch):
+        """App with a burst of 3 workouts per client"""
+        monkeypatch.setenv('RATE_LIMITS', 'add_workout=1/min:3')
+        return load_app_v1_3()
+
+    def test_client_over_budget_gets_429(self, limited):
+        """Test requests past the burst are refused with Retry-After"""
+        client = limited.app.test_client()
+        assert [self.post_workout(client).status_code for _ in range(3)] == [201] * 3
+        response = self.post_workout(client)
+        assert response.status_code == 429
+        assert 'error' in json.loads(response.data)
+        assert 1 <= int(response.headers['Retry-After']) <= 60
+        assert len(limited.workouts['Workout']) == 3
+        assert limited.rate_limiter.stats() == {'allowed': 3, 'limited': 1}
+
+    def test_other_clients_are_unaffected(self, limited):
+        """Test one client spending its budget does not limit the others"""
+        client = limited.app.test_client()
+        for _ in range(4):
+            self.post_workout(client)
+        assert self.post_workout(client, address='10.0.0.2').status_code == 201
+        assert self.post_workout(client, '/api/workouts?regn_id=R-1', '10.0.0.3').status_code == 201
+        assert client.get('/api/workouts', environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code == 200
+
+    def test_members_have_their_own_budget(self, limited):
+        """Test scoped requests are counted per regn_id, wherever they come from"""
+        client = limited.app.test_client()
+        for address in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+            assert self.post_workout(client, '/api/workouts?regn_id=R-1', address).status_code == 201
+        assert self.post_workout(client, '/api/workouts?regn_id=R-1', '10.0.0.4').status_code == 429
+        assert self.post_workout(client, address='10.0.0.4').status_code == 201
+    
+    def test_members_do_not_lift_the_address_budget(self, limited):
+        """Test naming a different regn_id per request still spends the address's budget"""
+        client = limited.app.test_client()
+        statuses = [self.post_workout(client, f'/api/workouts?regn_id=R-{i}').status_code for i in range(4)]
+        assert statuses == [201, 201, 201, 429]
+
+    def test_forwarded_address_behind_proxy(self, monkeypatch):
+        """Test the client address is taken from X-Forwarded-For behind a proxy"""
+        monkeypatch.setenv('RATE_LIMITS', 'add_workout=1/min:1')
+        monkeypatch.setenv('RATE_LIMIT_PROXY_HOPS', '1')
+        client = load_app_v1_3().app.test_client()
+        assert self.post_workout(client, headers={'X-Forwarded-For': 'spoofed, 192.0.2.1'}).status_code == 201
+        assert self.post_workout(client, headers={'X-Forwarded-For': 'other, 192.0.2.1'}).status_code == 429
+        assert self.post_workout(client, headers={'X-Forwarded-For': '192.0.2.2'}).status_code == 201
+
+    def test_budget_shared_between_workers(self, tmp_path, monkeypatch):
+        """Test two app processes on one RATE_LIMIT_FILE spend one budget"""
+        monkeypatch.setenv('RATE_LIMITS', 'save_user_info=1/min:2')
+        monkeypatch.setenv('RATE_LIMIT_FILE', str(tmp_path / 'ratelimit'))
+        profile = json.dumps({'name': 'A', 'regn_id': 'R-1', 'age': 30, 'gender': 'M',
+                              'height': 175, 'weight': 70})
+        workers = [load_app_v1_3(), load_app_v1_3()]
+        statuses = [worker.app.test_client().post('/api/user', data=profile, content_type='application/json').status_code
+                    for worker in workers + workers]
+        assert statuses == [201, 201, 429, 429]
+        for worker in workers:
+            worker.rate_limiter.close()
+
+    def test_limits_can_be_disabled(self, monkeypatch):
+        """Test a route set to off is not limited"""
+        monkeypatch.setenv('RATE_LIMITS', 'add_workouts_batch=off')
+        module = load_app_v1_3()
+        client = module.app.test_client()
+        batch = json.dumps({'workouts': [{'exercise': 'Run', 'duration': 5}]})
+        assert all(client.post('/api/workouts/batch', data=batch, content_type='application/json').status_code == 201
+                   for _ in range(30))
+        assert module.rate_limiter.budgets['add_workout'] is not None
+
+class TestMetrics:
+    """Test the /metrics endpoint"""
+
+    def samples(self, client):
+        """{series: value} of a scrape"""
+        text = client.get('/metrics').get_data(as_text=True)
+        return dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+
+    def test_requests_and_entries(self, client_v1_3):
+        """Test request counts per endpoint and status, and entries per category"""
+        workout = json.dumps({'category': 'Cool-down', 'exercise': 'Stretch', 'duration': 5})
+        client_v1_3.post('/api/workouts', data=workout, content_type='application/json')
+        client_v1_3.post('/api/workouts', data='{}', content_type='application/json')
+        samples = self.samples(client_v1_3)
+        assert samples['aceest_http_requests_total{endpoint="add_workout",method="POST",status="201"}'] == '1'
+        assert samples['aceest_http_requests_total{endpoint="add_workout",method="POST",status="400"}'] == '1'
+        assert samples['aceest_http_request_duration_seconds_count{endpoint="add_workout",method="POST"}'] == '2'
+        assert samples['aceest_workout_entries{category="Cool-down"}'] == '1'
+        assert samples['aceest_rate_limit_allowed_total'] == '2'
+
+    def test_cache_counters(self, client_v1_3):
+        """Test cache hits and misses are exported for hit ratios"""
+        client_v1_3.get('/summary')
+        client_v1_3.get('/summary')
+        samples = self.samples(client_v1_3)
+        assert int(samples['aceest_render_cache_hits_total']) >= 1
+        assert int(samples['aceest_render_cache_misses_total']) >= 1
+        assert samples['aceest_members_loaded'] == '1'
+
+    def test_shared_directory(self, tmp_path, monkeypatch):
+        """Test METRICS_DIR keeps the values in a per-process file"""
+        monkeypatch.setenv('METRICS_DIR', str(tmp_path / 'metrics'))
+        module = load_app_v1_3()
+        client = module.app.test_client()
+        client.get('/health')
+        assert self.samples(client)['aceest_http_requests_total{endpoint="health",method="GET",status="200"}'] == '1'
+        assert os.listdir(tmp_path / 'metrics') == [f'metrics_{os.getpid()}.db']
+        module.metrics.values.close()
+
+class TestProfiling:
+    """Test the admin profiling endpoints"""
+
+    ADMIN = {'Authorization': 'Bearer admin-secret'}
+
+    @pytest.fixture
+    def admin_client(self, monkeypatch):
+        """Client of an app with ADMIN_TOKEN set"""
+        monkeypatch.setenv('ADMIN_TOKEN', 'admin-secret')
+        return load_app_v1_3().app.test_client()
+
+    def test_disabled_without_token(self, client_v1_3):
+        """Test nothing is exposed unless ADMIN_TOKEN is configured"""
+        assert client_v1_3.get('/debug/profile?seconds=0.01', headers=self.ADMIN).status_code == 404
+        response = client_v1_3.get('/api/workouts/summary?profile=1', headers=self.ADMIN)
+        assert 'X-Profiled-Status' not in response.headers
+        assert response.is_json
+
+    def test_summary_request_profile(self, admin_client):
+        """Test ?profile=1 reports where get_summary spends its time"""
+        response = admin_client.get('/api/workouts/summary?profile=1', headers=self.ADMIN)
+        assert response.headers['X-Profiled-Status'] == '200'
+        assert 'workout_summary' in response.get_data(as_text=True)
+        # Metrics record the view's own response
+        metrics = admin_client.get('/metrics').get_data(as_text=True)
+        assert 'aceest_http_requests_total{endpoint="get_summary",method="GET",status="200"} 1' in metrics
+
+    def test_sampled_profile(self, admin_client):
+        """Test the sampler answers with collapsed stacks"""
+        response = admin_client.get('/debug/profile?seconds=0.05', headers=self.ADMIN)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        assert int(response.headers['X-Profile-Samples']) >= 1
+
+class TestMemberScoping:
+    """Test per-member scoping of the API by regn_id"""
+    
+    def save_member(self, client, regn_id, weight):
+        """Save a member profile scoped by the X-Regn-Id header"""
+        return client.post('/api/user',
+                   data=json.dumps({'name': regn_id, 'regn_id': regn_id, 'age': 30,
+                                    'gender': 'M', 'height': 175, 'weight': weight}),
+                   content_type='application/json', headers={'X-Regn-Id': regn_id})
+    
+    def test_members_have_separate_profiles(self, client_v1_3):
+        """Test profiles saved by two members do not overwrite each other"""
+        assert self.save_member(client_v1_3, 'REG001', 60).status_code == 201
+        assert self.save_member(client_v1_3, 'REG002', 120).status_code == 201
+        first = json.loads(client_v1_3.get('/api/user?regn_id=REG001').data)
+        second = json.loads(client_v1_3.get('/api/user', headers={'X-Regn-Id': 'REG002'}).data)
+        assert first['weight'] == 60
+        assert second['weight'] == 120
+        assert json.loads(client_v1_3.get('/api/user').data) == {}
+    
+    def test_calories_use_member_weight(self, client_v1_3):
+        """Test add_workout computes calories with the member's own weight"""
+        self.save_member(client_v1_3, 'REG001', 60)
+        self.save_member(client_v1_3, 'REG002', 120)
+        workout = {'category': 'Workout', 'exercise': 'Run', 'duration': 30}
+        light = client_v1_3.post('/api/workouts?regn_id=REG001', data=json.dumps(workout),
+                                 content_type='application/json')
+        heavy = client_v1_3.post('/api/workouts?regn_id=REG002', data=json.dumps(workout),
+                                 content_type='application/json')
+        assert json.loads(heavy.data)['workout']['calories'] == 2 * json.loads(light.data)['workout']['calories']
+        summary = json.loads(client_v1_3.get('/api/workouts/summary?regn_id=REG001').data)
+        assert summary['total_time'] == 30
+        assert json.loads(client_v1_3.get('/api/progress').data)['Workout'] == 0
+    
+    def test_scope_must_match_profile(self, client_v1_3):
+        """Test a scoped profile save must carry the same regn_id"""
+        response = client_v1_3.post('/api/user?regn_id=REG009',
+                   data=json.dumps({'name': 'A', 'regn_id': 'REG001', 'age': 30,
+                                    'gender': 'M', 'height': 175, 'weight': 70}),
+                   content_type='application/json')
+        assert response.status_code == 400
+    
+    def test_invalid_member_id(self, client_v1_3):
+        """Test over-long regn_id values are rejected"""
+        assert client_v1_3.get('/api/workouts?regn_id=' + 'x' * 65).status_code == 400
+    
+    def test_reads_do_not_register_members(self, client_v1_3):
+        """Test reads of unknown members answer empty data without opening a store"""
+        module = sys.modules['app_v1_3']
+        loaded = len(module.members)
+        for path in ('/api/workouts', '/api/user', '/api/workouts/summary', '/api/stats'):
+            response = client_v1_3.get(f'{path}?regn_id=STRAY')
+            assert response.status_code == 200
+        assert json.loads(client_v1_3.get('/api/user?regn_id=STRAY').data) == {}
+        assert len(module.members) == loaded
+        client_v1_3.post('/api/workouts?regn_id=STRAY', data=json.dumps({'exercise': 'Row', 'duration': 10}),
+                         content_type='application/json')
+        assert len(module.members) == loaded + 1
+        assert json.loads(client_v1_3.get('/api/workouts/summary?regn_id=STRAY').data)['total_time'] == 10
+    
+    def test_shm_reads_do_not_open_files(self, tmp_path, monkeypatch):
+        """Test stray regn_ids cannot exhaust file descriptors on the mmap backend"""
+        monkeypatch.setenv('STORAGE_URL', f"mmap:///{tmp_path / 'shm'}")
+        monkeypatch.setenv('MEMBER_CACHE_SIZE', '8')
+        module = load_app_v1_3()
+        client = module.app.test_client()
+        for i in range(600):
+            assert client.get(f'/api/workouts?regn_id=R-{i}').status_code == 200
+        assert os.listdir(tmp_path / 'shm') == ['default.shm']
+        for i in range(40):
+            client.post(f'/api/workouts?regn_id=R-{i}', data=json.dumps({'exercise': 'Row', 'duration': 10}),
+                        content_type='application/json')
+        assert len(module.members) <= 1 + 8 + len(module.members.shard_sizes())
+        # Evicted members load again from their files
+        assert json.loads(client.get('/api/workouts/summary?regn_id=R-0').data)['total_time'] == 10
+        module.store.close()
@@ -0,0 +1,309 @@
+"""
+Unit tests for the ASGI entry point of the v1.3 application
+The app is driven directly through the ASGI interface, without a server
+"""
+import asyncio
+import gzip
+import importlib.util
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+def load_asgi_v1_3():
+    """Load asgi_v1_3 (and with it a fresh app_v1_3) dynamically"""
+    file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'asgi_v1_3.py')
+    spec = importlib.util.spec_from_file_location("asgi_v1_3", file_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["asgi_v1_3"] = module
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture
+def asgi():
+    """Fresh ASGI module with empty storage"""
+    module = load_asgi_v1_3()
+    yield module
+    module.executor.shutdown(wait=True)
+
+def make_scope(method, path, query='', headers=()):
+    return {
+        'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http',
+        'path': path, 'root_path': '', 'query_string': query.encode('latin-1'),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 50000)
+    }
+
+async def call(app, method, path, query='', headers=(), body=b''):
+    """Send one request; returns (status, headers, body)"""
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    await app(make_scope(method, path, query, headers), receive, send)
+    start = sent[0]
+    response_headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in start['headers']}
+    return start['status'], response_headers, b''.join(m.get('body', b'') for m in sent[1:])
+
+def request(module, method, path, query='', headers=(), body=None):
+    """Run call() on a new event loop, sending body as JSON when given"""
+    if body is not None:
+        headers = tuple(headers) + (('Content-Type', 'application/json'),)
+        body = json.dumps(body).encode('utf-8')
+    return asyncio.run(call(module.app, method, path, query, headers, body or b''))
+
+class TestNativeRoutes:
+    """Test the routes served without Flask dispatch"""
+
+    def test_health(self, asgi):
+        """Test the health check answers like the WSGI app"""
+        status, headers, body = request(asgi, 'GET', '/health')
+        assert status == 200
+        assert headers['content-type'] == 'application/json'
+        assert json.loads(body) == {'status': 'healthy', 'version': '1.3'}
+
+    def test_add_workout_shares_the_business_logic(self, asgi):
+        """Test a workout added over ASGI is priced and stored like the WSGI app does"""
+        status, _headers, body = request(asgi, 'POST', '/api/workouts',
+                                         body={'category': 'Workout', 'exercise': 'Rowing', 'duration': 30})
+        assert status == 201
+        entry = json.loads(body)['workout']
+        assert entry['calories'] == round(asgi.app_module.calculate_calories(70, 6.0, 30), 1)
+        flask_client = asgi.flask_app.test_client()
+        assert json.loads(flask_client.get('/api/workouts').data)['Workout'] == [entry]
+
+    def test_add_workout_validation(self, asgi):
+        """Test invalid workouts get the WSGI app's error messages"""
+        status, _headers, body = request(asgi, 'POST', '/api/workouts',
+                                         body={'category': 'Workout', 'exercise': 'Rowing', 'duration': -5})
+        assert status == 400
+        assert json.loads(body)['error'] == 'Duration must be a positive integer'
+
+    def test_invalid_member_id(self, asgi):
+        """Test an invalid regn_id is rejected with 400"""
+        status, _headers, _body = request(asgi, 'GET', '/api/workouts/summary', query='regn_id=' + 'x' * 65)
+        assert status == 400
+
+    def test_summary_matches_wsgi(self, asgi):
+        """Test the summary body and ETag equal the WSGI app's"""
+        request(asgi, 'POST', '/api/workouts', body={'category': 'Warm-up', 'exercise': 'Jog', 'duration': 10})
+        status, headers, body = request(asgi, 'GET', '/api/workouts/summary')
+        wsgi_response = asgi.flask_app.test_client().get('/api/workouts/summary')
+        assert status == 200
+        assert body == wsgi_response.data
+        assert headers['etag'] == wsgi_response.headers['ETag']
+        assert headers['vary'] == wsgi_response.headers['Vary']
+        status, headers, body = request(asgi, 'GET', '/api/workouts/summary',
+                                        headers=[('If-None-Match', headers['etag'])])
+        assert status == 304
+        assert body == b''
+        assert 'X-Regn-Id' in headers['vary']
+
+    def test_progress_range(self, asgi):
+        """Test bucketed progress and its validation"""
+        status, _headers, body = request(asgi, 'GET', '/api/progress', query='days=7')
+        assert status == 200
+        assert len(json.loads(body)['buckets']) == 7
+        for query in ('days=0', 'days=99999999999', 'from=9999-12-31&to=9999-12-31&bucket=week'):
+            status, _headers, _body = request(asgi, 'GET', '/api/progress', query=query)
+            assert status == (200 if query.startswith('from') else 400), query
+
+    def test_exercise_suggestions(self, asgi):
+        """Test suggestions are answered natively and see workouts added over ASGI"""
+        request(asgi, 'POST', '/api/workouts', body={'category': 'Workout', 'exercise': 'Sled push', 'duration': 10})
+        status, _headers, body = request(asgi, 'GET', '/api/exercises/suggest', query='q=sl')
+        assert status == 200
+        assert [s['name'] for s in json.loads(body)['suggestions']] == ['Sled push', 'Slow Walking']
+        status, _headers, _body = request(asgi, 'GET', '/api/exercises/suggest', query='limit=0')
+        assert status == 400
+
+    def test_add_workout_is_rate_limited(self, monkeypatch):
+        """Test the native add_workout spends the same per-client budget"""
+        monkeypatch.setenv('RATE_LIMITS', 'add_workout=1/min:2')
+        module = load_asgi_v1_3()
+        workout = {'category': 'Workout', 'exercise': 'Rowing', 'duration': 30}
+        statuses = [request(module, 'POST', '/api/workouts', body=workout)[0] for _ in range(3)]
+        assert statuses == [201, 201, 429]
+        status, headers, body = request(module, 'POST', '/api/workouts', body=workout)
+        assert status == 429
+        assert int(headers['retry-after']) >= 1
+        assert 'error' in json.loads(body)
+        # Naming a member does not lift the address's budget
+        assert request(module, 'POST', '/api/workouts', query='regn_id=R-1', body=workout)[0] == 429
+        module.executor.shutdown(wait=True)
+
+    def test_native_routes_are_measured(self, asgi):
+        """Test requests answered without Flask are counted under their view's name"""
+        request(asgi, 'GET', '/health')
+        request(asgi, 'GET', '/api/workout-plans')
+        _status, headers, body = request(asgi, 'GET', '/metrics')
+        assert headers['content-type'].startswith('text/plain')
+        text = body.decode()
+        assert 'aceest_http_requests_total{endpoint="health",method="GET",status="200"} 1' in text
+        assert 'aceest_http_requests_total{endpoint="get_workout_plans",method="GET",status="200"} 1' in text
+
+    def test_request_profile_uses_flask(self, monkeypatch):
+        """Test ?profile=1 on a native route is served by the Flask app's profiler"""
+        monkeypatch.setenv('ADMIN_TOKEN', 'admin-secret')
+        module = load_asgi_v1_3()
+        status, headers, body = request(module, 'GET', '/api/workouts/summary', query='profile=1',
+                                        headers=[('Authorization', 'Bearer admin-secret')])
+        assert status == 200
+        assert headers['x-profiled-status'] == '200'
+        assert b'workout_summary' in body
+        module.executor.shutdown(wait=True)
+
+    def test_plans_are_precompressed(self, asgi):
+        """Test plan catalogs are served from the pre-compressed bodies"""
+        status, headers, body = request(asgi, 'GET', '/api/workout-plans',
+                                        headers=[('Accept-Encoding', 'gzip')])
+        assert status == 200
+        assert headers['content-encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(body)) == asgi.app_module.WORKOUT_PLANS
+
+    def test_large_summary_is_gzipped(self, asgi):
+        """Test native JSON responses use the app's gzip settings"""
+        for n in range(20):
+            request(asgi, 'POST', '/api/workouts', body={'category': 'Workout', 'exercise': f'Run {n}', 'duration': 30})
+        status, headers, body = request(asgi, 'GET', '/api/workouts/summary',
+                                        headers=[('Accept-Encoding', 'gzip')])
+        assert headers['content-encoding'] == 'gzip'
+        assert len(json.loads(gzip.decompress(body))['workouts']['Workout']) == 20
+
+class TestFlaskFallback:
+    """Test the remaining routes are served by the Flask app"""
+
+    def test_user_profile_roundtrip(self, asgi):
+        """Test POST and GET /api/user through the WSGI bridge"""
+        status, _headers, _body = request(asgi, 'POST', '/api/user',
+                                          body={'name': 'Asha', 'regn_id': 'R-1', 'age': 30, 'gender': 'F',
+                                                'height': 165, 'weight': 60})
+        assert status == 201
+        status, _headers, body = request(asgi, 'GET', '/api/user')
+        assert json.loads(body)['name'] == 'Asha'
+
+    def test_streamed_export(self, asgi):
+        """Test a streamed export arrives complete"""
+        request(asgi, 'POST', '/api/workouts', body={'category': 'Workout', 'exercise': 'Rowing', 'duration': 30})
+        status, headers, body = request(asgi, 'GET', '/api/workouts/export', query='format=csv')
+        assert status == 200
+        assert headers['content-type'].startswith('text/csv')
+        assert body.decode().splitlines()[1].startswith('Workout,')
+
+    def test_html_page(self, asgi):
+        """Test the summary page renders"""
+        status, headers, body = request(asgi, 'GET', '/summary')
+        assert status == 200
+        assert headers['content-type'].startswith('text/html')
+
+    def test_pages_subscribe_to_live_updates(self, asgi):
+        """Test pages served through ASGI open the update stream"""
+        status, _headers, body = request(asgi, 'GET', '/')
+        assert status == 200
+        assert b'data-live-updates="true"' in body
+
+    def test_unknown_route(self, asgi):
+        """Test unknown paths get Flask's 404"""
+        assert request(asgi, 'GET', '/missing')[0] == 404
+
+class TestLiveStream:
+    """Test the native /api/stream endpoint"""
+
+    def test_events_and_disconnect(self, asgi):
+        """Test a subscriber gets totals, then pushed workouts, and is removed on disconnect"""
+        async def scenario():
+            inbox = asyncio.Queue()
+            sent = asyncio.Queue()
+
+            async def send(message):
+                await sent.put(message)
+
+            stream = asyncio.ensure_future(asgi.app(make_scope('GET', '/api/stream'), inbox.get, send))
+            start = await asyncio.wait_for(sent.get(), 5)
+            opening = await asyncio.wait_for(sent.get(), 5)
+            await call(asgi.app, 'POST', '/api/workouts', headers=[('Content-Type', 'application/json')],
+                       body=json.dumps({'category': 'Workout', 'exercise': 'Rowing', 'duration': 30}).encode())
+            pushed = await asyncio.wait_for(sent.get(), 5)
+            subscribers = asgi.app_module.broker.stats()['subscribers']
+            await inbox.put({'type': 'http.disconnect'})
+            await asyncio.wait_for(stream, 5)
+            return start, opening, pushed, subscribers
+
+        start, opening, pushed, subscribers = asyncio.run(scenario())
+        assert start['status'] == 200
+        assert (b'content-type', b'text/event-stream; charset=utf-8') in start['headers']
+        assert b'event: totals' in opening['body']
+        assert b'event: workout' in pushed['body']
+        assert b'"exercise":"Rowing"' in pushed['body']
+        assert subscribers == 1
+        assert asgi.app_module.broker.stats()['subscribers'] == 0
+
+    def test_keepalive(self, asgi):
+        """Test idle streams send keep-alive comments"""
+        asgi.app_module.SSE_HEARTBEAT = 0.01
+
+        async def scenario():
+            inbox = asyncio.Queue()
+            sent = asyncio.Queue()
+
+            async def send(message):
+                await sent.put(message)
+
+            stream = asyncio.ensure_future(asgi.app(make_scope('GET', '/api/stream'), inbox.get, send))
+            for _ in range(2):
+                await asyncio.wait_for(sent.get(), 5)
+            keepalive = await asyncio.wait_for(sent.get(), 5)
+            await inbox.put({'type': 'http.disconnect'})
+            await asyncio.wait_for(stream, 5)
+            return keepalive
+
+        assert asyncio.run(scenario())['body'] == b': keepalive\n\n'
+
+    def test_store_is_opened_off_the_event_loop(self, asgi, monkeypatch):
+        """Test the subscriber's store is resolved on the executor, and invalid members get 400"""
+        current_store = asgi.app_module.current_store
+        threads = []
+
+        def recording_store(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return current_store(*args, **kwargs)
+
+        monkeypatch.setattr(asgi.app_module, 'current_store', recording_store)
+        asgi.app_module.broker.max_subscribers = 0
+        assert request(asgi, 'GET', '/api/stream', query='regn_id=R1')[0] == 503
+        assert threads and threads[0].startswith('aceest-asgi')
+        assert request(asgi, 'GET', '/api/stream', query='regn_id=' + 'x' * 65)[0] == 400
+
+    def test_subscriber_limit(self, asgi):
+        """Test a full broker answers 503"""
+        asgi.app_module.broker.max_subscribers = 0
+        assert request(asgi, 'GET', '/api/stream')[0] == 503
+
+class TestLifespan:
+    """Test the ASGI lifespan protocol"""
+
+    def test_startup_and_shutdown(self, asgi):
+        """Test startup and shutdown are acknowledged"""
+        async def scenario():
+            inbox = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+            sent = []
+
+            async def receive():
+                return inbox.pop(0)
+
+            async def send(message):
+                sent.append(message['type'])
+
+            await asgi.app({'type': 'lifespan'}, receive, send)
+            return sent
+
+        assert asyncio.run(scenario()) == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
@@ -0,0 +1,158 @@
+"""
+Unit tests for the calendar index over daily workout totals
+"""
+import random
+from datetime import date, timedelta
+import pytest
+from aceest.calendar_index import DayIndex, FenwickTree, bucket_bounds
+from aceest.storage import MemoryStore, SQLiteStore
+
+class TestFenwickTree:
+    """Test the prefix-sum tree"""
+
+    def test_matches_brute_force(self):
+        """Test range sums against slicing"""
+        values = [random.randint(0, 100) for _ in range(200)]
+        tree = FenwickTree(values)
+        for _ in range(100):
+            lo = random.randint(0, 199)
+            hi = random.randint(lo, 199)
+            assert tree.range_sum(lo, hi) == sum(values[lo:hi + 1])
+
+    def test_updates_and_clamping(self):
+        """Test point updates and out-of-range bounds"""
+        tree = FenwickTree([0] * 10)
+        tree.add(3, 5)
+        tree.add(9, 2)
+        assert tree.range_sum(-5, 100) == 7
+        assert tree.range_sum(4, 8) == 0
+        assert tree.range_sum(5, 2) == 0
+
+    def test_append_matches_construction(self):
+        """Test growing a tree one position at a time matches building it at once"""
+        values = [random.randint(-50, 50) for _ in range(70)]
+        tree = FenwickTree()
+        for value in values:
+            tree.append(value)
+        built = FenwickTree(values)
+        assert len(tree) == len(built) == 70
+        assert all(tree.prefix(i) == built.prefix(i) for i in range(70))
+
+class TestDayIndex:
+    """Test date-range totals"""
+
+    def test_range_totals(self):
+        """Test totals between two dates"""
+        index = DayIndex(['Workout', 'Warm-up'])
+        index.add('2025-01-01', 'Workout', 30, 220.5)
+        index.add('2025-01-02', 'Workout', 20, 100.1)
+        index.add('2025-01-05', 'Warm-up', 10, 18.4)
+        totals = index.range_totals('2025-01-01', '2025-01-02')
+        assert totals['Workout'] == {'time': 50, 'calories': 320.6}
+        assert totals['Warm-up'] == {'time': 0, 'calories': 0}
+
+    def test_growth_and_rebase(self):
+        """Test days far after and before the base are indexed"""
+        index = DayIndex(['Workout'])
+        index.add(date(2025, 6, 1), 'Workout', 10, 1.0)
+        index.add(date(2027, 6, 1), 'Workout', 20, 2.0)
+        index.add(date(2020, 6, 1), 'Workout', 30, 3.0)
+        assert index.range_totals(date(2000, 1, 1), date(2030, 1, 1))['Workout']['time'] == 60
+        assert index.range_totals(date(2020, 6, 1), date(2020, 6, 1))['Workout']['time'] == 30
+        assert index.range_totals(date(2025, 6, 2), date(2027, 5, 31))['Workout']['time'] == 0
+
+    def test_outlier_dates_stay_sparse(self):
+        """Test memory follows the number of active days, not the span between them"""
+        index = DayIndex(['Workout'])
+        for day in (date(2025, 6, 1), date(9999, 12, 31), date(1, 1, 1), date(2025, 6, 1)):
+            index.add(day, 'Workout', 10, 1.0)
+        assert len(index) == 3
+        assert index.range_totals(date(1, 1, 1), date(9999, 12, 31))['Workout']['time'] == 40
+        assert index.daily_totals(date(2000, 1, 1), date(3000, 1, 1)) == [(date(2025, 6, 1).toordinal(), 20, 20)]
+
+    def test_random_order_matches_brute_force(self):
+        """Test appended, backfilled and repeated days all total correctly"""
+        index = DayIndex(['Workout', 'Cool-down'])
+        start = date(2025, 1, 1)
+        expected = {}
+        for step in range(400):
+            day = start + timedelta(days=random.randint(0, 120))
+            category = random.choice(['Workout', 'Cool-down'])
+            index.add(day, category, 5, 0.5)
+            expected[day] = expected.get(day, 0) + 5
+            if step % 50 == 0:
+                low, high = sorted(start + timedelta(days=random.randint(0, 120)) for _ in range(2))
+                totals = index.range_totals(low, high)
+                assert sum(total['time'] for total in totals.values()) == \
+                    sum(minutes for day, minutes in expected.items() if low <= day <= high)
+        assert [(ordinal, minutes) for ordinal, minutes, _tenths in index.daily_totals()] == \
+            sorted((day.toordinal(), minutes) for day, minutes in expected.items())
+
+    def test_last_days(self):
+        """Test totals for the last N days"""
+        index = DayIndex(['Workout'])
+        today = date(2025, 3, 10)
+        index.add(today, 'Workout', 10, 1.0)
+        index.add(today - timedelta(days=6), 'Workout', 20, 2.0)
+        index.add(today - timedelta(days=7), 'Workout', 40, 4.0)
+        assert index.last_days(7, today=today)['Workout']['time'] == 30
+
+    def test_empty_index(self):
+        """Test queries on an empty index"""
+        index = DayIndex(['Workout'])
+        assert index.range_totals('2025-01-01', '2025-12-31') == {'Workout': {'time': 0, 'calories': 0}}
+
+class TestBucketBounds:
+    """Test bucketing of date ranges"""
+
+    def test_week_buckets_start_monday(self):
+        """Test weeks end on Sunday and ranges are clipped"""
+        bounds = list(bucket_bounds(date(2025, 1, 1), date(2025, 1, 14), 'week'))
+        assert bounds[0] == (date(2025, 1, 1), date(2025, 1, 5))
+        assert bounds[1] == (date(2025, 1, 6), date(2025, 1, 12))
+        assert bounds[-1] == (date(2025, 1, 13), date(2025, 1, 14))
+
+    def test_month_buckets(self):
+        """Test month boundaries including December"""
+        bounds = list(bucket_bounds(date(2024, 12, 15), date(2025, 2, 3), 'month'))
+        assert bounds == [(date(2024, 12, 15), date(2024, 12, 31)),
+                          (date(2025, 1, 1), date(2025, 1, 31)),
+                          (date(2025, 2, 1), date(2025, 2, 3))]
+
+    def test_buckets_up_to_the_last_date(self):
+        """Test ranges ending on date.max stop at it instead of overflowing"""
+        for bucket in ('day', 'week', 'month'):
+            bounds = list(bucket_bounds(date(9999, 12, 20), date.max, bucket))
+            assert bounds[-1][1] == date.max
+        assert list(bucket_bounds(date(2025, 1, 2), date(2025, 1, 1), 'day')) == []
+
+    def test_invalid_bucket(self):
+        """Test unknown bucket names are rejected"""
+        with pytest.raises(ValueError):
+            list(bucket_bounds(date(2025, 1, 1), date(2025, 1, 2), 'year'))
+
+@pytest.mark.parametrize('engine', ['memory', 'sqlite'])
+def test_store_range_totals(engine, tmp_path):
+    """Test both storage engines answer range totals"""
+    store = MemoryStore() if engine == 'memory' else SQLiteStore(str(tmp_path / 'range.db'))
+    for day, duration in (('2025-01-01', 10), ('2025-01-02', 20), ('2025-01-09', 40)):
+        store.add_workout('Workout', {'exercise': 'Row', 'duration': duration, 'calories': 12.5,
+                                      'timestamp': f'{day} 08:00:00'}, day)
+    totals = store.get_range_totals(date(2025, 1, 2), date(2025, 1, 9))
+    assert totals['Workout'] == {'time': 60, 'calories': 25.0}
+    assert totals['Warm-up'] == {'time': 0, 'calories': 0}
+    store.close()
+
+@pytest.mark.parametrize('engine', ['memory', 'sqlite'])
+def test_store_daily_totals(engine, tmp_path):
+    """Test both storage engines answer per-day rollups"""
+    store = MemoryStore() if engine == 'memory' else SQLiteStore(str(tmp_path / 'daily.db'))
+    for category, day, duration in (('Workout', '2025-01-09', 40), ('Warm-up', '2025-01-01', 10),
+                                    ('Workout', '2025-01-01', 20), ('Workout', '2025-01-02', 30)):
+        store.add_workout(category, {'exercise': 'Row', 'duration': duration, 'calories': 12.5,
+                                     'timestamp': f'{day} 08:00:00'}, day)
+    assert store.get_daily_totals() == [('2025-01-01', 30, 25.0), ('2025-01-02', 30, 12.5),
+                                        ('2025-01-09', 40, 12.5)]
+    assert store.get_daily_totals(date(2025, 1, 2), '2025-01-08') == [('2025-01-02', 30, 12.5)]
+    assert store.get_daily_totals(categories=['Warm-up']) == [('2025-01-01', 10, 12.5)]
+    store.close()
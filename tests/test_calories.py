@@ -0,0 +1,149 @@
+"""
+Unit tests for derived workout calories
+"""
+from aceest.calories import (DEFAULT_WEIGHT, MAX_WEIGHT_HISTORY, SINCE_START, CalorieModel,
+                             MetTable, met_version, record_weight, weight_at)
+from aceest.storage import MemoryStore
+
+MET_VALUES = {"Warm-up": 3.0, "Workout": 6.0, "Cool-down": 2.5}
+
+def calculate_calories(weight_kg, met, duration_min):
+    return (met * 3.5 * weight_kg / 200) * duration_min
+
+def entry(timestamp, duration, calories=0.0):
+    return {'exercise': 'Run', 'duration': duration, 'calories': calories, 'timestamp': timestamp}
+
+class TestMetTable:
+    def test_version_depends_on_content_only(self):
+        assert met_version({'a': 1.0, 'b': 2.0}) == met_version({'b': 2.0, 'a': 1.0})
+        assert met_version({'a': 1.0}) != met_version({'a': 1.5})
+
+    def test_update_changes_version_and_corrected(self):
+        table = MetTable(MET_VALUES)
+        assert not table.corrected
+        version = table.version
+        assert table.update({'Workout': 7.0}) != version
+        assert table.corrected
+        assert table.get('Workout') == 7.0
+        assert table.get('Unknown') == 5.0
+        # Reverting the correction restores the baseline version
+        table.update({'Workout': 6.0})
+        assert table.version == version
+        assert not table.corrected
+
+    def test_shipped_values_differing_from_baseline_are_corrected(self):
+        table = MetTable(dict(MET_VALUES, **{'Cool-down': 2.3}), baseline=MET_VALUES)
+        assert table.corrected
+
+    def test_saved_corrections_reach_other_processes_and_restarts(self, tmp_path):
+        path = str(tmp_path / 'met-values.json')
+        table = MetTable(MET_VALUES, path=path)
+        other = MetTable(MET_VALUES, path=path)
+        version = table.update({'Workout': 7.0})
+        assert other.version != version
+        other.refresh()
+        assert other.version == version and other.get('Workout') == 7.0
+        other.update({'Cool-down': 2.3})
+        table.refresh()
+        assert table.get('Workout') == 7.0 and table.get('Cool-down') == 2.3
+        restarted = MetTable(MET_VALUES, path=path)
+        assert restarted.version == table.version
+        assert restarted.corrected
+
+class TestWeightHistory:
+    def test_weight_at_picks_latest_record_not_after_timestamp(self):
+        history = [[SINCE_START, 80], ['2024-02-01 00:00:00', 75]]
+        assert weight_at(history, '2024-01-31 23:59:59') == 80
+        assert weight_at(history, '2024-02-01 00:00:00') == 75
+        assert weight_at(history, '2024-06-01 10:00:00') == 75
+        assert weight_at([['2024-02-01 00:00:00', 75]], '2024-01-01 00:00:00') == DEFAULT_WEIGHT
+
+    def test_record_weight_seeds_legacy_profiles(self):
+        info = record_weight({'weight': 80}, 75, '2024-03-01 00:00:00', '2024-03-01 00:00:00')
+        assert info['weight_history'] == [[SINCE_START, 80], ['2024-03-01 00:00:00', 75]]
+        assert info['weight_version'] == 1
+        assert info['weight'] == 75
+        assert not info['weight_corrected']
+
+    def test_backdated_record_is_a_correction(self):
+        current = record_weight({}, 80, '2024-03-01 00:00:00', '2024-03-01 00:00:00')
+        info = record_weight(current, 78, '2024-02-01 00:00:00', '2024-03-05 00:00:00')
+        assert info['weight_history'] == [['2024-02-01 00:00:00', 78], ['2024-03-01 00:00:00', 80]]
+        assert info['weight_version'] == 2
+        assert info['weight_corrected']
+        # The weight in effect now is unchanged by a correction of the past
+        assert info['weight'] == 80
+
+    def test_same_effective_time_replaces_record(self):
+        current = record_weight({}, 80, '2024-03-01 00:00:00', '2024-03-01 00:00:00')
+        info = record_weight(current, 81, '2024-03-01 00:00:00', '2024-03-02 00:00:00')
+        assert info['weight_history'] == [['2024-03-01 00:00:00', 81]]
+
+    def test_history_is_capped(self):
+        info = {}
+        for day in range(1, MAX_WEIGHT_HISTORY + 11):
+            timestamp = f'2024-01-01 00:{day // 60:02d}:{day % 60:02d}'
+            info.update(record_weight(info, 60 + day, timestamp, timestamp))
+        assert len(info['weight_history']) == MAX_WEIGHT_HISTORY
+        assert info['weight'] == 60 + MAX_WEIGHT_HISTORY + 10
+
+class TestCalorieModel:
+    def profile(self):
+        info = record_weight({}, 80, '2024-01-01 00:00:00', '2024-01-01 00:00:00')
+        info.update(record_weight(info, 60, '2024-02-01 00:00:00', '2024-03-01 00:00:00'))
+        return info
+
+    def test_applies_only_to_corrections(self):
+        model = CalorieModel(MetTable(MET_VALUES))
+        assert not model.applies({'weight': 80})
+        assert model.applies(self.profile())
+        model.met_table.update({'Workout': 7.0})
+        assert model.applies({'weight': 80})
+
+    def test_apply_uses_weight_in_effect_at_each_entry(self):
+        model = CalorieModel(MetTable(MET_VALUES))
+        records = [('Workout', entry('2024-01-15 08:00:00', 30)),
+                   ('Warm-up', entry('2024-02-15 08:00:00', 10))]
+        model.apply('member', self.profile(), records)
+        assert records[0][1]['calories'] == round(calculate_calories(80, 6.0, 30), 1)
+        assert records[1][1]['calories'] == round(calculate_calories(60, 3.0, 10), 1)
+
+    def test_memo_is_reused_and_invalidated_by_version_changes(self):
+        model = CalorieModel(MetTable(MET_VALUES))
+        info = self.profile()
+        model.apply('member', info, [('Workout', entry('2024-02-15 08:00:00', 30))])
+        records = [('Workout', entry('2024-02-15 08:00:00', 30))]
+        model.apply('member', info, records)
+        assert model.stats()['hits'] == 1
+        assert model.stats()['misses'] == 1
+
+        model.met_table.update({'Workout': 8.0})
+        model.apply('member', info, records)
+        assert records[0][1]['calories'] == round(calculate_calories(60, 8.0, 30), 1)
+        info.update(record_weight(info, 65, '2024-02-10 00:00:00', '2024-03-01 00:00:00'))
+        model.apply('member', info, records)
+        assert records[0][1]['calories'] == round(calculate_calories(65, 8.0, 30), 1)
+        stats = model.stats()
+        assert stats['invalidations'] == 2
+        assert stats['misses'] == 3
+
+    def test_category_totals_match_derived_entries(self):
+        store = MemoryStore()
+        store.add_workout('Workout', entry('2024-01-15 08:00:00', 30, 31.5), '2024-01-15')
+        store.add_workout('Workout', entry('2024-02-15 08:00:00', 45, 47.3), '2024-02-15')
+        model = CalorieModel(MetTable(MET_VALUES))
+        info = self.profile()
+        totals = model.category_totals('member', info, store)
+        expected = round(calculate_calories(80, 6.0, 30), 1) + round(calculate_calories(60, 6.0, 45), 1)
+        assert totals['Workout'] == {'time': 75, 'calories': round(expected, 1)}
+        assert totals['Warm-up'] == {'time': 0, 'calories': 0}
+        # Unchanged data is answered from the memo
+        assert model.category_totals('member', info, store) is totals
+        store.add_workout('Warm-up', entry('2024-02-16 08:00:00', 10), '2024-02-16')
+        assert model.category_totals('member', info, store)['Warm-up']['time'] == 10
+
+    def test_members_are_bounded(self):
+        model = CalorieModel(MetTable(MET_VALUES), max_members=2)
+        for member in ('a', 'b', 'c'):
+            model.apply(member, self.profile(), [('Workout', entry('2024-02-15 08:00:00', 30))])
+        assert model.stats()['members'] == 2
@@ -0,0 +1,73 @@
+"""
+Unit tests for the pre-compressed plan catalogs
+"""
+import gzip
+import json
+import zlib
+
+import pytest
+from flask import Flask, request
+from aceest.catalog import PrecompressedJSON, load_catalogs
+
+PLANS = {'Warm-up': ['Jog', 'Jumping Jacks'], 'Cool-down': ['Stretch']}
+
+@pytest.fixture
+def client():
+    """Minimal app serving one pre-compressed catalog"""
+    app = Flask(__name__)
+    payload = PrecompressedJSON(PLANS)
+
+    @app.route('/plans')
+    def plans():
+        return payload.serve(request, app.response_class, 'public, max-age=60')
+
+    return app.test_client()
+
+class TestPrecompressedJSON:
+    """Test encoding negotiation and validators"""
+
+    def test_bodies_decode_to_the_same_document(self):
+        """Test every encoding carries the same JSON"""
+        payload = PrecompressedJSON(PLANS)
+        assert json.loads(payload.bodies['identity']) == PLANS
+        assert gzip.decompress(payload.bodies['gzip']) == payload.bodies['identity']
+        assert zlib.decompress(payload.bodies['deflate']) == payload.bodies['identity']
+
+    def test_gzip_bytes_are_stable(self):
+        """Test encoding twice gives identical bytes and ETags"""
+        assert PrecompressedJSON(PLANS).bodies['gzip'] == PrecompressedJSON(PLANS).bodies['gzip']
+        assert PrecompressedJSON(PLANS).etag == PrecompressedJSON(dict(reversed(PLANS.items()))).etag
+
+    @pytest.mark.parametrize('header, encoding', [
+        (None, None), ('gzip, deflate, br', 'gzip'), ('deflate', 'deflate'),
+        ('gzip;q=0, deflate', 'deflate'), ('br', None), ('identity', None),
+    ])
+    def test_negotiation(self, client, header, encoding):
+        """Test the coding follows Accept-Encoding, falling back to identity"""
+        headers = {'Accept-Encoding': header} if header else {}
+        response = client.get('/plans', headers=headers)
+        assert response.headers.get('Content-Encoding') == encoding
+        assert response.headers['Cache-Control'] == 'public, max-age=60'
+
+    def test_not_modified_per_encoding(self, client):
+        """Test If-None-Match matches only the ETag of the negotiated coding"""
+        etag = client.get('/plans', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+        assert client.get('/plans', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}).status_code == 304
+        assert client.get('/plans', headers={'If-None-Match': etag}).status_code == 200
+
+class TestLoadCatalogs:
+    """Test reading catalogs from a data file"""
+
+    def test_load(self, tmp_path):
+        """Test both catalogs are returned"""
+        path = tmp_path / 'plans.json'
+        path.write_text(json.dumps({'workout_plans': PLANS, 'diet_plans': {'Keto': ['Eggs']}}))
+        assert load_catalogs(str(path)) == (PLANS, {'Keto': ['Eggs']})
+
+    @pytest.mark.parametrize('data', [[], {'workout_plans': PLANS}, {'workout_plans': {'A': 'B'}, 'diet_plans': {}}])
+    def test_invalid_files(self, tmp_path, data):
+        """Test malformed catalogs are rejected"""
+        path = tmp_path / 'plans.json'
+        path.write_text(json.dumps(data))
+        with pytest.raises(ValueError):
+            load_catalogs(str(path))
@@ -0,0 +1,107 @@
+"""
+Unit tests for the columnar workout entry store
+"""
+import pytest
+from aceest.columnar import (ColumnarWorkouts, EntryColumns, EntryView, StringInterner,
+                             epoch_to_timestamp, timestamp_to_epoch)
+
+def make_entry(exercise='Running', duration=30, calories=36.8, timestamp='2025-03-09 07:15:42'):
+    """Build a workout entry in the API shape"""
+    return {'exercise': exercise, 'duration': duration, 'calories': calories, 'timestamp': timestamp}
+
+class TestEntryColumns:
+    """Test the per-category column store"""
+
+    def test_round_trip_json_shape(self):
+        """Test entries serialize back to exactly what was logged"""
+        columns = EntryColumns()
+        entry = make_entry()
+        columns.append(entry)
+        assert columns.to_dicts() == [entry]
+
+    def test_view_behaves_like_dict(self):
+        """Test row views support dict and attribute access"""
+        columns = EntryColumns(entries=[make_entry()])
+        view = columns[0]
+        assert isinstance(view, EntryView)
+        assert view['duration'] == 30
+        assert view.get('calories', 0) == 36.8
+        assert view.exercise == 'Running'
+        assert dict(view) == make_entry()
+        with pytest.raises(KeyError):
+            view['missing']
+
+    def test_views_use_slots(self):
+        """Test row views carry no per-instance dict"""
+        view = EntryColumns(entries=[make_entry()])[0]
+        assert not hasattr(view, '__dict__')
+
+    def test_indexing_and_slicing(self):
+        """Test negative indexes, slices and bounds"""
+        columns = EntryColumns(entries=[make_entry(f'E{i}') for i in range(6)])
+        assert columns[-1].exercise == 'E5'
+        assert [v.exercise for v in columns[-5:]] == ['E1', 'E2', 'E3', 'E4', 'E5']
+        with pytest.raises(IndexError):
+            columns[6]
+
+    def test_totals(self):
+        """Test column scans for totals"""
+        columns = EntryColumns(entries=[make_entry(duration=10, calories=36.8),
+                                        make_entry(duration=20, calories=73.5)])
+        assert columns.total_duration() == 30
+        assert columns.total_calories() == 110.3
+
+    def test_large_calories_keep_their_decimal(self):
+        """Test calories are stored exactly, not rounded to float32"""
+        columns = EntryColumns(entries=[make_entry(calories=1234567.8), make_entry(calories=99999.9)])
+        assert [entry['calories'] for entry in columns] == [1234567.8, 99999.9]
+        assert columns.total_calories() == 1334567.7
+
+    def test_day_defaults_to_timestamp_date(self):
+        """Test the daily bucket falls back to the timestamp date"""
+        columns = EntryColumns()
+        columns.append(make_entry())
+        columns.append(make_entry(), '2025-03-10')
+        assert columns[0].day == '2025-03-09'
+        assert columns[1].day == '2025-03-10'
+
+    def test_compact_footprint(self):
+        """Test each entry costs a few dozen bytes of column storage"""
+        columns = EntryColumns(entries=[make_entry() for _ in range(100)])
+        assert columns.nbytes() == 100 * 24
+
+class TestInterning:
+    """Test exercise-name interning"""
+
+    def test_names_shared_across_categories(self):
+        """Test repeated names are stored once per mapping"""
+        workouts = ColumnarWorkouts(['Warm-up', 'Workout'])
+        workouts['Warm-up'].append(make_entry('Jog'))
+        workouts['Workout'].append(make_entry('Jog'))
+        workouts['Workout'].append(make_entry('Squats'))
+        assert workouts.interner.names == ['Jog', 'Squats']
+
+    def test_interner_lookup(self):
+        """Test interner ids are stable"""
+        interner = StringInterner()
+        assert interner.intern('A') == 0
+        assert interner.intern('B') == 1
+        assert interner.intern('A') == 0
+        assert interner.lookup('C') is None
+        assert len(interner) == 2
+
+class TestColumnarWorkouts:
+    """Test the category mapping"""
+
+    def test_assigning_resets_category(self):
+        """Test assigning a list replaces a category's entries"""
+        workouts = ColumnarWorkouts(['Workout'])
+        workouts['Workout'].append(make_entry())
+        workouts['Workout'] = []
+        assert len(workouts['Workout']) == 0
+        assert workouts.to_dicts() == {'Workout': []}
+
+    def test_timestamp_conversion(self):
+        """Test timestamps survive the epoch round trip"""
+        stamp = '2024-02-29 23:59:59'
+        assert epoch_to_timestamp(timestamp_to_epoch(stamp)) == stamp
@@ -0,0 +1,137 @@
+"""
+Unit tests for the gzip response middleware
+"""
+import gzip
+
+import pytest
+from flask import Flask, Response, request
+from aceest.compression import GzipMiddleware, accepts_gzip
+
+BIG = 'x' * 2000
+
+@pytest.fixture
+def app():
+    """Small app with one route per response kind, wrapped in the middleware"""
+    app = Flask(__name__)
+
+    @app.route('/big')
+    def big():
+        response = Response(BIG, mimetype='text/html')
+        response.set_etag('v1')
+        response.vary.add('Cookie')
+        return response
+
+    @app.route('/etag')
+    def etag():
+        response = Response(BIG, mimetype='application/json')
+        response.set_etag('v1')
+        return response.make_conditional(request)
+
+    @app.route('/small')
+    def small():
+        return Response('tiny', mimetype='text/html')
+
+    @app.route('/image')
+    def image():
+        return Response(b'\x89PNG' * 1000, mimetype='image/png')
+
+    @app.route('/encoded')
+    def encoded():
+        return Response(gzip.compress(BIG.encode()), mimetype='text/html',
+                        headers={'Content-Encoding': 'gzip'})
+
+    @app.route('/stream')
+    def stream():
+        return Response((f'line {i}\n' for i in range(100)), mimetype='text/plain')
+
+    app.wsgi_app = GzipMiddleware(app.wsgi_app, minimum_size=500)
+    return app
+
+def get(app, path, **headers):
+    """GET a path with gzip accepted unless overridden"""
+    headers = {name.replace('_', '-'): value for name, value in headers.items()}
+    headers.setdefault('Accept-Encoding', 'gzip')
+    return app.test_client().get(path, headers=headers)
+
+class TestAcceptsGzip:
+    """Test Accept-Encoding parsing"""
+
+    @pytest.mark.parametrize('header, expected', [
+        ('gzip', True), ('deflate, gzip;q=0.5', True), ('gzip;q=0', False),
+        ('*', True), ('br', False), ('', False), ('*;q=0, gzip', True),
+    ])
+    def test_header(self, header, expected):
+        """Test quality values and wildcards"""
+        assert accepts_gzip(header) is expected
+
+class TestGzipMiddleware:
+    """Test which responses are compressed and how"""
+
+    def test_compresses_large_allowed_response(self, app):
+        """Test a large HTML body is gzipped with adjusted headers"""
+        response = get(app, '/big')
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data).decode() == BIG
+        assert int(response.headers['Content-Length']) == len(response.data)
+        assert response.headers['ETag'] == '"v1-gzip"'
+        assert response.headers['Vary'] == 'Cookie, Accept-Encoding'
+
+    @pytest.mark.parametrize('path', ['/small', '/image', '/encoded'])
+    def test_skips_ineligible_responses(self, app, path):
+        """Test small, non-allowlisted and already encoded bodies pass through"""
+        plain = app.test_client().get(path)
+        response = get(app, path)
+        assert response.data == plain.data
+        assert response.headers.get('Content-Encoding') == plain.headers.get('Content-Encoding')
+
+    def test_client_without_gzip(self, app):
+        """Test nothing changes for clients that do not accept gzip"""
+        response = get(app, '/big', Accept_Encoding='identity')
+        assert response.data.decode() == BIG
+        assert 'Content-Encoding' not in response.headers
+
+    def test_streamed_response(self, app):
+        """Test generator responses are compressed chunk by chunk"""
+        response = app.test_client().get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+        chunks = list(response.response)
+        assert len(chunks) > 2
+        assert 'Content-Length' not in response.headers
+        assert gzip.decompress(b''.join(chunks)).decode() == ''.join(f'line {i}\n' for i in range(100))
+
+    def test_conditional_get_with_gzip_etag(self, app):
+        """Test the suffixed ETag still produces a 304"""
+        etag = get(app, '/etag').headers['ETag']
+        response = get(app, '/etag', If_None_Match=etag)
+        assert response.status_code == 304
+        assert response.headers['ETag'] == etag
+
+    def test_counters(self, app):
+        """Test bytes saved and compression counts are recorded"""
+        get(app, '/big')
+        get(app, '/small')
+        stats = app.wsgi_app.stats.snapshot()
+        assert stats['compressed'] == 1
+        assert stats['skipped'] == 1
+        assert stats['bytes_in'] == len(BIG)
+        assert stats['bytes_saved'] > 0
+        assert stats['cpu_seconds'] >= 0
+
+    def test_from_env(self, monkeypatch):
+        """Test settings are read from the environment"""
+        monkeypatch.setenv('COMPRESS_MIN_SIZE', '10')
+        monkeypatch.setenv('COMPRESS_LEVEL', '1')
+        monkeypatch.setenv('COMPRESS_MIMETYPES', 'text/html, application/json')
+        middleware = GzipMiddleware.from_env(None)
+        assert (middleware.minimum_size, middleware.level) == (10, 1)
+        assert middleware.mimetypes == {'text/html', 'application/json'}
+
+    def test_wrap_shares_settings_and_counters(self):
+        """Test wrap applies the same settings and counters to another app"""
+        middleware = GzipMiddleware(None, minimum_size=10, level=1)
+        wrapped = middleware.wrap(Response(BIG, mimetype='text/html'))
+        captured = []
+        body = b''.join(wrapped({'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': 'gzip'},
+                                lambda status, headers, exc_info=None: captured.append(headers)))
+        assert gzip.decompress(body).decode() == BIG
+        assert (wrapped.minimum_size, wrapped.level) == (10, 1)
+        assert middleware.stats.snapshot()['compressed'] == 1
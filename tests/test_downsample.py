@@ -0,0 +1,50 @@
+"""
+Unit tests for chart series downsampling
+"""
+import math
+
+import pytest
+from aceest.downsample import downsample, lttb, minmax
+
+def wave(length):
+    xs = list(range(length))
+    return xs, [math.sin(x / 20) * 100 + (500 if x == length // 3 else 0) for x in xs]
+
+class TestLTTB:
+    def test_short_series_is_kept(self):
+        xs, ys = wave(10)
+        assert lttb(xs, ys, 10) == list(range(10))
+        assert lttb(xs, ys, 50) == list(range(10))
+
+    def test_keeps_endpoints_and_count(self):
+        xs, ys = wave(5000)
+        keep = lttb(xs, ys, 300)
+        assert len(keep) == 300
+        assert keep[0] == 0 and keep[-1] == 4999
+        assert keep == sorted(set(keep))
+
+    def test_keeps_spikes(self):
+        xs, ys = wave(5000)
+        assert 5000 // 3 in lttb(xs, ys, 100)
+
+    def test_needs_three_points(self):
+        xs, ys = wave(10)
+        with pytest.raises(ValueError):
+            lttb(xs, ys, 2)
+
+class TestMinMax:
+    def test_keeps_extremes_of_each_bucket(self):
+        xs, ys = wave(1000)
+        keep = minmax(xs, ys, 20)
+        assert len(keep) <= 20
+        assert keep == sorted(keep)
+        assert ys.index(max(ys)) in keep
+        assert ys.index(min(ys)) in keep
+
+    def test_flat_bucket_contributes_one_point(self):
+        assert minmax(list(range(8)), [0] * 8, 4) == [0, 4]
+
+def test_unknown_method():
+    xs, ys = wave(10)
+    with pytest.raises(ValueError):
+        downsample(xs, ys, 5, 'stride')
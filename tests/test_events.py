@@ -0,0 +1,96 @@
+"""
+Unit tests for the live update event broker
+"""
+import json
+import threading
+
+import pytest
+from aceest.events import BrokerFull, EventBroker, format_event
+
+def parse(message):
+    """Split an SSE message into its fields"""
+    fields = dict(line.split(': ', 1) for line in message.strip().split('\n'))
+    fields['data'] = json.loads(fields['data'])
+    return fields
+
+class TestFormatEvent:
+    """Test Server-Sent Events encoding"""
+
+    def test_fields(self):
+        """Test id, event and JSON data lines end with a blank line"""
+        message = format_event('workout', {'b': 1, 'a': 'x'}, 7)
+        assert message == 'id: 7\nevent: workout\ndata: {"a":"x","b":1}\n\n'
+
+    def test_id_is_optional(self):
+        """Test an event without an id has no id line"""
+        assert not format_event('totals', {}).startswith('id:')
+
+class TestEventBroker:
+    """Test fan-out, backpressure and subscriber bookkeeping"""
+
+    def test_publish_reaches_every_subscriber_of_the_topic(self):
+        """Test subscribers of a topic get the event and others do not"""
+        broker = EventBroker()
+        first, second = broker.subscribe('a'), broker.subscribe('a')
+        other = broker.subscribe('b')
+        assert broker.publish('a', 'workout', {'n': 1}) == 2
+        assert parse(first.get(0))['data'] == {'n': 1}
+        assert parse(second.get(0))['event'] == 'workout'
+        assert other.get(0) is None
+
+    def test_publish_without_subscribers(self):
+        """Test publishing to an empty topic is a no-op"""
+        broker = EventBroker()
+        assert not broker.has_subscribers('a')
+        assert broker.publish('a', 'workout', {}) == 0
+        assert broker.stats()['published'] == 0
+
+    def test_event_ids_increase(self):
+        """Test each published event gets a larger id"""
+        broker = EventBroker()
+        subscription = broker.subscribe('a')
+        broker.publish('a', 'workout', {})
+        broker.publish('a', 'workout', {})
+        ids = [int(parse(subscription.get(0))['id']) for _ in range(2)]
+        assert ids[0] < ids[1]
+
+    def test_slow_subscriber_is_resynced(self):
+        """Test a full queue is replaced by one resync event"""
+        broker = EventBroker(queue_size=2)
+        slow = broker.subscribe('a')
+        fast = broker.subscribe('a')
+        for n in range(3):
+            broker.publish('a', 'workout', {'n': n})
+            fast.get(0)
+        assert len(slow) == 1
+        assert parse(slow.get(0))['event'] == 'resync'
+        assert slow.overflows == 1
+        assert broker.stats()['overflows'] == 1
+        assert broker.stats()['delivered'] == 5
+
+    def test_unsubscribe(self):
+        """Test unsubscribing removes the subscriber and wakes its reader"""
+        broker = EventBroker()
+        subscription = broker.subscribe('a')
+        broker.unsubscribe(subscription)
+        broker.unsubscribe(subscription)
+        assert subscription.closed
+        assert subscription.get(5) is None
+        assert broker.stats()['subscribers'] == 0
+        assert not broker.has_subscribers('a')
+
+    def test_max_subscribers(self):
+        """Test subscribing beyond the limit raises BrokerFull"""
+        broker = EventBroker(max_subscribers=1)
+        broker.subscribe('a')
+        with pytest.raises(BrokerFull):
+            broker.subscribe('b')
+
+    def test_get_waits_for_a_publish(self):
+        """Test a blocked reader is woken by a publish from another thread"""
+        broker = EventBroker()
+        subscription = broker.subscribe('a')
+        timer = threading.Timer(0.05, broker.publish, ('a', 'workout', {'n': 1}))
+        timer.start()
+        assert parse(subscription.get(5))['data'] == {'n': 1}
+        timer.join()
@@ -0,0 +1,76 @@
+"""
+Unit tests for the streaming workout export
+"""
+import csv
+import io
+import json
+
+import pytest
+from aceest.export import CHUNK_RECORDS, export_csv, export_ndjson, export_records
+from aceest.shm import SharedMemoryStore
+from aceest.storage import MemoryStore, SQLiteStore
+
+def make_entry(exercise='Running', duration=30, calories=220.5, day='2025-01-01'):
+    """Build a workout entry in the API shape"""
+    return {'exercise': exercise, 'duration': duration, 'calories': calories,
+            'timestamp': f'{day} 10:00:00'}
+
+@pytest.fixture(params=['memory', 'sqlite', 'mmap'])
+def store(request, tmp_path):
+    """Yield each storage engine in turn"""
+    if request.param == 'memory':
+        engine = MemoryStore()
+    elif request.param == 'sqlite':
+        engine = SQLiteStore(str(tmp_path / 'aceest.db'))
+    else:
+        engine = SharedMemoryStore(str(tmp_path / 'shm'))
+    yield engine
+    engine.close()
+
+class TestEncoders:
+    """Test the NDJSON and CSV encoders"""
+
+    def test_ndjson_lines(self):
+        """Test each record becomes one JSON object per line"""
+        records = [('Workout', '2025-01-01', make_entry())]
+        lines = ''.join(export_ndjson(records)).splitlines()
+        assert json.loads(lines[0]) == {'category': 'Workout', 'day': '2025-01-01', **make_entry()}
+
+    def test_csv_quotes_fields(self):
+        """Test CSV output has a header and quotes embedded separators"""
+        records = [('Workout', '2025-01-01', make_entry('Squats, goblet'))]
+        rows = list(csv.reader(io.StringIO(''.join(export_csv(records)))))
+        assert rows[0] == ['category', 'day', 'exercise', 'duration', 'calories', 'timestamp']
+        assert rows[1][2] == 'Squats, goblet'
+
+    def test_output_is_chunked_lazily(self):
+        """Test records are consumed chunk by chunk rather than all at once"""
+        consumed = []
+
+        def records():
+            for index in range(CHUNK_RECORDS * 3):
+                consumed.append(index)
+                yield 'Workout', '2025-01-01', make_entry()
+
+        chunks = export_ndjson(records())
+        next(chunks)
+        assert len(consumed) == CHUNK_RECORDS
+
+    def test_unknown_format(self):
+        """Test unsupported formats are rejected"""
+        with pytest.raises(ValueError):
+            export_records([], 'xml')
+
+class TestFilteredRecords:
+    """Test date and category filters pushed into the stores"""
+
+    def test_filters(self, store):
+        """Test only records inside the range and categories are yielded"""
+        for day in ('2025-01-01', '2025-01-02', '2025-01-03'):
+            store.add_workout('Workout', make_entry(day=day), day)
+            store.add_workout('Cool-down', make_entry('Stretch', day=day), day)
+        records = list(store.iter_records('2025-01-02', '2025-01-03', ['Cool-down']))
+        assert [(category, day) for category, day, _entry in records] == [
+            ('Cool-down', '2025-01-02'), ('Cool-down', '2025-01-03')]
+        assert len(list(store.iter_records(categories=['Workout']))) == 3
+        assert len(list(store.iter_records())) == 6
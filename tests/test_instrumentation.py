@@ -0,0 +1,42 @@
+"""
+Unit tests for the serving setup shared by the Flask applications
+"""
+import gzip
+
+from flask import Flask
+
+from aceest.compression import GzipMiddleware
+from aceest.instrumentation import instrument_app
+
+def make_app(monkeypatch, token=None):
+    """Small app set up with instrument_app"""
+    if token:
+        monkeypatch.setenv('ADMIN_TOKEN', token)
+    else:
+        monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+    monkeypatch.delenv('METRICS_DIR', raising=False)
+    app = Flask(__name__)
+    metrics = instrument_app(app)
+
+    @app.route('/big')
+    def big():
+        return 'x' * 4096
+
+    return app, metrics
+
+def test_gzip_metrics_and_profiling(monkeypatch):
+    """Test one call adds compression, /metrics with gzip counters, and token-gated profiling"""
+    app, _metrics = make_app(monkeypatch, token='secret')
+    assert isinstance(app.wsgi_app, GzipMiddleware)
+    client = app.test_client()
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert gzip.decompress(response.data) == b'x' * 4096
+    scrape = client.get('/metrics').data.decode()
+    assert 'aceest_gzip_compressed_total 1' in scrape
+    assert 'aceest_http_requests_total{endpoint="big",method="GET",status="200"} 1' in scrape
+    assert client.get('/debug/profile?seconds=0.05', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+def test_profiling_disabled_without_token(monkeypatch):
+    """Test /debug/profile stays hidden when ADMIN_TOKEN is unset"""
+    app, _metrics = make_app(monkeypatch)
+    assert app.test_client().get('/debug/profile').status_code == 404
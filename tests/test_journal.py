@@ -0,0 +1,142 @@
+"""
+Unit tests for the append-only workout journal and snapshots
+"""
+import glob
+import os
+import threading
+import pytest
+from aceest.journal import JournaledStore, WorkoutJournal
+from aceest.storage import MemoryStore
+
+def make_entry(exercise='Running', duration=30):
+    """Build a workout entry in the API shape"""
+    return {
+        'exercise': exercise,
+        'duration': duration,
+        'calories': 220.5,
+        'timestamp': '2025-01-01 10:00:00'
+    }
+
+def open_store(directory, snapshot_every=0):
+    """Open a journaled memory store on a directory"""
+    return JournaledStore(MemoryStore(), WorkoutJournal(str(directory)), snapshot_every=snapshot_every)
+
+class TestJournaledStore:
+    """Test durability of the journaled store"""
+
+    def test_restart_replays_journal(self, tmp_path):
+        """Test entries and user info survive a restart"""
+        store = open_store(tmp_path)
+        store.save_user_info({'name': 'A', 'weight': 80})
+        store.add_workout('Workout', make_entry('Squats'), '2025-01-01')
+        store.add_workout('Cool-down', make_entry('Walk'), '2025-01-02')
+        store.close()
+
+        restarted = open_store(tmp_path)
+        assert restarted.replayed == 3
+        assert restarted.get_workouts()['Workout'][0]['exercise'] == 'Squats'
+        assert '2025-01-02' in restarted.get_daily_workouts()
+        assert restarted.get_user_info()['weight'] == 80
+        restarted.close()
+
+    def test_batch_is_one_record(self, tmp_path):
+        """Test a batch is journaled as one record and replayed whole"""
+        store = open_store(tmp_path)
+        store.add_workouts([('Workout', make_entry(f'Ex{i}'), '2025-01-01') for i in range(3)])
+        store.close()
+
+        restarted = open_store(tmp_path)
+        assert restarted.replayed == 1
+        assert [e['exercise'] for e in restarted.get_workouts()['Workout']] == ['Ex0', 'Ex1', 'Ex2']
+        restarted.close()
+
+    def test_snapshot_limits_replay_to_tail(self, tmp_path):
+        """Test only journal records after the snapshot are replayed"""
+        store = open_store(tmp_path)
+        for i in range(5):
+            store.add_workout('Workout', make_entry(f'Set {i}'), '2025-01-01')
+        store.snapshot()
+        store.add_workout('Workout', make_entry('Tail'), '2025-01-02')
+        store.close()
+
+        restarted = open_store(tmp_path)
+        assert restarted.replayed == 1
+        names = [e['exercise'] for e in restarted.get_workouts()['Workout']]
+        assert names == ['Set 0', 'Set 1', 'Set 2', 'Set 3', 'Set 4', 'Tail']
+        restarted.close()
+
+    def test_snapshot_compacts_old_files(self, tmp_path):
+        """Test a snapshot removes the journal segments and snapshots it supersedes"""
+        store = open_store(tmp_path)
+        store.add_workout('Workout', make_entry(), '2025-01-01')
+        store.snapshot()
+        store.add_workout('Workout', make_entry(), '2025-01-01')
+        store.snapshot()
+        store.close()
+        assert len(glob.glob(os.path.join(tmp_path, 'snapshot-*.json'))) == 1
+        assert len(glob.glob(os.path.join(tmp_path, 'journal-*.ndjson'))) == 1
+
+    def test_periodic_snapshot(self, tmp_path):
+        """Test snapshots are taken automatically every N writes"""
+        store = open_store(tmp_path, snapshot_every=3)
+        for _ in range(3):
+            store.add_workout('Warm-up', make_entry(), '2025-01-01')
+        store.close()
+        assert glob.glob(os.path.join(tmp_path, 'snapshot-*.json'))
+        restarted = open_store(tmp_path)
+        assert restarted.replayed == 0
+        assert len(restarted.get_workouts()['Warm-up']) == 3
+        restarted.close()
+
+    def test_torn_tail_is_ignored(self, tmp_path):
+        """Test a partially written last record does not break recovery"""
+        store = open_store(tmp_path)
+        store.add_workout('Workout', make_entry('Kept'), '2025-01-01')
+        store.close()
+        segment = sorted(glob.glob(os.path.join(tmp_path, 'journal-*.ndjson')))[0]
+        with open(segment, 'a', encoding='utf-8') as handle:
+            handle.write('{"seq":2,"type":"work')
+
+        restarted = open_store(tmp_path)
+        restarted.add_workout('Workout', make_entry('After'), '2025-01-01')
+        restarted.close()
+        again = open_store(tmp_path)
+        names = [e['exercise'] for e in again.get_workouts()['Workout']]
+        assert names == ['Kept', 'After']
+        again.close()
+
+    def test_concurrent_writers_group_commit(self, tmp_path):
+        """Test concurrent durable writers all complete and are recovered"""
+        store = open_store(tmp_path)
+        threads = [
+            threading.Thread(target=store.add_workout, args=('Workout', make_entry(f'T{i}'), '2025-01-01'))
+            for i in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        store.close()
+        restarted = open_store(tmp_path)
+        assert len(restarted.get_workouts()['Workout']) == 20
+        restarted.close()
+
+class TestWorkoutJournal:
+    """Test the journal itself"""
+
+    def test_directory_is_locked(self, tmp_path):
+        """Test a second journal cannot open a directory in use"""
+        journal = WorkoutJournal(str(tmp_path))
+        with pytest.raises(RuntimeError):
+            WorkoutJournal(str(tmp_path))
+        journal.recover(lambda record: None)
+        journal.close()
+
+    def test_sequence_numbers(self, tmp_path):
+        """Test records receive increasing sequence numbers"""
+        journal = WorkoutJournal(str(tmp_path), durable=False)
+        journal.recover(lambda record: None)
+        assert journal.append({'type': 'user', 'data': {}}) == 1
+        assert journal.append({'type': 'user', 'data': {}}) == 2
+        assert journal.seq == 2
+        journal.close()
@@ -0,0 +1,70 @@
+"""
+Unit tests for the fast JSON provider
+"""
+import json
+from datetime import date
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+import aceest.json_provider as json_provider
+from aceest.json_provider import FastJSONProvider
+
+ENTRIES = {
+    'Workout': [{'exercise': 'Squats', 'duration': 25, 'calories': 183.8,
+                 'timestamp': '2025-03-01 07:30:00'}],
+    'Warm-up': [{'exercise': 'Jog', 'duration': 7, 'calories': round(7 * 3.0 * 3.5 * 70 / 200, 1),
+                 'timestamp': '2025-03-01 07:00:00'}],
+    'totals': {'time': 32, 'calories': round(0.1 + 0.2, 1), 'ratio': 0.1 + 0.2}
+}
+
+@pytest.fixture(params=['fast', 'fallback'])
+def app(request, monkeypatch):
+    """App using the provider, with orjson and with the stdlib fallback"""
+    if request.param == 'fallback':
+        monkeypatch.setattr(json_provider, 'orjson', None)
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    return app
+
+def default_response(data):
+    """Body the stock Flask provider produces"""
+    app = Flask(__name__)
+    app.json = DefaultJSONProvider(app)
+    with app.app_context():
+        return app.json.response(data).data
+
+class TestFastJSONProvider:
+    """Test output compatibility with the default provider"""
+
+    def test_matches_default_provider(self, app):
+        """Test responses are byte-identical to the stdlib provider for API data"""
+        with app.app_context():
+            assert app.json.response(ENTRIES).data == default_response(ENTRIES)
+
+    def test_dates_use_http_format(self, app):
+        """Test dates are encoded like the default provider does"""
+        with app.app_context():
+            data = {'day': date(2025, 1, 1)}
+            assert app.json.response(data).data == default_response(data)
+
+    def test_large_integers_fall_back(self, app):
+        """Test values orjson cannot encode still serialize"""
+        with app.app_context():
+            assert json.loads(app.json.response({'n': 2 ** 70}).data) == {'n': 2 ** 70}
+
+    def test_non_ascii_is_utf8(self, app):
+        """Test non-ASCII text is sent as UTF-8 on both paths"""
+        with app.app_context():
+            assert app.json.response({'exercise': 'Étirement'}).data == '{"exercise":"Étirement"}\n'.encode()
+
+    def test_loads(self, app):
+        """Test decoding, including inputs only the stdlib accepts"""
+        assert app.json.loads('{"a": [1, 2.5]}') == {'a': [1, 2.5]}
+        assert app.json.loads('{"a": NaN}')['a'] != app.json.loads('{"a": NaN}')['a']
+
+    def test_pretty_output_in_debug(self, app):
+        """Test debug mode keeps indented output"""
+        app.debug = True
+        with app.app_context():
+            assert b'\n  "a": 1' in app.json.response({'a': 1}).data
@@ -0,0 +1,36 @@
+"""
+Tests for the canary PrometheusRule in k8s/canary-deployment.yaml
+"""
+import os
+import shutil
+import subprocess
+
+import pytest
+
+yaml = pytest.importorskip('yaml')
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+RULE_TESTS = os.path.join(os.path.dirname(__file__), 'promtool', 'canary-rules.test.yaml')
+
+def canary_rules():
+    """The spec (rule groups) of the canary PrometheusRule"""
+    with open(os.path.join(ROOT, 'k8s', 'canary-deployment.yaml')) as handle:
+        documents = [document for document in yaml.safe_load_all(handle) if document]
+    return next(document['spec'] for document in documents if document['kind'] == 'PrometheusRule')
+
+def test_alerts_compare_across_versions():
+    """Test canary-vs-stable comparisons match series that differ only in version"""
+    alerts = [rule for group in canary_rules()['groups'] for rule in group['rules'] if 'alert' in rule]
+    assert {rule['alert'] for rule in alerts} == {'CanaryErrorRateAboveStable', 'CanaryLatencyAboveStable'}
+    for rule in alerts:
+        assert '> ignoring(version)' in ' '.join(rule['expr'].split())
+
+@pytest.mark.skipif(shutil.which('promtool') is None, reason='promtool not installed')
+def test_promtool_rule_tests(tmp_path):
+    """Test each alert fires, and stays quiet when the tracks agree"""
+    with open(tmp_path / 'canary-rules.yaml', 'w') as handle:
+        yaml.safe_dump(canary_rules(), handle)
+    shutil.copy(RULE_TESTS, tmp_path)
+    result = subprocess.run(['promtool', 'test', 'rules', 'canary-rules.test.yaml'],
+                            cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,200 @@
+"""
+Unit tests for the Prometheus metrics
+"""
+import multiprocessing
+import os
+
+import pytest
+from flask import Flask
+from aceest.metrics import (EXITED_FILE, MAGIC, LocalValues, Metrics, SharedValues, format_labels, format_value,
+                            instrument, merge_exited)
+
+def parse(text):
+    """{series: value} of a Prometheus text exposition"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            series, _, value = line.rpartition(' ')
+            samples[series] = float(value)
+    return samples
+
+def count_requests(directory, count):
+    """Worker process body: count requests into its own file"""
+    metrics = Metrics(SharedValues(directory))
+    metrics.describe('requests_total', 'counter', 'Requests')
+    metrics.describe('busy', 'gauge', 'Busy')
+    metrics.collector(lambda: [('busy', None, 1)])
+    for _ in range(count):
+        metrics.inc('requests_total', {'endpoint': 'add_workout'})
+    metrics.publish(force=True)
+
+class TestFormatting:
+    """Test the text format helpers"""
+
+    def test_labels(self):
+        """Test label sets keep their order and escape values"""
+        assert format_labels(None) == ''
+        assert format_labels({'endpoint': 'health', 'path': 'a"b\\c\nd'}) == \
+            '{endpoint="health",path="a\\"b\\\\c\\nd"}'
+
+    def test_values(self):
+        """Test integral values, fractions and infinities"""
+        assert format_value(3.0) == '3'
+        assert format_value(0.25) == '0.25'
+        assert format_value(float('inf')) == '+Inf'
+
+@pytest.fixture(params=['local', 'shared'])
+def metrics(request, tmp_path):
+    """Yield metrics on each value store"""
+    values = LocalValues() if request.param == 'local' else SharedValues(str(tmp_path / 'metrics'))
+    yield Metrics(values)
+    if request.param == 'shared':
+        values.close()
+
+class TestMetrics:
+    """Test recording and rendering on both value stores"""
+
+    def test_counter(self, metrics):
+        """Test counters add up per label set"""
+        metrics.describe('requests_total', 'counter', 'Requests')
+        metrics.inc('requests_total', {'status': '200'})
+        metrics.inc('requests_total', {'status': '200'}, 2)
+        metrics.inc('requests_total', {'status': '404'})
+        text = metrics.render()
+        assert '# TYPE requests_total counter' in text
+        assert parse(text) == {'requests_total{status="200"}': 3, 'requests_total{status="404"}': 1}
+
+    def test_histogram_is_cumulative(self, metrics):
+        """Test buckets count every value at or below their bound"""
+        metrics.describe('latency_seconds', 'histogram', 'Latency', buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            metrics.observe('latency_seconds', {'endpoint': 'health'}, value)
+        samples = parse(metrics.render())
+        assert samples['latency_seconds_bucket{endpoint="health",le="0.1"}'] == 2
+        assert samples['latency_seconds_bucket{endpoint="health",le="1"}'] == 3
+        assert samples['latency_seconds_bucket{endpoint="health",le="+Inf"}'] == 4
+        assert samples['latency_seconds_count{endpoint="health"}'] == 4
+        assert samples['latency_seconds_sum{endpoint="health"}'] == pytest.approx(3.65)
+
+    def test_collectors(self, metrics):
+        """Test published and local collectors and exported stats dicts"""
+        stats = {'hits': 3, 'misses': 1, 'entries': 2}
+        metrics.export_stats('render_cache', lambda: stats, counters=('hits', 'misses'), gauges=('entries',))
+        metrics.describe('entries', 'gauge', 'Entries')
+        metrics.collector(lambda: [('entries', {'category': 'Workout'}, 7)], local=True)
+        samples = parse(metrics.render())
+        assert samples == {'aceest_render_cache_hits_total': 3, 'aceest_render_cache_misses_total': 1,
+                           'aceest_render_cache_entries': 2, 'entries{category="Workout"}': 7}
+        stats['hits'] = 5
+        assert parse(metrics.render())['aceest_render_cache_hits_total'] == 5
+
+    def test_publish_is_throttled(self, metrics):
+        """Test collectors run at most once per interval outside a scrape"""
+        calls = []
+        metrics.collector(lambda: calls.append(1) or [])
+        metrics.publish()
+        metrics.publish()
+        assert len(calls) == 1
+        metrics.publish(force=True)
+        assert len(calls) == 2
+
+    def test_undescribed_families_are_not_rendered(self, metrics):
+        """Test only declared families are exposed"""
+        metrics.inc('stray_total')
+        assert metrics.render() == '\n'
+
+    def test_invalid_kind(self, metrics):
+        """Test unknown metric kinds are rejected"""
+        with pytest.raises(ValueError):
+            metrics.describe('x', 'summary', 'X')
+
+class TestSharedValues:
+    """Test aggregation across processes"""
+
+    def test_values_are_summed_across_processes(self, tmp_path):
+        """Test counters of every worker are summed, gauges of exited ones dropped"""
+        directory = str(tmp_path / 'metrics')
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=count_requests, args=(directory, count)) for count in (3, 4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+        metrics = Metrics(SharedValues(directory))
+        metrics.describe('requests_total', 'counter', 'Requests')
+        metrics.describe('busy', 'gauge', 'Busy')
+        metrics.collector(lambda: [('busy', None, 1)])
+        metrics.inc('requests_total', {'endpoint': 'add_workout'})
+        assert parse(metrics.render()) == {'requests_total{endpoint="add_workout"}': 8, 'busy': 1}
+        assert len(os.listdir(directory)) == 3
+
+    def test_exited_processes_are_merged(self, tmp_path):
+        """Test merge_exited folds exited workers into one file without changing any total"""
+        directory = str(tmp_path / 'metrics')
+        context = multiprocessing.get_context('fork')
+        for count in (3, 4, 5):
+            worker = context.Process(target=count_requests, args=(directory, count))
+            worker.start()
+            worker.join(timeout=30)
+            assert merge_exited(directory) == 1
+        values = SharedValues(directory)
+        metrics = Metrics(values)
+        metrics.describe('requests_total', 'counter', 'Requests')
+        metrics.describe('busy', 'gauge', 'Busy')
+        metrics.inc('requests_total', {'endpoint': 'add_workout'})
+        assert parse(metrics.render()) == {'requests_total{endpoint="add_workout"}': 13}
+        assert sorted(os.listdir(directory)) == sorted([EXITED_FILE, f'metrics_{os.getpid()}.db'])
+        # Live processes are left alone
+        assert merge_exited(directory) == 0
+        values.close()
+
+    def test_magic_differs_from_other_mmap_files(self):
+        """Test a metrics file is never mistaken for a store or rate limit table"""
+        from aceest import ratelimit, shm
+        assert len({MAGIC, shm.MAGIC, ratelimit.MAGIC}) == 3
+
+    def test_file_grows(self, tmp_path):
+        """Test more samples than fit the initial file are kept"""
+        values = SharedValues(str(tmp_path / 'metrics'))
+        for index in range(5000):
+            values.inc(f'requests_total requests_total{{id="{index}"}}', index)
+        collected = values.collect()[0][1]
+        assert len(collected) == 5000
+        assert collected['requests_total requests_total{id="4999"}'] == 4999
+        values.close()
+
+    def test_reopened_file_continues(self, tmp_path):
+        """Test a process reusing a pid keeps counting from the stored values"""
+        directory = str(tmp_path / 'metrics')
+        values = SharedValues(directory)
+        values.inc('a_total a_total', 2)
+        values.close()
+        reopened = SharedValues(directory)
+        reopened.inc('a_total a_total', 1)
+        reopened.inc('b_total b_total', 1)
+        assert reopened.collect() == [(True, {'a_total a_total': 3.0, 'b_total b_total': 1.0})]
+        reopened.close()
+
+class TestInstrument:
+    """Test the Flask instrumentation"""
+
+    def test_requests_are_recorded(self):
+        """Test counts, statuses and latencies per endpoint, and the scrape endpoint"""
+        app = Flask(__name__)
+
+        @app.route('/ping')
+        def ping():
+            return 'pong'
+
+        instrument(app, Metrics())
+        client = app.test_client()
+        client.get('/ping')
+        client.get('/ping')
+        client.get('/missing')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.headers['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+        samples = parse(response.get_data(as_text=True))
+        assert samples['aceest_http_requests_total{endpoint="ping",method="GET",status="200"}'] == 2
+        assert samples['aceest_http_requests_total{endpoint="unmatched",method="GET",status="404"}'] == 1
+        assert samples['aceest_http_request_duration_seconds_count{endpoint="ping",method="GET"}'] == 2
@@ -0,0 +1,89 @@
+"""
+Unit tests for workout pagination
+"""
+import pytest
+from aceest.pagination import (MAX_PAGE_SIZE, decode_cursor, encode_cursor, parse_fields,
+                               parse_limit, select_fields)
+from aceest.shm import SharedMemoryStore
+from aceest.storage import MemoryStore, SQLiteStore
+
+def make_entry(index):
+    """Build a workout entry in the API shape"""
+    return {'exercise': f'Exercise {index}', 'duration': index + 1, 'calories': 10.5,
+            'timestamp': '2025-01-01 10:00:00'}
+
+@pytest.fixture(params=['memory', 'sqlite', 'mmap'])
+def store(request, tmp_path):
+    """Yield each storage engine in turn"""
+    if request.param == 'memory':
+        engine = MemoryStore()
+    elif request.param == 'sqlite':
+        engine = SQLiteStore(str(tmp_path / 'aceest.db'))
+    else:
+        engine = SharedMemoryStore(str(tmp_path / 'shm'))
+    yield engine
+    engine.close()
+
+class TestCursors:
+    """Test cursor encoding and parameter parsing"""
+
+    def test_cursor_round_trip(self):
+        """Test a cursor decodes back to its category and position"""
+        cursor = encode_cursor('Cool-down', 42)
+        assert '=' not in cursor
+        assert decode_cursor(cursor) == ('Cool-down', 42)
+
+    @pytest.mark.parametrize('cursor', ['', 'not base64!', encode_cursor('Workout', -1), 'W10'])
+    def test_invalid_cursors(self, cursor):
+        """Test malformed or tampered cursors are rejected"""
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+    def test_parse_limit(self):
+        """Test limits default and stay within bounds"""
+        assert parse_limit(None) == 50
+        assert parse_limit('5') == 5
+        for value in ('0', str(MAX_PAGE_SIZE + 1), 'five'):
+            with pytest.raises(ValueError):
+                parse_limit(value)
+
+    def test_fields(self):
+        """Test field lists are validated and projected"""
+        fields = parse_fields('exercise, duration')
+        assert select_fields([make_entry(0)], fields) == [{'exercise': 'Exercise 0', 'duration': 1}]
+        assert parse_fields(None) is None
+        with pytest.raises(ValueError):
+            parse_fields('exercise,password')
+
+class TestPageWorkouts:
+    """Test store pages across engines"""
+
+    def test_pages_walk_history_newest_first(self, store):
+        """Test following next positions visits every entry exactly once"""
+        for index in range(7):
+            store.add_workout('Workout', make_entry(index), '2025-01-01')
+            store.add_workout('Warm-up', make_entry(100 + index), '2025-01-01')
+        seen = []
+        entries, before = store.page_workouts('Workout', 3)
+        seen.extend(entries)
+        while before is not None:
+            entries, before = store.page_workouts('Workout', 3, before)
+            seen.extend(entries)
+        assert [entry['exercise'] for entry in seen] == [f'Exercise {i}' for i in range(6, -1, -1)]
+
+    def test_exact_page_has_no_next(self, store):
+        """Test a page that ends at the oldest entry reports no next position"""
+        for index in range(3):
+            store.add_workout('Cool-down', make_entry(index), '2025-01-01')
+        entries, before = store.page_workouts('Cool-down', 3)
+        assert len(entries) == 3
+        assert before is None
+
+    def test_cursor_is_stable_under_appends(self, store):
+        """Test new entries do not shift pages that were already handed out"""
+        for index in range(4):
+            store.add_workout('Workout', make_entry(index), '2025-01-01')
+        _entries, before = store.page_workouts('Workout', 2)
+        store.add_workout('Workout', make_entry(99), '2025-01-02')
+        entries, _before = store.page_workouts('Workout', 2, before)
+        assert [entry['exercise'] for entry in entries] == ['Exercise 1', 'Exercise 0']
@@ -0,0 +1,137 @@
+"""
+Unit tests for the on-demand profiler
+"""
+import threading
+import time
+from collections import Counter
+
+import pytest
+from flask import Flask
+from aceest.profiling import StackSampler, collapsed, enable_profiling, is_admin, parse_number
+
+TOKEN = 'admin-secret'
+
+def spin_until(stop):
+    """Busy thread body the sampler should find"""
+    while not stop.is_set():
+        sum(range(100))
+
+@pytest.fixture
+def busy_thread():
+    """Run spin_until on a named thread for the duration of a test"""
+    stop = threading.Event()
+    thread = threading.Thread(target=spin_until, args=(stop,), name='busy worker')
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+class TestStackSampler:
+    """Test thread stack sampling"""
+
+    def test_samples_other_threads(self, busy_thread):
+        """Test stacks are collapsed root first, under the thread's name"""
+        counts, ticks = StackSampler(hz=200).sample(0.2)
+        assert ticks >= 10
+        busy = [stack for stack in counts if stack.startswith('busy_worker;')]
+        assert busy and all('spin_until (' in stack for stack in busy)
+        assert sum(counts[stack] for stack in busy) == ticks
+        # The sampling thread leaves itself out
+        assert not any('sample_once' in stack for stack in counts)
+
+    def test_frame_labels(self):
+        """Test frames name the function, its file relative to sys.path and its first line"""
+        counts = Counter()
+        stop = threading.Event()
+        thread = threading.Thread(target=stop.wait, name='idle')
+        thread.start()
+        StackSampler().sample_once(counts)
+        stop.set()
+        thread.join()
+        stack = next(stack for stack in counts if stack.startswith('idle;'))
+        assert all(';' not in frame for frame in stack.split(';'))
+        assert any(frame.startswith('wait (threading.py:') for frame in stack.split(';'))
+
+    def test_collapsed_format(self):
+        """Test one 'stack count' line per stack, most sampled first"""
+        assert collapsed(Counter({'main;a': 1, 'main;a;b': 3})) == 'main;a;b 3\nmain;a 1\n'
+
+class TestHelpers:
+    """Test authorization and argument parsing"""
+
+    def test_is_admin(self):
+        """Test only the configured bearer token is accepted"""
+        app = Flask(__name__)
+        with app.test_request_context(headers={'Authorization': f'Bearer {TOKEN}'}) as context:
+            assert is_admin(context.request, TOKEN)
+            assert not is_admin(context.request, 'other')
+            assert not is_admin(context.request, None)
+        with app.test_request_context(headers={'Authorization': f'Basic {TOKEN}'}) as context:
+            assert not is_admin(context.request, TOKEN)
+
+    def test_parse_number(self):
+        """Test defaults, bounds and junk"""
+        assert parse_number({}, 'seconds', 5, 0, 60) == 5.0
+        assert parse_number({'seconds': '0.5'}, 'seconds', 5, 0, 60) == 0.5
+        for value in ('0', '61', 'soon', 'nan'):
+            with pytest.raises(ValueError):
+                parse_number({'seconds': value}, 'seconds', 5, 0, 60)
+
+@pytest.fixture
+def client():
+    """Flask app with profiling enabled"""
+    app = Flask(__name__)
+
+    @app.route('/slow')
+    def slow():
+        time.sleep(0.01)
+        return 'done', 202
+
+    enable_profiling(app, TOKEN)
+    return app.test_client()
+
+ADMIN = {'Authorization': f'Bearer {TOKEN}'}
+
+class TestEndpoints:
+    """Test /debug/profile and ?profile=1"""
+
+    def test_profile_requires_the_token(self, client):
+        """Test the sampler is hidden from everyone else"""
+        assert client.get('/debug/profile?seconds=0.01').status_code == 404
+        assert client.get('/debug/profile?seconds=0.01', headers={'Authorization': 'Bearer nope'}).status_code == 404
+        assert client.get('/slow?profile=1').data == b'done'
+
+    def test_sampled_profile(self, client, busy_thread):
+        """Test collapsed stacks of the worker's other threads are returned"""
+        response = client.get('/debug/profile?seconds=0.1&hz=200', headers=ADMIN)
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == 'no-store'
+        assert int(response.headers['X-Profile-Samples']) >= 5
+        lines = response.get_data(as_text=True).splitlines()
+        assert any(line.startswith('busy_worker;') and 'spin_until' in line for line in lines)
+        assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+    def test_invalid_arguments(self, client):
+        """Test out-of-range durations and rates are rejected"""
+        assert client.get('/debug/profile?seconds=600', headers=ADMIN).status_code == 400
+        assert client.get('/debug/profile?hz=0', headers=ADMIN).status_code == 400
+
+    def test_one_profile_at_a_time(self, client):
+        """Test a second concurrent profile is refused"""
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            client.get('/debug/profile?seconds=0.5', headers=ADMIN).status_code))
+        thread.start()
+        time.sleep(0.1)
+        assert client.get('/debug/profile?seconds=0.1', headers=ADMIN).status_code == 409
+        thread.join()
+        assert results == [200]
+
+    def test_request_profile(self, client):
+        """Test ?profile=1 answers with the cProfile report of the request"""
+        response = client.get('/slow?profile=1', headers=ADMIN)
+        assert response.status_code == 200
+        assert response.headers['X-Profiled-Status'] == '202'
+        report = response.get_data(as_text=True)
+        assert 'cumulative' in report
+        assert 'slow' in report
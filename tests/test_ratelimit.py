@@ -0,0 +1,172 @@
+"""
+Unit tests for the per-client rate limiter
+"""
+import multiprocessing
+
+import pytest
+from aceest.ratelimit import Budget, LocalTable, RateLimiter, SharedTable, parse_budgets
+
+def take_tokens(path, count, results):
+    """Worker process body: spend tokens through its own mapping"""
+    table = SharedTable(path, slots=64)
+    budget = Budget(0.001, 100)
+    results.put(sum(table.take(('add_workout', 'ip:10.0.0.1'), budget, 1000.0)[0] for _ in range(count)))
+    table.close()
+
+class Clock:
+    """Settable clock for deterministic refills"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestBudget:
+    """Test budget parsing"""
+
+    def test_parse(self):
+        """Test count/period:burst specs"""
+        assert Budget.parse('120/min:30') == Budget(2.0, 30.0)
+        assert Budget.parse('5/s') == Budget(5.0, 5.0)
+        assert Budget.parse('10') == Budget(10.0, 10.0)
+
+    @pytest.mark.parametrize('spec', ['', 'ten/min', '10/fortnight', '0/min', '10/min:0'])
+    def test_parse_invalid(self, spec):
+        """Test malformed budgets are rejected"""
+        with pytest.raises(ValueError):
+            Budget.parse(spec)
+
+    def test_parse_budgets(self):
+        """Test per-route specs, including disabled routes"""
+        assert parse_budgets('add_workout=60/min:10; save_user_info=off;') == {
+            'add_workout': Budget(1.0, 10.0), 'save_user_info': None}
+
+@pytest.fixture(params=['local', 'shared'])
+def table(request, tmp_path):
+    """Yield each bucket table implementation"""
+    engine = LocalTable() if request.param == 'local' else SharedTable(str(tmp_path / 'ratelimit'), slots=64)
+    yield engine
+    engine.close()
+
+class TestRateLimiter:
+    """Test token-bucket admission on both tables"""
+
+    def test_burst_then_refill(self, table):
+        """Test a client gets its burst, then one request per refilled token"""
+        clock = Clock()
+        limiter = RateLimiter({'add_workout': Budget(1.0, 3)}, table, clock)
+        assert [limiter.acquire('add_workout', 'ip:a') for _ in range(3)] == [None] * 3
+        assert limiter.acquire('add_workout', 'ip:a') == pytest.approx(1.0)
+        clock.now += 0.5
+        assert limiter.acquire('add_workout', 'ip:a') == pytest.approx(0.5)
+        clock.now += 0.5
+        assert limiter.acquire('add_workout', 'ip:a') is None
+        assert limiter.stats() == {'allowed': 4, 'limited': 2}
+
+    def test_refill_is_capped_at_burst(self, table):
+        """Test an idle client does not save up more than its burst"""
+        clock = Clock()
+        limiter = RateLimiter({'add_workout': Budget(1.0, 2)}, table, clock)
+        limiter.acquire('add_workout', 'ip:a')
+        clock.now += 3600
+        assert [limiter.acquire('add_workout', 'ip:a') is None for _ in range(3)] == [True, True, False]
+
+    def test_clients_and_routes_are_isolated(self, table):
+        """Test one client spending its budget leaves others untouched"""
+        clock = Clock()
+        limiter = RateLimiter({'add_workout': Budget(0.1, 1), 'save_user_info': Budget(0.1, 1)}, table, clock)
+        assert limiter.acquire('add_workout', 'ip:a') is None
+        assert limiter.acquire('add_workout', 'ip:a') is not None
+        assert limiter.acquire('add_workout', 'ip:b') is None
+        assert limiter.acquire('save_user_info', 'ip:a') is None
+
+    def test_request_charged_to_several_buckets(self, table):
+        """Test each bucket is charged, and a refusal stops before the later ones"""
+        clock = Clock()
+        limiter = RateLimiter({'add_workout': Budget(0.1, 2)}, table, clock)
+        assert limiter.acquire('add_workout', 'ip:a', 'member:R-1') is None
+        assert limiter.acquire('add_workout', 'ip:a', 'member:R-2') is None
+        assert limiter.acquire('add_workout', 'ip:a', 'member:R-1') is not None
+        # R-1 was charged once: the refused request stopped at ip:a
+        assert limiter.acquire('add_workout', 'ip:b', 'member:R-1') is None
+        assert limiter.acquire('add_workout', 'ip:c', 'member:R-1') is not None
+        assert limiter.stats() == {'allowed': 3, 'limited': 2}
+
+    def test_unlimited_routes(self, table):
+        """Test routes without a budget are always admitted"""
+        limiter = RateLimiter({'save_user_info': None}, table)
+        assert all(limiter.acquire(route, 'ip:a') is None for route in ['save_user_info', 'get_workouts'] * 50)
+        assert limiter.stats() == {'allowed': 0, 'limited': 0}
+
+    def test_clock_going_backwards(self, table):
+        """Test a clock step back does not mint or remove tokens"""
+        clock = Clock()
+        limiter = RateLimiter({'add_workout': Budget(1.0, 1)}, table, clock)
+        limiter.acquire('add_workout', 'ip:a')
+        clock.now -= 60
+        assert limiter.acquire('add_workout', 'ip:a') == pytest.approx(1.0)
+
+    def test_retry_after_header(self):
+        """Test Retry-After is whole seconds, at least one"""
+        assert RateLimiter.retry_after_header(0.01) == '1'
+        assert RateLimiter.retry_after_header(2.2) == '3'
+
+class TestTables:
+    """Test table-specific behaviour"""
+
+    def test_local_table_forgets_least_recent_clients(self):
+        """Test the local table stays bounded"""
+        table = LocalTable(max_clients=2)
+        budget = Budget(0.001, 1)
+        for client in 'abc':
+            table.take(client, budget, 1000.0)
+        assert len(table) == 2
+        # 'a' was dropped and starts over with a full bucket
+        assert table.take('a', budget, 1000.0)[0]
+        assert not table.take('c', budget, 1000.0)[0]
+
+    def test_shared_table_is_shared(self, tmp_path):
+        """Test two mappings of one file (two workers) spend one budget"""
+        path = str(tmp_path / 'ratelimit')
+        first, second = SharedTable(path, slots=64), SharedTable(path, slots=64)
+        budget = Budget(0.001, 2)
+        assert first.take('ip:a', budget, 1000.0)[0]
+        assert second.take('ip:a', budget, 1000.0)[0]
+        assert not first.take('ip:a', budget, 1000.0)[0]
+        assert len(second) == 1
+        first.close()
+        second.close()
+
+    def test_shared_table_across_processes(self, tmp_path):
+        """Test concurrent worker processes never admit more than the burst"""
+        path = str(tmp_path / 'ratelimit')
+        SharedTable(path, slots=64).close()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [context.Process(target=take_tokens, args=(path, 60, results)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        admitted = sum(results.get(timeout=30) for _ in workers)
+        for worker in workers:
+            worker.join(timeout=30)
+        assert admitted == 100
+
+    def test_full_shared_table_reuses_idle_slots(self, tmp_path):
+        """Test more clients than slots evict the longest idle bucket"""
+        table = SharedTable(str(tmp_path / 'ratelimit'), slots=4)
+        budget = Budget(0.001, 1)
+        for index, client in enumerate('abcde'):
+            assert table.take(client, budget, 1000.0 + index)[0]
+        assert len(table) == 4
+        # 'e' took the slot of 'a', the longest idle client
+        assert table.take('a', budget, 1010.0)[0]
+        assert not table.take('d', budget, 1010.0)[0]
+        table.close()
+
+    def test_rejects_foreign_file(self, tmp_path):
+        """Test a file that is not a rate limit table is not mapped"""
+        path = tmp_path / 'ratelimit'
+        path.write_bytes(b'not a table' * 10)
+        with pytest.raises(ValueError):
+            SharedTable(str(path))
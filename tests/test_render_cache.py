@@ -0,0 +1,71 @@
+"""
+Unit tests for the rendered fragment cache
+"""
+import pytest
+from aceest.render_cache import RenderCache
+
+class TestRenderCache:
+    """Test lookups, LRU eviction and counters"""
+
+    def test_get_or_render_renders_once(self):
+        """Test a hit returns the cached fragment without rendering"""
+        cache = RenderCache()
+        calls = []
+
+        def render():
+            calls.append(1)
+            return '<div>card</div>'
+
+        assert cache.get_or_render(('card', 1), render) == '<div>card</div>'
+        assert cache.get_or_render(('card', 1), render) == '<div>card</div>'
+        assert len(calls) == 1
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+        assert cache.stats()['hit_ratio'] == 0.5
+
+    def test_least_recently_used_is_evicted(self):
+        """Test the entry limit evicts the least recently used fragment"""
+        cache = RenderCache(max_entries=2)
+        cache.put('a', 'A')
+        cache.put('b', 'B')
+        cache.get('a')
+        cache.put('c', 'C')
+        assert cache.get('b') is None
+        assert cache.get('a') == 'A'
+        assert cache.get('c') == 'C'
+        assert cache.stats()['evictions'] == 1
+
+    def test_size_limit_evicts(self):
+        """Test the total size bound evicts old fragments"""
+        cache = RenderCache(max_bytes=10)
+        cache.put('a', 'x' * 6)
+        cache.put('b', 'y' * 6)
+        assert cache.get('a') is None
+        assert cache.stats()['size'] == 6
+
+    def test_oversized_fragment_is_not_cached(self):
+        """Test a fragment larger than the whole cache is returned but not kept"""
+        cache = RenderCache(max_bytes=4)
+        assert cache.get_or_render('a', lambda: 'too large') == 'too large'
+        assert len(cache) == 0
+
+    def test_replacing_a_key_keeps_size_accurate(self):
+        """Test putting an existing key accounts for the old value"""
+        cache = RenderCache()
+        cache.put('a', 'xxxx')
+        cache.put('a', 'yy')
+        assert cache.stats()['size'] == 2
+        assert len(cache) == 1
+
+    def test_clear(self):
+        """Test clear drops fragments but keeps counters"""
+        cache = RenderCache()
+        cache.get_or_render('a', lambda: 'A')
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.stats()['misses'] == 1
+
+    def test_limits_must_be_positive(self):
+        """Test invalid limits are rejected"""
+        with pytest.raises(ValueError):
+            RenderCache(max_entries=0)
@@ -0,0 +1,123 @@
+"""
+Unit tests for the shared-memory storage engine
+"""
+import multiprocessing
+import os
+
+import pytest
+from aceest.shm import MAX_EXERCISE_BYTES, SharedMemoryStore, _SEQ_OFFSET
+from aceest.storage import create_store
+
+def make_entry(exercise='Running', duration=30, calories=220.5):
+    """Build a workout entry in the API shape"""
+    return {'exercise': exercise, 'duration': duration, 'calories': calories,
+            'timestamp': '2025-01-01 10:00:00'}
+
+def append_entries(directory, count):
+    """Worker process body: append entries through its own mapping"""
+    store = SharedMemoryStore(directory)
+    for _ in range(count):
+        store.add_workout('Workout', make_entry(duration=1, calories=0.1), '2025-01-01')
+    store.close()
+
+@pytest.fixture
+def store(tmp_path):
+    """Yield a shared-memory store in a temporary directory"""
+    engine = SharedMemoryStore(str(tmp_path / 'shm'), initial_capacity=4)
+    yield engine
+    engine.close()
+
+class TestSharedMemoryStore:
+    """Test the mmap-backed store"""
+
+    def test_round_trip(self, store):
+        """Test entries, daily buckets and totals read back from the mapping"""
+        store.add_workout('Workout', make_entry(), '2025-01-01')
+        store.add_workout('Cool-down', make_entry('Stretching', 10, 18.4), '2025-01-02')
+        assert store.get_workouts()['Workout'] == [make_entry()]
+        assert list(store.get_daily_workouts()) == ['2025-01-01', '2025-01-02']
+        assert store.get_category_totals()['Cool-down'] == {'time': 10, 'calories': 18.4}
+        assert store.get_range_totals('2025-01-02', '2025-01-31')['Workout'] == {'time': 0, 'calories': 0.0}
+        assert store.get_daily_totals('2025-01-02') == [('2025-01-02', 10, 18.4)]
+        assert store.verify_totals() == []
+
+    def test_grows_past_initial_capacity(self, store):
+        """Test the file is extended when records outgrow it"""
+        for i in range(50):
+            store.add_workout('Warm-up', make_entry(duration=i), '2025-01-01')
+        assert len(store) == 50
+        assert store.get_category_totals()['Warm-up']['time'] == sum(range(50))
+
+    def test_second_mapping_sees_writes(self, store):
+        """Test another handle on the same files (another worker) sees each write"""
+        other = SharedMemoryStore(store.directory)
+        other.get_workouts()
+        for i in range(10):
+            store.add_workout('Workout', make_entry(duration=i), '2025-01-01')
+        store.save_user_info({'name': 'Asha'})
+        assert len(other.get_workouts()['Workout']) == 10
+        assert other.get_user_info() == {'name': 'Asha'}
+        other.close()
+
+    def test_members_use_separate_files(self, store):
+        """Test member stores do not see each other's data"""
+        member = store.for_member('R-1')
+        member.add_workout('Workout', make_entry(), '2025-01-01')
+        assert store.get_workouts()['Workout'] == []
+        assert os.path.dirname(member.path) == store.directory
+        member.close()
+
+    def test_dropped_stores_release_their_files(self, store):
+        """Test member stores left to the garbage collector close their descriptors"""
+        before = len(os.listdir('/proc/self/fd'))
+        for i in range(50):
+            store.for_member(f'R-{i}').data_version()
+        assert len(os.listdir('/proc/self/fd')) <= before + 2
+        assert store.has_member('R-1') and not store.has_member('R-99')
+
+    def test_longest_exercise_names_round_trip(self, store):
+        """Test 100-character names of multi-byte characters are stored whole"""
+        name = '💪' * 99 + 'é'
+        store.add_workout('Workout', make_entry(name), '2025-01-01')
+        assert store.get_workouts()['Workout'][0]['exercise'] == name
+
+    def test_oversized_names_are_rejected(self, store):
+        """Test names the record cannot hold fail the whole write instead of being cut"""
+        with pytest.raises(ValueError):
+            store.add_workouts([('Workout', make_entry(), '2025-01-01'),
+                                ('Workout', make_entry('é' * MAX_EXERCISE_BYTES), '2025-01-01')])
+        assert len(store) == 0
+
+    def test_odd_sequence_is_repaired(self, store):
+        """Test a writer that died mid-update does not block readers forever"""
+        store._mm[_SEQ_OFFSET:_SEQ_OFFSET + 8] = (7).to_bytes(8, 'little')
+        reopened = SharedMemoryStore(store.directory)
+        assert reopened.get_workouts()['Workout'] == []
+        store.add_workout('Workout', make_entry(), '2025-01-01')
+        assert len(reopened) == 1
+        reopened.close()
+
+    def test_rejects_foreign_file(self, tmp_path):
+        """Test a file without the store header is refused"""
+        (tmp_path / 'default.shm').write_bytes(b'x' * 8192)
+        with pytest.raises(ValueError):
+            SharedMemoryStore(str(tmp_path))
+
+    def test_concurrent_processes(self, store):
+        """Test appends from several processes are all kept"""
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=append_entries, args=(store.directory, 100)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert len(store) == 400
+        assert store.get_category_totals()['Workout'] == {'time': 400, 'calories': 40.0}
+
+    def test_create_store_url(self, tmp_path):
+        """Test mmap:/// URLs select the shared-memory engine"""
+        engine = create_store(f"mmap:///{tmp_path / 'shm'}")
+        assert isinstance(engine, SharedMemoryStore)
+        engine.close()
+        with pytest.raises(ValueError):
+            create_store('mmap:///')
@@ -0,0 +1,116 @@
+"""
+Unit tests for the mergeable quantile sketches
+"""
+import json
+import random
+
+import pytest
+from aceest.sketches import DDSketch, StatsCache, WorkoutStats, merge_stats
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+def entry(exercise, duration, calories):
+    return {'exercise': exercise, 'duration': duration, 'calories': calories, 'timestamp': '2025-01-01 08:00:00'}
+
+class TestDDSketch:
+    def test_quantiles_within_relative_accuracy(self):
+        rng = random.Random(3)
+        values = [rng.lognormvariate(3, 1) for _ in range(20000)]
+        sketch = DDSketch(0.01)
+        for value in values:
+            sketch.add(value)
+        for q in (0.5, 0.9, 0.99):
+            exact = exact_quantile(values, q)
+            assert abs(sketch.quantile(q) - exact) <= 0.01 * exact + 1e-9
+        assert sketch.count == 20000
+        assert sketch.quantile(0) == min(values)
+        assert sketch.quantile(1) == max(values)
+
+    def test_zeros_and_empty(self):
+        sketch = DDSketch()
+        assert sketch.quantile(0.5) is None
+        for value in (0, 0, 0, 10):
+            sketch.add(value)
+        assert sketch.quantile(0.5) == 0.0
+        with pytest.raises(ValueError):
+            sketch.add(-1)
+
+    def test_merge_equals_single_sketch(self):
+        rng = random.Random(5)
+        values = [rng.randint(1, 1440) for _ in range(5000)]
+        whole, left, right = DDSketch(), DDSketch(), DDSketch()
+        for index, value in enumerate(values):
+            whole.add(value)
+            (left if index % 3 else right).add(value)
+        merged = left.merge(right)
+        assert merged.bins == whole.bins
+        assert merged.quantile(0.99) == whole.quantile(0.99)
+        with pytest.raises(ValueError):
+            merged.merge(DDSketch(0.05))
+
+    def test_serialization_round_trip(self):
+        sketch = DDSketch()
+        for value in (5, 10, 20, 45):
+            sketch.add(value)
+        restored = DDSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+        assert restored.bins == sketch.bins
+        assert restored.quantile(0.9) == sketch.quantile(0.9)
+        empty = DDSketch.from_dict(json.loads(json.dumps(DDSketch().to_dict())))
+        assert empty.quantile(0.5) is None
+
+    def test_bins_are_bounded(self):
+        sketch = DDSketch(0.01, max_bins=50)
+        for exponent in range(200):
+            sketch.add(1.1 ** exponent)
+        assert len(sketch.bins) == 50
+        assert sketch.quantile(1) == pytest.approx(1.1 ** 199)
+
+class TestWorkoutStats:
+    def test_summary_per_category_and_exercise(self):
+        stats = WorkoutStats()
+        for duration in range(1, 101):
+            stats.add('Workout', entry('Rowing', duration, duration * 2.0))
+        stats.add('Warm-up', entry('Jog', 10, 5.0))
+        summary = stats.summary()
+        assert summary['categories']['Workout']['count'] == 100
+        assert summary['categories']['Workout']['duration']['p50'] == pytest.approx(50, rel=0.01)
+        assert summary['categories']['Workout']['calories']['p99'] == pytest.approx(198, rel=0.01)
+        assert summary['exercises']['Jog']['duration'] == {'p50': 10, 'p90': 10, 'p99': 10}
+
+    def test_merge_stats_from_serialized_workers(self):
+        workers = [WorkoutStats(), WorkoutStats()]
+        for duration in range(1, 41):
+            workers[duration % 2].add('Workout', entry('Rowing', duration, 1.0))
+        merged = merge_stats([json.loads(json.dumps(worker.to_dict())) for worker in workers])
+        assert merged.summary()['categories']['Workout']['count'] == 40
+        assert merge_stats([]).summary() == {'categories': {}, 'exercises': {}}
+
+class TestStatsCache:
+    def test_record_only_follows_the_cached_state(self):
+        cache = StatsCache()
+        stats = cache.get('member', lambda: 1, WorkoutStats)
+        assert cache.record('member', 1, 2, [('Workout', entry('Rowing', 30, 1.0))])
+        assert stats.summary()['categories']['Workout']['count'] == 1
+        # A change the cache did not see cannot be folded in
+        assert not cache.record('member', 5, 6, [('Workout', entry('Rowing', 30, 1.0))])
+        assert cache.get('member', lambda: 2, WorkoutStats) is stats
+        assert cache.get('member', lambda: 6, WorkoutStats) is not stats
+        assert cache.stats() == {'datasets': 1, 'rebuilds': 2, 'updates': 1}
+
+    def test_unbounded_cache_discards_on_request(self):
+        cache = StatsCache(max_datasets=None)
+        for member in range(2000):
+            cache.get(member, lambda: 1, WorkoutStats)
+        assert cache.stats()['datasets'] == 2000
+        cache.discard(7)
+        cache.discard('unknown')
+        assert cache.stats()['datasets'] == 1999
+
+    def test_racing_rebuild_is_not_kept(self):
+        cache = StatsCache()
+        states = iter([1, 2, 2, 2])
+        cache.get('member', lambda: next(states), WorkoutStats)
+        assert not cache.record('member', 1, 2, [])
+        assert cache.stats()['datasets'] == 0
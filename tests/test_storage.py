@@ -0,0 +1,212 @@
+"""
+Unit tests for the ACEest Fitness storage engines
+"""
+import pytest
+from aceest.columnar import ColumnarWorkouts
+from aceest.shm import SharedMemoryStore
+from aceest.storage import MemoryStore, SQLiteStore, create_store, empty_workouts
+
+def make_entry(exercise='Running', duration=30, calories=220.5):
+    """Build a workout entry in the API shape"""
+    return {
+        'exercise': exercise,
+        'duration': duration,
+        'calories': calories,
+        'timestamp': '2025-01-01 10:00:00'
+    }
+
+@pytest.fixture(params=['memory', 'sqlite', 'mmap'])
+def store(request, tmp_path):
+    """Yield each storage engine in turn"""
+    if request.param == 'memory':
+        engine = MemoryStore()
+    elif request.param == 'sqlite':
+        engine = SQLiteStore(str(tmp_path / 'aceest.db'))
+    else:
+        engine = SharedMemoryStore(str(tmp_path / 'shm'))
+    yield engine
+    engine.close()
+
+class TestStoreContract:
+    """Behaviour every storage engine must provide"""
+
+    def test_empty_store(self, store):
+        """Test a new store has empty categories and no user"""
+        assert store.get_workouts() == empty_workouts()
+        assert store.get_daily_workouts() == {}
+        assert store.get_user_info() == {}
+
+    def test_add_and_get_workouts(self, store):
+        """Test added entries are returned in insertion order"""
+        store.add_workout('Workout', make_entry('Running'), '2025-01-01')
+        store.add_workout('Workout', make_entry('Rowing'), '2025-01-01')
+        workouts = store.get_workouts()
+        assert [e['exercise'] for e in workouts['Workout']] == ['Running', 'Rowing']
+        assert workouts['Warm-up'] == []
+
+    def test_daily_workouts(self, store):
+        """Test entries are grouped by day"""
+        store.add_workout('Warm-up', make_entry(), '2025-01-01')
+        store.add_workout('Workout', make_entry(), '2025-01-02')
+        daily = store.get_daily_workouts()
+        assert len(daily['2025-01-01']['Warm-up']) == 1
+        assert len(daily['2025-01-02']['Workout']) == 1
+
+    def test_category_totals(self, store):
+        """Test per-category totals"""
+        store.add_workout('Workout', make_entry(duration=30, calories=200.0), '2025-01-01')
+        store.add_workout('Workout', make_entry(duration=15, calories=100.5), '2025-01-01')
+        totals = store.get_category_totals()
+        assert totals['Workout'] == {'time': 45, 'calories': pytest.approx(300.5)}
+        assert totals['Cool-down'] == {'time': 0, 'calories': 0}
+
+    def test_add_workouts_batch(self, store):
+        """Test a batch lands entries, daily buckets and totals together"""
+        store.add_workouts([
+            ('Workout', make_entry('Running', 30, 200.0), '2025-01-01'),
+            ('Workout', make_entry('Rowing', 15, 100.5), '2025-01-02'),
+            ('Cool-down', make_entry('Walk', 10, 20.0), '2025-01-02'),
+        ])
+        assert [e['exercise'] for e in store.get_workouts()['Workout']] == ['Running', 'Rowing']
+        assert len(store.get_daily_workouts()['2025-01-02']['Cool-down']) == 1
+        assert store.get_category_totals()['Workout'] == {'time': 45, 'calories': pytest.approx(300.5)}
+        assert store.get_range_totals('2025-01-02', '2025-01-02')['Workout']['time'] == 15
+        assert store.verify_totals() == []
+
+    def test_data_version_increases_on_writes(self, store):
+        """Test every write path moves the data version forward"""
+        versions = [store.data_version()]
+        store.add_workout('Workout', make_entry(), '2025-01-01')
+        versions.append(store.data_version())
+        store.add_workouts([('Warm-up', make_entry(), '2025-01-01')])
+        versions.append(store.data_version())
+        store.save_user_info({'weight': 70})
+        versions.append(store.data_version())
+        store.get_workouts()
+        assert store.data_version() == versions[-1]
+        assert versions == sorted(set(versions))
+        assert store.store_id
+
+    def test_category_versions_track_each_category(self, store):
+        """Test a write changes only the version of the category it touches"""
+        before = store.category_versions()
+        assert set(before) == {'Warm-up', 'Workout', 'Cool-down'}
+        store.add_workout('Workout', make_entry(), '2025-01-01')
+        after = store.category_versions()
+        assert after['Workout'] != before['Workout']
+        assert after['Warm-up'] == before['Warm-up']
+        assert after['Cool-down'] == before['Cool-down']
+        store.save_user_info({'weight': 70})
+        assert store.category_versions() == after
+
+    def test_save_user_info_merges(self, store):
+        """Test saving user info returns the merged profile"""
+        store.save_user_info({'name': 'A', 'weight': 70})
+        saved = store.save_user_info({'weight': 80})
+        assert saved == {'name': 'A', 'weight': 80}
+        assert store.get_user_info() == saved
+
+    def test_has_category(self, store):
+        """Test category validation"""
+        assert store.has_category('Workout')
+        assert not store.has_category('Stretching')
+
+    def test_exercise_counts(self, store):
+        """Test logged exercise names are counted"""
+        store.add_workout('Workout', make_entry('Running'), '2025-01-01')
+        store.add_workout('Warm-up', make_entry('Running'), '2025-01-02')
+        store.add_workout('Workout', make_entry('Rowing'), '2025-01-02')
+        assert store.exercise_counts() == {'Running': 2, 'Rowing': 1}
+
+    def test_category_counts(self, store):
+        """Test entries are counted per category"""
+        store.add_workout('Workout', make_entry('Running'), '2025-01-01')
+        store.add_workouts([('Workout', make_entry('Rowing'), '2025-01-02'),
+                            ('Cool-down', make_entry('Stretching'), '2025-01-02')])
+        assert store.category_counts() == {'Warm-up': 0, 'Workout': 2, 'Cool-down': 1}
+
+class TestSQLiteStore:
+    """SQLite specific behaviour"""
+
+    def test_batch_is_atomic(self, tmp_path):
+        """Test a batch failing part-way leaves no entries or totals behind"""
+        store = SQLiteStore(str(tmp_path / 'aceest.db'))
+        with pytest.raises(Exception):
+            store.add_workouts([
+                ('Workout', make_entry(), '2025-01-01'),
+                ('Workout', dict(make_entry(), exercise=None), '2025-01-01'),
+            ])
+        assert store.get_workouts()['Workout'] == []
+        assert store.get_category_totals()['Workout'] == {'time': 0, 'calories': 0}
+        store.close()
+
+    def test_wal_mode(self, tmp_path):
+        """Test the database runs in WAL journal mode"""
+        store = SQLiteStore(str(tmp_path / 'wal.db'))
+        mode = store.pool.connection().execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode.lower() == 'wal'
+        store.close()
+
+    def test_workers_share_dataset(self, tmp_path):
+        """Test two store instances (as in two workers) see the same data"""
+        path = str(tmp_path / 'shared.db')
+        worker_a = SQLiteStore(path)
+        worker_b = SQLiteStore(path)
+        worker_a.add_workout('Workout', make_entry('Squats'), '2025-01-01')
+        worker_b.save_user_info({'weight': 82})
+        assert worker_b.get_workouts()['Workout'][0]['exercise'] == 'Squats'
+        assert worker_a.get_user_info() == {'weight': 82}
+        worker_a.close()
+        worker_b.close()
+
+    def test_data_survives_reopen(self, tmp_path):
+        """Test data persists across store restarts"""
+        path = str(tmp_path / 'restart.db')
+        store = SQLiteStore(path)
+        store.add_workout('Cool-down', make_entry('Walk'), '2025-01-01')
+        store.close()
+        reopened = SQLiteStore(path)
+        assert reopened.get_workouts()['Cool-down'][0]['exercise'] == 'Walk'
+        reopened.close()
+
+    def test_connection_per_thread(self, tmp_path):
+        """Test the pool hands each thread its own connection"""
+        import threading
+        store = SQLiteStore(str(tmp_path / 'pool.db'))
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(store.pool.connection()))
+        thread.start()
+        thread.join()
+        assert seen[0] is not store.pool.connection()
+        store.close()
+
+class TestCreateStore:
+    """Test storage URL parsing"""
+
+    def test_memory_default(self):
+        """Test empty and memory URLs give a MemoryStore"""
+        assert isinstance(create_store(None), MemoryStore)
+        assert isinstance(create_store('memory://'), MemoryStore)
+
+    def test_memory_shares_state(self):
+        """Test the memory store uses the state it is given"""
+        workouts = ColumnarWorkouts(['Warm-up', 'Workout', 'Cool-down'])
+        daily_workouts = {}
+        store = create_store('memory://', workouts=workouts, daily_workouts=daily_workouts)
+        store.add_workout('Workout', make_entry(), '2025-01-01')
+        assert len(workouts['Workout']) == 1
+        assert list(daily_workouts['2025-01-01']['Workout']) == [0]
+
+    def test_sqlite_url(self, tmp_path):
+        """Test absolute sqlite URLs"""
+        store = create_store(f"sqlite:///{tmp_path / 'url.db'}")
+        assert isinstance(store, SQLiteStore)
+        assert store.path == str(tmp_path / 'url.db')
+        store.close()
+
+    def test_invalid_url(self):
+        """Test unsupported URLs are rejected"""
+        with pytest.raises(ValueError):
+            create_store('redis://localhost')
+        with pytest.raises(ValueError):
+            create_store('sqlite:///')
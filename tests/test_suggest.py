@@ -0,0 +1,58 @@
+"""
+Unit tests for the exercise name autocomplete index
+"""
+import random
+
+from aceest import suggest
+from aceest.suggest import ExerciseIndex, normalize_name, plan_exercise_names
+
+def brute_force(counts, prefix, limit):
+    key = normalize_name(prefix)
+    matches = [name for name in counts if normalize_name(name).startswith(key)]
+    return sorted(matches, key=lambda name: (-counts[name], normalize_name(name)))[:limit]
+
+class TestExerciseIndex:
+    def test_plan_names(self):
+        plans = {'Strength': ['Push-ups (3 sets of 10-15) - Upper body strength.',
+                              'Slow Walking - Bring heart rate down gradually.',
+                              'Deep Breathing Exercises - Aid recovery and relaxation.']}
+        assert plan_exercise_names(plans) == ['Push-ups', 'Slow Walking', 'Deep Breathing Exercises']
+
+    def test_ranks_by_frequency_then_name(self):
+        index = ExerciseIndex(['Push-ups', 'Plank', 'Pull-ups'])
+        for _ in range(3):
+            index.add('Pull-ups')
+        index.add('plank')
+        assert [s['name'] for s in index.suggest('p')] == ['Pull-ups', 'Plank', 'Push-ups']
+        assert index.suggest('PU') == [{'name': 'Pull-ups', 'count': 3}, {'name': 'Push-ups', 'count': 0}]
+        assert index.suggest('x') == []
+
+    def test_case_and_spacing_share_one_name(self):
+        index = ExerciseIndex(['Jumping Jacks'])
+        index.add('jumping   jacks')
+        assert index.suggest('jumping j') == [{'name': 'Jumping Jacks', 'count': 1}]
+        index.add('Rowing machine')
+        assert index.suggest('rowing ') == [{'name': 'Rowing machine', 'count': 1}]
+        assert index.suggest('rowingm') == []
+        assert len(index) == 2
+
+    def test_matches_brute_force_under_inserts(self, monkeypatch):
+        """Test the maintained top lists stay exact as counts change"""
+        monkeypatch.setattr(suggest, 'SCAN_LIMIT', 5)
+        rng = random.Random(11)
+        names = [' '.join(''.join(rng.choice('abc ') for _ in range(rng.randint(1, 7))).split()) or 'a'
+                 for _ in range(300)]
+        index = ExerciseIndex()
+        counts = {}
+        for step in range(3000):
+            name = rng.choice(names)
+            index.add(name)
+            counts[name] = counts.get(name, 0) + 1
+            if step % 97 == 0:
+                for prefix in ('', 'a', 'ab', 'abc', 'abca', 'b c', 'cab'):
+                    expected = brute_force(counts, prefix, 10)
+                    assert [s['name'] for s in index.suggest(prefix, 10)] == expected
+
+    def test_limit_is_capped(self):
+        index = ExerciseIndex(f'Drill {n}' for n in range(50))
+        assert len(index.suggest('drill', 100)) == suggest.MAX_LIMIT
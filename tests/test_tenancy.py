@@ -0,0 +1,157 @@
+"""
+Unit tests for multi-member tenancy
+"""
+import sqlite3
+import threading
+import pytest
+from aceest.journal import JournaledStore, WorkoutJournal
+from aceest.storage import MemoryStore, SQLiteStore
+from aceest.tenancy import InvalidMemberId, MemberRegistry, normalize_member_id
+
+def make_entry(exercise='Running', duration=30):
+    """Build a workout entry in the API shape"""
+    return {'exercise': exercise, 'duration': duration, 'calories': 100.0,
+            'timestamp': '2025-01-01 10:00:00'}
+
+class TestMemberRegistry:
+    """Test the sharded member registry"""
+
+    def test_get_creates_once(self):
+        """Test each member gets exactly one store"""
+        registry = MemberRegistry(lambda member: MemoryStore(), shards=4)
+        first = registry.get('REG001')
+        assert registry.get('REG001') is first
+        assert registry.get('REG002') is not first
+        assert len(registry) == 2
+        assert 'REG001' in registry
+        assert sorted(registry.members()) == ['REG001', 'REG002']
+
+    def test_members_spread_over_shards(self):
+        """Test members are distributed across shards"""
+        registry = MemberRegistry(lambda member: object(), shards=16)
+        for i in range(1600):
+            registry.get(f'REG{i:05d}')
+        sizes = registry.shard_sizes()
+        assert sum(sizes) == 1600
+        assert min(sizes) > 50
+
+    def test_concurrent_creation(self):
+        """Test racing first requests for a member create one store"""
+        created = []
+        registry = MemberRegistry(lambda member: created.append(member) or MemoryStore(), shards=2)
+        threads = [threading.Thread(target=registry.get, args=('REG001',)) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert created == ['REG001']
+
+    def test_lookup_without_create(self):
+        """Test create=False never builds a store"""
+        registry = MemberRegistry(lambda member: MemoryStore(), shards=4)
+        assert registry.get('REG001', create=False) is None
+        assert len(registry) == 0
+        store = registry.get('REG001')
+        assert registry.get('REG001', create=False) is store
+
+    def test_least_recently_used_is_evicted(self):
+        """Test a full shard drops its least recently used evictable store"""
+        registry = MemberRegistry(lambda member: MemoryStore(), shards=1, max_members=4)
+        pinned = MemoryStore()
+        registry.add('', pinned)
+        for member in ('A', 'B', 'C'):
+            registry.get(member)
+        registry.get('A')
+        registry.get('D')
+        assert sorted(registry.members()) == ['', 'A', 'C', 'D']
+        assert registry.evictions == 1
+        assert registry.get('', create=False) is pinned
+
+    def test_evictions_are_reported(self):
+        """Test on_evict hears of every store dropped"""
+        evicted = []
+        registry = MemberRegistry(lambda member: member.lower(), shards=1, max_members=2,
+                                  on_evict=lambda member, store: evicted.append((member, store)))
+        for member in ('A', 'B', 'C', 'D'):
+            registry.get(member)
+        assert evicted == [('A', 'a'), ('B', 'b')]
+
+    def test_only_evictable_stores_are_dropped(self):
+        """Test stores the predicate protects are kept past the bound"""
+        registry = MemberRegistry(lambda member: member, shards=1, max_members=2,
+                                  evictable=lambda store: store.startswith('tmp'))
+        for member in ('keep1', 'keep2', 'tmp1', 'keep3'):
+            registry.get(member)
+        assert sorted(registry.members()) == ['keep1', 'keep2', 'keep3']
+
+    def test_invalid_shards(self):
+        """Test a registry needs at least one shard"""
+        with pytest.raises(ValueError):
+            MemberRegistry(lambda member: None, shards=0)
+
+    def test_normalize_member_id(self):
+        """Test regn_id validation"""
+        assert normalize_member_id(None) == ''
+        assert normalize_member_id(' REG001 ') == 'REG001'
+        with pytest.raises(InvalidMemberId):
+            normalize_member_id('x' * 65)
+        with pytest.raises(InvalidMemberId):
+            normalize_member_id(42)
+
+class TestMemberStores:
+    """Test member isolation in the storage engines"""
+
+    def test_sqlite_members_are_isolated(self, tmp_path):
+        """Test SQLite member stores share a pool but not data"""
+        store = SQLiteStore(str(tmp_path / 'members.db'))
+        member = store.for_member('REG001')
+        assert member.pool is store.pool
+        member.add_workout('Workout', make_entry('Squats'), '2025-01-01')
+        member.save_user_info({'weight': 90})
+        assert store.get_workouts()['Workout'] == []
+        assert store.get_user_info() == {}
+        assert member.get_category_totals()['Workout']['time'] == 30
+        assert store.get_category_totals()['Workout']['time'] == 0
+        assert member.get_range_totals('2025-01-01', '2025-01-01')['Workout']['time'] == 30
+        store.close()
+
+    def test_sqlite_migrates_single_user_database(self, tmp_path):
+        """Test databases without member scoping are migrated to the default member"""
+        path = str(tmp_path / 'legacy.db')
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE workouts (id INTEGER PRIMARY KEY AUTOINCREMENT, category TEXT NOT NULL, "
+                     "exercise TEXT NOT NULL, duration INTEGER NOT NULL, calories REAL NOT NULL, "
+                     "timestamp TEXT NOT NULL, day TEXT NOT NULL)")
+        conn.execute("CREATE TABLE category_totals (category TEXT PRIMARY KEY, sessions INTEGER NOT NULL, "
+                     "time INTEGER NOT NULL, calories_tenths INTEGER NOT NULL)")
+        conn.execute("CREATE TABLE user_info (id INTEGER PRIMARY KEY CHECK (id = 1), data TEXT NOT NULL)")
+        conn.execute("INSERT INTO workouts (category, exercise, duration, calories, timestamp, day) "
+                     "VALUES ('Workout', 'Row', 15, 50.5, '2025-01-01 08:00:00', '2025-01-01')")
+        conn.execute("""INSERT INTO user_info (id, data) VALUES (1, '{"weight": 75}')""")
+        conn.commit()
+        conn.close()
+
+        store = SQLiteStore(path)
+        assert store.get_workouts()['Workout'][0]['exercise'] == 'Row'
+        assert store.get_user_info() == {'weight': 75}
+        assert store.get_category_totals()['Workout'] == {'time': 15, 'calories': 50.5}
+        assert store.verify_totals() == []
+        store.close()
+
+    def test_journal_recovers_every_member(self, tmp_path):
+        """Test journaled writes of several members survive restart and snapshot"""
+        root = JournaledStore(MemoryStore(), WorkoutJournal(str(tmp_path)), snapshot_every=0)
+        root.for_member('REG001').add_workout('Workout', make_entry('A'), '2025-01-01')
+        root.add_workout('Warm-up', make_entry('Default'), '2025-01-01')
+        root.snapshot()
+        root.for_member('REG002').save_user_info({'weight': 60})
+        root.for_member('REG001').add_workout('Workout', make_entry('B'), '2025-01-02')
+        root.close()
+
+        restarted = JournaledStore(MemoryStore(), WorkoutJournal(str(tmp_path)), snapshot_every=0)
+        assert restarted.replayed == 2
+        names = [e['exercise'] for e in restarted.for_member('REG001').get_workouts()['Workout']]
+        assert names == ['A', 'B']
+        assert restarted.for_member('REG002').get_user_info() == {'weight': 60}
+        assert restarted.get_workouts()['Warm-up'][0]['exercise'] == 'Default'
+        restarted.close()
@@ -0,0 +1,90 @@
+"""
+Unit tests for the batch calorie, BMI and BMR formulas
+"""
+import random
+
+import pytest
+from aceest import vectorized
+from aceest.vectorized import bmi_batch, bmr_batch, calories_batch
+
+def calculate_calories(weight_kg, met, duration_min):
+    return (met * 3.5 * weight_kg / 200) * duration_min
+
+def calculate_bmi(height_cm, weight_kg):
+    return weight_kg / ((height_cm / 100) ** 2)
+
+def calculate_bmr(weight_kg, height_cm, age, gender):
+    if gender.upper() == 'M':
+        return 10 * weight_kg + 6.25 * height_cm - 5 * age + 5
+    return 10 * weight_kg + 6.25 * height_cm - 5 * age - 161
+
+def cohort(size, seed=7):
+    """Random member profiles and workouts"""
+    rng = random.Random(seed)
+    return {
+        'weights': [rng.choice([rng.randint(40, 140), round(rng.uniform(40, 140), 1)]) for _ in range(size)],
+        'heights': [rng.choice([rng.randint(140, 205), round(rng.uniform(140, 205), 1)]) for _ in range(size)],
+        'ages': [rng.randint(14, 90) for _ in range(size)],
+        'genders': [rng.choice('MFmf') for _ in range(size)],
+        'mets': [rng.choice([3.0, 6.0, 2.5, 5.0]) for _ in range(size)],
+        'durations': [rng.randint(1, 1440) for _ in range(size)]
+    }
+
+@pytest.fixture(params=['python', 'numpy'])
+def engine(request, monkeypatch):
+    """Run a test on the pure-Python path and, when installed, on NumPy"""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+        monkeypatch.setattr(vectorized, 'NUMPY_MIN_SIZE', 1)
+    else:
+        monkeypatch.setattr(vectorized, 'numpy', None)
+    return request.param
+
+class TestBatchFormulas:
+    """Test the batch formulas agree exactly with the scalar ones"""
+
+    @pytest.mark.parametrize('ndigits', [None, 0, 1])
+    def test_calories_match_scalar(self, engine, ndigits):
+        """Test every calorie value equals calculate_calories (rounded alike)"""
+        data = cohort(2000)
+        expected = [calculate_calories(w, m, d) for w, m, d in zip(data['weights'], data['mets'], data['durations'])]
+        if ndigits is not None:
+            expected = [round(value, ndigits) for value in expected]
+        assert calories_batch(data['weights'], data['mets'], data['durations'], ndigits) == expected
+
+    def test_bmi_matches_scalar(self, engine):
+        """Test every BMI equals calculate_bmi rounded to one decimal"""
+        data = cohort(2000)
+        expected = [round(calculate_bmi(h, w), 1) for h, w in zip(data['heights'], data['weights'])]
+        assert bmi_batch(data['heights'], data['weights'], ndigits=1) == expected
+
+    def test_bmr_matches_scalar(self, engine):
+        """Test every BMR equals calculate_bmr rounded to a whole number"""
+        data = cohort(2000)
+        expected = [round(calculate_bmr(w, h, a, g), 0)
+                    for w, h, a, g in zip(data['weights'], data['heights'], data['ages'], data['genders'])]
+        assert bmr_batch(data['weights'], data['heights'], data['ages'], data['genders'], ndigits=0) == expected
+
+    def test_halfway_values_round_like_round(self, engine):
+        """Test values next to a rounding boundary round as round() does"""
+        # METs chosen so the calories land next to .x5 boundaries
+        assert calories_batch(1, [0.15 * 200 / 3.5, 0.35 * 200 / 3.5, 0.25 * 200 / 3.5], 1, ndigits=1) == [
+            round(calculate_calories(1, met, 1), 1) for met in (0.15 * 200 / 3.5, 0.35 * 200 / 3.5, 0.25 * 200 / 3.5)]
+
+    def test_scalars_broadcast(self, engine):
+        """Test a single number is applied to every row"""
+        assert calories_batch(70, [6.0, 3.0], 30) == [calculate_calories(70, 6.0, 30), calculate_calories(70, 3.0, 30)]
+        assert bmr_batch([70, 80], 175, 30, 'M') == [calculate_bmr(70, 175, 30, 'M'), calculate_bmr(80, 175, 30, 'M')]
+
+    def test_results_are_plain_floats(self, engine):
+        """Test results are Python floats on both paths"""
+        assert all(type(value) is float for value in calories_batch([70, 80], 6.0, [30, 45], ndigits=1))
+
+    def test_length_mismatch(self, engine):
+        """Test sequences of different lengths are rejected"""
+        with pytest.raises(ValueError):
+            calories_batch([70, 80], [6.0], [30, 45])
+
+    def test_empty_batch(self, engine):
+        """Test an empty batch gives an empty result"""
+        assert calories_batch([], [], []) == []
@@ -90,3 +90,26 @@ def test_wsgi_import_error_handling():
         # This is expected behavior - spec is None for missing files
         assert spec is None or spec.loader is None
 
+def load_gunicorn_config():
+    """Run gunicorn.conf.py and return its settings"""
+    import runpy
+    return runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py'))
+
+def test_gunicorn_config(monkeypatch):
+    """Test the v1.3 image runs one threaded worker per journal directory"""
+    monkeypatch.delenv('JOURNAL_DIR', raising=False)
+    monkeypatch.delenv('WEB_CONCURRENCY', raising=False)
+    assert load_gunicorn_config()['workers'] == 4
+    monkeypatch.setenv('JOURNAL_DIR', '/data/journal')
+    config = load_gunicorn_config()
+    assert config['workers'] == 1
+    assert config['threads'] == 8
+
+def test_gunicorn_folds_exited_worker_metrics(tmp_path, monkeypatch):
+    """Test the child_exit hook merges metrics files of exited workers"""
+    from aceest.metrics import EXITED_FILE
+    monkeypatch.setenv('METRICS_DIR', str(tmp_path))
+    # No process has pid 2**22 + 1 (above the default pid_max of most hosts)
+    (tmp_path / f'metrics_{2 ** 22 + 1}.db').write_bytes(b'')
+    load_gunicorn_config()['child_exit'](None, None)
+    assert os.listdir(tmp_path) == [EXITED_FILE]